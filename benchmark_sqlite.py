@@ -0,0 +1,198 @@
+"""
+SQLite write throughput benchmark: default engine vs production profile.
+
+Воспроизводит реальную нагрузку процесса бота - несколько потоков пишут
+в одну БД одновременно:
+    - bot:        добавление аккаунтов (по одному и пачками)
+    - dispatcher: пометка аккаунтов done после проверки
+    - worker:     аренда / завершение заданий check_jobs
+    - expiry:     чтение истекающих аккаунтов + запись ExpiryNotification
+    - keys:       списание квоты API ключей
+
+Usage:
+    python benchmark_sqlite.py [--seconds 10] [--threads-per-role 2]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account, APIKey, ExpiryNotification
+from services.accounts import create_account, bulk_create_accounts
+from services.job_queue import enqueue_check_jobs, lease_jobs, complete_job
+
+USERS = 20
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commits = 0
+        self.locked_errors = 0
+        self.latencies = []
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.commits += 1
+            self.latencies.append(seconds)
+
+    def error(self) -> None:
+        with self.lock:
+            self.locked_errors += 1
+
+
+def seed(SessionLocal) -> None:
+    with SessionLocal() as session:
+        for user_id in range(1, USERS + 1):
+            session.add(User(id=user_id, username=f"user{user_id}", is_active=True))
+            session.add(APIKey(user_id=user_id, key=f"key-{user_id}", qty_req=0))
+        session.commit()
+        for user_id in range(1, USERS + 1):
+            bulk_create_accounts(session, user_id, [f"seed_{user_id}_{i}" for i in range(200)])
+
+
+def role_bot(SessionLocal, stats: Stats, stop: threading.Event, n: int) -> None:
+    i = 0
+    while not stop.is_set():
+        i += 1
+        user_id = random.randint(1, USERS)
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            if i % 10 == 0:
+                bulk_create_accounts(session, user_id, [f"bulk_{n}_{i}_{k}" for k in range(20)])
+            else:
+                create_account(session, user_id, f"bot_{n}_{i}", 30)
+        stats.record(time.perf_counter() - started)
+
+
+def role_dispatcher(SessionLocal, stats: Stats, stop: threading.Event, n: int) -> None:
+    while not stop.is_set():
+        user_id = random.randint(1, USERS)
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            acc = session.query(Account).filter(
+                Account.user_id == user_id, Account.done == False
+            ).order_by(Account.from_date.asc()).first()
+            if acc:
+                acc.done = True
+                acc.date_of_finish = date.today()
+            session.commit()
+        stats.record(time.perf_counter() - started)
+
+
+def role_worker(SessionLocal, stats: Stats, stop: threading.Event, n: int) -> None:
+    worker_id = f"bench-{n}"
+    while not stop.is_set():
+        user_id = random.randint(1, USERS)
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            ids = [a.id for a in session.query(Account.id).filter(Account.user_id == user_id).limit(3)]
+            enqueue_check_jobs(session, user_id, ids)
+            for job in lease_jobs(session, worker_id, 3, 60):
+                complete_job(session, job.id, worker_id, {"success": True})
+        stats.record(time.perf_counter() - started)
+
+
+def role_expiry(SessionLocal, stats: Stats, stop: threading.Event, n: int) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            accounts = session.query(Account).filter(
+                Account.done == False,
+                Account.to_date <= date.today() + timedelta(days=60)
+            ).limit(5).all()
+            for acc in accounts:
+                session.add(ExpiryNotification(
+                    account_id=acc.id,
+                    user_id=acc.user_id,
+                    notification_type="expiring_soon",
+                    notification_date=date.today() - timedelta(days=random.randint(0, 500000)),
+                ))
+            try:
+                session.commit()
+            except IntegrityError:
+                # Duplicate notification - same as the scheduler, skip
+                session.rollback()
+        stats.record(time.perf_counter() - started)
+
+
+def role_keys(SessionLocal, stats: Stats, stop: threading.Event, n: int) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        with SessionLocal() as session:
+            key = session.query(APIKey).filter(APIKey.user_id == random.randint(1, USERS)).first()
+            key.qty_req = (key.qty_req or 0) + 1
+            session.commit()
+        stats.record(time.perf_counter() - started)
+
+
+ROLES = [role_bot, role_dispatcher, role_worker, role_expiry, role_keys]
+
+
+def run_profile(name: str, production: bool, seconds: float, threads_per_role: int) -> Stats:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = get_engine(f"sqlite:///{db_path}", sqlite_production=production)
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+    seed(SessionLocal)
+
+    stats = Stats()
+    stop = threading.Event()
+
+    def guarded(role, n):
+        while not stop.is_set():
+            try:
+                role(SessionLocal, stats, stop, n)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                stats.error()
+
+    threads = [
+        threading.Thread(target=guarded, args=(role, n), daemon=True)
+        for role in ROLES for n in range(threads_per_role)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join(timeout=30)
+    engine.dispose()
+
+    latencies = sorted(stats.latencies) or [0.0]
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(
+        f"{name:<12} {stats.commits / seconds:>10.1f} tx/s   "
+        f"p50 {p50:>7.1f} ms   p95 {p95:>7.1f} ms   'database is locked': {stats.locked_errors}"
+    )
+    return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="SQLite write throughput benchmark")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--threads-per-role", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    print("=" * 70)
+    print(f"SQLite benchmark: {len(ROLES)} roles x {args.threads_per_role} threads, {args.seconds:.0f}s per profile")
+    print("=" * 70)
+    run_profile("default", False, args.seconds, args.threads_per_role)
+    run_profile("production", True, args.seconds, args.threads_per_role)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Migration: Add adaptive check schedule columns to accounts
+
+- accounts.next_check_at (NULL = check on the next run)
+- accounts.check_backoff (checks in a row without changes)
+- ix_accounts_user_done_next_check (user_id, done, next_check_at)
+
+Существующие аккаунты начинают с уровня 0 и проверяются на ближайшем прогоне.
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+
+def migrate(db_url: str = None):
+    """Add next_check_at / check_backoff columns and the due-accounts index"""
+    if db_url is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        db_url = os.getenv("DB_URL", "sqlite:///bot.db")
+    engine = create_engine(db_url, echo=False)
+
+    with engine.connect() as conn:
+        columns = [c["name"] for c in inspect(conn).get_columns("accounts")]
+
+        if 'next_check_at' not in columns:
+            print("[MIGRATION] Adding next_check_at column to accounts table...")
+            conn.execute(text("ALTER TABLE accounts ADD COLUMN next_check_at TIMESTAMP"))
+            conn.commit()
+            print("[MIGRATION] ✅ Added next_check_at column")
+        else:
+            print("[MIGRATION] ⚠️ next_check_at column already exists")
+
+        if 'check_backoff' not in columns:
+            print("[MIGRATION] Adding check_backoff column to accounts table...")
+            conn.execute(text("ALTER TABLE accounts ADD COLUMN check_backoff INTEGER DEFAULT 0"))
+            conn.execute(text("UPDATE accounts SET check_backoff = 0 WHERE check_backoff IS NULL"))
+            conn.commit()
+            print("[MIGRATION] ✅ Added check_backoff column")
+        else:
+            print("[MIGRATION] ⚠️ check_backoff column already exists")
+
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("accounts")}
+
+        if 'ix_accounts_user_done_next_check' not in indexes:
+            conn.execute(text(
+                "CREATE INDEX ix_accounts_user_done_next_check ON accounts (user_id, done, next_check_at)"
+            ))
+            conn.commit()
+            print("[MIGRATION] ✅ Created index ix_accounts_user_done_next_check")
+        else:
+            print("[MIGRATION] ⚠️ ix_accounts_user_done_next_check already exists")
+
+    print("[MIGRATION] ✅ Migration completed successfully!")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if migrate(sys.argv[1] if len(sys.argv) > 1 else None) else 1)
@@ -0,0 +1,87 @@
+"""
+Migration: Add normalized username column and lookup indexes to accounts
+
+- accounts.account_norm (lower case, no @ / spaces) + backfill
+- ux_accounts_user_account_norm UNIQUE (user_id, account_norm)
+- ix_accounts_user_done_from_date (user_id, done, from_date)
+
+Если у пользователя уже есть аккаунты, отличающиеся только регистром
+(Alpha / alpha), уникальный индекс не создаётся: миграция выводит список
+дубликатов - удалите лишние и запустите миграцию ещё раз.
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'project'))
+
+from models import account_norm
+
+BATCH_SIZE = 1000
+
+
+def migrate(db_url: str = None):
+    """Add account_norm column, backfill it and create indexes"""
+    if db_url is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        db_url = os.getenv("DB_URL", "sqlite:///bot.db")
+    engine = create_engine(db_url, echo=False)
+
+    with engine.connect() as conn:
+        columns = [c["name"] for c in inspect(conn).get_columns("accounts")]
+
+        if 'account_norm' not in columns:
+            print("[MIGRATION] Adding account_norm column to accounts table...")
+            conn.execute(text("ALTER TABLE accounts ADD COLUMN account_norm VARCHAR"))
+            conn.commit()
+            print("[MIGRATION] ✅ Added account_norm column")
+        else:
+            print("[MIGRATION] ⚠️ account_norm column already exists")
+
+        # Backfill (в Python: та же нормализация, что и в приложении)
+        rows = conn.execute(text("SELECT id, account FROM accounts WHERE account_norm IS NULL")).fetchall()
+        for i in range(0, len(rows), BATCH_SIZE):
+            conn.execute(
+                text("UPDATE accounts SET account_norm = :norm WHERE id = :id"),
+                [{"id": row[0], "norm": account_norm(row[1])} for row in rows[i:i + BATCH_SIZE]]
+            )
+        conn.commit()
+        print(f"[MIGRATION] ✅ Backfilled account_norm for {len(rows)} accounts")
+
+        indexes = {ix["name"] for ix in inspect(conn).get_indexes("accounts")}
+
+        if 'ix_accounts_user_done_from_date' not in indexes:
+            conn.execute(text(
+                "CREATE INDEX ix_accounts_user_done_from_date ON accounts (user_id, done, from_date)"
+            ))
+            conn.commit()
+            print("[MIGRATION] ✅ Created index ix_accounts_user_done_from_date")
+        else:
+            print("[MIGRATION] ⚠️ ix_accounts_user_done_from_date already exists")
+
+        if 'ux_accounts_user_account_norm' not in indexes:
+            duplicates = conn.execute(text(
+                "SELECT user_id, account_norm, COUNT(*) FROM accounts "
+                "GROUP BY user_id, account_norm HAVING COUNT(*) > 1"
+            )).fetchall()
+            if duplicates:
+                print(f"[MIGRATION] ❌ {len(duplicates)} case-insensitive duplicates, unique index NOT created:")
+                for user_id, norm, count in duplicates[:50]:
+                    print(f"[MIGRATION]    user_id={user_id} @{norm}: {count} accounts")
+                return False
+            conn.execute(text(
+                "CREATE UNIQUE INDEX ux_accounts_user_account_norm ON accounts (user_id, account_norm)"
+            ))
+            conn.commit()
+            print("[MIGRATION] ✅ Created unique index ux_accounts_user_account_norm")
+        else:
+            print("[MIGRATION] ⚠️ ux_accounts_user_account_norm already exists")
+
+    print("[MIGRATION] ✅ Migration completed successfully!")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if migrate(sys.argv[1] if len(sys.argv) > 1 else None) else 1)
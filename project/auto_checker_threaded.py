@@ -6,11 +6,11 @@ from sqlalchemy.orm import sessionmaker
 
 try:
     from .utils.bot_proxy import ThreadSafeBotProxy
-    from .utils.async_bot_wrapper import AsyncBotWrapper
+    from .utils.async_bot_wrapper import get_async_bot
     from .cron.auto_checker import check_pending_accounts
 except ImportError:
     from utils.bot_proxy import ThreadSafeBotProxy
-    from utils.async_bot_wrapper import AsyncBotWrapper
+    from utils.async_bot_wrapper import get_async_bot
     from cron.auto_checker import check_pending_accounts
 
 class AutoCheckerThread:
@@ -54,7 +54,7 @@ class AutoCheckerThread:
 
     async def _runner(self, loop):
         # Создаем асинхронную обертку для бота
-        async_bot = AsyncBotWrapper(self._bot_token)
+        async_bot = get_async_bot(self._bot_token)
         bot_proxy = ThreadSafeBotProxy(async_bot, self._main_loop)
 
         # 1) первый прогон (опционально)
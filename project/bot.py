@@ -5,6 +5,7 @@ import time
 import json
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 from typing import Dict, Any
 
@@ -60,6 +61,8 @@ class TelegramBot:
         self.last_update_id = 0
         # FSM state storage (user_id -> state_data)
         self.fsm_states = {}
+        # Async transport (utils.telegram_transport), set in main()
+        self.transport = None
     
     def get_updates(self) -> Dict[str, Any]:
         """Get updates from Telegram API."""
@@ -77,9 +80,48 @@ class TelegramBot:
             print(f"Error getting updates: {e}")
             return {"ok": False, "result": []}
     
+    def _api_call(self, method: str, data: Dict[str, Any], files: Dict[str, tuple] = None,
+                  timeout: float = 60) -> Dict[str, Any]:
+        """
+        Call Telegram Bot API method.
+        
+        With async transport started, the call goes through its send queue
+        (rate limits, 429 retries); otherwise a direct blocking request is made.
+        Coroutines use api_call() instead: a blocking call in the transport
+        loop thread is refused with {"ok": False}.
+        """
+        if self.transport is not None:
+            if self.transport.in_loop_thread():
+                # Ждать ответ здесь нельзя (встанет сам транспорт), а без ответа
+                # вызывающий не узнает ни об ошибке, ни message_id - не отправляем
+                description = f"{method}: blocking call in the transport loop thread, use await bot.api_call()"
+                print(f"[BOT] ❌ {description}")
+                return {"ok": False, "description": description}
+            try:
+                return self.transport.submit(method, data, files).result(timeout=timeout)
+            except Exception as e:
+                return {"ok": False, "description": str(e)}
+        
+        url = f"{self.api_url}/{method}"
+        try:
+            if files:
+                field, (path, filename, content_type) = next(iter(files.items()))
+                with open(path, 'rb') as f:
+                    response = requests.post(url, data=data, files={field: (filename, f, content_type)}, timeout=30)
+            else:
+                response = requests.post(url, json=data, timeout=10)
+            return response.json()
+        except (requests.RequestException, IOError, ValueError) as e:
+            return {"ok": False, "description": str(e)}
+    
+    async def api_call(self, method: str, data: Dict[str, Any], files: Dict[str, tuple] = None) -> Dict[str, Any]:
+        """Call Telegram Bot API method from a coroutine (any event loop, incl. the transport loop)."""
+        if self.transport is not None:
+            return await self.transport.call(method, data, files)
+        return await asyncio.to_thread(self._api_call, method, data, files)
+    
     def send_message(self, chat_id: int, text: str, reply_markup: Dict = None) -> Dict:
         """Send message to chat."""
-        url = f"{self.api_url}/sendMessage"
         data = {
             "chat_id": chat_id,
             "text": text,
@@ -89,50 +131,32 @@ class TelegramBot:
         if reply_markup:
             data["reply_markup"] = json.dumps(reply_markup)
         
-        try:
-            response = requests.post(url, json=data, timeout=10)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("ok", False):
-                return result.get("result", {})
-            else:
-                return {"message_id": None}
-        except requests.RequestException as e:
-            print(f"Error sending message: {e}")
+        result = self._api_call("sendMessage", data)
+        if not result.get("ok", False):
+            print(f"Error sending message: {result.get('description')}")
             # Try to send without HTML parsing if that's the issue
-            try:
-                data.pop("parse_mode", None)
-                response = requests.post(url, json=data, timeout=10)
-                response.raise_for_status()
-                result = response.json()
-                if result.get("ok", False):
-                    return result.get("result", {})
-                else:
-                    return {"message_id": None}
-            except requests.RequestException as e2:
-                print(f"Error sending message (retry): {e2}")
-            return {"message_id": None}
+            data.pop("parse_mode", None)
+            result = self._api_call("sendMessage", data)
+            if not result.get("ok", False):
+                print(f"Error sending message (retry): {result.get('description')}")
+                return {"message_id": None}
+        return result.get("result", {})
     
     async def send_photo(self, chat_id: int, photo_path: str, caption: str = None) -> bool:
         """Send photo to chat."""
-        url = f"{self.api_url}/sendPhoto"
         data = {"chat_id": chat_id}
         
         if caption:
             data["caption"] = caption
             data["parse_mode"] = "HTML"
         
-        try:
-            with open(photo_path, 'rb') as photo:
-                files = {'photo': photo}
-                response = requests.post(url, data=data, files=files, timeout=30)
-                response.raise_for_status()
-                result = response.json()
-                print(f"[BOT] 📸 Photo send result: {result}")
-                return result.get("ok", False)
-        except (requests.RequestException, IOError) as e:
-            print(f"[BOT] ❌ Error sending photo: {e}")
+        files = {"photo": (photo_path, os.path.basename(photo_path), "image/png")}
+        result = await self.api_call("sendPhoto", data, files)
+        if not result.get("ok", False):
+            print(f"[BOT] ❌ Error sending photo: {result.get('description')}")
             return False
+        print(f"[BOT] 📸 Photo sent to {chat_id}")
+        return True
     
     def edit_message_text(self, chat_id: int, message_id: int, text: str, reply_markup: dict = None) -> bool:
         """Edit message text."""
@@ -146,12 +170,10 @@ class TelegramBot:
         if reply_markup:
             data["reply_markup"] = json.dumps(reply_markup)
         
-        try:
-            response = requests.post(f"{self.api_url}/editMessageText", json=data)
-            return response.json().get("ok", False)
-        except requests.RequestException as e:
-            print(f"Error editing message: {e}")
-            return False
+        result = self._api_call("editMessageText", data)
+        if not result.get("ok", False):
+            print(f"Error editing message: {result.get('description')}")
+        return result.get("ok", False)
     
     def delete_message(self, chat_id: int, message_id: int) -> bool:
         """Delete message."""
@@ -160,12 +182,34 @@ class TelegramBot:
             "message_id": message_id
         }
         
+        result = self._api_call("deleteMessage", data)
+        if not result.get("ok", False):
+            print(f"Error deleting message: {result.get('description')}")
+        return result.get("ok", False)
+    
+    def handle_update(self, update: Dict[str, Any], session_factory) -> None:
+        """
+        Handle single update (runs in the updates thread, off the event loop).
+        
+        Args:
+            update: Telegram update
+            session_factory: SQLAlchemy session factory
+        """
         try:
-            response = requests.post(f"{self.api_url}/deleteMessage", json=data)
-            return response.json().get("ok", False)
-        except requests.RequestException as e:
-            print(f"Error deleting message: {e}")
-            return False
+            if "message" in update:
+                message = update["message"]
+                
+                # Check for web_app_data (from Mini App)
+                if "web_app_data" in message:
+                    self.process_web_app_data(message, session_factory)
+                else:
+                    asyncio.run(self.process_message(message, session_factory))
+            elif "callback_query" in update:
+                self.process_callback_query(update["callback_query"], session_factory)
+        except Exception as e:
+            print(f"Error handling update {update.get('update_id')}: {e}")
+            import traceback
+            traceback.print_exc()
     
     def process_web_app_data(self, message: Dict[str, Any], session_factory) -> None:
         """Process data from Telegram Mini App."""
@@ -300,12 +344,10 @@ class TelegramBot:
         if show_alert:
             data["show_alert"] = True
         
-        try:
-            response = requests.post(f"{self.api_url}/answerCallbackQuery", json=data)
-            return response.json().get("ok", False)
-        except requests.RequestException as e:
-            print(f"Error answering callback query: {e}")
-            return False
+        result = self._api_call("answerCallbackQuery", data)
+        if not result.get("ok", False):
+            print(f"Error answering callback query: {result.get('description')}")
+        return result.get("ok", False)
     
     def process_callback_query(self, callback_query: Dict[str, Any], session_factory) -> None:
         """Process callback query from inline keyboards."""
@@ -1757,8 +1799,17 @@ class TelegramBot:
                             # Send error message to user
                             self.send_message(user.id, f"⚠️ Ошибка при автопроверке @{username}: {str(e)}")
                     
-                    import threading
-                    threading.Thread(target=auto_check_new_account, daemon=True).start()
+                    if get_settings().check_queue_enabled:
+                        # Check runs in a worker process (run_worker.py)
+                        try:
+                            from .services.job_queue import enqueue_check_jobs, JOB_SOURCE_ADD
+                        except ImportError:
+                            from services.job_queue import enqueue_check_jobs, JOB_SOURCE_ADD
+                        with session_factory() as session:
+                            enqueue_check_jobs(session, user.id, [acc.id], source=JOB_SOURCE_ADD, priority=10)
+                    else:
+                        import threading
+                        threading.Thread(target=auto_check_new_account, daemon=True).start()
                 
                 
                 elif state == "waiting_for_add_days":
@@ -2112,6 +2163,7 @@ class TelegramBot:
                     # Parse account list (semicolon-separated)
                     usernames = [username.strip() for username in text.split(';') if username.strip()]
                     accounts = []
+                    seen_usernames = set()
                     errors = []
                     auto_fixed_usernames = []  # Track auto-fixed usernames
                     
@@ -2131,9 +2183,10 @@ class TelegramBot:
                         # Все символы (регистр, подчеркивания, точки и т.д.) сохраняются как введено
                         
                         # Check for duplicates in input
-                        if username in [acc['username'] for acc in accounts]:
+                        if username in seen_usernames:
                             errors.append(f"Дубликат в списке: {username_input}")
                             continue
+                        seen_usernames.add(username)
                         
                         accounts.append({
                             'username': username,
@@ -2223,39 +2276,16 @@ class TelegramBot:
                     settings = get_settings()
                     fernet = OptionalFernet(settings.encryption_key)
                     
-                    added_count = 0
-                    duplicates = 0
+                    try:
+                        from .services.accounts import bulk_create_accounts
+                    except ImportError:
+                        from services.accounts import bulk_create_accounts
                     
                     with session_factory() as session:
-                        for account_data in accounts:
-                            username = account_data['username']
-                            
-                            # Check if account already exists
-                            existing = session.query(Account).filter(
-                                Account.user_id == user.id,
-                                Account.account == username
-                            ).first()
-                            
-                            if existing:
-                                duplicates += 1
-                                continue
-                            
-                            # Create new account with selected period
-                            now = datetime.now()
-                            account = Account(
-                                user_id=user.id,
-                                account=username,
-                                from_date=date.today(),
-                                from_date_time=now,  # Точное время добавления
-                                to_date=date.today() + timedelta(days=period),
-                                period=period,
-                                done=False
-                            )
-                            
-                            session.add(account)
-                            added_count += 1
-                        
-                        session.commit()
+                        added_ids, _, duplicates = bulk_create_accounts(
+                            session, user.id, [account_data['username'] for account_data in accounts], period
+                        )
+                    added_count = len(added_ids)
                     
                     # Clear FSM
                     del self.fsm_states[user_id]
@@ -2294,6 +2324,16 @@ class TelegramBot:
                         
                         # Start automatic check for added accounts
                         print(f"[MASS-ADD] 🚀 Starting auto-check for {added_count} accounts")
+                        if settings.check_queue_enabled:
+                            # Check runs in worker processes (run_worker.py)
+                            try:
+                                from .services.job_queue import enqueue_check_jobs, JOB_SOURCE_ADD
+                            except ImportError:
+                                from services.job_queue import enqueue_check_jobs, JOB_SOURCE_ADD
+                            with session_factory() as session:
+                                enqueue_check_jobs(session, user.id, added_ids, source=JOB_SOURCE_ADD, priority=10)
+                            self.send_message(chat_id, result_message, main_menu(is_admin=ensure_admin(user), verify_mode=verify_mode))
+                            return
                         try:
                             import asyncio
                             from .services.main_checker import check_account_main
@@ -2303,11 +2343,11 @@ class TelegramBot:
                                 print(f"[AUTO-CHECK] 🔍 Starting auto-check for user {user.id}")
                                 try:
                                     with session_factory() as session:
-                                        # Get recently added accounts for this user
+                                        # Accounts added by this import
                                         recent_accounts = session.query(Account).filter(
-                                            Account.user_id == user.id,
+                                            Account.id.in_(added_ids),
                                             Account.done == False
-                                        ).order_by(Account.id.desc()).limit(added_count).all()
+                                        ).order_by(Account.id).all()
                                         
                                         print(f"[AUTO-CHECK] 📋 Found {len(recent_accounts)} accounts to check")
                                         
@@ -3290,10 +3330,10 @@ class TelegramBot:
                     elif text == "Проверка через API (все)":
                         try:
                             from .models import Account
-                            from .services.check_via_api import check_account_exists_via_api
+                            from .services.check_via_api import check_accounts_exist_via_api_batch
                         except ImportError:
                             from models import Account
-                            from services.check_via_api import check_account_exists_via_api
+                            from services.check_via_api import check_accounts_exist_via_api_batch
                         
                         with session_factory() as s:
                             accs = s.query(Account).filter(Account.user_id == user.id, Account.done == False).all()
@@ -3309,20 +3349,25 @@ class TelegramBot:
                                 try:
                                     ok_count = nf_count = unk_count = 0
                                     import asyncio
-                                    for a in accs:
+                                    
+                                    async def run_batch():
+                                        nonlocal ok_count, nf_count, unk_count
+                                        # All usernames spread across all working keys, results stream in
                                         with session_factory() as s2:
-                                            info = asyncio.run(check_account_exists_via_api(s2, user.id, a.account))
-                                        
-                                        if info["exists"] is True:
-                                            ok_count += 1
-                                        elif info["exists"] is False:
-                                            nf_count += 1
-                                        else:
-                                            unk_count += 1
-                                        
-                                        mark = "✅" if info["exists"] is True else ("❌" if info["exists"] is False else "❓")
-                                        error_msg = f" — {info.get('error')}" if info.get('error') else " — ok"
-                                        self.send_message(chat_id, f"{mark} @{info['username']}{error_msg}")
+                                            usernames = [a.account for a in accs]
+                                            async for info in check_accounts_exist_via_api_batch(s2, user.id, usernames):
+                                                if info["exists"] is True:
+                                                    ok_count += 1
+                                                elif info["exists"] is False:
+                                                    nf_count += 1
+                                                else:
+                                                    unk_count += 1
+                                                
+                                                mark = "✅" if info["exists"] is True else ("❌" if info["exists"] is False else "❓")
+                                                error_msg = f" — {info.get('error')}" if info.get('error') else " — ok"
+                                                self.send_message(chat_id, f"{mark} @{info['username']}{error_msg}")
+                                    
+                                    asyncio.run(run_batch())
                                     
                                     self.send_message(chat_id, 
                                         f"Готово: найдено — {ok_count}, не найдено — {nf_count}, неизвестно — {unk_count}."
@@ -3915,6 +3960,13 @@ async def main():
     init_db(engine)
     logger.info("Database initialized")
     
+    # Batched writes of check results and counters (flushed on shutdown)
+    try:
+        from .services.write_behind import start_write_behind, stop_write_behind
+    except ImportError:
+        from services.write_behind import start_write_behind, stop_write_behind
+    start_write_behind(session_factory)
+    
     # Create bot
     bot = TelegramBot(settings.bot_token)
     logger.info("Bot created")
@@ -3976,42 +4028,60 @@ async def main():
     if next_expiry:
         logger.info(f"Next expiry notification scheduled at: {next_expiry}")
     
+    # Async transport: long polling and outgoing queue don't block the event loop
+    try:
+        from .utils.telegram_transport import TelegramTransport
+    except ImportError:
+        from utils.telegram_transport import TelegramTransport
+    
+    transport = TelegramTransport(settings.bot_token)
+    await transport.start()
+    bot.transport = transport
+    
+    # Handlers are synchronous: process updates in order in a dedicated thread
+    update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tg-updates")
+    loop = asyncio.get_running_loop()
+    
     # Start polling
     logger.info("Starting polling...")
     
-    while True:
-        try:
-            updates = bot.get_updates()
-            
-            if updates.get("ok") and updates.get("result"):
-                for update in updates["result"]:
-                    bot.last_update_id = update["update_id"]
-                    
-                    if "message" in update:
-                        message = update["message"]
-                        
-                        # Check for web_app_data (from Mini App)
-                        if "web_app_data" in message:
-                            bot.process_web_app_data(message, session_factory)
-                        else:
-                            await bot.process_message(message, session_factory)
-                    elif "callback_query" in update:
-                        bot.process_callback_query(update["callback_query"], session_factory)
-            
-            time.sleep(1)  # Small delay between requests
-            
-        except KeyboardInterrupt:
-            logger.info("Bot stopped by user")
-            # Stop scheduler
+    try:
+        while True:
             try:
-                _checker_scheduler.stop()
-                logger.info("APScheduler auto-checker stopped")
+                updates = await transport.get_updates(offset=bot.last_update_id + 1, timeout=30)
+                
+                for update in updates:
+                    bot.last_update_id = update["update_id"]
+                    loop.run_in_executor(update_executor, bot.handle_update, update, session_factory)
+                
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                logger.info("Bot stopped by user")
+                break
             except Exception as e:
-                logger.error(f"Error stopping auto-checker: {e}")
-            break
+                logger.error(f"Error in main loop: {e}")
+                await asyncio.sleep(5)  # Wait before retrying
+    finally:
+        # Stop scheduler
+        try:
+            _checker_scheduler.stop()
+            logger.info("APScheduler auto-checker stopped")
         except Exception as e:
-            logger.error(f"Error in main loop: {e}")
-            time.sleep(5)  # Wait before retrying
+            logger.error(f"Error stopping auto-checker: {e}")
+        update_executor.shutdown(wait=False, cancel_futures=True)
+        # Close shared keep-alive HTTP sessions of this loop
+        try:
+            from .services.http_sessions import close_http_sessions
+        except ImportError:
+            from services.http_sessions import close_http_sessions
+        await close_http_sessions()
+        # Stop profile header render processes
+        try:
+            from .services.profile_renderer import shutdown_render_pool
+        except ImportError:
+            from services.profile_renderer import shutdown_render_pool
+        shutdown_render_pool()
+        await transport.close()
+        stop_write_behind()
 
 
 if __name__ == "__main__":
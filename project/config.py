@@ -16,6 +16,21 @@ class Settings:
         self.bot_token: str = os.getenv("BOT_TOKEN", "")
         self.admin_ids: List[int] = self._parse_admin_ids(os.getenv("ADMIN_IDS", ""))
         self.db_url: str = os.getenv("DB_URL", "sqlite:///bot.db")
+
+        # SQLite production profile (WAL, synchronous=NORMAL, pooled connections, serialized writes)
+        self.sqlite_production: bool = os.getenv("SQLITE_PRODUCTION", "false").lower() == "true"
+        self.sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+        # Max wait for the write lock on an event loop thread (the whole loop waits with it)
+        self.sqlite_loop_write_wait_ms: int = int(os.getenv("SQLITE_LOOP_WRITE_WAIT_MS", "200"))
+        self.sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+        self.sqlite_cache_size_kb: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+        self.sqlite_pool_size: int = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+        # Async DB (aiosqlite / asyncpg) for the checking pipeline: DB I/O does not block the event loop
+        self.db_async: bool = os.getenv("DB_ASYNC", "false").lower() == "true"
+        # Write-behind: check results and proxy counters are written in batches (API key quota is not)
+        self.write_behind: bool = os.getenv("WRITE_BEHIND", "true").lower() == "true"
+        self.write_behind_flush_ms: int = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "500"))
+        self.write_behind_max_items: int = int(os.getenv("WRITE_BEHIND_MAX_ITEMS", "200"))
         self.log_level: str = os.getenv("LOG_LEVEL", "INFO")
         self.tz: str = os.getenv("TZ", "Asia/Aqtobe")
         
@@ -26,6 +41,12 @@ class Settings:
         self.screenshot_fallback_selector: str = os.getenv("SCREENSHOT_FALLBACK_SELECTOR", "main")
         self.screenshot_dark_theme: bool = os.getenv("SCREENSHOT_DARK_THEME", "true").lower() == "true"
 
+        # Browser pool settings (persistent Chromium per proxy)
+        self.browser_pool_max_pages: int = int(os.getenv("BROWSER_POOL_MAX_PAGES", "50"))
+        self.browser_pool_lease_seconds: int = int(os.getenv("BROWSER_POOL_LEASE_SECONDS", "180"))
+        self.browser_pool_idle_seconds: int = int(os.getenv("BROWSER_POOL_IDLE_SECONDS", "300"))
+        self.browser_pool_max_browsers: int = int(os.getenv("BROWSER_POOL_MAX_BROWSERS", "10"))
+
         # Encryption
         self.encryption_key: str = os.getenv("ENCRYPTION_KEY", "")
 
@@ -42,6 +63,71 @@ class Settings:
         self.rapidapi_url: str = os.getenv("RAPIDAPI_URL", "https://instagram210.p.rapidapi.com/ig/user/profile")
         self.api_daily_limit: int = int(os.getenv("API_DAILY_LIMIT", "950"))
         self.rapidapi_timeout_seconds: int = int(os.getenv("RAPIDAPI_TIMEOUT_SECONDS", "10"))
+        self.rapidapi_key_concurrency: int = int(os.getenv("RAPIDAPI_KEY_CONCURRENCY", "2"))  # Параллельных запросов на ключ
+        self.rapidapi_key_rps: float = float(os.getenv("RAPIDAPI_KEY_RPS", "2"))  # Запросов в секунду на ключ
+        # In-memory key ring: reload from DB every N seconds (and on key changes in this process)
+        self.key_ring_refresh_seconds: int = int(os.getenv("KEY_RING_REFRESH_SECONDS", "60"))
+        self.key_ring_auth_cooldown_seconds: int = int(os.getenv("KEY_RING_AUTH_COOLDOWN_SECONDS", "1800"))
+        # In-memory proxy index: reload from DB every N seconds (and on proxy changes in this process)
+        self.proxy_selector_refresh_seconds: int = int(os.getenv("PROXY_SELECTOR_REFRESH_SECONDS", "60"))
+        # Proxy health sweep (services/proxy_sweep.py)
+        self.proxy_sweep_concurrency: int = int(os.getenv("PROXY_SWEEP_CONCURRENCY", "50"))  # Проверок одновременно
+        self.proxy_sweep_per_host: int = int(os.getenv("PROXY_SWEEP_PER_HOST", "5"))  # Одновременно на один IP / gateway прокси
+        self.proxy_sweep_timeout_seconds: float = float(os.getenv("PROXY_SWEEP_TIMEOUT_SECONDS", "15"))
+        self.proxy_sweep_batch_size: int = int(os.getenv("PROXY_SWEEP_BATCH_SIZE", "50"))  # Результатов на одну транзакцию
+
+        # Shared HTTP connection pool (keep-alive sessions)
+        self.http_pool_limit: int = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+        self.http_pool_limit_per_host: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+        self.http_dns_cache_seconds: int = int(os.getenv("HTTP_DNS_CACHE_SECONDS", "300"))
+        self.http_keepalive_seconds: int = int(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+        # Username lookup cache (services/username_cache.py)
+        self.username_cache_exists_ttl: int = int(os.getenv("USERNAME_CACHE_EXISTS_TTL", "1800"))  # Найден (секунды)
+        self.username_cache_not_found_ttl: int = int(os.getenv("USERNAME_CACHE_NOT_FOUND_TTL", "180"))  # Не найден - короткий TTL, ждём разблокировку
+        self.username_cache_error_ttl: int = int(os.getenv("USERNAME_CACHE_ERROR_TTL", "60"))  # Ошибка проверки (0 = не кэшировать)
+        self.username_cache_max_entries: int = int(os.getenv("USERNAME_CACHE_MAX_ENTRIES", "10000"))
+        self.username_cache_db: bool = os.getenv("USERNAME_CACHE_DB", "false").lower() == "true"  # Хранить кэш в БД (переживает рестарт)
+
+        # Global auto-check dispatcher (worker pool size per stage, for all users together)
+        self.check_api_workers: int = int(os.getenv("CHECK_API_WORKERS", "2"))  # Пользователей в API-этапе одновременно
+        self.check_browser_workers: int = int(os.getenv("CHECK_BROWSER_WORKERS", "3"))  # Прокси/скриншот проверок одновременно
+        self.check_image_workers: int = int(os.getenv("CHECK_IMAGE_WORKERS", "2"))  # Генераций картинки профиля одновременно
+        self.check_first_run_spread: float = float(os.getenv("CHECK_FIRST_RUN_SPREAD", "1.0"))  # Доля интервала, по которой разносятся первые прогоны (0 = все сразу)
+
+        # Tiered check pipeline (services/check_pipeline.py): cheap tiers first, screenshot only for confirmed
+        self.check_pipeline_tiers: List[str] = [
+            t.strip() for t in os.getenv("CHECK_PIPELINE_TIERS", "cache,probe,api,screenshot").split(",") if t.strip()
+        ]
+        self.check_probe_concurrency: int = int(os.getenv("CHECK_PROBE_CONCURRENCY", "10"))  # HTTP проб одновременно в batch-автопроверке
+        self.check_probe_proxy_cooldown_seconds: int = int(os.getenv("CHECK_PROBE_PROXY_COOLDOWN_SECONDS", "300"))  # Кулдаун прокси после неясного ответа пробы
+
+        # Profile header renderer (services/profile_renderer.py): proof image for found accounts without a browser
+        self.profile_render_verify_modes: List[str] = [
+            m.strip() for m in os.getenv("PROFILE_RENDER_VERIFY_MODES", "api-v2,api+proxy,api+instagram").split(",") if m.strip()
+        ]
+        self.profile_render_process_pool: bool = os.getenv("PROFILE_RENDER_PROCESS_POOL", "true").lower() == "true"  # Рендер в пуле процессов (CHECK_IMAGE_WORKERS), false = в потоке
+
+        # Adaptive per-account check frequency (services/check_schedule.py)
+        self.check_backoff_max_level: int = int(os.getenv("CHECK_BACKOFF_MAX_LEVEL", "4"))  # До interval * 2^level между проверками (0 = каждый прогон)
+        self.check_backoff_max_minutes: int = int(os.getenv("CHECK_BACKOFF_MAX_MINUTES", "240"))  # Но не реже, чем раз в столько минут
+        self.check_unban_windows_hours: List[float] = [
+            float(h) for h in os.getenv("CHECK_UNBAN_WINDOWS_HOURS", "24,48,168,720").split(",") if h.strip()
+        ]  # Ожидаемые сроки разблокировки от добавления аккаунта - там проверяем каждый прогон
+        self.check_unban_window_margin_hours: float = float(os.getenv("CHECK_UNBAN_WINDOW_MARGIN_HOURS", "6"))
+
+        # DB job queue + worker processes (run_worker.py)
+        self.check_queue_enabled: bool = os.getenv("CHECK_QUEUE_ENABLED", "false").lower() == "true"  # Проверки выполняют воркеры, бот только ставит задания
+        self.check_worker_concurrency: int = int(os.getenv("CHECK_WORKER_CONCURRENCY", "3"))
+        self.check_worker_poll_seconds: float = float(os.getenv("CHECK_WORKER_POLL_SECONDS", "2"))
+        self.check_job_lease_seconds: int = int(os.getenv("CHECK_JOB_LEASE_SECONDS", "300"))
+        self.check_job_max_attempts: int = int(os.getenv("CHECK_JOB_MAX_ATTEMPTS", "3"))
+        self.check_job_retry_seconds: int = int(os.getenv("CHECK_JOB_RETRY_SECONDS", "60"))
+        self.check_job_retention_hours: float = float(os.getenv("CHECK_JOB_RETENTION_HOURS", "24"))  # Сколько хранить done / failed задания
+
+        # Outgoing notifications (AsyncBotWrapper.send_many)
+        self.telegram_send_rate: float = float(os.getenv("TELEGRAM_SEND_RATE", "25"))  # Сообщений в секунду (лимит Telegram ~30)
+        self.telegram_send_concurrency: int = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
     
     def _parse_admin_ids(self, admin_ids_str: str) -> List[int]:
         """Parse admin IDs from comma-separated string."""
@@ -64,6 +64,15 @@ async def send_traffic_report_to_admins(SessionLocal: sessionmaker, bot, user_id
         report += traffic_stats.get_report()
         
         # Send report to all admins
+        if hasattr(bot, 'send_many'):
+            results = await bot.send_many([{"chat_id": admin.id, "text": report} for admin in admin_users])
+            for admin, sent in zip(admin_users, results):
+                if sent:
+                    print(f"[AUTO-CHECK] 📤 Traffic report sent to admin {admin.id} (@{admin.username})")
+                else:
+                    print(f"[AUTO-CHECK] ❌ Failed to send traffic report to admin {admin.id}")
+            return
+        
         for admin in admin_users:
             try:
                 await bot.send_message(admin.id, report)
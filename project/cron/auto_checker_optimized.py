@@ -9,43 +9,62 @@ from sqlalchemy.orm import sessionmaker
 try:
     from ..models import Account, User
     from ..services.main_checker import check_account_main
+    from ..services.accounts import mark_account_done
+    from ..services.check_via_api import check_accounts_exist_via_api_batch
     from ..services.system_settings import get_global_verify_mode
     from ..services.traffic_monitor import get_traffic_monitor
     from ..services.autocheck_traffic_stats import AutoCheckTrafficStats
     from ..utils.encryptor import OptionalFernet
     from ..config import get_settings
+    from ..database import run_db
 except ImportError:
     from models import Account, User
     from services.main_checker import check_account_main
+    from services.accounts import mark_account_done
+    from services.check_via_api import check_accounts_exist_via_api_batch
     from services.system_settings import get_global_verify_mode
     from services.traffic_monitor import get_traffic_monitor
     from services.autocheck_traffic_stats import AutoCheckTrafficStats
     from utils.encryptor import OptionalFernet
     from config import get_settings
+    from database import run_db
 
 
-async def send_notification_async(bot, user, acc, screenshot_path, message_text):
-    """Send notification to user asynchronously without blocking."""
+def _mark_found(session, user_id: int, username: str) -> bool:
+    """Mark the user's account as done after a successful check."""
+    return mark_account_done(session, user_id, username)
+
+
+def build_notification(user, screenshot_path, message_text):
+    """Build notification for AsyncBotWrapper.send_many (photo with caption if screenshot exists)."""
+    notification = {"chat_id": user.id, "text": message_text}
+    if screenshot_path and os.path.exists(screenshot_path):
+        notification["photo_path"] = screenshot_path
+    return notification
+
+
+async def send_notifications(bot, notifications):
+    """Send collected notifications in one batch over the bot's pooled session."""
+    if not bot or not notifications:
+        return
     try:
-        if screenshot_path and os.path.exists(screenshot_path):
-            try:
-                await bot.send_photo(user.id, screenshot_path, message_text)
-                print(f"[AUTO-CHECK] 📸 Screenshot sent successfully!")
-            except Exception as e:
-                print(f"[AUTO-CHECK] ❌ Failed to send photo: {e}")
-                await bot.send_message(user.id, message_text)
-        else:
-            await bot.send_message(user.id, message_text)
+        results = await bot.send_many(notifications)
+        print(f"[AUTO-CHECK] 📤 Notifications sent: {sum(results)}/{len(notifications)}")
     except Exception as e:
-        print(f"[AUTO-CHECK] ❌ Failed to send notification: {e}")
+        print(f"[AUTO-CHECK] ❌ Failed to send notifications: {e}")
 
 
-async def check_single_account_optimized(acc, user_id: int, user, session, traffic_monitor, bot=None):
+async def check_single_account_optimized(acc, user_id: int, user, session, traffic_monitor, bot=None, api_result=None):
     """
     Check a single account (optimized for parallel execution).
     
+    Args:
+        session: Database session (Session or AsyncSession)
+        api_result: Result of batch API check (skips API step in check_account_main)
+    
     Returns:
-        Tuple: (acc, result_dict)
+        Tuple: (acc, result_dict); result_dict['notification'] is set for
+        found accounts and is sent by the caller in a batch
     """
     check_start_traffic = traffic_monitor.total_traffic
     check_start_time = datetime.now()
@@ -65,7 +84,8 @@ async def check_single_account_optimized(acc, user_id: int, user, session, traff
         success, message, screenshot_path = await check_account_main(
             username=acc.account,
             session=session,
-            user_id=user_id
+            user_id=user_id,
+            api_result=api_result
         )
         
         # Calculate metrics
@@ -83,18 +103,10 @@ async def check_single_account_optimized(acc, user_id: int, user, session, traff
         
         # Mark as done if found
         if success:
-            account = session.query(Account).filter(
-                Account.user_id == user_id,
-                Account.account == acc.account
-            ).first()
-            
-            if account:
-                account.done = True
-                account.date_of_finish = date.today()
-                session.commit()
+            if await run_db(session, _mark_found, user_id, acc.account):
                 result['marked_done'] = True
                 
-                # Send notification asynchronously (don't wait)
+                # Build notification (sent in a batch by the caller)
                 if bot:
                     # Calculate completion time
                     completed_text = "1 дней"
@@ -131,8 +143,7 @@ async def check_single_account_optimized(acc, user_id: int, user, session, traff
 Конец работ: {acc.to_date.strftime("%d.%m.%Y") if acc.to_date else "N/A"}
 Статус: Аккаунт разблокирован✅"""
                     
-                    # Send in background
-                    asyncio.create_task(send_notification_async(bot, user, acc, screenshot_path, notification_text))
+                    result['notification'] = build_notification(user, screenshot_path, notification_text)
             
     except Exception as e:
         print(f"[AUTO-CHECK] ❌ Error checking @{acc.account}: {str(e)}")
@@ -174,51 +185,101 @@ async def check_user_accounts_optimized(user_id: int, user_accounts: list, Sessi
         verify_mode = get_global_verify_mode(session)
         print(f"[AUTO-CHECK-OPT] 👤 User {user_id} - режим: {verify_mode}")
         
-        # Process in batches
-        total_batches = (len(user_accounts) + batch_size - 1) // batch_size
+        outbox = []
+        
+        async def flush_notifications():
+            if outbox:
+                batch = outbox[:]
+                outbox.clear()
+                await send_notifications(bot, batch)
         
-        for batch_idx in range(0, len(user_accounts), batch_size):
-            batch = user_accounts[batch_idx:batch_idx + batch_size]
-            batch_num = batch_idx // batch_size + 1
+        def record(item):
+            nonlocal checked, found, not_found, errors
+            if isinstance(item, Exception):
+                print(f"[AUTO-CHECK-OPT] ❌ Exception in batch: {item}")
+                errors += 1
+                return
             
-            print(f"[AUTO-CHECK-OPT] 📦 Batch {batch_num}/{total_batches}: {len(batch)} accounts in parallel...")
+            acc, result = item
+            checked += 1
             
-            # Create parallel tasks
-            tasks = [check_single_account_optimized(acc, user_id, user, session, traffic_monitor, bot) for acc in batch]
+            # Add to traffic stats
+            traffic_stats.add_check(
+                username=acc.account,
+                is_active=result['success'],
+                traffic_bytes=result['traffic_bytes'],
+                duration_ms=result['duration_ms'],
+                error=result['error']
+            )
             
-            # Execute in parallel
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+            if result['error']:
+                errors += 1
+            elif result['success']:
+                found += 1
+                print(f"[AUTO-CHECK-OPT] ✅ @{acc.account} - FOUND")
+                if result.get('notification'):
+                    outbox.append(result['notification'])
+            else:
+                not_found += 1
+                print(f"[AUTO-CHECK-OPT] ❌ @{acc.account} - NOT FOUND")
+        
+        if verify_mode != "api-v2":
+            # API step for all accounts at once (spread across all user's keys);
+            # only found accounts go on to proxy + screenshot, up to batch_size in parallel
+            accounts_by_name = {acc.account: acc for acc in user_accounts}
+            semaphore = asyncio.Semaphore(batch_size)
+            
+            async def screenshot_stage(acc, api_info):
+                async with semaphore:
+                    return await check_single_account_optimized(
+                        acc, user_id, user, session, traffic_monitor, bot, api_result=api_info
+                    )
             
-            # Process results
-            for item in batch_results:
-                if isinstance(item, Exception):
-                    print(f"[AUTO-CHECK-OPT] ❌ Exception in batch: {item}")
-                    errors += 1
+            stage_tasks = []
+            async for info in check_accounts_exist_via_api_batch(session, user_id, list(accounts_by_name)):
+                acc = accounts_by_name.get(info["username"])
+                if acc is None:
                     continue
+                if info.get("exists") is True:
+                    stage_tasks.append(asyncio.create_task(screenshot_stage(acc, info)))
+                else:
+                    record((acc, {
+                        'success': False,
+                        'traffic_bytes': 0,
+                        'duration_ms': 0,
+                        'error': info.get("exists") is None,
+                    }))
+            
+            # Notifications go out in batches as screenshots complete
+            for next_done in asyncio.as_completed(stage_tasks):
+                try:
+                    item = await next_done
+                except Exception as e:
+                    item = e
+                record(item)
+                if len(outbox) >= batch_size:
+                    await flush_notifications()
+        else:
+            # Process in batches
+            total_batches = (len(user_accounts) + batch_size - 1) // batch_size
+            
+            for batch_idx in range(0, len(user_accounts), batch_size):
+                batch = user_accounts[batch_idx:batch_idx + batch_size]
+                batch_num = batch_idx // batch_size + 1
                 
-                acc, result = item
-                checked += 1
+                print(f"[AUTO-CHECK-OPT] 📦 Batch {batch_num}/{total_batches}: {len(batch)} accounts in parallel...")
                 
-                # Add to traffic stats
-                traffic_stats.add_check(
-                    username=acc.account,
-                    is_active=result['success'],
-                    traffic_bytes=result['traffic_bytes'],
-                    duration_ms=result['duration_ms'],
-                    error=result['error']
-                )
+                # Create parallel tasks
+                tasks = [check_single_account_optimized(acc, user_id, user, session, traffic_monitor, bot) for acc in batch]
                 
-                if result['error']:
-                    errors += 1
-                elif result['success']:
-                    found += 1
-                    print(f"[AUTO-CHECK-OPT] ✅ @{acc.account} - FOUND")
-                else:
-                    not_found += 1
-                    print(f"[AUTO-CHECK-OPT] ❌ @{acc.account} - NOT FOUND")
-            
-            # No delay between batches for maximum speed
+                # Execute in parallel
+                for item in await asyncio.gather(*tasks, return_exceptions=True):
+                    record(item)
+                await flush_notifications()
+                
+                # No delay between batches for maximum speed
         
+        await flush_notifications()
         traffic_stats.finalize()
         
         print(f"[AUTO-CHECK-OPT] ✅ Complete: {checked} checked, {found} found, {not_found} not found, {errors} errors")
@@ -0,0 +1,537 @@
+"""
+Global cross-user check dispatcher.
+
+Раньше у каждого пользователя была своя APScheduler-задача со своим gather(3):
+при 40 пользователях запуски Chromium накладывались и память заканчивалась.
+Здесь один планировщик на все аккаунты:
+
+- Расписание пользователей: следующий прогон = последний прогон + User.auto_check_interval
+- API-пул (api_workers): дешёвые уровни (cache, HTTP probe) и batch API проверка
+  оставшихся аккаунтов пользователя (ключи пользователя), см. services/check_pipeline
+- Browser-пул (browser_workers): proxy + скриншот / API v2 для найденных аккаунтов
+- Генерация картинки профиля ограничена отдельно (services/stage_limits)
+- Прогон берёт только аккаунты, которым пора на проверку (services/check_schedule)
+
+Очередь browser-этапа - приоритетная, с виртуальным временем на пользователя
+(fair queuing): пользователь с 500 аккаунтами не блокирует пользователя с 5,
+а суммарная нагрузка не зависит от числа пользователей.
+
+Расписание меняется инкрементально: изменения пользователя (is_active,
+auto_check_enabled, auto_check_interval), закоммиченные через ORM, помечают
+его id, и на следующем тике перечитываются только помеченные пользователи.
+Первые прогоны новых пользователей разнесены по их интервалу (слот + jitter),
+а не стартуют все сразу.
+"""
+
+import asyncio
+import itertools
+import random
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from ..models import Account, User
+    from ..services.check_via_api import check_accounts_exist_via_api_batch
+    from ..services.system_settings import get_global_verify_mode
+    from ..services.traffic_monitor import get_traffic_monitor
+    from ..services.autocheck_traffic_stats import AutoCheckTrafficStats
+    from ..services.stage_limits import set_stage_limits, STAGE_IMAGE
+    from ..services.job_queue import enqueue_check_jobs
+    from ..services.check_pipeline import TIER_API, get_pipeline_metrics, prefilter_accounts
+    from ..services.check_schedule import (
+        OUTCOME_ERROR, OUTCOME_UNCHANGED, added_at, due_condition, plan_next_check, save_check_schedule,
+    )
+    from ..config import get_settings
+    from ..database import (
+        async_engine_for, get_async_session_factory, on_committed_changes, open_session, run_db,
+    )
+    from .auto_checker_optimized import check_single_account_optimized, send_notifications
+    from .auto_checker import send_traffic_report_to_admins
+except ImportError:
+    from models import Account, User
+    from services.check_via_api import check_accounts_exist_via_api_batch
+    from services.system_settings import get_global_verify_mode
+    from services.traffic_monitor import get_traffic_monitor
+    from services.autocheck_traffic_stats import AutoCheckTrafficStats
+    from services.stage_limits import set_stage_limits, STAGE_IMAGE
+    from services.job_queue import enqueue_check_jobs
+    from services.check_pipeline import TIER_API, get_pipeline_metrics, prefilter_accounts
+    from services.check_schedule import (
+        OUTCOME_ERROR, OUTCOME_UNCHANGED, added_at, due_condition, plan_next_check, save_check_schedule,
+    )
+    from config import get_settings
+    from database import (
+        async_engine_for, get_async_session_factory, on_committed_changes, open_session, run_db,
+    )
+    from cron.auto_checker_optimized import check_single_account_optimized, send_notifications
+    from cron.auto_checker import send_traffic_report_to_admins
+
+
+class _UserRun:
+    """State of one scheduled run of a user's pending accounts."""
+
+    def __init__(self, user_id: int, usernames: Dict[int, str], interval: int,
+                 schedule: Dict[int, Tuple[Optional[datetime], int]]):
+        self.user_id = user_id
+        self.usernames = usernames  # {account_id: username} still in progress
+        self.interval = interval
+        self.schedule = schedule  # {account_id: (added_at, check_backoff)}
+        self.schedule_rows: List[Dict[str, Any]] = []  # next_check_at updates, written on completion
+        self.traffic_stats = AutoCheckTrafficStats()
+        self.outbox: List[Dict[str, Any]] = []
+        self.checked = 0
+        self.found = 0
+        self.not_found = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+
+
+class CheckDispatcher:
+    """One scheduler for all users with per-stage worker pools."""
+
+    def __init__(
+        self,
+        SessionLocal: sessionmaker,
+        bot=None,
+        api_workers: Optional[int] = None,
+        browser_workers: Optional[int] = None,
+        image_workers: Optional[int] = None,
+        notify_batch: int = 5,
+        async_db: Optional[bool] = None,
+        first_run_spread: Optional[float] = None,
+    ):
+        """
+        Initialize dispatcher.
+
+        Args:
+            SessionLocal: SQLAlchemy session factory
+            bot: AsyncBotWrapper for notifications
+            api_workers: Users checked via API at the same time (default: settings)
+            browser_workers: Concurrent proxy/screenshot checks (default: settings)
+            image_workers: Concurrent profile image generations (default: settings)
+            notify_batch: Flush user's notifications when this many are collected
+            async_db: Run checks with AsyncSession (default: DB_ASYNC setting)
+            first_run_spread: Share of the interval over which first runs of new
+                users are spread (0 = all at once, default: settings)
+        """
+        settings = get_settings()
+        self._SessionLocal = SessionLocal
+        self._bot = bot
+        self.api_workers = api_workers or settings.check_api_workers
+        self.browser_workers = browser_workers or settings.check_browser_workers
+        self.image_workers = image_workers or settings.check_image_workers
+        self.notify_batch = notify_batch
+        self.async_db = settings.db_async if async_db is None else async_db
+        self.first_run_spread = settings.check_first_run_spread if first_run_spread is None else first_run_spread
+        # Sessions for the check stages (async factory is created in run(), bound to its loop)
+        self._check_sessions = SessionLocal
+
+        # {user_id: {"interval": minutes, "next_run": datetime}}
+        self._schedule: Dict[int, Dict[str, Any]] = {}
+        self._runs: Dict[int, _UserRun] = {}
+        # Users changed since the last tick (filled from other threads)
+        self._changed: Set[int] = set()
+        self._changed_lock = threading.Lock()
+
+        self._api_queue: Optional[asyncio.PriorityQueue] = None
+        self._browser_queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._user_virtual_time: Dict[int, float] = {}
+
+        self._running = False
+
+    # ---------- Schedule ----------
+
+    def load_users(self, run_immediately: bool = False) -> None:
+        """
+        Load all users with auto-check enabled and reconcile the schedule.
+
+        Used at startup (and as a full resync). New users get their first run
+        spread across their interval: right away with run_immediately,
+        otherwise one interval later; disabled users are dropped.
+        """
+        with self._SessionLocal() as session:
+            rows = self._query_users(session).all()
+
+        active_ids = {row.id for row in rows}
+        self._apply_users(rows, set(self._schedule) - active_ids, run_immediately)
+        # С этого момента изменения пользователей приходят через mark_users_changed
+        _dispatchers.add(self)
+        print(f"[CHECK-DISPATCHER] Found {len(self._schedule)} users with autocheck enabled")
+
+    def update_users(self, user_ids: Iterable[int]) -> None:
+        """
+        Re-read only the given users and add, update or remove their schedule.
+
+        Args:
+            user_ids: Users whose auto-check settings may have changed
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        with self._SessionLocal() as session:
+            rows = self._query_users(session).filter(User.id.in_(user_ids)).all()
+        self._apply_users(rows, user_ids - {row.id for row in rows}, run_immediately=True)
+
+    def mark_users_changed(self, user_ids: Iterable[int]) -> None:
+        """Thread-safe: reschedule these users on the next tick."""
+        with self._changed_lock:
+            self._changed.update(user_ids)
+
+    def _apply_changes(self) -> None:
+        with self._changed_lock:
+            changed, self._changed = self._changed, set()
+        if changed:
+            try:
+                self.update_users(changed)
+            except Exception as e:
+                self.mark_users_changed(changed)
+                print(f"[CHECK-DISPATCHER] ⚠️ Failed to reschedule users {sorted(changed)}: {e}")
+
+    @staticmethod
+    def _query_users(session):
+        return session.query(User.id, User.username, User.auto_check_interval).filter(
+            User.is_active == True,
+            User.auto_check_enabled == True
+        )
+
+    def _apply_users(self, rows, removed: Set[int], run_immediately: bool) -> None:
+        now = datetime.now()
+        new_users = []
+        for row in rows:
+            interval = row.auto_check_interval or 5  # Default to 5 minutes if not set
+            entry = self._schedule.get(row.id)
+            if entry is None:
+                new_users.append((row, interval))
+            elif entry["interval"] != interval:
+                last_run = entry["next_run"] - timedelta(minutes=entry["interval"])
+                entry["interval"] = interval
+                entry["next_run"] = max(now, last_run + timedelta(minutes=interval))
+                print(f"[CHECK-DISPATCHER] 🔄 User {row.id} interval changed to {interval} minutes")
+
+        # Первые прогоны: i-й из n новых пользователей попадает в свой слот интервала
+        # со случайным сдвигом внутри слота - без пика при старте и без синхронных волн
+        new_users.sort(key=lambda item: item[0].id)
+        for slot, (row, interval) in enumerate(new_users):
+            spread = timedelta(minutes=interval) * self.first_run_spread
+            offset = spread * ((slot + random.random()) / len(new_users))
+            if not run_immediately:
+                offset += timedelta(minutes=interval)
+            self._schedule[row.id] = {"interval": interval, "next_run": now + offset}
+            print(f"[CHECK-DISPATCHER] ✅ Scheduled user {row.id} (@{row.username}) - interval: {interval} minutes, "
+                  f"first run in {offset.total_seconds():.0f}s")
+
+        for user_id in removed:
+            if self._schedule.pop(user_id, None) is not None:
+                print(f"[CHECK-DISPATCHER] ⏹️ User {user_id} removed from schedule")
+
+    def next_run_time(self, user_id: Optional[int] = None) -> Optional[datetime]:
+        """Next scheduled run for a user (or the earliest across all users)."""
+        if user_id is not None:
+            entry = self._schedule.get(user_id)
+            return entry["next_run"] if entry else None
+        if not self._schedule:
+            return None
+        return min(entry["next_run"] for entry in self._schedule.values())
+
+    def _start_due_runs(self) -> None:
+        """Start runs for users whose next run time has come."""
+        self._apply_changes()
+        now = datetime.now()
+        for user_id, entry in self._schedule.items():
+            if entry["next_run"] > now:
+                continue
+            entry["next_run"] = now + timedelta(minutes=entry["interval"])
+
+            if user_id in self._runs:
+                # Previous run is still in progress (max_instances=1)
+                print(f"[CHECK-DISPATCHER] ⏭️ User {user_id}: previous run still in progress, skipping")
+                continue
+
+            try:
+                self._start_user_run(user_id, entry["interval"])
+            except Exception as e:
+                print(f"[CHECK-DISPATCHER] ❌ Failed to start run for user {user_id}: {e}")
+
+    def _start_user_run(self, user_id: int, interval: int) -> None:
+        with self._SessionLocal() as session:
+            pending = session.query(
+                Account.id, Account.account, Account.from_date_time, Account.from_date, Account.check_backoff
+            ).filter(
+                Account.user_id == user_id,
+                Account.done == False,
+                due_condition(datetime.now(), interval)
+            ).order_by(Account.from_date.asc()).all()
+            verify_mode = get_global_verify_mode(session)
+
+        if not pending:
+            print(f"[CHECK-DISPATCHER-USER-{user_id}] No accounts due for a check")
+            return
+
+        if get_settings().check_queue_enabled:
+            # Checks run in worker processes (run_worker.py)
+            with self._SessionLocal() as session:
+                queued = enqueue_check_jobs(session, user_id, [row.id for row in pending])
+            print(f"[CHECK-DISPATCHER-USER-{user_id}] 📥 Queued {queued} check jobs for workers")
+            return
+
+        run = _UserRun(
+            user_id,
+            {row.id: row.account for row in pending},
+            interval,
+            {row.id: (added_at(row.from_date_time, row.from_date), row.check_backoff or 0) for row in pending},
+        )
+        self._runs[user_id] = run
+        print(f"[CHECK-DISPATCHER-USER-{user_id}] 🚀 Run started: {len(pending)} accounts (режим: {verify_mode})")
+
+        if verify_mode == "api-v2":
+            # API v2 works through proxies - straight to browser stage
+            for account_id in run.usernames:
+                self._push_browser(user_id, account_id, None)
+        else:
+            self._api_queue.put_nowait((time.monotonic(), next(self._seq), user_id))
+
+    # ---------- Queues ----------
+
+    def _push_browser(self, user_id: int, account_id: int, api_info: Optional[Dict]) -> None:
+        """Queue account for the browser stage (start-time fair queuing across users)."""
+        start = max(self._user_virtual_time.get(user_id, 0.0), self._virtual_time)
+        finish = start + 1.0
+        self._user_virtual_time[user_id] = finish
+        self._browser_queue.put_nowait((finish, next(self._seq), user_id, account_id, api_info))
+
+    def pending(self) -> Dict[str, int]:
+        """Queued jobs per stage."""
+        return {
+            "api": self._api_queue.qsize() if self._api_queue else 0,
+            "browser": self._browser_queue.qsize() if self._browser_queue else 0,
+            "runs": len(self._runs),
+        }
+
+    # ---------- Workers ----------
+
+    async def _api_worker(self) -> None:
+        while True:
+            _, _, user_id = await self._api_queue.get()
+            try:
+                await self._run_api_stage(user_id)
+            finally:
+                self._api_queue.task_done()
+
+    async def _run_api_stage(self, user_id: int) -> None:
+        run = self._runs.get(user_id)
+        if run is None:
+            return
+        ids_by_name = {username: account_id for account_id, username in run.usernames.items()}
+
+        try:
+            async with open_session(self._check_sessions) as session:
+                # Дешёвые уровни: "не найден" сразу записываем, найденные в кэше идут на скриншот,
+                # в платный API - только кандидаты probe и неясные
+                contexts = await prefilter_accounts(session, user_id, list(ids_by_name))
+                to_api = []
+                for username, ctx in contexts.items():
+                    if ctx.confirmed:
+                        self._push_browser(user_id, ids_by_name.pop(username), ctx.api_result)
+                    elif ctx.exists is False:
+                        await self._record(run, ids_by_name.pop(username), {
+                            'success': False, 'traffic_bytes': 0, 'duration_ms': 0, 'error': False,
+                        })
+                    else:
+                        to_api.append(username)
+
+                metrics = get_pipeline_metrics()
+                last = time.monotonic()
+                async for info in check_accounts_exist_via_api_batch(session, user_id, to_api):
+                    now = time.monotonic()
+                    metrics.record(TIER_API, info.get("exists"), now - last)
+                    last = now
+                    account_id = ids_by_name.pop(info["username"], None)
+                    if account_id is None:
+                        continue
+                    if info.get("exists") is True:
+                        self._push_browser(user_id, account_id, info)
+                    else:
+                        await self._record(run, account_id, {
+                            'success': False,
+                            'traffic_bytes': 0,
+                            'duration_ms': 0,
+                            'error': info.get("exists") is None,
+                        })
+        except Exception as e:
+            print(f"[CHECK-DISPATCHER-USER-{user_id}] ❌ API stage failed: {e}")
+
+        # Accounts left without API result count as errors
+        for account_id in list(ids_by_name.values()):
+            await self._record(run, account_id, {
+                'success': False, 'traffic_bytes': 0, 'duration_ms': 0, 'error': True,
+            })
+
+    async def _browser_worker(self) -> None:
+        traffic_monitor = get_traffic_monitor()
+        while True:
+            finish, _, user_id, account_id, api_info = await self._browser_queue.get()
+            self._virtual_time = max(self._virtual_time, finish - 1.0)
+            run = self._runs.get(user_id)
+            try:
+                if run is None:
+                    continue
+                async with open_session(self._check_sessions) as session:
+                    acc = await run_db(session, lambda s: s.get(Account, account_id))
+                    user = await run_db(session, lambda s: s.get(User, user_id))
+                    if acc is None or user is None or acc.done:
+                        await self._record(run, account_id, None)
+                        continue
+                    _, result = await check_single_account_optimized(
+                        acc, user_id, user, session, traffic_monitor, self._bot, api_result=api_info
+                    )
+                await self._record(run, account_id, result)
+            except Exception as e:
+                print(f"[CHECK-DISPATCHER-USER-{user_id}] ❌ Exception in check: {e}")
+                if run is not None:
+                    await self._record(run, account_id, {
+                        'success': False, 'traffic_bytes': 0, 'duration_ms': 0, 'error': True,
+                    })
+            finally:
+                self._browser_queue.task_done()
+
+    async def _record(self, run: _UserRun, account_id: int, result: Optional[Dict[str, Any]]) -> None:
+        """Account finished (result None = skipped); completes the run after the last one."""
+        username = run.usernames.pop(account_id, None)
+        if username is None:
+            return
+
+        if result is not None:
+            run.checked += 1
+            run.traffic_stats.add_check(
+                username=username,
+                is_active=result['success'],
+                traffic_bytes=result['traffic_bytes'],
+                duration_ms=result['duration_ms'],
+                error=result['error']
+            )
+            if result['error']:
+                run.errors += 1
+                self._plan_next_check(run, account_id, OUTCOME_ERROR)
+            elif result['success']:
+                run.found += 1
+                print(f"[CHECK-DISPATCHER-USER-{run.user_id}] ✅ @{username} - FOUND")
+                if result.get('notification'):
+                    run.outbox.append(result['notification'])
+            else:
+                run.not_found += 1
+                self._plan_next_check(run, account_id, OUTCOME_UNCHANGED)
+
+        if len(run.outbox) >= self.notify_batch:
+            await self._flush(run)
+        if not run.usernames:
+            await self._complete(run)
+
+    @staticmethod
+    def _plan_next_check(run: _UserRun, account_id: int, outcome: str) -> None:
+        account_added_at, level = run.schedule.get(account_id, (None, 0))
+        next_check_at, level = plan_next_check(datetime.now(), run.interval, level, account_added_at, outcome)
+        run.schedule_rows.append({"id": account_id, "next_check_at": next_check_at, "check_backoff": level})
+
+    def _save_schedule(self, run: _UserRun) -> None:
+        if not run.schedule_rows:
+            return
+        try:
+            with self._SessionLocal() as session:
+                save_check_schedule(session, run.schedule_rows)
+                session.commit()
+        except Exception as e:
+            print(f"[CHECK-DISPATCHER-USER-{run.user_id}] ⚠️ Failed to save check schedule: {e}")
+
+    async def _flush(self, run: _UserRun) -> None:
+        if run.outbox:
+            batch = run.outbox[:]
+            run.outbox.clear()
+            await send_notifications(self._bot, batch)
+
+    async def _complete(self, run: _UserRun) -> None:
+        self._runs.pop(run.user_id, None)
+        await self._flush(run)
+        self._save_schedule(run)
+        run.traffic_stats.finalize()
+        duration = time.monotonic() - run.started_at
+        print(f"[CHECK-DISPATCHER-USER-{run.user_id}] ✅ Run complete in {duration:.1f}s: "
+              f"{run.checked} checked, {run.found} found, {run.not_found} not found, {run.errors} errors")
+        print(f"[CHECK-PIPELINE] 📊 {get_pipeline_metrics().summary()}")
+
+        if self._bot and run.checked:
+            try:
+                await send_traffic_report_to_admins(
+                    SessionLocal=self._SessionLocal,
+                    bot=self._bot,
+                    user_id=run.user_id,
+                    traffic_stats=run.traffic_stats
+                )
+            except Exception as e:
+                print(f"[CHECK-DISPATCHER-USER-{run.user_id}] ⚠️ Traffic report failed: {e}")
+
+    # ---------- Main loop ----------
+
+    def is_running(self) -> bool:
+        return self._running
+
+    async def run(self, stop_event: threading.Event, tick_seconds: float = 1.0) -> None:
+        """
+        Run schedule and worker pools until stop_event is set.
+
+        Args:
+            stop_event: Thread-safe stop flag
+            tick_seconds: How often the schedule is checked
+        """
+        self._api_queue = asyncio.PriorityQueue()
+        self._browser_queue = asyncio.PriorityQueue()
+        set_stage_limits({STAGE_IMAGE: self.image_workers})
+        async_engine = None
+        if self.async_db:
+            async_engine = async_engine_for(self._SessionLocal)
+            self._check_sessions = get_async_session_factory(async_engine)
+
+        workers = [asyncio.create_task(self._api_worker()) for _ in range(self.api_workers)]
+        workers += [asyncio.create_task(self._browser_worker()) for _ in range(self.browser_workers)]
+        self._running = True
+        _dispatchers.add(self)
+        print(f"[CHECK-DISPATCHER] 🚀 Started: api={self.api_workers}, browser={self.browser_workers}, "
+              f"image={self.image_workers} workers for {len(self._schedule)} users"
+              f"{' (async DB)' if async_engine is not None else ''}")
+
+        try:
+            while not stop_event.is_set():
+                self._start_due_runs()
+                await asyncio.sleep(tick_seconds)
+        finally:
+            self._running = False
+            _dispatchers.discard(self)
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if async_engine is not None:
+                self._check_sessions = self._SessionLocal
+                await async_engine.dispose()
+            print(f"[CHECK-DISPATCHER] 🛑 Stopped ({len(self._runs)} runs interrupted)")
+
+
+# ---------- Rescheduling on user changes ----------
+# Running dispatchers узнают об изменениях пользователей из ORM событий:
+# id копятся в session.info и передаются после commit (при rollback - забываются).
+
+_dispatchers: "weakref.WeakSet[CheckDispatcher]" = weakref.WeakSet()
+_SCHEDULE_FIELDS = ("is_active", "auto_check_enabled", "auto_check_interval")
+
+
+def _reschedule_users(users: Set[int]) -> None:
+    for dispatcher in list(_dispatchers):
+        dispatcher.mark_users_changed(users)
+
+
+# Смена username и прочих полей расписание не трогает
+on_committed_changes(User, _SCHEDULE_FIELDS, _reschedule_users, key="id")
@@ -1,23 +1,208 @@
 """Database configuration and models."""
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from typing import Optional
+import asyncio
+import sqlite3
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, object_session, sessionmaker, Session
+from sqlalchemy.pool import QueuePool, StaticPool
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Set, Union
+
+try:
+    from .config import get_settings
+except ImportError:
+    from config import get_settings
 
 # Global base for all models
 Base = declarative_base()
 
+# SQLite допускает одного писателя. Транзакции записи сессий из разных потоков
+# выстраиваются в очередь на этой блокировке (от первой записи до commit /
+# rollback - столько же SQLite держит блокировку файла), а не бьются за lock
+# файла БД. Писать без блокировки нельзя: не дождались - та же ошибка
+# "database is locked", что выдал бы сам SQLite по busy_timeout.
+# Поток с event loop не ждёт дольше SQLITE_LOOP_WRITE_WAIT_MS (иначе встанут
+# все его корутины), а если блокировку держит другая сессия этого же потока
+# (другая корутина), ошибка сразу: ожидание только заморозило бы loop вместе
+# с владельцем. Корутинам, пишущим параллельно, нужен DB_ASYNC.
+
+
+def _database_locked(reason: str) -> OperationalError:
+    return OperationalError(None, None, sqlite3.OperationalError(f"database is locked ({reason})"))
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class _SqliteWriteLock:
+    """Process-wide SQLite writer lock that knows the thread of its owner session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owner_thread: Optional[int] = None
+
+    def acquire(self, timeout: float) -> None:
+        """
+        Take the lock or raise OperationalError ("database is locked").
+
+        Raises immediately when the owner is another session of this thread,
+        waits at most SQLITE_LOOP_WRITE_WAIT_MS on an event loop thread.
+        """
+        if self._owner_thread == threading.get_ident():
+            raise _database_locked("write transaction of another session in this thread is still open")
+        if _on_event_loop():
+            timeout = min(timeout, get_settings().sqlite_loop_write_wait_ms / 1000)
+        if not self._lock.acquire(timeout=timeout):
+            print(f"[DB] ⚠️ SQLite write lock not acquired in {timeout:.2f}s")
+            raise _database_locked(f"write lock not acquired in {timeout:.2f}s")
+        self._owner_thread = threading.get_ident()
+
+    def release(self) -> None:
+        self._owner_thread = None
+        self._lock.release()
+
+
+_sqlite_write_lock = _SqliteWriteLock()
+
+
+class SerializedWriteSession(Session):
+    """Session whose write transactions run one at a time per process (SQLite, across threads)."""
+
+    _holds_write_lock = False
+
+    def _acquire_write(self) -> None:
+        if not self._holds_write_lock:
+            # Таймаут: сессия, забытая без close(), не должна навсегда блокировать запись
+            timeout = get_settings().sqlite_busy_timeout_ms / 1000
+            _sqlite_write_lock.acquire(timeout)
+            self._holds_write_lock = True
+
+    def _release_write(self) -> None:
+        if self._holds_write_lock:
+            self._holds_write_lock = False
+            # threading.Lock можно отпустить из любого потока (сессию могут закрыть не там, где писали)
+            _sqlite_write_lock.release()
+
+    def execute(self, statement, *args, **kwargs):
+        if getattr(statement, "is_dml", False):
+            self._acquire_write()
+        return super().execute(statement, *args, **kwargs)
+
+    def flush(self, objects=None):
+        if self._new or self._deleted or self.dirty:
+            self._acquire_write()
+        super().flush(objects)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._release_write()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._release_write()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._release_write()
+
+
+def _is_memory_sqlite(db_url: str) -> bool:
+    return db_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in db_url
 
-def get_engine(db_url: str):
+
+# Профиль выбирается при создании engine (get_engine(..., sqlite_production=...)),
+# сессии берут его оттуда, а не из SQLITE_PRODUCTION
+_production_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def _sqlite_production_engine(db_url: str) -> Engine:
+    """
+    SQLite engine for the multi-threaded bot: WAL, pragmas, pooled connections.
+
+    Pool:
+        - in-memory DB: StaticPool (одно соединение, иначе у каждого своя БД)
+        - file DB: QueuePool - потоки бота / планировщиков / проверок
+          получают свои соединения и читают параллельно с записью (WAL)
+    """
+    settings = get_settings()
+    connect_args = {
+        "check_same_thread": False,
+        "timeout": settings.sqlite_busy_timeout_ms / 1000,
+    }
+
+    if _is_memory_sqlite(db_url):
+        engine = create_engine(db_url, echo=False, future=True, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        engine = create_engine(
+            db_url,
+            echo=False,
+            future=True,
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=settings.sqlite_pool_size,
+            max_overflow=settings.sqlite_pool_size,
+            pool_pre_ping=False,
+        )
+
+    _apply_sqlite_pragmas(engine)
+    _production_engines.add(engine)
+    return engine
+
+
+def _apply_sqlite_pragmas(engine: Engine) -> None:
+    """Set WAL / synchronous / busy_timeout / mmap / cache pragmas on every new connection."""
+    settings = get_settings()
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={-int(settings.sqlite_cache_size_kb)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+def is_sqlite_production(engine: Engine) -> bool:
+    """True if the engine was created with the production SQLite profile."""
+    return engine in _production_engines
+
+
+def get_engine(db_url: str, sqlite_production: Optional[bool] = None):
     """
     Create SQLAlchemy engine.
     
     Args:
         db_url: Database connection URL
+        sqlite_production: Use WAL/pragmas/pool profile for SQLite
+            (default: SQLITE_PRODUCTION setting)
         
     Returns:
         SQLAlchemy engine instance
     """
+    if sqlite_production is None:
+        sqlite_production = get_settings().sqlite_production
+    if db_url.startswith("sqlite") and sqlite_production:
+        return _sqlite_production_engine(db_url)
     return create_engine(
         db_url,
         echo=False,
@@ -37,6 +222,7 @@ def get_session_factory(engine):
     """
     return sessionmaker(
         bind=engine,
+        class_=SerializedWriteSession if is_sqlite_production(engine) else Session,
         autoflush=False,
         autocommit=False,
         expire_on_commit=False,
@@ -44,6 +230,217 @@ def get_session_factory(engine):
     )
 
 
+# ---------- Async engine (checking pipeline) ----------
+
+def to_async_url(db_url: str) -> str:
+    """Map a sync DB URL to its async driver (aiosqlite / asyncpg)."""
+    if db_url.startswith("sqlite+") or "+asyncpg" in db_url:
+        return db_url
+    if db_url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + db_url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if db_url.startswith(prefix):
+            return "postgresql+asyncpg:" + db_url[len(prefix):]
+    return db_url
+
+
+def get_async_engine(db_url: str, sqlite_production: Optional[bool] = None) -> AsyncEngine:
+    """
+    Create async SQLAlchemy engine (aiosqlite / asyncpg).
+
+    DB I/O runs in the driver (aiosqlite thread / asyncpg protocol), so
+    queries do not block the event loop that drives Playwright and aiohttp.
+
+    Args:
+        db_url: Database connection URL (sync or async form)
+        sqlite_production: Apply SQLite WAL/pragmas profile (default: SQLITE_PRODUCTION setting)
+
+    Returns:
+        AsyncEngine instance
+    """
+    if sqlite_production is None:
+        sqlite_production = get_settings().sqlite_production
+    url = to_async_url(db_url)
+
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, echo=False)
+
+    kwargs = {}
+    if sqlite_production:
+        kwargs["connect_args"] = {"timeout": get_settings().sqlite_busy_timeout_ms / 1000}
+    if _is_memory_sqlite(db_url):
+        kwargs["poolclass"] = StaticPool
+    engine = create_async_engine(url, echo=False, **kwargs)
+    if sqlite_production:
+        _apply_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+
+def async_engine_for(session_factory: sessionmaker) -> AsyncEngine:
+    """Async engine for the same database as a sync session factory."""
+    engine = session_factory.kw["bind"]
+    return get_async_engine(engine.url.render_as_string(hide_password=False))
+
+
+def get_async_session_factory(engine: AsyncEngine) -> async_sessionmaker:
+    """
+    Create async session factory.
+
+    Writes are not serialized through SerializedWriteSession here: its
+    threading lock would block the event loop. SQLite busy_timeout is
+    handled in the aiosqlite thread instead.
+    """
+    return async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+async def run_db(session: Union[Session, AsyncSession], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run sync ORM code fn(session, *args, **kwargs) with either session type.
+
+    Calls on one AsyncSession are serialized (a session is not safe for
+    concurrent use by several coroutines).
+
+    With AsyncSession the function runs via run_sync: ORM code is unchanged,
+    but every round trip awaits the async driver instead of blocking the loop.
+    With a sync Session it is called directly (bot handlers, old call sites).
+    """
+    if isinstance(session, AsyncSession):
+        # AsyncSession нельзя использовать из нескольких корутин одновременно
+        lock = session.info.get("_run_db_lock")
+        if lock is None:
+            lock = session.info["_run_db_lock"] = asyncio.Lock()
+        async with lock:
+            return await session.run_sync(fn, *args, **kwargs)
+    return fn(session, *args, **kwargs)
+
+
+def insert_ignore(session: Session, model):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for the session's dialect.
+
+    Rows that hit a unique constraint are skipped by the database itself:
+    no SELECT of existing rows before the insert.
+
+    Args:
+        session: SQLAlchemy session (sync)
+        model: Mapped class or Table
+
+    Returns:
+        Insert statement; execute it with a list of row dicts
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy import insert
+        # MySQL / MariaDB: INSERT IGNORE
+        return insert(model).prefix_with("IGNORE")
+    return insert(model).on_conflict_do_nothing()
+
+
+def upsert(session: Session, model, values: Dict[str, Any], conflict_columns: Sequence[str]):
+    """
+    INSERT ... ON CONFLICT (conflict_columns) DO UPDATE for the session's dialect.
+
+    One atomic statement instead of SELECT-then-INSERT: concurrent writers
+    of the same key (bot and worker processes) do not hit IntegrityError.
+
+    Args:
+        session: SQLAlchemy session (sync)
+        model: Mapped class or Table
+        values: Column values of the row
+        conflict_columns: Columns of the unique constraint
+
+    Returns:
+        Insert statement ready to execute
+    """
+    dialect = session.get_bind().dialect.name
+    update_columns = [name for name in values if name not in conflict_columns]
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(model).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={name: stmt.excluded[name] for name in update_columns},
+        )
+    # MySQL / MariaDB: ON DUPLICATE KEY UPDATE
+    from sqlalchemy.dialects.mysql import insert
+    stmt = insert(model).values(**values)
+    return stmt.on_duplicate_key_update(**{name: stmt.inserted[name] for name in update_columns})
+
+
+@asynccontextmanager
+async def open_session(factory: Union[sessionmaker, async_sessionmaker]):
+    """Open a session from a sync or async factory and close it afterwards."""
+    session = factory()
+    try:
+        yield session
+    finally:
+        if isinstance(session, AsyncSession):
+            await session.close()
+        else:
+            session.close()
+
+
+def on_committed_changes(
+    model,
+    fields: Optional[Iterable[str]],
+    callback: Callable[[Set[Any]], None],
+    key: str = "user_id",
+) -> None:
+    """
+    Call callback with the keys of changed model rows once their transaction commits.
+
+    Inserts, deletes and updates (only of the given fields, or any field when
+    fields is None) made through the ORM are collected per session; after
+    commit the callback gets the set of target.<key> values, after rollback
+    the set is dropped. Core UPDATE / DELETE statements are not seen.
+
+    Args:
+        model: Mapped class to watch
+        fields: Attribute names whose change counts as an update, None for any
+        callback: Called with a non-empty set of keys after commit
+        key: Attribute of the changed row passed to the callback
+    """
+    info_key = f"_committed_changes_{model.__name__}_{key}_{id(callback)}"
+    fields = tuple(fields) if fields is not None else None
+
+    def remember(mapper, connection, target) -> None:
+        session = object_session(target)
+        value = getattr(target, key)
+        if session is not None and value is not None:
+            session.info.setdefault(info_key, set()).add(value)
+
+    def remember_update(mapper, connection, target) -> None:
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in fields):
+            remember(mapper, connection, target)
+
+    def after_commit(session: Session) -> None:
+        changed = session.info.pop(info_key, None)
+        if changed:
+            callback(changed)
+
+    def after_rollback(session: Session) -> None:
+        session.info.pop(info_key, None)
+
+    event.listen(model, "after_insert", remember)
+    event.listen(model, "after_update", remember if fields is None else remember_update)
+    event.listen(model, "after_delete", remember)
+    event.listen(Session, "after_commit", after_commit)
+    event.listen(Session, "after_rollback", after_rollback)
+
+
 def init_db(engine) -> None:
     """
     Initialize database tables.
@@ -13,10 +13,12 @@ from apscheduler.triggers.cron import CronTrigger
 
 try:
     from .services.expiry_notifications import check_and_send_expiry_notifications
-    from .utils.async_bot_wrapper import AsyncBotWrapper
+    from .utils.async_bot_wrapper import get_async_bot
+    from .services.http_sessions import close_http_sessions
 except ImportError:
     from services.expiry_notifications import check_and_send_expiry_notifications
-    from utils.async_bot_wrapper import AsyncBotWrapper
+    from utils.async_bot_wrapper import get_async_bot
+    from services.http_sessions import close_http_sessions
 
 
 class ExpiryNotificationScheduler:
@@ -56,8 +58,8 @@ class ExpiryNotificationScheduler:
         try:
             print(f"[EXPIRY-SCHEDULER] Starting expiry check at {datetime.now()}")
             
-            # Create bot wrapper for this check
-            async_bot = AsyncBotWrapper(self._bot_token)
+            # Shared bot wrapper (pooled keep-alive session)
+            async_bot = get_async_bot(self._bot_token)
             
             await check_and_send_expiry_notifications(
                 SessionLocal=self._SessionLocal,
@@ -115,6 +117,10 @@ class ExpiryNotificationScheduler:
         finally:
             if self._scheduler and self._scheduler.running:
                 self._scheduler.shutdown(wait=False)
+            try:
+                self._loop.run_until_complete(close_http_sessions())
+            except Exception as e:
+                print(f"[EXPIRY-SCHEDULER] ⚠️ Error closing HTTP sessions: {e}")
             self._loop.close()
     
     def start(self):
@@ -119,15 +119,11 @@ def register_admin_auto_check_handlers(bot, session_factory):
                 
                 old_interval = target_user.auto_check_interval
                 target_user.auto_check_interval = new_interval
+                # Dispatcher reschedules the user after commit (ORM events in check_dispatcher)
                 session.commit()
                 
                 username = target_user.username
             
-            # Reload scheduler to update user intervals
-            scheduler = get_checker_scheduler()
-            if scheduler:
-                scheduler.reload_users()
-            
             bot.send_message(
                 message["chat"]["id"],
                 f"✅ Интервал для @{username} (ID: {target_user_id}) изменен:\n"
@@ -174,11 +170,6 @@ def register_admin_auto_check_handlers(bot, session_factory):
                 target_user.auto_check_enabled = True
                 session.commit()
             
-            # Reload scheduler to update user settings
-            scheduler = get_checker_scheduler()
-            if scheduler:
-                scheduler.reload_users()
-            
             bot.send_message(
                 message["chat"]["id"],
                 f"✅ Автопроверка включена для @{username} (ID: {target_user_id})\n"
@@ -223,11 +214,6 @@ def register_admin_auto_check_handlers(bot, session_factory):
                 target_user.auto_check_enabled = False
                 session.commit()
             
-            # Reload scheduler to update user settings
-            scheduler = get_checker_scheduler()
-            if scheduler:
-                scheduler.reload_users()
-            
             bot.send_message(
                 message["chat"]["id"],
                 f"✅ Автопроверка выключена для @{username} (ID: {target_user_id})"
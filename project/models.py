@@ -1,7 +1,7 @@
 """Database models."""
 
-from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, func, UniqueConstraint, CheckConstraint, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, func, UniqueConstraint, CheckConstraint, Text, Index
+from sqlalchemy.orm import relationship, validates
 try:
     from .database import Base
 except ImportError:
@@ -27,22 +27,43 @@ class User(Base):
     instagram_sessions = relationship("InstagramSession", back_populates="user", cascade="all, delete-orphan")
 
 
+def account_norm(username: str) -> str:
+    """Case-insensitive lookup key for an account username (no @, no spaces, lower case)."""
+    return (username or "").strip().lstrip("@").lower()
+
+
 class Account(Base):
     """Account model."""
     
     __tablename__ = "accounts"
+    __table_args__ = (
+        # Один username на пользователя без учёта регистра; поиск по (user_id, account_norm)
+        Index("ux_accounts_user_account_norm", "user_id", "account_norm", unique=True),
+        # Скан ожидающих проверки аккаунтов пользователя (done=False, по дате добавления)
+        Index("ix_accounts_user_done_from_date", "user_id", "done", "from_date"),
+        # Аккаунты, которым пора на проверку (services/check_schedule.py)
+        Index("ix_accounts_user_done_next_check", "user_id", "done", "next_check_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     account = Column(String, index=True, nullable=False)
+    account_norm = Column(String)  # account_norm(account), заполняется автоматически
     from_date = Column(Date)
     from_date_time = Column(DateTime)  # Точное время добавления аккаунта
     period = Column(Integer)  # дни
     to_date = Column(Date)
     date_of_finish = Column(Date)
     done = Column(Boolean, default=False, index=True)
+    next_check_at = Column(DateTime)  # Не проверять раньше (NULL = на ближайшем прогоне)
+    check_backoff = Column(Integer, default=0)  # Проверок подряд без изменений (уровень backoff)
     
     user = relationship("User", back_populates="accounts")
+    
+    @validates("account")
+    def _set_account_norm(self, key, value):
+        self.account_norm = account_norm(value)
+        return value
 
 
 class APIKey(Base):
@@ -127,4 +148,45 @@ class ExpiryNotification(Base):
     __table_args__ = (
         UniqueConstraint("user_id", "account_id", "notification_type", "notification_date", 
                         name="uq_expiry_notification"),
-    )
\ No newline at end of file
+    )
+
+class CheckJob(Base):
+    """Durable check job queue (processed by worker processes)."""
+    __tablename__ = "check_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), index=True, nullable=False)
+    source = Column(String, default="auto", nullable=False)  # 'auto' | 'add'
+    status = Column(String, default="queued", nullable=False)  # 'queued' | 'leased' | 'done' | 'failed'
+    priority = Column(Integer, default=0, nullable=False)  # Больше = раньше
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    available_at = Column(DateTime, nullable=False)  # Не раньше этого времени (retry backoff)
+    lease_owner = Column(String, nullable=True)  # worker_id
+    lease_expires_at = Column(DateTime, nullable=True)  # Visibility timeout
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_check_jobs_status_available", "status", "available_at"),
+    )
+
+
+class UsernameCacheEntry(Base):
+    """Persistent tier of the username lookup cache (services/username_cache.py)."""
+    __tablename__ = "username_cache"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String, nullable=False)  # 'rapidapi' | 'api-v2'
+    username = Column(String, nullable=False)  # normalized, lowercase
+    account_exists = Column(Boolean, nullable=True)  # None = ошибка проверки
+    payload = Column(Text, nullable=False)  # JSON результата
+    expires_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("source", "username", name="uq_username_cache_source_username"),
+    )
@@ -1,18 +1,23 @@
 """Account management services."""
 
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Iterable
 from datetime import date, datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, insert, select
 
 try:
-    from ..models import Account
+    from ..models import Account, account_norm
     from ..utils.dates import today, add_days, clamp_min_days
+    from .write_behind import get_write_behind
+    from .job_queue import delete_account_jobs
 except ImportError:
-    from models import Account
+    from models import Account, account_norm
     from utils.dates import today, add_days, clamp_min_days
+    from services.write_behind import get_write_behind
+    from services.job_queue import delete_account_jobs
 
 PAGE_SIZE = 15
+BULK_CHUNK = 500
 
 
 def normalize_username(username: str) -> str:
@@ -22,11 +27,17 @@ def normalize_username(username: str) -> str:
 
 
 def find_duplicate(session: Session, user_id: int, username: str) -> Optional[Account]:
-    """Find duplicate account for user."""
+    """
+    Find duplicate account for user (case-insensitive).
+
+    Databases migrated with case-only duplicates (no unique index) may have
+    several matches - the oldest one is returned.
+    """
     return (
         session.query(Account)
-        .filter(Account.user_id == user_id, Account.account == username)
-        .one_or_none()
+        .filter(Account.user_id == user_id, Account.account_norm == account_norm(username))
+        .order_by(Account.id)
+        .first()
     )
 
 
@@ -51,6 +62,111 @@ def create_account(session: Session, user_id: int, username: str, days: int = 30
     return acc
 
 
+def bulk_create_accounts(
+    session: Session,
+    user_id: int,
+    usernames: Iterable[str],
+    days: int = 30,
+    chunk_size: int = BULK_CHUNK,
+) -> Tuple[List[int], List[str], int]:
+    """
+    Create many accounts at once (mass add).
+
+    Usernames are normalized and deduplicated (case-insensitive) in memory
+    against one query of the user's existing accounts, then inserted in chunks with executemany
+    (one commit for the whole import).
+
+    Args:
+        session: Database session
+        user_id: User ID
+        usernames: Usernames to add (may contain @, spaces, duplicates)
+        days: Period in days for every account
+        chunk_size: Rows per INSERT executemany
+
+    Returns:
+        Tuple of (inserted_ids, inserted_usernames, duplicates) -
+        ids and usernames are in input order
+    """
+    days = clamp_min_days(int(days))
+    start = today()
+    start_datetime = datetime.now()
+    to_date = add_days(start, days)
+
+    existing = {
+        norm for (norm,) in session.query(Account.account_norm).filter(Account.user_id == user_id)
+    }
+
+    new_usernames: List[str] = []
+    duplicates = 0
+    for raw in usernames:
+        username = normalize_username(raw)
+        if not username:
+            continue
+        norm = account_norm(username)
+        if norm in existing:
+            duplicates += 1
+            continue
+        existing.add(norm)
+        new_usernames.append(username)
+
+    inserted_ids: List[int] = []
+    stmt = insert(Account).returning(Account.id, sort_by_parameter_order=True)
+    for i in range(0, len(new_usernames), chunk_size):
+        rows = [
+            {
+                "user_id": user_id,
+                "account": username,
+                "account_norm": account_norm(username),
+                "from_date": start,
+                "from_date_time": start_datetime,
+                "period": days,
+                "to_date": to_date,
+                "done": False,
+                "date_of_finish": None,
+            }
+            for username in new_usernames[i:i + chunk_size]
+        ]
+        inserted_ids.extend(session.scalars(stmt, rows).all())
+    session.commit()
+
+    return inserted_ids, new_usernames, duplicates
+
+
+def mark_account_done(session: Session, user_id: int, username: str) -> bool:
+    """
+    Mark the user's account as done (found by a check).
+
+    With the write-behind buffer running the update is buffered (no commit
+    per account); otherwise it is committed right away.
+
+    Returns:
+        False if the user does not track this username
+    """
+    row = session.query(Account.id, Account.done).filter(
+        Account.user_id == user_id,
+        Account.account_norm == account_norm(username)
+    ).first()
+    if row is None:
+        return False
+    if row.done:
+        return True
+
+    buffer = get_write_behind()
+    if buffer is not None:
+        buffer.mark_account_done(user_id, username)
+        return True
+
+    try:
+        acc = session.get(Account, row.id)
+        acc.done = True
+        acc.date_of_finish = date.today()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return True
+
+
 def get_accounts_page(session: Session, user_id: int, done: bool, page: int) -> Tuple[List[Account], int]:
     """
     Возвращает (items, total_pages) для аккаунтов пользователя по статусу done.
@@ -114,6 +230,8 @@ def decrease_days(session: Session, acc: Account, amount: int) -> Account:
 
 def delete_account(session: Session, acc: Account) -> None:
     """Delete account from database."""
+    # Задания аккаунта: ondelete=CASCADE на SQLite не срабатывает
+    delete_account_jobs(session, [acc.id])
     session.delete(acc)
     session.commit()
 
@@ -158,70 +276,90 @@ def get_accounts_expiring_soon(session: Session, days_ahead: int = 3) -> List[Ac
     )
 
 
-def mass_delete_accounts_by_usernames(session: Session, user_id: int, usernames: List[str], delete_type: str = "all") -> Tuple[int, List[str]]:
+def _delete_type_filter(query, delete_type: str):
+    """Restrict account query/delete by status: 'active' | 'inactive' | 'all'."""
+    if delete_type == "active":
+        return query.filter(Account.done == False)
+    if delete_type == "inactive":
+        return query.filter(Account.done == True)
+    # For "all", no additional filter needed
+    return query
+
+
+def _delete_ids(session: Session, ids: List[int], chunk_size: int) -> int:
+    """DELETE accounts by id in chunks (SQLite parameter limit)."""
+    deleted = 0
+    for i in range(0, len(ids), chunk_size):
+        delete_account_jobs(session, ids[i:i + chunk_size])
+        deleted += (
+            session.query(Account)
+            .filter(Account.id.in_(ids[i:i + chunk_size]))
+            .delete(synchronize_session=False)
+        )
+    return deleted
+
+
+def mass_delete_accounts_by_usernames(
+    session: Session,
+    user_id: int,
+    usernames: List[str],
+    delete_type: str = "all",
+    chunk_size: int = BULK_CHUNK,
+) -> Tuple[int, List[str]]:
     """
     Mass delete accounts by usernames list with flexible matching.
+
+    Matching is case-insensitive (account_norm); for databases migrated with
+    case-only duplicates the exact spelling wins. Candidates are loaded with
+    one SELECT per chunk of usernames and deleted with DELETE ... WHERE id IN (...).
     
     Args:
         session: Database session
         user_id: User ID
         usernames: List of usernames to delete
         delete_type: Type of deletion - "active", "inactive", or "all"
+        chunk_size: Usernames / ids per statement
         
     Returns:
         Tuple of (deleted_count, not_found_usernames)
     """
-    deleted_count = 0
+    norms = list({account_norm(u) for u in usernames if account_norm(u)})
+
+    # account_norm -> [(id, account, done), ...]
+    candidates = {}
+    for i in range(0, len(norms), chunk_size):
+        rows = session.query(Account.id, Account.account, Account.account_norm, Account.done).filter(
+            Account.user_id == user_id,
+            Account.account_norm.in_(norms[i:i + chunk_size])
+        )
+        for row in rows:
+            candidates.setdefault(row.account_norm, []).append(row)
+
+    to_delete = set()
     not_found_usernames = []
-    
     for username in usernames:
         normalized_username = normalize_username(username)
-        
-        print(f"[MASS-DELETE] Поиск аккаунта: '{normalized_username}' для user_id={user_id}")
-        
-        # Try exact match first
-        account = (
-            session.query(Account)
-            .filter(Account.user_id == user_id, Account.account == normalized_username)
-            .one_or_none()
-        )
-        
-        # If not found, try case-insensitive search
-        if not account:
-            print(f"[MASS-DELETE] Точное совпадение не найдено, пробуем case-insensitive поиск...")
-            from sqlalchemy import func
-            account = (
-                session.query(Account)
-                .filter(
-                    Account.user_id == user_id,
-                    func.lower(Account.account) == func.lower(normalized_username)
-                )
-                .first()
-            )
-            
-            if account:
-                print(f"[MASS-DELETE] ✅ Найден с другим регистром: '{account.account}' вместо '{normalized_username}'")
-        
-        if not account:
+        matches = candidates.get(account_norm(normalized_username))
+        if not matches:
             print(f"[MASS-DELETE] ❌ Аккаунт не найден: '{normalized_username}'")
             not_found_usernames.append(username)
             continue
-            
+
+        # Exact match first, then case-insensitive
+        account = next((m for m in matches if m.account == normalized_username), matches[0])
+        if account.account != normalized_username:
+            print(f"[MASS-DELETE] ✅ Найден с другим регистром: '{account.account}' вместо '{normalized_username}'")
+
         # Check deletion type
-        if delete_type == "active" and not account.done:
-            session.delete(account)
-            deleted_count += 1
-        elif delete_type == "inactive" and account.done:
-            session.delete(account)
-            deleted_count += 1
-        elif delete_type == "all":
-            session.delete(account)
-            deleted_count += 1
-        else:
-            # Account doesn't match the deletion criteria
+        if delete_type == "active" and account.done:
             continue
-    
+        if delete_type == "inactive" and not account.done:
+            continue
+        to_delete.add(account.id)
+
+    deleted_count = _delete_ids(session, sorted(to_delete), chunk_size)
     session.commit()
+    print(f"[MASS-DELETE] 🗑️ user_id={user_id}: удалено {deleted_count}, не найдено {len(not_found_usernames)}")
     return deleted_count, not_found_usernames
 
 
@@ -237,19 +375,8 @@ def mass_delete_all_accounts(session: Session, user_id: int, delete_type: str =
     Returns:
         Number of deleted accounts
     """
-    query = session.query(Account).filter(Account.user_id == user_id)
-    
-    if delete_type == "active":
-        query = query.filter(Account.done == False)
-    elif delete_type == "inactive":
-        query = query.filter(Account.done == True)
-    # For "all", no additional filter needed
-    
-    accounts = query.all()
-    deleted_count = len(accounts)
-    
-    for account in accounts:
-        session.delete(account)
-    
+    query = _delete_type_filter(session.query(Account).filter(Account.user_id == user_id), delete_type)
+    delete_account_jobs(session, _delete_type_filter(select(Account.id).where(Account.user_id == user_id), delete_type))
+    deleted_count = query.delete(synchronize_session=False)
     session.commit()
-    return deleted_count
\ No newline at end of file
+    return deleted_count
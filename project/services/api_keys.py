@@ -2,25 +2,31 @@
 
 from __future__ import annotations
 from typing import Optional, List, Tuple, Dict, Any
-from datetime import datetime, date
+from datetime import datetime, time as dt_time
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from aiohttp import ClientSession, ClientTimeout
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import case, func, or_, update
 
 try:
     from ..models import APIKey
     from ..config import get_settings
+    from .http_sessions import get_rapidapi_session
 except ImportError:
     from models import APIKey
     from config import get_settings
+    from services.http_sessions import get_rapidapi_session
 
 
-def _reset_if_new_day(obj: APIKey) -> None:
-    """Reset counter if a new day has started."""
-    today = date.today()
-    if obj.ref_date is None or obj.ref_date.date() != today:
-        obj.ref_date = datetime.utcnow()
-        obj.qty_req = 0
+def _day_start() -> datetime:
+    """Start of the current quota day (ref_date is stored in UTC)."""
+    return datetime.combine(datetime.utcnow().date(), dt_time.min)
+
+
+def usage_today(key: APIKey) -> int:
+    """Requests used today (a counter left from a previous day counts as 0)."""
+    if key.ref_date is None or key.ref_date < _day_start():
+        return 0
+    return key.qty_req or 0
 
 
 def list_keys_for_user(session: Session, user_id: int) -> List[APIKey]:
@@ -40,17 +46,20 @@ def list_keys_for_user(session: Session, user_id: int) -> List[APIKey]:
         .order_by(APIKey.is_work.desc(), APIKey.qty_req.asc())
         .all()
     )
-    # Update ref_date/qty_req on the fly (display only, not saving)
+    # Show today's usage (display only: the row is not marked dirty and not saved)
     for k in keys:
-        _reset_if_new_day(k)
+        set_committed_value(k, "qty_req", usage_today(k))
     return keys
 
 
 def pick_best_key(session: Session, user_id: int) -> Optional[APIKey]:
     """
     Pick the best working API key with rotation logic.
-    Keys are used in order, and when one reaches the limit (950), 
-    the system moves to the next key.
+    Keys are picked by weighted round-robin from the in-memory key ring
+    (remaining quota, error rate, latency); keys at the limit (950) or
+    with an open circuit are skipped.
+    
+    Read-only: use claim_key_quota() before a request to actually reserve quota.
     
     Args:
         session: Database session
@@ -59,45 +68,143 @@ def pick_best_key(session: Session, user_id: int) -> Optional[APIKey]:
     Returns:
         Best available API key or None
     """
-    settings = get_settings()
-    keys = (
-        session.query(APIKey)
-        .filter(and_(APIKey.user_id == user_id, APIKey.is_work == True))
-        .order_by(APIKey.id.asc())  # Use keys in order of creation (rotation)
-        .all()
-    )
+    try:
+        from .key_ring import get_key_ring
+    except ImportError:
+        from services.key_ring import get_key_ring
     
-    for k in keys:
-        _reset_if_new_day(k)
-        # Check if this key hasn't reached the daily limit
-        if (k.qty_req or 0) < settings.api_daily_limit:
-            return k
+    for state in get_key_ring().candidates(session, user_id):
+        key = session.get(APIKey, state.id)
+        if key is not None:
+            return key
     
     return None
 
 
-def incr_usage(session: Session, key: APIKey) -> None:
+def _add_usage(session: Session, key_id: int, limit: Optional[int]) -> Optional[int]:
     """
-    Increment usage counter for an API key.
+    Atomically count one request: UPDATE api SET qty_req = qty_req + 1
+    WHERE id = :id [AND qty_req < :limit] RETURNING qty_req.
+
+    The counter restarts from 1 on a new day in the same statement, so no
+    row is read and written back from Python.
+    """
+    new_day = or_(APIKey.ref_date.is_(None), APIKey.ref_date < _day_start())
+    stmt = (
+        update(APIKey)
+        .where(APIKey.id == key_id)
+        .values(
+            qty_req=case((new_day, 1), else_=func.coalesce(APIKey.qty_req, 0) + 1),
+            ref_date=datetime.utcnow(),
+        )
+        .returning(APIKey.qty_req)
+        .execution_options(synchronize_session=False)
+    )
+    if limit is not None:
+        stmt = stmt.where(APIKey.is_work == True, or_(new_day, func.coalesce(APIKey.qty_req, 0) < limit))
+    try:
+        used = session.execute(stmt).scalar_one_or_none()
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return used
+
+
+def _log_usage(key_id: int, used: int) -> None:
+    settings = get_settings()
+    remaining = settings.api_daily_limit - used
+    print(f"🔑 API Key {key_id}: {used}/{settings.api_daily_limit} requests used (remaining: {remaining})")
+    
+    # Warn when approaching limit
+    if remaining <= 50:
+        print(f"⚠️ API Key {key_id} is approaching limit: {remaining} requests remaining")
+
+
+def claim_key_quota(session: Session, key_id: int) -> Optional[int]:
+    """
+    Reserve one request of the key's daily quota before using it.
+    
+    Concurrent workers (and processes) can never push a key over the
+    limit: the check and the increment are one SQL statement.
     
     Args:
         session: Database session
-        key: API key to increment
+        key_id: API key ID
+        
+    Returns:
+        Usage after the claim, or None if the key is exhausted / not working
     """
-    _reset_if_new_day(key)
-    old_count = key.qty_req or 0
-    key.qty_req = old_count + 1
-    key.ref_date = datetime.utcnow()
-    session.commit()
+    used = _add_usage(session, key_id, get_settings().api_daily_limit)
+    if used is not None:
+        _log_usage(key_id, used)
+    return used
+
+
+def release_key_quota(session: Session, key_id: int) -> None:
+    """
+    Give back a claimed request that was not made (network error).
     
-    # Log usage for monitoring
-    settings = get_settings()
-    remaining = settings.api_daily_limit - key.qty_req
-    print(f"🔑 API Key {key.id}: {key.qty_req}/{settings.api_daily_limit} requests used (remaining: {remaining})")
+    Args:
+        session: Database session
+        key_id: API key ID
+    """
+    try:
+        session.execute(
+            update(APIKey)
+            .where(APIKey.id == key_id, APIKey.qty_req > 0, APIKey.ref_date >= _day_start())
+            .values(qty_req=APIKey.qty_req - 1)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def exhaust_key_quota(session: Session, key_id: int) -> None:
+    """
+    Mark the key's daily quota as used up (RapidAPI reported quota exceeded).
     
-    # Warn when approaching limit
-    if remaining <= 50:
-        print(f"⚠️ API Key {key.id} is approaching limit: {remaining} requests remaining")
+    Args:
+        session: Database session
+        key_id: API key ID
+    """
+    limit = get_settings().api_daily_limit
+    new_day = or_(APIKey.ref_date.is_(None), APIKey.ref_date < _day_start())
+    try:
+        session.execute(
+            update(APIKey)
+            .where(APIKey.id == key_id)
+            .values(
+                qty_req=case(
+                    (or_(new_day, func.coalesce(APIKey.qty_req, 0) < limit), limit),
+                    else_=APIKey.qty_req,
+                ),
+                ref_date=datetime.utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def incr_usage(session: Session, key: APIKey) -> None:
+    """
+    Increment usage counter for an API key (atomic, without limit check).
+    
+    Args:
+        session: Database session
+        key: API key to increment
+    """
+    used = _add_usage(session, key.id, None)
+    if used is None:
+        return
+    # Объект обновляем без пометки dirty: commit не должен перезаписать счётчик
+    set_committed_value(key, "qty_req", used)
+    _log_usage(key.id, used)
 
 
 def set_work_status(session: Session, key: APIKey, ok: bool) -> None:
@@ -134,12 +241,12 @@ def get_api_keys_status(session: Session, user_id: int) -> List[Dict[str, Any]]:
     
     status_list = []
     for key in keys:
-        _reset_if_new_day(key)
-        remaining = max(0, settings.api_daily_limit - (key.qty_req or 0))
+        used = usage_today(key)
+        remaining = max(0, settings.api_daily_limit - used)
         status_list.append({
             "id": key.id,
             "key": key.key[:8] + "..." if len(key.key) > 8 else key.key,
-            "qty_req": key.qty_req or 0,
+            "qty_req": used,
             "limit": settings.api_daily_limit,
             "remaining": remaining,
             "is_work": key.is_work,
@@ -162,7 +269,6 @@ async def test_api_key(key_value: str, test_username: str = "instagram") -> Tupl
         Tuple of (success: bool, error: Optional[str])
     """
     settings = get_settings()
-    timeout = ClientTimeout(total=settings.rapidapi_timeout_seconds)
     headers = {
         "X-RapidAPI-Key": key_value,
         "X-RapidAPI-Host": settings.rapidapi_host,
@@ -171,27 +277,27 @@ async def test_api_key(key_value: str, test_username: str = "instagram") -> Tupl
     payload = {"username": test_username.lower()}
     
     try:
-        async with ClientSession(timeout=timeout, headers=headers) as sess:
-            async with sess.post(settings.rapidapi_url, json=payload) as resp:
-                data = await resp.json(content_type=None)
-                
-                # Check if response is valid according to new API schema
-                ok = False
-                if isinstance(data, dict):
-                    # Check for success response with result
-                    if "result" in data and data["result"]:
-                        result_data = data["result"]
-                        ok = result_data.get("username", "").lower() == test_username.lower()
-                    # Check for error response (account not found)
-                    elif "success" in data and data["success"] is False:
-                        # This is actually a valid response - account not found
-                        ok = True
-                    else:
-                        ok = False
+        sess = get_rapidapi_session()
+        async with sess.post(settings.rapidapi_url, json=payload, headers=headers) as resp:
+            data = await resp.json(content_type=None)
+            
+            # Check if response is valid according to new API schema
+            ok = False
+            if isinstance(data, dict):
+                # Check for success response with result
+                if "result" in data and data["result"]:
+                    result_data = data["result"]
+                    ok = result_data.get("username", "").lower() == test_username.lower()
+                # Check for error response (account not found)
+                elif "success" in data and data["success"] is False:
+                    # This is actually a valid response - account not found
+                    ok = True
                 else:
                     ok = False
-                
-                return ok, None if ok else "unexpected_response"
+            else:
+                ok = False
+            
+            return ok, None if ok else "unexpected_response"
     except Exception as e:
         return False, str(e)
 
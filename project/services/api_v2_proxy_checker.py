@@ -18,17 +18,27 @@ from sqlalchemy.orm import Session
 from datetime import date
 
 try:
-    from ..models import Account, Proxy
+    from ..models import Account
     from ..config import get_settings
-    from .proxy_utils import select_best_proxy, is_available
+    from ..database import run_db
+    from .proxy_selector import get_proxy_selector
     from .traffic_monitor import get_traffic_monitor
     from .traffic_decorator import TrafficAwareSession
+    from .stage_limits import stage_slot, STAGE_IMAGE
+    from .profile_renderer import generate_instagram_profile_image_improved
+    from .username_cache import get_username_cache, SOURCE_API_V2
+    from .accounts import mark_account_done
 except ImportError:
-    from models import Account, Proxy
+    from models import Account
     from config import get_settings
-    from services.proxy_utils import select_best_proxy, is_available
+    from database import run_db
+    from services.proxy_selector import get_proxy_selector
     from services.traffic_monitor import get_traffic_monitor
     from services.traffic_decorator import TrafficAwareSession
+    from services.stage_limits import stage_slot, STAGE_IMAGE
+    from services.profile_renderer import generate_instagram_profile_image_improved
+    from services.username_cache import get_username_cache, SOURCE_API_V2
+    from services.accounts import mark_account_done
 
 
 class InstagramCheckerWithProxy:
@@ -523,8 +533,13 @@ class InstagramCheckerWithProxy:
         }
 
 
+def _mark_account_finished(session: Session, user_id: int, username: str) -> bool:
+    """Mark the user's account as done. Returns True if the account was found."""
+    return mark_account_done(session, user_id, username)
+
+
 async def check_account_via_api_v2_proxy(
-    session: Session,
+    session,
     user_id: int,
     username: str,
     max_attempts: int = 1  # Changed from 3 to 1 for traffic optimization
@@ -537,7 +552,7 @@ async def check_account_via_api_v2_proxy(
     2. Если аккаунт не существует - возвращается результат без скриншота
     
     Args:
-        session: Database session
+        session: Database session (Session or AsyncSession)
         user_id: User ID
         username: Instagram username to check
         max_attempts: Maximum number of attempts
@@ -590,37 +605,25 @@ async def check_account_via_api_v2_proxy(
     screenshot_path = os.path.join(screenshot_dir, f"{username}_header_{timestamp}.png")
     
     try:
-        # Получаем список прокси для пользователя через select_best_proxy
-        # Используем весь список доступных прокси (не только is_active, но и без cooldown)
-        from datetime import datetime
+        # Доступные прокси пользователя (без кулдауна), лучшие первыми - из индекса в памяти
         proxy_list = []
         
-        # Получаем все прокси с учетом cooldown
-        all_proxies = session.query(Proxy).filter(
-            Proxy.user_id == user_id,
-            Proxy.is_active == True
-        ).all()
+        available = await get_proxy_selector().aranked(session, user_id)
         
-        print(f"[API-V2-PROXY] 🔍 Найдено прокси в БД для user_id {user_id}: {len(all_proxies)} шт.")
+        print(f"[API-V2-PROXY] 🔍 Доступно прокси для user_id {user_id}: {len(available)} шт.")
         
-        for proxy in all_proxies:
-            # Проверяем доступность через is_available (с учетом cooldown)
-            if is_available(proxy):
-                print(f"[API-V2-PROXY] 🔍 Проверяем прокси: id={proxy.id}, host={proxy.host}, username={proxy.username}, is_active={proxy.is_active}")
-                if proxy.username and proxy.password:
-                    # Извлекаем порт из host (формат host:port)
-                    if ':' in proxy.host:
-                        host, port = proxy.host.split(':', 1)
-                        proxy_str = f"{host}:{port}:{proxy.username}:{proxy.password}"
-                    else:
-                        # Если порт не указан, используем стандартный
-                        proxy_str = f"{proxy.host}:8080:{proxy.username}:{proxy.password}"
-                    proxy_list.append(proxy_str)
-                    print(f"[API-V2-PROXY] ✅ Добавлен прокси: {proxy_str}")
+        for proxy in available:
+            if proxy.username and proxy.password:
+                # Извлекаем порт из host (формат host:port)
+                if ':' in proxy.host:
+                    host, port = proxy.host.split(':', 1)
+                    proxy_str = f"{host}:{port}:{proxy.username}:{proxy.password}"
                 else:
-                    print(f"[API-V2-PROXY] ⚠️ Пропущен прокси: нет username или password")
+                    # Если порт не указан, используем стандартный
+                    proxy_str = f"{proxy.host}:8080:{proxy.username}:{proxy.password}"
+                proxy_list.append(proxy_str)
             else:
-                print(f"[API-V2-PROXY] ⚠️ Прокси {proxy.id} недоступен (в cooldown или не активен)")
+                print(f"[API-V2-PROXY] ⚠️ Пропущен прокси {proxy.id}: нет username или password")
         
         # Если у пользователя нет прокси - возвращаем ошибку
         if not proxy_list:
@@ -633,8 +636,16 @@ async def check_account_via_api_v2_proxy(
         # Инициализируем проверщик с прокси
         checker = InstagramCheckerWithProxy(proxy_list=proxy_list)
         
-        # Проверяем аккаунт
-        api_result = await checker.check_account(username, max_attempts=max_attempts, use_proxy=True)
+        # Проверяем аккаунт (общий кэш: повторная / одновременная проверка того же username не идёт через прокси)
+        api_result, from_cache = await get_username_cache().get_or_fetch(
+            SOURCE_API_V2,
+            username,
+            lambda: checker.check_account(username, max_attempts=max_attempts, use_proxy=True),
+            session,
+        )
+        if from_cache:
+            print(f"[API-V2-PROXY] ♻️ @{username}: exists={api_result.get('exists')} (из кэша)")
+            result["checked_via"] = "api-v2-cache"
         
         # Обновляем результат
         result.update({
@@ -651,22 +662,20 @@ async def check_account_via_api_v2_proxy(
         if api_result.get("exists") is True:
             print(f"[API-V2-PROXY] ✅ Аккаунт @{username} существует — генерируем шапку профиля (без браузера)")
             try:
-                import os
-                os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
-                # Импорт генератора шапки
-                from test_api_with_profile_gen import generate_instagram_profile_image_improved
-                gen = await generate_instagram_profile_image_improved(
-                    username=api_result.get('username', username),
-                    full_name=api_result.get('full_name', ''),
-                    posts=api_result.get('posts', 0),
-                    followers=api_result.get('followers', 0),
-                    following=api_result.get('following', 0),
-                    is_private=api_result.get('is_private', False),
-                    is_verified=api_result.get('is_verified', False),
-                    biography='',  # Всегда пустое описание
-                    profile_pic_url=api_result.get('profile_pic_url', ''),
-                    output_path=screenshot_path.replace('header_', 'profile_')
-                )
+                # Шапка рендерится в пуле процессов (services/profile_renderer)
+                async with stage_slot(STAGE_IMAGE):
+                    gen = await generate_instagram_profile_image_improved(
+                        username=api_result.get('username', username),
+                        full_name=api_result.get('full_name', ''),
+                        posts=api_result.get('posts', 0),
+                        followers=api_result.get('followers', 0),
+                        following=api_result.get('following', 0),
+                        is_private=api_result.get('is_private', False),
+                        is_verified=api_result.get('is_verified', False),
+                        biography='',  # Всегда пустое описание
+                        profile_pic_url=api_result.get('profile_pic_url', ''),
+                        output_path=screenshot_path.replace('header_', 'profile_')
+                    )
                 if gen.get("success"):
                     result["screenshot_path"] = gen.get("image_path")
                 else:
@@ -675,32 +684,17 @@ async def check_account_via_api_v2_proxy(
                 result["error"] = f"header_generation_exception: {e}"
             # Обновляем статус аккаунта в БД как активный (найден)
             try:
-                normalized_username = (api_result.get('username') or username).lower()
-                account = session.query(Account).filter(
-                    Account.user_id == user_id,
-                    Account.account == normalized_username
-                ).first()
-                if account:
-                    account.done = True
-                    account.date_of_finish = date.today()
-                    session.commit()
+                normalized_username = api_result.get('username') or username
+                if await run_db(session, _mark_account_finished, user_id, normalized_username):
                     print(f"[API-V2-PROXY] ✅ Аккаунт @{normalized_username} помечен как активный (найден)")
             except Exception as db_e:
-                session.rollback()
                 print(f"[API-V2-PROXY] ⚠️ Не удалось обновить статус аккаунта в БД: {db_e}")
             # DON'T return here - need to register traffic first!
         
         elif api_result.get("exists") is False:
             print(f"[API-V2-PROXY] ❌ Аккаунт @{username} не существует")
             # Помечаем аккаунт как выполненный (не найден)
-            account = session.query(Account).filter(
-                Account.user_id == user_id,
-                Account.account == username
-            ).first()
-            if account:
-                account.done = True
-                account.date_of_finish = date.today()
-                session.commit()
+            if await run_db(session, _mark_account_finished, user_id, username):
                 print(f"[API-V2-PROXY] ✅ Аккаунт @{username} помечен как выполненный (не найден)")
         
         else:
@@ -715,7 +709,12 @@ async def check_account_via_api_v2_proxy(
     duration_ms = (time.time() - start_time) * 1000
     proxy_used = result.get("proxy_used", "unknown")
     
-    if result.get("exists") is True:
+    request_size = 500  # Estimated request size
+    if result["checked_via"] == "api-v2-cache":
+        # Cached result: nothing went through the proxy
+        request_size = 0
+        estimated_traffic = 0
+    elif result.get("exists") is True:
         # Active account: larger response (profile data + screenshot loading)
         estimated_traffic = 5000  # ~5 KB
     elif result.get("exists") is False:
@@ -729,8 +728,8 @@ async def check_account_via_api_v2_proxy(
         request_id=request_id,
         success=(result.get("exists") is not None),
         status_code=200 if result.get("exists") is not None else 0,
-        request_size=500,  # Estimated request size
-        response_size=estimated_traffic - 500,  # Estimated response size
+        request_size=request_size,
+        response_size=estimated_traffic - request_size,  # Estimated response size
         duration_ms=duration_ms
     )
     
@@ -0,0 +1,364 @@
+"""
+Browser Pool - долгоживущий пул Chromium браузеров для proxy-скриншотов.
+
+Chromium принимает прокси и флаги только при запуске, поэтому пул держит
+один браузер на прокси и набор флагов запуска и выдаёт для каждой проверки
+свежий BrowserContext.
+- Браузер запускается один раз и переиспользуется между проверками
+- Аренда (lease) ограничена по времени: по истечении контексты закрываются
+- Браузер пересоздаётся после N выданных страниц (утечки памяти Chromium)
+- Фоновая health-проверка закрывает отключённые и простаивающие браузеры
+
+Пул привязан к event loop, в котором был запущен (Playwright не работает
+между loop'ами). Долгоживущие loop'ы (автопроверка) запускают пул явно через
+start_browser_pool(); короткие asyncio.run() продолжают запускать браузер
+на каждую проверку, как раньше.
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright
+
+try:
+    from ..config import get_settings
+except ImportError:
+    from config import get_settings
+
+
+def _proxy_kwargs_from_url(proxy_url: str) -> dict:
+    """Convert proxy URL to Playwright proxy kwargs."""
+    u = urlparse(proxy_url)
+    auth = {}
+    if u.username and u.password:
+        auth["username"] = u.username
+        auth["password"] = u.password
+    return {"server": f"{u.scheme}://{u.hostname}:{u.port}", **auth}
+
+
+class _PooledBrowser:
+    """Browser instance owned by the pool."""
+
+    def __init__(self, key: Tuple, browser):
+        self.key = key
+        self.browser = browser
+        self.launched_at = time.monotonic()
+        self.last_used = self.launched_at
+        self.pages_served = 0
+        self.active_leases = 0
+        self.retired = False
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+
+class BrowserLease:
+    """
+    Аренда браузера: выдаёт свежие контексты и освобождает их одним вызовом.
+
+    Без пула (owned browser) release() закрывает сам браузер — так
+    check_account_with_header_screenshot работает одинаково в обоих режимах.
+    """
+
+    def __init__(self, browser, pool: Optional["BrowserPool"] = None,
+                 entry: Optional[_PooledBrowser] = None, lease_seconds: Optional[float] = None):
+        self.browser = browser
+        self._pool = pool
+        self._entry = entry
+        self._contexts: List = []
+        self._released = False
+        self._expiry_handle = None
+
+        if pool is not None and lease_seconds:
+            loop = asyncio.get_running_loop()
+            self._expiry_handle = loop.call_later(lease_seconds, self._on_expired)
+
+    @property
+    def pooled(self) -> bool:
+        return self._pool is not None
+
+    async def new_context(self, **context_options):
+        """Create a fresh BrowserContext bound to this lease."""
+        if self._released:
+            raise RuntimeError("browser lease already released")
+        context = await self.browser.new_context(**context_options)
+        self._contexts.append(context)
+        if self._entry is not None:
+            self._entry.pages_served += 1
+        return context
+
+    def _on_expired(self):
+        if self._released:
+            return
+        print(f"[BROWSER-POOL] ⏱️ Аренда браузера истекла, принудительно закрываем контексты")
+        asyncio.ensure_future(self.release())
+
+    async def release(self) -> None:
+        """Close contexts created by this lease and return the browser (idempotent)."""
+        if self._released:
+            return
+        self._released = True
+
+        if self._expiry_handle is not None:
+            self._expiry_handle.cancel()
+            self._expiry_handle = None
+
+        for context in self._contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        self._contexts.clear()
+
+        if self._pool is not None:
+            await self._pool._release(self._entry)
+        else:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+
+
+class BrowserPool:
+    """Pool of long-lived Chromium browsers, one per (proxy, headless)."""
+
+    def __init__(
+        self,
+        max_pages_per_browser: int = 50,
+        lease_seconds: float = 180,
+        idle_seconds: float = 300,
+        max_browsers: int = 10,
+        health_check_interval: float = 60,
+    ):
+        """
+        Initialize browser pool.
+
+        Args:
+            max_pages_per_browser: Recycle browser after this many contexts
+            lease_seconds: Max time a lease may hold a browser context
+            idle_seconds: Close browsers unused for this long
+            max_browsers: Max simultaneously launched browsers
+            health_check_interval: Seconds between health sweeps
+        """
+        self.max_pages_per_browser = max_pages_per_browser
+        self.lease_seconds = lease_seconds
+        self.idle_seconds = idle_seconds
+        self.max_browsers = max_browsers
+        self.health_check_interval = health_check_interval
+
+        self._playwright = None
+        self._browsers: Dict[Tuple, _PooledBrowser] = {}
+        self._retired: List[_PooledBrowser] = []
+        self._launch_locks: Dict[Tuple, asyncio.Lock] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._launches = 0
+        self._leases = 0
+
+    @property
+    def playwright(self):
+        return self._playwright
+
+    @property
+    def is_running(self) -> bool:
+        return self._playwright is not None
+
+    async def start(self) -> None:
+        """Start Playwright driver and health checker."""
+        if self._playwright is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._playwright = await async_playwright().start()
+        self._health_task = asyncio.create_task(self._health_loop())
+        print(f"[BROWSER-POOL] 🚀 Пул браузеров запущен (max_pages={self.max_pages_per_browser}, "
+              f"lease={self.lease_seconds}s)")
+
+    async def acquire(self, proxy_url: Optional[str], headless: bool = True,
+                      args: Optional[List[str]] = None) -> BrowserLease:
+        """
+        Lease a browser for given proxy.
+
+        Args:
+            proxy_url: Proxy URL (scheme://[user:pass@]host:port) or None
+            headless: Run in headless mode
+            args: Chromium launch args (part of the pool key: other args - other browser)
+
+        Returns:
+            BrowserLease
+        """
+        if self._playwright is None:
+            raise RuntimeError("browser pool is not started")
+
+        # Флаги запуска применяются только при launch: браузер с другими
+        # args - другой браузер, а не тот же с новым контекстом
+        key = (proxy_url or "", headless, tuple(args or ()))
+        lock = self._launch_locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            entry = self._browsers.get(key)
+            if entry is not None and (not entry.is_healthy() or
+                                      entry.pages_served >= self.max_pages_per_browser):
+                reason = "отключён" if not entry.is_healthy() else f"{entry.pages_served} страниц"
+                print(f"[BROWSER-POOL] ♻️ Пересоздаём браузер ({reason})")
+                await self._retire(entry)
+                entry = None
+
+            if entry is None:
+                await self._evict_if_full()
+                launch_kwargs = {"headless": headless, "args": args or []}
+                if proxy_url:
+                    launch_kwargs["proxy"] = _proxy_kwargs_from_url(proxy_url)
+                browser = await self._playwright.chromium.launch(**launch_kwargs)
+                entry = _PooledBrowser(key, browser)
+                self._browsers[key] = entry
+                self._launches += 1
+
+            entry.active_leases += 1
+            entry.last_used = time.monotonic()
+            self._leases += 1
+
+        return BrowserLease(entry.browser, pool=self, entry=entry, lease_seconds=self.lease_seconds)
+
+    async def _release(self, entry: _PooledBrowser) -> None:
+        entry.active_leases = max(0, entry.active_leases - 1)
+        entry.last_used = time.monotonic()
+        if entry.retired and entry.active_leases == 0:
+            await self._close_entry(entry)
+
+    async def _retire(self, entry: _PooledBrowser) -> None:
+        """Detach browser from pool; close it once all leases are returned."""
+        if self._browsers.get(entry.key) is entry:
+            del self._browsers[entry.key]
+        entry.retired = True
+        if entry.active_leases == 0:
+            await self._close_entry(entry)
+        else:
+            self._retired.append(entry)
+
+    async def _close_entry(self, entry: _PooledBrowser) -> None:
+        if entry in self._retired:
+            self._retired.remove(entry)
+        try:
+            await entry.browser.close()
+        except Exception:
+            pass
+
+    async def _evict_if_full(self) -> None:
+        """Close least recently used idle browser when pool is full."""
+        if len(self._browsers) < self.max_browsers:
+            return
+        idle = [e for e in self._browsers.values() if e.active_leases == 0]
+        if idle:
+            victim = min(idle, key=lambda e: e.last_used)
+            await self._retire(victim)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.health_check()
+            except Exception as e:
+                print(f"[BROWSER-POOL] ⚠️ Ошибка health-проверки: {e}")
+
+    async def health_check(self) -> None:
+        """Close disconnected and idle browsers."""
+        now = time.monotonic()
+        for entry in list(self._browsers.values()):
+            if not entry.is_healthy():
+                print(f"[BROWSER-POOL] 💀 Браузер отключён, удаляем из пула")
+                await self._retire(entry)
+            elif entry.active_leases == 0 and now - entry.last_used > self.idle_seconds:
+                await self._retire(entry)
+
+    def stats(self) -> dict:
+        """Get pool statistics."""
+        return {
+            "browsers": len(self._browsers),
+            "retired": len(self._retired),
+            "active_leases": sum(e.active_leases for e in self._browsers.values()),
+            "launches": self._launches,
+            "leases": self._leases,
+        }
+
+    async def close(self) -> None:
+        """Close all browsers and stop Playwright."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._health_task = None
+
+        for entry in list(self._browsers.values()) + list(self._retired):
+            try:
+                await entry.browser.close()
+            except Exception:
+                pass
+        self._browsers.clear()
+        self._retired.clear()
+
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+        print(f"[BROWSER-POOL] 🛑 Пул браузеров остановлен ({self._launches} запусков на {self._leases} проверок)")
+
+
+# Пулы по event loop'ам: Playwright-объекты нельзя использовать из другого loop
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BrowserPool]" = weakref.WeakKeyDictionary()
+
+
+async def start_browser_pool() -> BrowserPool:
+    """
+    Start (or get) browser pool for the running event loop.
+
+    Returns:
+        BrowserPool instance
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        settings = get_settings()
+        pool = BrowserPool(
+            max_pages_per_browser=settings.browser_pool_max_pages,
+            lease_seconds=settings.browser_pool_lease_seconds,
+            idle_seconds=settings.browser_pool_idle_seconds,
+            max_browsers=settings.browser_pool_max_browsers,
+        )
+        _pools[loop] = pool
+    await pool.start()
+    return pool
+
+
+def get_browser_pool() -> Optional[BrowserPool]:
+    """
+    Get started browser pool for the running event loop.
+
+    Returns:
+        BrowserPool or None if no pool was started in this loop
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    pool = _pools.get(loop)
+    if pool is not None and pool.is_running:
+        return pool
+    return None
+
+
+async def close_browser_pool() -> None:
+    """Close browser pool of the running event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.pop(loop, None)
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,445 @@
+"""
+Tiered account check pipeline.
+
+Раньше проверка сразу шла в платный RapidAPI (или в браузер), хотя
+большинство отслеживаемых аккаунтов на каждой проверке всё ещё не найдены.
+
+Теперь проверка проходит уровни от дешёвого к дорогому (CHECK_PIPELINE_TIERS):
+    0. cache      - username cache (результат RapidAPI любого пользователя)
+    1. probe      - лёгкий HTTP запрос профиля через прокси (ig_probe)
+    2. api        - платный RapidAPI
+    3. screenshot - браузер + скриншот, только для подтверждённых найденных
+       (render - шапка профиля из данных API без браузера, services/profile_renderer;
+       в режимах PROFILE_RENDER_VERIFY_MODES заменяет screenshot, см. tiers_for_mode)
+
+Уровни 0-2 ищут ответ "существует / не найден": первый однозначный
+"не найден" завершает проверку, неопределённый ответ передаёт её дальше.
+"Найден" от probe - только кандидат: его подтверждает api (или cache).
+Уровни screenshot / render запускаются только для подтверждённых.
+
+По каждому уровню собираются метрики (get_pipeline_metrics): сколько
+проверок дошло до уровня, сколько он решил и сколько времени занял.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from ..config import get_settings
+    from ..database import run_db
+    from .accounts import mark_account_done
+    from .check_via_api import check_account_exists_via_api
+    from .username_cache import get_username_cache, SOURCE_RAPIDAPI
+    from .proxy_selector import get_proxy_selector
+    from .browser_pool import get_browser_pool
+    from .stage_limits import stage_slot, STAGE_IMAGE
+    from .profile_renderer import generate_instagram_profile_image_improved, profile_fields, uses_profile_render
+except ImportError:
+    from config import get_settings
+    from database import run_db
+    from services.accounts import mark_account_done
+    from services.check_via_api import check_account_exists_via_api
+    from services.username_cache import get_username_cache, SOURCE_RAPIDAPI
+    from services.proxy_selector import get_proxy_selector
+    from services.browser_pool import get_browser_pool
+    from services.stage_limits import stage_slot, STAGE_IMAGE
+    from services.profile_renderer import generate_instagram_profile_image_improved, profile_fields, uses_profile_render
+
+
+TIER_CACHE = "cache"
+TIER_PROBE = "probe"
+TIER_API = "api"
+TIER_SCREENSHOT = "screenshot"
+TIER_RENDER = "render"
+
+# Ошибки API, после которых дальше идти некуда (ответ пользователю как раньше)
+_FATAL_API_ERRORS = {
+    "all_api_keys_exhausted": "Все API ключи исчерпаны.",
+    "no_api_keys_available": "Нет доступных API ключей.",
+}
+
+
+@dataclass
+class CheckContext:
+    """State of one account check as it moves through the tiers."""
+    username: str
+    session: Any
+    user_id: int
+    screenshot_path: Optional[str] = None
+    exists: Optional[bool] = None
+    confirmed: bool = False  # "Найден" от авторитетного уровня (cache / api)
+    decided_by: Optional[str] = None
+    error: Optional[str] = None  # Ошибка, после которой проверка прекращается
+    screenshot: Optional[str] = None
+    proxy_message: Optional[str] = None
+    api_result: Optional[Dict[str, Any]] = None
+
+    @property
+    def decided(self) -> bool:
+        return self.exists is False or self.confirmed or self.error is not None
+
+
+@dataclass
+class Tier:
+    """
+    One pipeline stage.
+
+    run(ctx) returns True (exists), False (not found) or None (inconclusive -
+    escalate). A positive from a non-authoritative tier is only a candidate;
+    confirm_only tiers run only for confirmed positives.
+    """
+    name: str
+    run: Callable[[CheckContext], Awaitable[Optional[bool]]]
+    authoritative: bool = True
+    confirm_only: bool = False
+
+
+class PipelineMetrics:
+    """Per-tier counters (thread-safe: checks run in several event loops)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, float]] = {}
+        self.checks = 0
+
+    def record_check(self) -> None:
+        with self._lock:
+            self.checks += 1
+
+    def record(self, tier: str, outcome: Optional[bool], seconds: float = 0.0, error: bool = False) -> None:
+        with self._lock:
+            stats = self._tiers.setdefault(tier, {
+                "calls": 0, "positive": 0, "negative": 0, "inconclusive": 0, "errors": 0, "seconds": 0.0,
+            })
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if error:
+                stats["errors"] += 1
+            elif outcome is True:
+                stats["positive"] += 1
+            elif outcome is False:
+                stats["negative"] += 1
+            else:
+                stats["inconclusive"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters per tier plus the share of checks that reached each tier."""
+        with self._lock:
+            checks = self.checks
+            tiers = {name: dict(stats) for name, stats in self._tiers.items()}
+        for stats in tiers.values():
+            stats["share"] = round(stats["calls"] / checks, 3) if checks else 0.0
+            stats["avg_ms"] = round(stats["seconds"] * 1000 / stats["calls"], 1) if stats["calls"] else 0.0
+        return {"checks": checks, "tiers": tiers}
+
+    def summary(self) -> str:
+        """One log line: calls and share per tier."""
+        snapshot = self.snapshot()
+        parts = [
+            f"{name} {stats['calls']} ({stats['share']:.0%})"
+            for name, stats in snapshot["tiers"].items()
+        ]
+        return f"{snapshot['checks']} checks: " + ", ".join(parts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tiers.clear()
+            self.checks = 0
+
+
+_metrics = PipelineMetrics()
+
+
+def get_pipeline_metrics() -> PipelineMetrics:
+    """Get the process-wide pipeline metrics."""
+    return _metrics
+
+
+# ---------- Tiers ----------
+
+async def _cache_tier(ctx: CheckContext) -> Optional[bool]:
+    cached = await get_username_cache().aget(SOURCE_RAPIDAPI, ctx.username, ctx.session)
+    if cached is None:
+        return None
+    ctx.api_result = cached
+    if cached.get("exists") is True:
+        await run_db(ctx.session, mark_account_done, ctx.user_id, ctx.username)
+    return cached.get("exists")
+
+
+# Пробы идут по кругу по доступным прокси пользователя: с одного лучшего прокси
+# пачка проб быстро упирается в лимит Instagram (редирект на логин = None)
+_probe_turns: Dict[int, int] = {}
+_probe_turns_lock = threading.Lock()
+
+
+def _next_probe_proxy(user_id: int, proxies: List[Any]) -> Optional[Any]:
+    """Round-robin over the user's available proxies (snapshot from aranked())."""
+    if not proxies:
+        return None
+    with _probe_turns_lock:
+        turn = _probe_turns.get(user_id, 0)
+        _probe_turns[user_id] = turn + 1
+    return proxies[turn % len(proxies)]
+
+
+async def _probe_tier(ctx: CheckContext) -> Optional[bool]:
+    try:
+        from .ig_probe import fetch_profile_exists_via_proxy
+    except ImportError:
+        from services.ig_probe import fetch_profile_exists_via_proxy
+
+    selector = get_proxy_selector()
+    proxy = _next_probe_proxy(ctx.user_id, await selector.aranked(ctx.session, ctx.user_id))
+    if proxy is None:
+        return None
+    try:
+        outcome = await fetch_profile_exists_via_proxy(ctx.username, proxy.url)
+    except Exception:
+        outcome = None
+    # Неясный ответ (логин / челлендж / ошибка) - прокси уходит в кулдаун и выпадает из ротации
+    if outcome is None:
+        selector.record(ctx.user_id, proxy.id, False, get_settings().check_probe_proxy_cooldown_seconds)
+    else:
+        selector.record(ctx.user_id, proxy.id, True)
+    return outcome
+
+
+async def _api_tier(ctx: CheckContext) -> Optional[bool]:
+    result = await check_account_exists_via_api(ctx.session, ctx.user_id, ctx.username)
+    ctx.api_result = result
+    if result.get("error") in _FATAL_API_ERRORS:
+        ctx.error = result["error"]
+        return None
+    # Неопределённый ответ API считается "не найден" (как раньше): следующая проверка - по расписанию
+    return result.get("exists") is True
+
+
+async def _screenshot_tier(ctx: CheckContext) -> Optional[bool]:
+    proxy = await get_proxy_selector().aselect(ctx.session, ctx.user_id, fallback=True)
+    if not proxy:
+        print(f"[CHECK-PIPELINE] ⚠️ Прокси не найден, возвращаем только API результат")
+        return None
+
+    proxy_id, proxy_url = proxy
+    print(f"[CHECK-PIPELINE] 📸 Proxy проверка + полный скриншот (темная тема, desktop): {proxy_url[:50]}...")
+
+    screenshot_path = ctx.screenshot_path
+    if not screenshot_path:
+        screenshots_dir = "screenshots"
+        os.makedirs(screenshots_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        screenshot_path = os.path.join(screenshots_dir, f"{ctx.username}_{timestamp}.png")
+
+    try:
+        from .ig_screenshot import check_account_with_header_screenshot
+    except ImportError:
+        from services.ig_screenshot import check_account_with_header_screenshot
+
+    proxy_result = await check_account_with_header_screenshot(
+        username=ctx.username,
+        proxy_url=proxy_url,
+        screenshot_path=screenshot_path,
+        headless=True,
+        timeout_ms=60000,
+        dark_theme=True,  # Темная тема (черный фон)
+        mobile_emulation=False,  # Desktop формат
+        crop_ratio=0,  # БЕЗ обрезки - полный скриншот страницы
+        browser_pool=get_browser_pool()  # Постоянный браузер, если пул запущен в этом loop
+    )
+    proxy_success = proxy_result.get("exists", False)
+    ctx.proxy_message = proxy_result.get("checked_via", "proxy_screenshot")
+    # Скриншот возвращаем, даже если прокси-проверка не подтвердила аккаунт
+    ctx.screenshot = screenshot_path if os.path.exists(screenshot_path) else None
+
+    try:
+        await run_db(ctx.session, get_proxy_selector().record_result, ctx.user_id, proxy_id, proxy_success)
+    except Exception as e:
+        print(f"[CHECK-PIPELINE] ⚠️ Не удалось обновить статистику прокси: {e}")
+    return proxy_success
+
+
+async def _render_tier(ctx: CheckContext) -> Optional[bool]:
+    profile = profile_fields(ctx.api_result)
+    screenshot_path = ctx.screenshot_path
+    if not screenshot_path:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        screenshot_path = os.path.join("screenshots", f"{ctx.username}_profile_{timestamp}.png")
+
+    async with stage_slot(STAGE_IMAGE):
+        gen = await generate_instagram_profile_image_improved(
+            username=ctx.username,
+            full_name=profile.get("full_name", ""),
+            posts=profile.get("posts", 0),
+            followers=profile.get("followers", 0),
+            following=profile.get("following", 0),
+            is_private=profile.get("is_private", False),
+            is_verified=profile.get("is_verified", False),
+            biography='',  # Всегда пустое описание
+            profile_pic_url=profile.get("profile_pic_url", ""),
+            output_path=screenshot_path,
+        )
+    if not gen.get("success"):
+        print(f"[CHECK-PIPELINE] ⚠️ Шапка профиля @{ctx.username} не сгенерирована: {gen.get('error')}")
+        return None
+    ctx.screenshot = gen.get("image_path")
+    return True
+
+
+TIERS: Dict[str, Tier] = {
+    TIER_CACHE: Tier(TIER_CACHE, _cache_tier),
+    TIER_PROBE: Tier(TIER_PROBE, _probe_tier, authoritative=False),
+    TIER_API: Tier(TIER_API, _api_tier),
+    TIER_SCREENSHOT: Tier(TIER_SCREENSHOT, _screenshot_tier, confirm_only=True),
+    TIER_RENDER: Tier(TIER_RENDER, _render_tier, confirm_only=True),
+}
+
+
+def configured_tiers(names: Optional[List[str]] = None) -> List[Tier]:
+    """Tiers from CHECK_PIPELINE_TIERS (unknown names are skipped)."""
+    names = names if names is not None else get_settings().check_pipeline_tiers
+    tiers = []
+    for name in names:
+        tier = TIERS.get(name)
+        if tier is None:
+            print(f"[CHECK-PIPELINE] ⚠️ Unknown tier '{name}' - skipped")
+            continue
+        tiers.append(tier)
+    return tiers
+
+
+def tiers_for_mode(verify_mode: Optional[str]) -> List[Tier]:
+    """Configured tiers; in PROFILE_RENDER_VERIFY_MODES the screenshot tier is replaced by render."""
+    tiers = configured_tiers()
+    if uses_profile_render(verify_mode):
+        tiers = [TIERS[TIER_RENDER] if tier.name == TIER_SCREENSHOT else tier for tier in tiers]
+    return tiers
+
+
+# ---------- Engine ----------
+
+async def run_tiers(ctx: CheckContext, tiers: List[Tier]) -> CheckContext:
+    """
+    Run tiers in order until the check is decided.
+
+    Args:
+        ctx: Check state (may already carry a result, e.g. from the batch API stage)
+        tiers: Tiers to run
+
+    Returns:
+        The same context with exists / confirmed / decided_by filled in
+    """
+    for tier in tiers:
+        if tier.confirm_only:
+            if not ctx.confirmed:
+                continue
+        elif ctx.decided:
+            continue
+
+        started = time.monotonic()
+        try:
+            outcome = await tier.run(ctx)
+        except Exception as e:
+            print(f"[CHECK-PIPELINE] ⚠️ Tier {tier.name} failed for @{ctx.username}: {e}")
+            _metrics.record(tier.name, None, time.monotonic() - started, error=True)
+            continue
+        _metrics.record(tier.name, outcome, time.monotonic() - started)
+
+        if tier.confirm_only or outcome is None:
+            continue
+        ctx.exists = outcome
+        ctx.decided_by = tier.name
+        if outcome and tier.authoritative:
+            ctx.confirmed = True
+    return ctx
+
+
+async def check_account_tiered(
+    username: str,
+    session,
+    user_id: int,
+    screenshot_path: Optional[str] = None,
+    api_result: Optional[Dict] = None,
+    tiers: Optional[List[Tier]] = None
+) -> CheckContext:
+    """
+    Check one account through the configured tiers.
+
+    Args:
+        username: Instagram username
+        session: Database session (Session or AsyncSession)
+        user_id: User ID
+        screenshot_path: Path for screenshot (auto-generated if None)
+        api_result: Ready RapidAPI result (batch stage) - existence tiers are skipped
+        tiers: Tiers to run (default: CHECK_PIPELINE_TIERS)
+
+    Returns:
+        CheckContext with the outcome
+    """
+    ctx = CheckContext(username=username, session=session, user_id=user_id, screenshot_path=screenshot_path)
+    if api_result is not None:
+        # Проверка уже посчитана в prefilter_accounts
+        ctx.api_result = api_result
+        ctx.exists = api_result.get("exists") is True
+        ctx.confirmed = ctx.exists
+        ctx.decided_by = TIER_API
+    else:
+        _metrics.record_check()
+    return await run_tiers(ctx, configured_tiers() if tiers is None else tiers)
+
+
+def tiered_result(ctx: CheckContext):
+    """
+    (success, message, screenshot_path) in check_account_main format.
+    """
+    if ctx.error in _FATAL_API_ERRORS:
+        print(f"[CHECK-PIPELINE] ❌ {_FATAL_API_ERRORS[ctx.error]} (user {ctx.user_id})")
+        return False, _FATAL_API_ERRORS[ctx.error], None
+    if not ctx.confirmed:
+        if ctx.decided_by == TIER_PROBE and ctx.exists is False:
+            return False, "Probe: не найден", None
+        return False, "API: не найден", None
+    if ctx.proxy_message is None:
+        # Без скриншота или с отрисованной шапкой (render)
+        return True, "API: найден", ctx.screenshot
+    return True, f"API: найден | Proxy: {ctx.proxy_message}", ctx.screenshot
+
+
+async def prefilter_accounts(
+    session,
+    user_id: int,
+    usernames: List[str],
+    concurrency: Optional[int] = None
+) -> Dict[str, CheckContext]:
+    """
+    Run the tiers before 'api' for many usernames (batch auto-check).
+
+    Args:
+        session: Database session (used by one tier at a time)
+        user_id: User ID
+        usernames: Usernames to check
+        concurrency: Probes at the same time (default: CHECK_PROBE_CONCURRENCY)
+
+    Returns:
+        {username: context}; contexts that are not decided still need the API
+    """
+    tiers = configured_tiers()
+    names = [tier.name for tier in tiers]
+    cheap = tiers[:names.index(TIER_API)] if TIER_API in names else [t for t in tiers if not t.confirm_only]
+    limit = asyncio.Semaphore(concurrency or get_settings().check_probe_concurrency)
+
+    async def check(username: str) -> CheckContext:
+        _metrics.record_check()
+        ctx = CheckContext(username=username, session=session, user_id=user_id)
+        if not cheap:
+            return ctx
+        async with limit:
+            return await run_tiers(ctx, cheap)
+
+    contexts = await asyncio.gather(*(check(username) for username in usernames))
+    return {ctx.username: ctx for ctx in contexts}
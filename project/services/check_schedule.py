@@ -0,0 +1,132 @@
+"""
+Adaptive per-account check schedule.
+
+Раньше каждый ожидающий аккаунт проверялся на каждом прогоне пользователя
+(раз в auto_check_interval минут) - и заблокированный 10 минут назад, и
+заблокированный 40 дней назад.
+
+Теперь у аккаунта есть next_check_at и уровень backoff (check_backoff):
+    - каждая проверка без изменений (аккаунт всё ещё не найден) поднимает
+      уровень: следующая проверка через interval * 2^level, но не позже
+      CHECK_BACKOFF_MAX_MINUTES
+    - около ожидаемых окон разблокировки (CHECK_UNBAN_WINDOWS_HOURS от
+      добавления аккаунта, +- CHECK_UNBAN_WINDOW_MARGIN_HOURS) аккаунт
+      проверяется на каждом прогоне, а отложенная проверка не перепрыгивает
+      начало окна
+    - ошибка проверки уровень не меняет, повтор на следующем прогоне
+
+Прогон пользователя берёт только аккаунты, у которых подошло время
+(индекс ix_accounts_user_done_next_check). Найденный аккаунт становится
+done и из расписания выходит. CHECK_BACKOFF_MAX_LEVEL=0 возвращает
+проверку всех аккаунтов на каждом прогоне.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import Account
+    from ..config import get_settings
+except ImportError:
+    from models import Account
+    from config import get_settings
+
+
+OUTCOME_UNCHANGED = "unchanged"  # Аккаунт всё ещё не найден
+OUTCOME_ERROR = "error"  # Проверка не удалась - результат неизвестен
+
+
+def added_at(from_date_time: Optional[datetime], from_date: Optional[date]) -> Optional[datetime]:
+    """When the account was added to monitoring (start of the ban history)."""
+    if from_date_time is not None:
+        return from_date_time
+    if from_date is not None:
+        return datetime.combine(from_date, time.min)
+    return None
+
+
+def due_condition(now: datetime, interval_minutes: int):
+    """
+    SQL filter for accounts due in a user's run at `now`.
+
+    Accounts due before the next run (half an interval of slack) are
+    taken now: a check finishing a bit after the run started must not
+    slip to the run after next.
+    """
+    horizon = now + timedelta(minutes=interval_minutes) / 2
+    return or_(Account.next_check_at.is_(None), Account.next_check_at <= horizon)
+
+
+def next_check_delay(interval_minutes: int, level: int, age: Optional[timedelta]) -> timedelta:
+    """
+    Delay until the next check of an account.
+
+    Args:
+        interval_minutes: User's auto-check interval
+        level: Backoff level after this check
+        age: Time since the account was added (None = unknown)
+
+    Returns:
+        interval * 2^level (capped), shortened to the interval inside an
+        unban window and to the start of the next window before it
+    """
+    settings = get_settings()
+    base = timedelta(minutes=interval_minutes)
+    level = max(0, min(level, settings.check_backoff_max_level))
+    delay = min(base * (2 ** level), max(base, timedelta(minutes=settings.check_backoff_max_minutes)))
+    if age is None or delay <= base:
+        return delay
+
+    margin = timedelta(hours=settings.check_unban_window_margin_hours)
+    for hours in sorted(settings.check_unban_windows_hours):
+        window = timedelta(hours=hours)
+        start, end = window - margin, window + margin
+        if start <= age <= end:
+            return base
+        if age < start < age + delay:
+            return start - age
+    return delay
+
+
+def plan_next_check(
+    now: datetime,
+    interval_minutes: int,
+    level: int,
+    account_added_at: Optional[datetime],
+    outcome: str
+) -> Tuple[datetime, int]:
+    """
+    Next check time and backoff level after a check.
+
+    Args:
+        now: Check time
+        interval_minutes: User's auto-check interval
+        level: Current backoff level
+        account_added_at: See added_at()
+        outcome: OUTCOME_UNCHANGED or OUTCOME_ERROR
+
+    Returns:
+        (next_check_at, check_backoff)
+    """
+    level = level or 0
+    if outcome == OUTCOME_UNCHANGED:
+        level = min(level + 1, get_settings().check_backoff_max_level)
+        age = now - account_added_at if account_added_at is not None else None
+        return now + next_check_delay(interval_minutes, level, age), level
+    # Ошибка: повтор на следующем прогоне, уровень не меняем
+    return now + timedelta(minutes=interval_minutes), level
+
+
+def save_check_schedule(session: Session, rows: List[Dict]) -> None:
+    """
+    Write next_check_at / check_backoff for many accounts (one executemany, no commit).
+
+    Args:
+        session: SQLAlchemy session
+        rows: {"id", "next_check_at", "check_backoff"} per account
+    """
+    if rows:
+        session.execute(update(Account), rows)
@@ -1,33 +1,164 @@
 """Account checking service via RapidAPI."""
 
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional
+import asyncio
+import json as json_lib
 import time
 import uuid
-from aiohttp import ClientSession, ClientTimeout
 from sqlalchemy.orm import Session
 from datetime import date
 
 try:
     from ..models import Account, APIKey
-    from .api_keys import pick_best_key, incr_usage, set_work_status, _reset_if_new_day
+    from .api_keys import (
+        claim_key_quota, release_key_quota, exhaust_key_quota, set_work_status,
+    )
     from .traffic_monitor import get_traffic_monitor
+    from .http_sessions import get_rapidapi_session
+    from .username_cache import get_username_cache, SOURCE_RAPIDAPI
+    from .accounts import mark_account_done
+    from .key_ring import get_key_ring, KeyState
+    from .profile_renderer import profile_fields
     from ..config import get_settings
-    from sqlalchemy import and_
+    from ..database import run_db
 except ImportError:
     from models import Account, APIKey
-    from services.api_keys import pick_best_key, incr_usage, set_work_status, _reset_if_new_day
+    from services.api_keys import (
+        claim_key_quota, release_key_quota, exhaust_key_quota, set_work_status,
+    )
     from services.traffic_monitor import get_traffic_monitor
+    from services.http_sessions import get_rapidapi_session
+    from services.username_cache import get_username_cache, SOURCE_RAPIDAPI
+    from services.accounts import mark_account_done
+    from services.key_ring import get_key_ring, KeyState
+    from services.profile_renderer import profile_fields
     from config import get_settings
-    from sqlalchemy import and_
+    from database import run_db
+
+
+def _is_quota_error(data: Any) -> bool:
+    """Check if RapidAPI response is a quota error (daily quota exceeded etc.)."""
+    if isinstance(data, dict) and isinstance(data.get("message"), str):
+        message = data["message"]
+        return "exceeded the DAILY quota" in message or "quota" in message.lower()
+    return False
+
+
+def _is_auth_error(data: Any) -> bool:
+    """Check if RapidAPI rejected the key itself (not subscribed / invalid key)."""
+    if isinstance(data, dict) and isinstance(data.get("message"), str):
+        message = data["message"].lower()
+        return "not subscribed" in message or "invalid api key" in message
+    return False
+
+
+def _exists_from_response(data: Any, username: str) -> bool:
+    """Parse account existence from RapidAPI response (new API schema)."""
+    if isinstance(data, dict):
+        # Check for success response with result
+        if "result" in data and data["result"]:
+            result_data = data["result"]
+            print(f"[API-DEBUG] Success format: username={result_data.get('username')}, expected={username.lower()}")
+            return result_data.get("username", "").lower() == username.lower()
+        # Check for error response
+        elif "success" in data and data["success"] is False:
+            print(f"[API-DEBUG] Error format: success={data.get('success')}, message={data.get('message')}")
+            return False
+        print(f"[API-DEBUG] Unexpected dict format: {data}")
+    else:
+        print(f"[API-DEBUG] Unexpected data format: {type(data)}")
+    return False
+
+
+def _profile_from_response(data: Any) -> Dict[str, Any]:
+    """Profile fields of a found account (full_name, followers, ...) for the rendered header."""
+    if isinstance(data, dict) and isinstance(data.get("result"), dict):
+        return profile_fields(data["result"])
+    return {}
+
+
+def _mark_account_done(session: Session, user_id: int, username: str) -> None:
+    """Mark tracked account as done (found via API)."""
+    mark_account_done(session, user_id, username)
 
 
-async def check_account_exists_via_api(session: Session, user_id: int, username: str) -> Dict[str, Any]:
+def _disable_key(session: Session, key_id: int) -> None:
+    """Mark API key as not working."""
+    key = session.get(APIKey, key_id)
+    if key is not None:
+        set_work_status(session, key, ok=False)
+
+
+async def _request_profile(key_value: str, username: str) -> Any:
+    """
+    Request profile from RapidAPI through the shared keep-alive session.
+
+    Args:
+        key_value: RapidAPI key
+        username: Instagram username
+
+    Returns:
+        Parsed JSON response (raises on network/parse errors)
+    """
+    settings = get_settings()
+    headers = {
+        "X-RapidAPI-Key": key_value,
+        "X-RapidAPI-Host": settings.rapidapi_host,
+        "Content-Type": "application/json"
+    }
+    payload = {"username": username.lower()}
+
+    # Initialize traffic monitoring
+    monitor = get_traffic_monitor()
+    request_id = str(uuid.uuid4())
+    monitor.start_request(request_id, "rapidapi", settings.rapidapi_url)
+
+    # Calculate request size
+    request_size = len(settings.rapidapi_url.encode('utf-8'))
+    request_size += len(str(headers).encode('utf-8'))
+    request_size += len(json_lib.dumps(payload).encode('utf-8'))
+
+    start_time = time.time()
+    try:
+        # Shared keep-alive session: TCP/TLS connection is reused between checks
+        sess = get_rapidapi_session()
+        async with sess.post(settings.rapidapi_url, json=payload, headers=headers) as resp:
+            response_text = await resp.text()
+            status_code = resp.status
+    except Exception:
+        # End traffic monitoring for failed request
+        monitor.end_request(
+            request_id=request_id,
+            success=False,
+            status_code=0,
+            request_size=request_size,
+            response_size=0,
+            duration_ms=(time.time() - start_time) * 1000
+        )
+        raise
+
+    monitor.end_request(
+        request_id=request_id,
+        success=True,
+        status_code=status_code,
+        request_size=request_size,
+        response_size=len(response_text.encode('utf-8')),
+        duration_ms=(time.time() - start_time) * 1000
+    )
+    return json_lib.loads(response_text)
+
+
+async def check_account_exists_via_api(session, user_id: int, username: str) -> Dict[str, Any]:
     """
     Check if Instagram account exists via RapidAPI with automatic key rotation.
 
+    Results are shared through the username cache: a fresh cached result
+    (from any user) costs no API request, and identical concurrent lookups
+    make a single request.
+
     Args:
-        session: Database session
+        session: Database session (Session or AsyncSession)
         user_id: User ID
         username: Instagram username to check
 
@@ -38,17 +169,30 @@ async def check_account_exists_via_api(session: Session, user_id: int, username:
             "error": str | None
         }
     """
+    async def fetch() -> Dict[str, Any]:
+        return await _fetch_account_exists(session, user_id, username)
+
+    result, from_cache = await get_username_cache().get_or_fetch(SOURCE_RAPIDAPI, username, fetch, session)
+    if from_cache:
+        print(f"[API-CACHE] ♻️ @{username}: exists={result.get('exists')} (из кэша, запрос не потрачен)")
+
+    if result.get("exists") is True:
+        # Mark account as done
+        await run_db(session, _mark_account_done, user_id, username)
+
+    result["username"] = username
+    return result
+
+
+async def _fetch_account_exists(session, user_id: int, username: str) -> Dict[str, Any]:
+    """RapidAPI lookup with key rotation (no cache, no side effects on accounts)."""
     settings = get_settings()
 
-    # Get all available keys for user
-    all_keys = (
-        session.query(APIKey)
-        .filter(and_(APIKey.user_id == user_id, APIKey.is_work == True))
-        .order_by(APIKey.id.asc())
-        .all()
-    )
+    # Keys from the in-memory ring: weighted pick first, then fallbacks (DB read only on refresh)
+    ring = get_key_ring()
+    keys = await ring.acandidates(session, user_id)
 
-    if not all_keys:
+    if not keys and not ring.known(user_id):
         print(f"❌ No API keys available for user {user_id}")
         return {
             "username": username,
@@ -57,143 +201,269 @@ async def check_account_exists_via_api(session: Session, user_id: int, username:
         }
 
     # Try each key until we find one that works
-    for key in all_keys:
-        _reset_if_new_day(key)
-
-        # Skip if key has reached daily limit
-        if (key.qty_req or 0) >= settings.api_daily_limit:
-            print(f"⚠️ API key {key.id} has reached daily limit ({key.qty_req}/{settings.api_daily_limit})")
+    for key in keys:
+        # Claim one request of the key's quota (atomic: parallel checks can't oversubscribe it)
+        used = await run_db(session, claim_key_quota, key.id)
+        ring.record_claim(user_id, key.id, used)
+        if used is None:
+            print(f"⚠️ API key {key.id} has reached daily limit ({settings.api_daily_limit})")
             continue
 
-        print(f"🔑 Trying API key {key.id} for @{username} (current usage: {key.qty_req or 0}/{settings.api_daily_limit})")
-
-        timeout = ClientTimeout(total=settings.rapidapi_timeout_seconds)
-        headers = {
-            "X-RapidAPI-Key": key.key,
-            "X-RapidAPI-Host": settings.rapidapi_host,
-            "Content-Type": "application/json"
-        }
-        payload = {"username": username.lower()}
-        
-        # Initialize traffic monitoring
-        monitor = get_traffic_monitor()
-        request_id = str(uuid.uuid4())
-        monitor.start_request(request_id, "rapidapi", settings.rapidapi_url)
-        
-        # Calculate request size
-        import json as json_lib
-        request_size = len(settings.rapidapi_url.encode('utf-8'))
-        request_size += len(str(headers).encode('utf-8'))
-        request_size += len(json_lib.dumps(payload).encode('utf-8'))
+        print(f"🔑 Trying API key {key.id} for @{username} (usage: {used}/{settings.api_daily_limit})")
 
+        started = time.monotonic()
         try:
-            start_time = time.time()
-            async with ClientSession(timeout=timeout, headers=headers) as sess:
-                async with sess.post(settings.rapidapi_url, json=payload) as resp:
-                    # Parse response
-                    response_text = await resp.text()
-                    
-                    # Calculate response size and duration
-                    response_size = len(response_text.encode('utf-8'))
-                    duration_ms = (time.time() - start_time) * 1000
-                    
-                    # End traffic monitoring
-                    monitor.end_request(
-                        request_id=request_id,
-                        success=True,
-                        status_code=resp.status,
-                        request_size=request_size,
-                        response_size=response_size,
-                        duration_ms=duration_ms
-                    )
-                    
-                    # Parse JSON from text
-                    import json as json_lib
-                    data = json_lib.loads(response_text)
-
-                    # Debug logging
-                    print(f"[API-DEBUG] Response for @{username}: {data}")
-
-                    # Check for quota exceeded error
-                    if isinstance(data, dict) and "message" in data:
-                        if "exceeded the DAILY quota" in data["message"]:
-                            print(f"⚠️ API key {key.id} exceeded daily quota - setting to 950 and trying next key")
-                            key.qty_req = 950  # Set to max limit
-                            session.commit()
-                            continue  # Try next key
-                        elif "quota" in data["message"].lower():
-                            print(f"⚠️ API key {key.id} quota issue: {data['message']}")
-                            key.qty_req = 950  # Set to max limit
-                            session.commit()
-                            continue  # Try next key
-
-                    # Count usage for successful request
-                    incr_usage(session, key)
-
-                    # Check if account exists according to new API schema
-                    exists = False
-                    if isinstance(data, dict):
-                        # Check for success response with result
-                        if "result" in data and data["result"]:
-                            result_data = data["result"]
-                            exists = result_data.get("username", "").lower() == username.lower()
-                            print(f"[API-DEBUG] Success format: username={result_data.get('username')}, expected={username.lower()}")
-                        # Check for error response
-                        elif "success" in data and data["success"] is False:
-                            exists = False
-                            print(f"[API-DEBUG] Error format: success={data.get('success')}, message={data.get('message')}")
-                        else:
-                            print(f"[API-DEBUG] Unexpected dict format: {data}")
-                    else:
-                        print(f"[API-DEBUG] Unexpected data format: {type(data)}")
-
-                    if exists:
-                        # Mark account as done
-                        acc = session.query(Account).filter(
-                            Account.user_id == user_id,
-                            Account.account == username
-                        ).first()
-                        if acc:
-                            acc.done = True
-                            acc.date_of_finish = date.today()
-                            session.commit()
-
-                        return {
-                            "username": username,
-                            "exists": True,
-                            "error": None
-                        }
-                    else:
-                        return {
-                            "username": username,
-                            "exists": False,
-                            "error": None
-                        }
+            data = await _request_profile(key.key, username)
         except Exception as e:
             print(f"❌ Error with API key {key.id}: {e}")
-            
-            # End traffic monitoring for failed request
-            try:
-                duration_ms = (time.time() - start_time) * 1000 if 'start_time' in locals() else 0
-                monitor.end_request(
-                    request_id=request_id,
-                    success=False,
-                    status_code=0,
-                    request_size=request_size if 'request_size' in locals() else 0,
-                    response_size=0,
-                    duration_ms=duration_ms
-                )
-            except:
-                pass
-            
+            # Request was not made - give the claimed quota back
+            await run_db(session, release_key_quota, key.id)
+            ring.record_release(user_id, key.id)
+            ring.record_error(user_id, key.id)
             # Mark key as potentially problematic but don't give up yet
-            set_work_status(session, key, ok=False)
+            await run_db(session, _disable_key, key.id)
+            continue  # Try next key
+
+        # Debug logging
+        print(f"[API-DEBUG] Response for @{username}: {data}")
+
+        # Check for quota exceeded error
+        if _is_quota_error(data):
+            print(f"⚠️ API key {key.id} quota issue: {data['message']} - marking as exhausted and trying next key")
+            await run_db(session, exhaust_key_quota, key.id)
+            ring.quota_exhausted(user_id, key.id)
+            continue  # Try next key
+
+        if _is_auth_error(data):
+            print(f"⚠️ API key {key.id} rejected: {data['message']} - skipping it for a while")
+            await run_db(session, release_key_quota, key.id)
+            ring.auth_failed(user_id, key.id)
             continue  # Try next key
 
+        ring.record_success(user_id, key.id, time.monotonic() - started)
+
+        # Check if account exists according to new API schema
+        exists = _exists_from_response(data, username)
+
+        return {
+            "username": username,
+            "exists": exists,
+            "error": None,
+            **(_profile_from_response(data) if exists else {}),
+        }
+
     # If we get here, all keys failed
     print(f"❌ All API keys exhausted for user {user_id}")
     return {
         "username": username,
         "exists": None,
         "error": "all_api_keys_exhausted"
-    }
\ No newline at end of file
+    }
+
+class _KeyRateLimiter:
+    """Per-key pacing: minimal interval between request starts."""
+
+    def __init__(self, requests_per_second: float):
+        self._interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+                now = time.monotonic()
+            self._next_at = now + self._interval
+
+
+async def check_accounts_exist_via_api_batch(
+    session,
+    user_id: int,
+    usernames: List[str],
+    per_key_concurrency: Optional[int] = None,
+    per_key_rps: Optional[float] = None,
+    max_attempts: int = 3,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Check many usernames via RapidAPI, spreading them across all working keys.
+
+    Each key gets its own workers (per-key concurrency + rate limit) and never
+    spends more than its remaining daily quota. Results are yielded as soon as
+    they arrive (not in input order).
+
+    Args:
+        session: Database session (Session or AsyncSession)
+        user_id: User ID
+        usernames: Instagram usernames to check
+        per_key_concurrency: Parallel requests per key (default from settings)
+        per_key_rps: Max requests per second per key (default from settings)
+        max_attempts: Max attempts per username on network errors
+
+    Yields:
+        Dict with check results: {
+            "username": str,
+            "exists": bool | None,
+            "error": str | None
+        }
+    """
+    settings = get_settings()
+    per_key_concurrency = per_key_concurrency or settings.rapidapi_key_concurrency
+    per_key_rps = per_key_rps or settings.rapidapi_key_rps
+
+    # Deduplicate preserving order
+    unique_usernames = list(dict.fromkeys(u for u in usernames if u))
+    if not unique_usernames:
+        return
+
+    # Fresh cached results cost no quota
+    cache = get_username_cache()
+    to_check = []
+    for username in unique_usernames:
+        cached = await cache.aget(SOURCE_RAPIDAPI, username, session)
+        if cached is None:
+            to_check.append(username)
+            continue
+        if cached.get("exists") is True:
+            await run_db(session, _mark_account_done, user_id, username)
+        yield {"username": username, "exists": cached.get("exists"), "error": cached.get("error")}
+    if len(to_check) < len(unique_usernames):
+        print(f"[API-BATCH] ♻️ {len(unique_usernames) - len(to_check)} results from cache")
+    unique_usernames = to_check
+    if not unique_usernames:
+        return
+
+    ring = get_key_ring()
+    keys = await ring.acandidates(session, user_id)
+
+    if not keys and not ring.known(user_id):
+        print(f"❌ No API keys available for user {user_id}")
+        for username in unique_usernames:
+            yield {"username": username, "exists": None, "error": "no_api_keys_available"}
+        return
+
+    # Remaining daily quota per key (estimate from the ring; claims in the DB are authoritative)
+    remaining: Dict[int, int] = {key.id: key.remaining for key in keys}
+
+    print(f"[API-BATCH] 🚀 {len(unique_usernames)} usernames across {len(keys)} keys "
+          f"(quota left: {sum(remaining.values())}, {per_key_concurrency}/key, {per_key_rps} rps/key)")
+
+    pending: asyncio.Queue = asyncio.Queue()
+    for username in unique_usernames:
+        pending.put_nowait((username, 0))
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def key_worker(key: KeyState, limiter: _KeyRateLimiter, state: Dict[str, Any]) -> None:
+        while not state["dead"]:
+            if remaining[key.id] <= 0:
+                return
+            try:
+                username, attempts = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            # Claim one request of quota in the DB before the request (atomic
+            # across workers and processes - the key can't go over the limit)
+            used = await run_db(session, claim_key_quota, key.id)
+            ring.record_claim(user_id, key.id, used)
+            if used is None:
+                remaining[key.id] = 0
+                pending.put_nowait((username, attempts))
+                return
+
+            await limiter.wait()
+            started = time.monotonic()
+            try:
+                data = await _request_profile(key.key, username)
+            except Exception as e:
+                print(f"[API-BATCH] ❌ Key {key.id} error for @{username}: {e}")
+                await run_db(session, release_key_quota, key.id)
+                ring.record_release(user_id, key.id)
+                ring.record_error(user_id, key.id)
+                state["errors"] += 1
+                if attempts + 1 < max_attempts:
+                    pending.put_nowait((username, attempts + 1))
+                else:
+                    results.put_nowait({"username": username, "exists": None, "error": f"api_error: {e}"})
+                if state["errors"] >= max_attempts and not state["dead"]:
+                    # Key keeps failing - same as single check: mark as not working
+                    state["dead"] = True
+                    await run_db(session, _disable_key, key.id)
+                continue
+
+            if _is_quota_error(data):
+                print(f"[API-BATCH] ⚠️ Key {key.id} quota exhausted: {data['message']}")
+                remaining[key.id] = 0
+                if not state["dead"]:
+                    state["dead"] = True
+                    await run_db(session, exhaust_key_quota, key.id)
+                    ring.quota_exhausted(user_id, key.id)
+                pending.put_nowait((username, attempts))
+                return
+
+            if _is_auth_error(data):
+                print(f"[API-BATCH] ⚠️ Key {key.id} rejected: {data['message']}")
+                await run_db(session, release_key_quota, key.id)
+                remaining[key.id] = 0
+                if not state["dead"]:
+                    state["dead"] = True
+                    ring.auth_failed(user_id, key.id)
+                pending.put_nowait((username, attempts))
+                return
+
+            state["errors"] = 0
+            ring.record_success(user_id, key.id, time.monotonic() - started)
+            exists = _exists_from_response(data, username)
+            if exists:
+                await run_db(session, _mark_account_done, user_id, username)
+            result = {"username": username, "exists": exists, "error": None}
+            if exists:
+                result.update(_profile_from_response(data))
+            await cache.aput(SOURCE_RAPIDAPI, username, result, session)
+            results.put_nowait(result)
+
+    async def run_all() -> None:
+        # Key slots are re-run while usernames remain and some key still has quota
+        # (usernames returned to the queue by a failing key go to the others)
+        states = {k.id: {"dead": False, "errors": 0} for k in keys}
+        limiters = {k.id: _KeyRateLimiter(per_key_rps) for k in keys}
+        while not pending.empty():
+            live = [k for k in keys if not states[k.id]["dead"] and remaining[k.id] > 0]
+            if not live:
+                break
+            await asyncio.gather(*[
+                key_worker(k, limiters[k.id], states[k.id])
+                for k in live
+                for _ in range(per_key_concurrency)
+            ])
+        # Whatever is left could not be checked with available quota
+        while not pending.empty():
+            username, _ = pending.get_nowait()
+            results.put_nowait({"username": username, "exists": None, "error": "all_api_keys_exhausted"})
+
+    runner = asyncio.create_task(run_all())
+    delivered = 0
+    try:
+        while delivered < len(unique_usernames):
+            get_result = asyncio.ensure_future(results.get())
+            done, _ = await asyncio.wait({get_result, runner}, return_when=asyncio.FIRST_COMPLETED)
+            if get_result in done:
+                delivered += 1
+                yield get_result.result()
+                continue
+            get_result.cancel()
+            if runner.exception() is not None:
+                raise runner.exception()
+            # Runner finished: drain what is left
+            while not results.empty():
+                delivered += 1
+                yield results.get_nowait()
+            break
+    finally:
+        if not runner.done():
+            runner.cancel()
+            try:
+                await runner
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    print(f"[API-BATCH] ✅ Done: {delivered}/{len(unique_usernames)} results")
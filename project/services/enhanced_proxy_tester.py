@@ -10,30 +10,19 @@ import json
 
 try:
     from ..models import Proxy, Account
-    from ..utils.encryptor import OptionalFernet
-    from ..config import get_settings
+    from .proxy_credentials import get_proxy_url
     from .simple_monitor_checker import check_account_simple
     from .ig_screenshot import check_account_with_header_screenshot
 except ImportError:
     from models import Proxy, Account
-    from utils.encryptor import OptionalFernet
-    from config import get_settings
+    from services.proxy_credentials import get_proxy_url
     from services.simple_monitor_checker import check_account_simple
     from services.ig_screenshot import check_account_with_header_screenshot
 
 
 def build_proxy_url(proxy: Proxy) -> str:
     """Build proxy URL from Proxy object."""
-    if proxy.username and proxy.password:
-        try:
-            settings = get_settings()
-            encryptor = OptionalFernet(settings.encryption_key)
-            password = encryptor.decrypt(proxy.password)
-            return f"{proxy.scheme}://{proxy.username}:{password}@{proxy.host}"
-        except:
-            return f"{proxy.scheme}://{proxy.host}"
-    else:
-        return f"{proxy.scheme}://{proxy.host}"
+    return get_proxy_url(proxy)
 
 
 async def test_proxy_connectivity(proxy: Proxy) -> Tuple[bool, str, Optional[float]]:
@@ -267,11 +256,11 @@ async def test_proxy_screenshot(proxy: Proxy, test_username: str = "instagram")
     proxy_url = build_proxy_url(proxy)
     
     try:
-        # Import API checker and profile generator
-        import sys
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        
-        from test_api_with_profile_gen import generate_instagram_profile_image_improved
+        # Import profile generator
+        try:
+            from .profile_renderer import generate_instagram_profile_image_improved
+        except ImportError:
+            from services.profile_renderer import generate_instagram_profile_image_improved
         import aiohttp
         
         # Get Instagram API data via proxy WITH TRAFFIC MONITORING
@@ -1,17 +1,35 @@
-"""Expiry notifications service."""
+"""
+Expiry notifications service.
 
-from typing import List
+Раньше проверка грузила истёкшие и истекающие аккаунты двумя запросами,
+затем на каждый аккаунт делала SELECT "уже отправляли сегодня?", на
+каждого пользователя session.query(User).get и commit на каждую отметку.
+
+Теперь это один запрос: аккаунты с пользователями (JOIN + contains_eager),
+тип уведомления считается в SQL, уже отправленные сегодня отсекаются
+анти-джойном с expiry_notifications. Отметки о доставке вставляются одним
+INSERT ... ON CONFLICT DO NOTHING и одним commit.
+"""
+
+from itertools import groupby
+from typing import Dict, List, Tuple
 from datetime import date, timedelta
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, case
+from sqlalchemy.orm import Session, contains_eager, sessionmaker
 
 try:
     from ..models import Account, User, ExpiryNotification
-    from ..services.accounts import get_expired_accounts, get_accounts_expiring_soon
+    from ..database import insert_ignore
     from ..utils.access import ensure_active
+    from ..services.write_behind import get_write_behind
 except ImportError:
     from models import Account, User, ExpiryNotification
-    from services.accounts import get_expired_accounts, get_accounts_expiring_soon
+    from database import insert_ignore
     from utils.access import ensure_active
+    from services.write_behind import get_write_behind
+
+
+EXPIRING_SOON_DAYS = 7
 
 
 def was_notification_sent_today(session, user_id: int, account_id: int, notification_type: str) -> bool:
@@ -49,25 +67,75 @@ def mark_notification_sent(session, user_id: int, account_id: int, notification_
         account_id: Account ID
         notification_type: Type of notification ('expiring_soon' | 'expired')
     """
+    buffer = get_write_behind()
+    if buffer is not None:
+        # Строка будет вставлена пакетом (существующие пропускаются при flush)
+        buffer.mark_notification_sent(user_id, account_id, notification_type)
+        return
+    
+    mark_notifications_sent(session, [(user_id, account_id, notification_type)])
+
+
+def mark_notifications_sent(session: Session, sent: List[Tuple[int, int, str]]) -> None:
+    """
+    Mark notifications as sent for today in one INSERT and one commit.
+    
+    Rows that are already there are skipped by the unique constraint
+    (uq_expiry_notification), no SELECT before the insert.
+    
+    Args:
+        session: SQLAlchemy session
+        sent: (user_id, account_id, notification_type) tuples
+    """
+    if not sent:
+        return
     today = date.today()
+    rows = [
+        {"user_id": user_id, "account_id": account_id,
+         "notification_type": notification_type, "notification_date": today}
+        for user_id, account_id, notification_type in sent
+    ]
+    session.execute(insert_ignore(session, ExpiryNotification), rows)
+    session.commit()
+
+
+def get_accounts_to_notify(session: Session, days_ahead: int = EXPIRING_SOON_DAYS) -> List[Tuple[Account, str]]:
+    """
+    Expired and expiring accounts that were not notified about today (one query).
     
-    # Check if already exists (shouldn't happen, but just in case)
-    existing = session.query(ExpiryNotification).filter(
-        ExpiryNotification.user_id == user_id,
-        ExpiryNotification.account_id == account_id,
-        ExpiryNotification.notification_type == notification_type,
-        ExpiryNotification.notification_date == today
-    ).first()
+    Args:
+        session: SQLAlchemy session
+        days_ahead: Accounts ending within this many days are 'expiring_soon'
+    
+    Returns:
+        (account, notification_type) pairs ordered by user and to_date;
+        account.user is loaded by the same query
+    """
+    today = date.today()
+    notification_type = case((Account.to_date < today, 'expired'), else_='expiring_soon')
     
-    if not existing:
-        notification = ExpiryNotification(
-            user_id=user_id,
-            account_id=account_id,
-            notification_type=notification_type,
-            notification_date=today
+    # Анти-джойн: LEFT JOIN отметок за сегодня + WHERE отметка IS NULL
+    return (
+        session.query(Account, notification_type)
+        .join(Account.user)
+        .options(contains_eager(Account.user))
+        .outerjoin(
+            ExpiryNotification,
+            and_(
+                ExpiryNotification.user_id == Account.user_id,
+                ExpiryNotification.account_id == Account.id,
+                ExpiryNotification.notification_type == notification_type,
+                ExpiryNotification.notification_date == today,
+            ),
         )
-        session.add(notification)
-        session.commit()
+        .filter(
+            Account.done == False,
+            Account.to_date <= today + timedelta(days=days_ahead),
+            ExpiryNotification.id.is_(None),
+        )
+        .order_by(Account.user_id, Account.to_date.asc())
+        .all()
+    )
 
 
 async def check_and_send_expiry_notifications(SessionLocal: sessionmaker, bot=None):
@@ -85,84 +153,82 @@ async def check_and_send_expiry_notifications(SessionLocal: sessionmaker, bot=No
     print(f"[EXPIRY-CHECK] {date.today()} - Checking for expired accounts...")
     
     with SessionLocal() as session:
-        # Get expired accounts (to_date < today)
-        expired_accounts = get_expired_accounts(session)
-        
-        # Get accounts expiring soon (in next 7 days)
-        expiring_soon = get_accounts_expiring_soon(session, days_ahead=7)
-        
-        print(f"[EXPIRY-CHECK] Found {len(expired_accounts)} expired accounts (before filtering)")
-        print(f"[EXPIRY-CHECK] Found {len(expiring_soon)} accounts expiring soon (before filtering)")
-        
-        # Filter out accounts that already received notification today
-        expired_accounts_to_notify = []
-        for acc in expired_accounts:
-            if not was_notification_sent_today(session, acc.user_id, acc.id, 'expired'):
-                expired_accounts_to_notify.append(acc)
-            else:
-                print(f"[EXPIRY-CHECK] ⏭️ Skipping expired notification for @{acc.account} - already sent today")
+        rows = get_accounts_to_notify(session)
         
-        expiring_soon_to_notify = []
-        for acc in expiring_soon:
-            if not was_notification_sent_today(session, acc.user_id, acc.id, 'expiring_soon'):
-                expiring_soon_to_notify.append(acc)
-            else:
-                print(f"[EXPIRY-CHECK] ⏭️ Skipping expiring soon notification for @{acc.account} - already sent today")
+        expired_count = sum(1 for _, notification_type in rows if notification_type == 'expired')
+        print(f"[EXPIRY-CHECK] {expired_count} expired accounts to notify")
+        print(f"[EXPIRY-CHECK] {len(rows) - expired_count} expiring soon accounts to notify")
         
-        print(f"[EXPIRY-CHECK] {len(expired_accounts_to_notify)} expired accounts to notify")
-        print(f"[EXPIRY-CHECK] {len(expiring_soon_to_notify)} expiring soon accounts to notify")
+        # Group accounts by user (rows are ordered by user_id)
+        user_accounts: Dict[str, List[Tuple[User, List[Account]]]] = {'expired': [], 'expiring_soon': []}
+        for user_id, user_rows in groupby(rows, key=lambda row: row[0].user_id):
+            user_rows = list(user_rows)
+            user = user_rows[0][0].user
+            if not ensure_active(user):
+                print(f"[EXPIRY-CHECK] ⚠️ User {user_id} not found or inactive")
+                continue
+            for notification_type, grouped in user_accounts.items():
+                accounts = [acc for acc, kind in user_rows if kind == notification_type]
+                if accounts:
+                    grouped.append((user, accounts))
         
-        # Group accounts by user
-        user_expired = {}
-        user_expiring = {}
+        # Build notifications for all users, then send them in one batch
+        outgoing = []  # (notification, user_id, accounts, notification_type)
+        for notification_type, build in (
+            ('expired', build_expired_notification),
+            ('expiring_soon', build_expiring_soon_notification),
+        ):
+            for user, accounts in user_accounts[notification_type]:
+                outgoing.append((build(user, accounts), user.id, accounts, notification_type))
         
-        for acc in expired_accounts_to_notify:
-            if acc.user_id not in user_expired:
-                user_expired[acc.user_id] = []
-            user_expired[acc.user_id].append(acc)
+        if not outgoing:
+            return
         
-        for acc in expiring_soon_to_notify:
-            if acc.user_id not in user_expiring:
-                user_expiring[acc.user_id] = []
-            user_expiring[acc.user_id].append(acc)
+        results = await send_notifications(bot, [item[0] for item in outgoing])
         
-        # Send notifications for expired accounts
-        for user_id, accounts in user_expired.items():
-            try:
-                user = session.query(User).get(user_id)
-                if user and ensure_active(user):
-                    await send_expired_notification(bot, user, accounts)
-                    print(f"[EXPIRY-CHECK] ✅ Sent expired notification to user {user_id}")
-                    
-                    # Mark notifications as sent for all accounts
-                    for acc in accounts:
-                        mark_notification_sent(session, user_id, acc.id, 'expired')
-                        print(f"[EXPIRY-CHECK] 📝 Marked expired notification as sent for @{acc.account}")
-                else:
-                    print(f"[EXPIRY-CHECK] ⚠️ User {user_id} not found or inactive")
-            except Exception as e:
-                print(f"[EXPIRY-CHECK] ❌ Failed to send expired notification to user {user_id}: {e}")
+        # Mark notifications as sent only for delivered messages
+        sent = []
+        for (_, user_id, accounts, notification_type), delivered in zip(outgoing, results):
+            if not delivered:
+                print(f"[EXPIRY-CHECK] ❌ Failed to send {notification_type} notification to user {user_id}")
+                continue
+            print(f"[EXPIRY-CHECK] ✅ Sent {notification_type} notification to user {user_id}")
+            sent.extend((user_id, acc.id, notification_type) for acc in accounts)
         
-        # Send notifications for accounts expiring soon
-        for user_id, accounts in user_expiring.items():
-            try:
-                user = session.query(User).get(user_id)
-                if user and ensure_active(user):
-                    await send_expiring_soon_notification(bot, user, accounts)
-                    print(f"[EXPIRY-CHECK] ✅ Sent expiring soon notification to user {user_id}")
-                    
-                    # Mark notifications as sent for all accounts
-                    for acc in accounts:
-                        mark_notification_sent(session, user_id, acc.id, 'expiring_soon')
-                        print(f"[EXPIRY-CHECK] 📝 Marked expiring soon notification as sent for @{acc.account}")
-                else:
-                    print(f"[EXPIRY-CHECK] ⚠️ User {user_id} not found or inactive")
-            except Exception as e:
-                print(f"[EXPIRY-CHECK] ❌ Failed to send expiring soon notification to user {user_id}: {e}")
+        mark_notifications_sent(session, sent)
+        if sent:
+            print(f"[EXPIRY-CHECK] 📝 Marked {len(sent)} notifications as sent")
 
 
-async def send_expired_notification(bot, user: User, accounts: List[Account]):
-    """Send notification about expired accounts with interactive buttons."""
+async def send_notifications(bot, notifications: List[dict]) -> List[bool]:
+    """
+    Send notifications in a batch (AsyncBotWrapper.send_many) or one by one.
+    
+    Returns:
+        Delivery flags in the same order as notifications
+    """
+    if hasattr(bot, 'send_many'):
+        try:
+            return await bot.send_many(notifications)
+        except Exception as e:
+            print(f"[EXPIRY-CHECK] ❌ Batch send failed: {e}")
+            return [False] * len(notifications)
+    
+    results = []
+    for notification in notifications:
+        try:
+            sent = await bot.send_message(
+                notification["chat_id"], notification["text"], reply_markup=notification["reply_markup"]
+            )
+            results.append(sent is not False)
+        except Exception as e:
+            print(f"[EXPIRY-CHECK] ❌ Failed to send notification to user {notification['chat_id']}: {e}")
+            results.append(False)
+    return results
+
+
+def build_expired_notification(user: User, accounts: List[Account]) -> dict:
+    """Build notification about expired accounts with interactive buttons."""
     # Original message format
     message_lines = [
         "⚠️ <b>ВНИМАНИЕ: Истек срок мониторинга!</b>\n",
@@ -205,15 +271,21 @@ async def send_expired_notification(bot, user: User, accounts: List[Account]):
     
     reply_markup = {"inline_keyboard": keyboard}
     
+    return {"chat_id": user.id, "text": message, "reply_markup": reply_markup}
+
+
+async def send_expired_notification(bot, user: User, accounts: List[Account]):
+    """Send notification about expired accounts with interactive buttons."""
+    notification = build_expired_notification(user, accounts)
     try:
         # Send message with inline keyboard
-        await bot.send_message(user.id, message, reply_markup=reply_markup)
+        await bot.send_message(user.id, notification["text"], reply_markup=notification["reply_markup"])
     except Exception as e:
         print(f"[EXPIRY-CHECK] Failed to send expired notification: {e}")
 
 
-async def send_expiring_soon_notification(bot, user: User, accounts: List[Account]):
-    """Send notification about accounts expiring soon with interactive buttons."""
+def build_expiring_soon_notification(user: User, accounts: List[Account]) -> dict:
+    """Build notification about accounts expiring soon with interactive buttons."""
     # Header message
     message_lines = [
         "⏰ <b>Напоминание: скоро истечет срок мониторинга</b>\n",
@@ -242,9 +314,15 @@ async def send_expiring_soon_notification(bot, user: User, accounts: List[Accoun
     
     reply_markup = {"inline_keyboard": keyboard}
     
+    return {"chat_id": user.id, "text": message, "reply_markup": reply_markup}
+
+
+async def send_expiring_soon_notification(bot, user: User, accounts: List[Account]):
+    """Send notification about accounts expiring soon with interactive buttons."""
+    notification = build_expiring_soon_notification(user, accounts)
     try:
         # Send message with inline keyboard
-        await bot.send_message(user.id, message, reply_markup=reply_markup)
+        await bot.send_message(user.id, notification["text"], reply_markup=notification["reply_markup"])
     except Exception as e:
         print(f"[EXPIRY-CHECK] Failed to send expiring soon notification: {e}")
 
@@ -0,0 +1,145 @@
+"""
+Shared keep-alive aiohttp sessions.
+
+Раньше каждый запрос к RapidAPI открывал новый ClientSession (новый TCP + TLS
+handshake). Здесь держим по одной сессии на event loop с пулом соединений,
+лимитом на хост и DNS-кэшем, и закрываем их при остановке.
+
+aiohttp-сессия привязана к loop'у, поэтому ключ реестра - (loop, name).
+Сессии закрытых loop'ов (asyncio.run в фоновых потоках) подчищаются
+при следующем обращении.
+"""
+
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+try:
+    from ..config import get_settings
+except ImportError:
+    from config import get_settings
+
+
+RAPIDAPI_SESSION = "rapidapi"
+PROFILE_PIC_SESSION = "profile_pic"
+
+
+class HttpSessionManager:
+    """Process-wide registry of pooled aiohttp sessions."""
+
+    def __init__(self):
+        self._sessions: Dict[Tuple[int, str], Tuple[asyncio.AbstractEventLoop, ClientSession]] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, name: str, timeout_seconds: float) -> ClientSession:
+        """
+        Get (or create) pooled session for the running event loop.
+
+        Args:
+            name: Session name (one pool per upstream service)
+            timeout_seconds: Total request timeout
+
+        Returns:
+            Shared ClientSession (do not close it - use close_http_sessions())
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), name)
+
+        with self._lock:
+            self._purge_closed_loops()
+
+            entry = self._sessions.get(key)
+            if entry is not None and entry[0] is loop and not entry[1].closed:
+                return entry[1]
+
+            settings = get_settings()
+            connector = TCPConnector(
+                limit=settings.http_pool_limit,
+                limit_per_host=settings.http_pool_limit_per_host,
+                ttl_dns_cache=settings.http_dns_cache_seconds,
+                use_dns_cache=True,
+                keepalive_timeout=settings.http_keepalive_seconds,
+                enable_cleanup_closed=True,
+            )
+            session = ClientSession(
+                connector=connector,
+                timeout=ClientTimeout(total=timeout_seconds),
+            )
+            self._sessions[key] = (loop, session)
+            print(f"[HTTP-SESSIONS] 🔌 Создана keep-alive сессия '{name}' "
+                  f"(limit_per_host={settings.http_pool_limit_per_host})")
+            return session
+
+    def _purge_closed_loops(self) -> None:
+        """Drop sessions whose event loop is already closed."""
+        for key, (loop, session) in list(self._sessions.items()):
+            if loop.is_closed():
+                del self._sessions[key]
+                try:
+                    # Loop мёртв - await невозможен, закрываем транспорты синхронно
+                    session.connector.close()
+                except Exception:
+                    pass
+
+    async def close(self, name: Optional[str] = None) -> None:
+        """
+        Close sessions of the running event loop (graceful shutdown).
+
+        Args:
+            name: Close only this session (default: all sessions of the loop)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            to_close = [
+                (key, session) for key, (owner, session) in self._sessions.items()
+                if owner is loop and (name is None or key[1] == name)
+            ]
+            for key, _ in to_close:
+                del self._sessions[key]
+
+        for _, session in to_close:
+            try:
+                await session.close()
+            except Exception:
+                pass
+        if to_close:
+            # Даём SSL-транспортам корректно закрыться
+            await asyncio.sleep(0.25)
+            print(f"[HTTP-SESSIONS] 🛑 Закрыто сессий: {len(to_close)}")
+
+
+# Global manager instance
+_manager = HttpSessionManager()
+
+
+def get_session_manager() -> HttpSessionManager:
+    """Get the global HTTP session manager."""
+    return _manager
+
+
+def get_rapidapi_session() -> ClientSession:
+    """
+    Get shared keep-alive session for RapidAPI calls.
+
+    Returns:
+        ClientSession bound to the running event loop
+    """
+    settings = get_settings()
+    return _manager.get_session(RAPIDAPI_SESSION, settings.rapidapi_timeout_seconds)
+
+
+def get_profile_pic_session() -> ClientSession:
+    """
+    Get shared keep-alive session for profile picture downloads (profile_renderer).
+
+    Returns:
+        ClientSession bound to the running event loop
+    """
+    return _manager.get_session(PROFILE_PIC_SESSION, 10)
+
+
+async def close_http_sessions() -> None:
+    """Close shared sessions of the running event loop."""
+    await _manager.close()
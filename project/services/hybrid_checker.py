@@ -7,7 +7,7 @@ from datetime import date, datetime
 import os
 
 try:
-    from ..models import Account, InstagramSession, Proxy
+    from ..models import Account, InstagramSession, Proxy, account_norm
     from .check_via_api import check_account_exists_via_api
     from .ig_simple_checker import check_account_with_screenshot
     from .proxy_checker import check_account_via_proxy_with_screenshot
@@ -16,7 +16,7 @@ try:
     from ..utils.encryptor import OptionalFernet
     from ..config import get_settings
 except ImportError:
-    from models import Account, InstagramSession, Proxy
+    from models import Account, InstagramSession, Proxy, account_norm
     from services.check_via_api import check_account_exists_via_api
     from services.ig_simple_checker import check_account_with_screenshot
     from services.proxy_checker import check_account_via_proxy_with_screenshot
@@ -114,7 +114,7 @@ async def check_account_hybrid(
                 if result["exists"] is True:
                     acc = session.query(Account).filter(
                         Account.user_id == user_id,
-                        Account.account == username
+                        Account.account_norm == account_norm(username)
                     ).first()
                     if acc:
                         acc.done = True
@@ -10,9 +10,15 @@ Instagram profile screenshot via Playwright + proxy.
 """
 
 import asyncio
+import contextlib
 from typing import Optional
 from playwright.async_api import async_playwright, TimeoutError as PWTimeoutError
 
+try:
+    from .browser_pool import BrowserLease, BrowserPool
+except ImportError:
+    from services.browser_pool import BrowserLease, BrowserPool
+
 
 def _proxy_kwargs_from_url(proxy_url: str):
     """Convert proxy URL to Playwright proxy kwargs."""
@@ -173,7 +179,8 @@ async def check_account_with_header_screenshot(
     timeout_ms: int = 30000,
     dark_theme: bool = True,
     mobile_emulation: bool = True,
-    crop_ratio: float = 0.5  # 50% верха по умолчанию (достаточно для header + био)
+    crop_ratio: float = 0.5,  # 50% верха по умолчанию (достаточно для header + био)
+    browser_pool: Optional[BrowserPool] = None
 ) -> dict:
     """
     Проверяет Instagram аккаунт через proxy БЕЗ IG сессии.
@@ -188,6 +195,7 @@ async def check_account_with_header_screenshot(
         dark_theme: Apply dark theme (black background)
         mobile_emulation: Use mobile device emulation (iPhone 12)
         crop_ratio: Ratio for cropping to header (0.5 = 50% top, includes header+bio+buttons)
+        browser_pool: Persistent browser pool (if None - browser is launched per call)
     
     Returns:
         dict with check results:
@@ -253,9 +261,14 @@ async def check_account_with_header_screenshot(
     
     # Will be updated in finally block
     traffic_registered = False
+    lease: Optional[BrowserLease] = None
     
     try:
-        async with async_playwright() as p:
+        # С пулом Playwright уже запущен - используем его драйвер
+        playwright_scope = (
+            contextlib.nullcontext(browser_pool.playwright) if browser_pool else async_playwright()
+        )
+        async with playwright_scope as p:
             # 🔥 УЛУЧШЕННАЯ настройка браузера
             launch_args = [
                 "--disable-blink-features=AutomationControlled",
@@ -298,18 +311,22 @@ async def check_account_with_header_screenshot(
                 # "--start-maximized",  # ОТКЛЮЧЕНО: конфликт с headless режимом
             ]
             
+            if browser_pool:
+                # 🔥 Браузер из пула (один на прокси) - без запуска Chromium
+                lease = await browser_pool.acquire(proxy_url, headless=headless, args=browser_args)
             # Добавляем proxy только если он указан
-            if proxy_kwargs:
-                browser = await p.chromium.launch(
+            elif proxy_kwargs:
+                lease = BrowserLease(await p.chromium.launch(
                     headless=headless,
                     args=browser_args,
                     proxy=proxy_kwargs
-                )
+                ))
             else:
-                browser = await p.chromium.launch(
+                lease = BrowserLease(await p.chromium.launch(
                     headless=headless,
                     args=browser_args
-                )
+                ))
+            browser = lease.browser
             
             # 🔥 МОБИЛЬНАЯ ЭМУЛЯЦИЯ или обычный режим
             if mobile_emulation:
@@ -341,7 +358,7 @@ async def check_account_with_header_screenshot(
                     # context_options["color_scheme"] = "dark"
                     pass
             
-            context = await browser.new_context(**context_options)
+            context = await lease.new_context(**context_options)
             
             # 🔥 ПРИНУДИТЕЛЬНАЯ ТЕМНАЯ ТЕМА через JavaScript injection - ОТКЛЮЧЕНО
             if dark_theme:
@@ -430,7 +447,7 @@ async def check_account_with_header_screenshot(
                     print(f"[PROXY-HEADER-SCREENSHOT] ⏱️ Timeout при загрузке страницы: {e}")
                     result["error"] = f"timeout_loading_page: {str(e)}"
                     result["exists"] = False
-                    await browser.close()
+                    await lease.release()
                     return result
                 
                 # Проверяем статус код
@@ -438,14 +455,14 @@ async def check_account_with_header_screenshot(
                     print(f"[PROXY-HEADER-SCREENSHOT] ❌ Профиль не найден (404)")
                     result["exists"] = False
                     result["error"] = "404_not_found"
-                    await browser.close()
+                    await lease.release()
                     return result
                 
                 elif status_code == 403:
                     print(f"[PROXY-HEADER-SCREENSHOT] 🚫 Доступ запрещен (403)")
                     result["exists"] = None
                     result["error"] = "403_forbidden"
-                    await browser.close()
+                    await lease.release()
                     return result
                 
                 # ОПТИМИЗИРОВАННОЕ ожидание загрузки контента
@@ -547,7 +564,7 @@ async def check_account_with_header_screenshot(
                                     print(f"[PROXY-HEADER-SCREENSHOT] ❌ Все попытки исчерпаны, возвращаем ошибку")
                                     result["error"] = "wrong_page_redirect"
                                     result["exists"] = False
-                                    await browser.close()
+                                    await lease.release()
                                     return result
                         
                         except Exception as retry_error:
@@ -555,7 +572,7 @@ async def check_account_with_header_screenshot(
                             if retry == max_retries - 1:
                                 result["error"] = f"retry_failed: {retry_error}"
                                 result["exists"] = False
-                                await browser.close()
+                                await lease.release()
                                 return result
                 
                 # Проверяем контент страницы СНАЧАЛА
@@ -569,24 +586,30 @@ async def check_account_with_header_screenshot(
                     print(f"[PROXY-HEADER-SCREENSHOT] ⚠️ Instagram показывает блокировку - переключаемся на desktop...")
                     
                     # Закрываем текущий браузер
-                    await browser.close()
+                    await lease.release()
                     
                     # Перезапускаем с DESKTOP эмуляцией
                     print(f"[PROXY-HEADER-SCREENSHOT] 🖥️ Переключаемся на DESKTOP режим...")
                     
-                    browser = await p.chromium.launch(
-                        headless=headless,
-                        args=launch_args + [
-                            "--disable-dev-shm-usage",
-                            "--disable-gpu-sandbox",
-                            "--enable-gpu", 
-                            "--force-device-scale-factor=1",
-                            "--disable-web-security",
-                            "--disable-features=VizDisplayCompositor",
-                            "--window-size=1366,768",  # ОПТИМИЗАЦИЯ ТРАФИКА
-                        ],
-                        proxy=proxy_kwargs
-                    )
+                    desktop_args = launch_args + [
+                        "--disable-dev-shm-usage",
+                        "--disable-gpu-sandbox",
+                        "--enable-gpu", 
+                        "--force-device-scale-factor=1",
+                        "--disable-web-security",
+                        "--disable-features=VizDisplayCompositor",
+                        "--window-size=1366,768",  # ОПТИМИЗАЦИЯ ТРАФИКА
+                    ]
+                    if browser_pool:
+                        # Другие флаги запуска - пул отдаёт отдельный desktop-браузер этого прокси
+                        lease = await browser_pool.acquire(proxy_url, headless=headless, args=desktop_args)
+                    else:
+                        lease = BrowserLease(await p.chromium.launch(
+                            headless=headless,
+                            args=desktop_args,
+                            proxy=proxy_kwargs
+                        ))
+                    browser = lease.browser
                     
                     # Desktop viewport с уменьшенным разрешением для экономии трафика
                     context_options = {
@@ -596,7 +619,7 @@ async def check_account_with_header_screenshot(
                     if dark_theme:
                         context_options["color_scheme"] = "dark"
                     
-                    context = await browser.new_context(**context_options)
+                    context = await lease.new_context(**context_options)
                     
                     if dark_theme:
                         await context.add_init_script("""
@@ -880,7 +903,7 @@ async def check_account_with_header_screenshot(
                     print(f"[PROXY-HEADER-SCREENSHOT] ❌ Страница недоступна")
                     result["exists"] = False
                     result["error"] = "page_not_found"
-                    await browser.close()
+                    await lease.release()
                     return result
                 
                 # Пропускаем проверку на страницу логина - создаем скриншот в любом случае
@@ -1072,7 +1095,7 @@ async def check_account_with_header_screenshot(
                     print(f"[PROXY-FULL-SCREENSHOT] ❌ Ошибка при создании скриншота: {e}")
                     result["error"] = f"screenshot_failed: {str(e)}"
                     result["exists"] = False
-                    await browser.close()
+                    await lease.release()
                     return result
                 
                 # Полный скриншот без обрезки
@@ -1227,7 +1250,7 @@ async def check_account_with_header_screenshot(
                                         print(f"[PROXY-HEADER-SCREENSHOT] ❌ Белый скрин остался даже после перезагрузки")
                                         result["error"] = "white_screen_persistent"
                                         result["exists"] = False
-                                        await browser.close()
+                                        await lease.release()
                                         return result
                                     else:
                                         print(f"[PROXY-HEADER-SCREENSHOT] ✅ После перезагрузки скрин стал нормальным!")
@@ -1235,7 +1258,7 @@ async def check_account_with_header_screenshot(
                                     print(f"[PROXY-HEADER-SCREENSHOT] ❌ Ошибка финальной попытки: {reload_error}")
                                     result["error"] = "white_screen_detected"
                                     result["exists"] = False
-                                    await browser.close()
+                                    await lease.release()
                                     return result
                             else:
                                 print(f"[PROXY-HEADER-SCREENSHOT] ✅ После пересоздания скрин стал нормальным")
@@ -1256,23 +1279,30 @@ async def check_account_with_header_screenshot(
                     result["error"] = "screenshot_failed"
                     result["exists"] = False
                 
-                await browser.close()
+                await lease.release()
                 
             except PWTimeoutError as e:
                 print(f"[PROXY-HEADER-SCREENSHOT] ⏱️ Timeout: {e}")
                 result["error"] = f"timeout: {e}"
-                await browser.close()
+                await lease.release()
                 
             except Exception as e:
                 print(f"[PROXY-HEADER-SCREENSHOT] ❌ Ошибка: {e}")
                 result["error"] = str(e)
-                await browser.close()
+                await lease.release()
     
     except Exception as e:
         print(f"[PROXY-HEADER-SCREENSHOT] ❌ Критическая ошибка: {e}")
         result["error"] = str(e)
     
     finally:
+        # Возвращаем браузер в пул / закрываем его (release идемпотентен)
+        if lease is not None:
+            try:
+                await lease.release()
+            except Exception:
+                pass
+        
         # ALWAYS end traffic monitoring (even on early returns/errors)
         # (Playwright doesn't provide exact traffic data, so we estimate based on result)
         try:
@@ -0,0 +1,299 @@
+"""
+Durable check job queue in the main database.
+
+Бот (планировщик, добавление аккаунта) кладёт задания в таблицу check_jobs,
+а отдельные процессы worker.py их забирают. Так проверки (Chromium, Selenium,
+генерация картинок) не делят GIL и память с Telegram-процессом, и воркеров
+можно запустить несколько - на одной машине или на разных (Postgres).
+
+- Аренда (lease): воркер захватывает задание на lease_seconds; если воркер
+  умер, по истечении аренды задание снова становится доступным
+- Захват атомарный: UPDATE ... WHERE status/lease не изменились
+  (на Postgres дополнительно SELECT ... FOR UPDATE SKIP LOCKED)
+- Повторы: при ошибке задание возвращается в очередь с backoff,
+  после max_attempts помечается failed
+- Хранение: done / failed старше CHECK_JOB_RETENTION_HOURS и задания удалённых
+  аккаунтов удаляет purge_finished_jobs (воркер, периодически). ondelete=CASCADE
+  на SQLite не срабатывает (PRAGMA foreign_keys выключен), поэтому удаление
+  аккаунтов удаляет их задания явно (delete_account_jobs)
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, delete, exists, func, or_, update
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import Account, CheckJob
+    from ..config import get_settings
+except ImportError:
+    from models import Account, CheckJob
+    from config import get_settings
+
+
+JOB_QUEUED = "queued"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+JOB_SOURCE_AUTO = "auto"
+JOB_SOURCE_ADD = "add"
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_LEASED)
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+def _now() -> datetime:
+    # UTC: воркеры могут работать на машинах с другим часовым поясом
+    return datetime.utcnow()
+
+
+def enqueue_check_jobs(
+    session: Session,
+    user_id: int,
+    account_ids: Iterable[int],
+    source: str = JOB_SOURCE_AUTO,
+    priority: int = 0,
+    max_attempts: Optional[int] = None,
+) -> int:
+    """
+    Queue check jobs for accounts (accounts with an active job are skipped).
+
+    Args:
+        session: Database session
+        user_id: Owner of the accounts
+        account_ids: Account IDs to check
+        source: 'auto' (scheduled) | 'add' (just added, user waits for result)
+        priority: Higher runs first
+        max_attempts: Attempts before the job is marked failed
+
+    Returns:
+        Number of queued jobs
+    """
+    account_ids = list(dict.fromkeys(account_ids))
+    if not account_ids:
+        return 0
+
+    active = {
+        account_id for (account_id,) in session.query(CheckJob.account_id).filter(
+            CheckJob.account_id.in_(account_ids),
+            CheckJob.status.in_(ACTIVE_STATUSES)
+        )
+    }
+
+    now = _now()
+    attempts = max_attempts or get_settings().check_job_max_attempts
+    jobs = [
+        CheckJob(
+            user_id=user_id,
+            account_id=account_id,
+            source=source,
+            status=JOB_QUEUED,
+            priority=priority,
+            max_attempts=attempts,
+            available_at=now,
+        )
+        for account_id in account_ids if account_id not in active
+    ]
+    session.add_all(jobs)
+    session.commit()
+    return len(jobs)
+
+
+def _available_condition(now: datetime):
+    """Queued and due, or leased with an expired lease."""
+    return or_(
+        and_(CheckJob.status == JOB_QUEUED, CheckJob.available_at <= now),
+        and_(CheckJob.status == JOB_LEASED, CheckJob.lease_expires_at < now),
+    )
+
+
+def reap_expired_leases(session: Session) -> int:
+    """Mark jobs failed whose lease expired on the last attempt (worker died mid-check)."""
+    now = _now()
+    result = session.execute(
+        update(CheckJob)
+        .where(
+            CheckJob.status == JOB_LEASED,
+            CheckJob.lease_expires_at < now,
+            CheckJob.attempts >= CheckJob.max_attempts,
+        )
+        .values(status=JOB_FAILED, last_error="lease_expired", lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount or 0
+
+
+def lease_jobs(session: Session, worker_id: str, limit: int, lease_seconds: int) -> List[CheckJob]:
+    """
+    Atomically lease up to `limit` available jobs.
+
+    Args:
+        session: Database session
+        worker_id: Unique worker identifier (host:pid)
+        limit: Max jobs to lease
+        lease_seconds: Visibility timeout
+
+    Returns:
+        Leased jobs (attempts already incremented)
+    """
+    if limit <= 0:
+        return []
+    reap_expired_leases(session)
+
+    now = _now()
+    query = (
+        session.query(CheckJob.id)
+        .filter(_available_condition(now))
+        .order_by(CheckJob.priority.desc(), CheckJob.available_at.asc(), CheckJob.id.asc())
+        .limit(limit * 2)
+    )
+    if session.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    candidate_ids = [job_id for (job_id,) in query]
+
+    leased_ids = []
+    lease_until = now + timedelta(seconds=lease_seconds)
+    for job_id in candidate_ids:
+        if len(leased_ids) >= limit:
+            break
+        # Условие повторяется в UPDATE: если другой воркер успел первым, rowcount = 0
+        result = session.execute(
+            update(CheckJob)
+            .where(CheckJob.id == job_id, _available_condition(now))
+            .values(
+                status=JOB_LEASED,
+                lease_owner=worker_id,
+                lease_expires_at=lease_until,
+                attempts=CheckJob.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            leased_ids.append(job_id)
+    session.commit()
+
+    if not leased_ids:
+        return []
+    # populate_existing: bulk UPDATE above does not refresh objects already in the session
+    return (
+        session.query(CheckJob)
+        .populate_existing()
+        .filter(CheckJob.id.in_(leased_ids))
+        .order_by(CheckJob.id)
+        .all()
+    )
+
+
+def extend_lease(session: Session, job_id: int, worker_id: str, lease_seconds: int) -> bool:
+    """Extend lease of a running job (heartbeat). False if the lease was lost."""
+    result = session.execute(
+        update(CheckJob)
+        .where(CheckJob.id == job_id, CheckJob.status == JOB_LEASED, CheckJob.lease_owner == worker_id)
+        .values(lease_expires_at=_now() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount == 1
+
+
+def complete_job(session: Session, job_id: int, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+    """Mark job done. False if the lease was lost (job was taken by another worker)."""
+    updated = session.execute(
+        update(CheckJob)
+        .where(CheckJob.id == job_id, CheckJob.status == JOB_LEASED, CheckJob.lease_owner == worker_id)
+        .values(
+            status=JOB_DONE,
+            result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return updated.rowcount == 1
+
+
+def fail_job(session: Session, job_id: int, worker_id: str, error: str, retry_delay_seconds: Optional[int] = None) -> str:
+    """
+    Return job to the queue with backoff, or mark it failed after max_attempts.
+
+    Returns:
+        New job status ('queued' | 'failed'), or '' if the lease was lost
+    """
+    job = session.query(CheckJob).populate_existing().get(job_id)
+    if job is None or job.status != JOB_LEASED or job.lease_owner != worker_id:
+        return ""
+
+    job.last_error = error[:1000]
+    job.lease_owner = None
+    job.lease_expires_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = JOB_FAILED
+    else:
+        delay = retry_delay_seconds
+        if delay is None:
+            delay = get_settings().check_job_retry_seconds * (2 ** (job.attempts - 1))
+        job.status = JOB_QUEUED
+        job.available_at = _now() + timedelta(seconds=delay)
+    session.commit()
+    return job.status
+
+
+def queue_stats(session: Session) -> Dict[str, int]:
+    """Number of jobs per status."""
+    stats = {JOB_QUEUED: 0, JOB_LEASED: 0, JOB_DONE: 0, JOB_FAILED: 0}
+    for status, count in session.query(CheckJob.status, func.count(CheckJob.id)).group_by(CheckJob.status):
+        stats[status] = count
+    return stats
+
+
+def delete_account_jobs(session: Session, account_ids) -> int:
+    """
+    Delete jobs of accounts that are being deleted (no commit).
+
+    Args:
+        session: Database session
+        account_ids: Account IDs (list or a SELECT of Account.id)
+
+    Returns:
+        Number of deleted jobs
+    """
+    result = session.execute(
+        delete(CheckJob)
+        .where(CheckJob.account_id.in_(account_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def purge_finished_jobs(session: Session, retention_hours: Optional[float] = None) -> int:
+    """
+    Delete done / failed jobs older than the retention period and jobs of deleted accounts.
+
+    Args:
+        session: Database session
+        retention_hours: Keep finished jobs this long (default: CHECK_JOB_RETENTION_HOURS)
+
+    Returns:
+        Number of deleted jobs
+    """
+    if retention_hours is None:
+        retention_hours = get_settings().check_job_retention_hours
+    # updated_at ставит БД (CURRENT_TIMESTAMP на SQLite - UTC), сравниваем с UTC
+    cutoff = _now() - timedelta(hours=retention_hours)
+    result = session.execute(
+        delete(CheckJob)
+        .where(or_(
+            and_(CheckJob.status.in_(FINISHED_STATUSES), CheckJob.updated_at < cutoff),
+            ~exists().where(Account.id == CheckJob.account_id),
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount or 0
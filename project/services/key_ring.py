@@ -0,0 +1,267 @@
+"""
+In-memory API key ring per user.
+
+Раньше каждая проверка заново читала все рабочие ключи из БД и шла по ним
+в порядке id: ключ #1 выжигался до 950, и все 429 приходились на него.
+
+Кольцо держит ключи пользователя в памяти и выбирает их взвешенным
+round-robin (smooth weighted round-robin, как в nginx). Вес ключа зависит от
+    - оставшейся дневной квоты
+    - доли ошибок (EWMA)
+    - времени ответа (EWMA)
+
+Ключи, вернувшие ошибку квоты, выключаются до начала следующих суток (UTC),
+ключи с ошибкой авторизации - на KEY_RING_AUTH_COOLDOWN_SECONDS (circuit breaker).
+
+БД остаётся источником истины: квота всё равно резервируется атомарно
+(api_keys.claim_key_quota) и её ответ обновляет кольцо. Кольцо перечитывается
+раз в KEY_RING_REFRESH_SECONDS и сразу после изменения ключей в этом процессе
+(добавление, удаление, is_work).
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import APIKey
+    from ..config import get_settings
+    from ..database import on_committed_changes, run_db
+    from .api_keys import usage_today, _day_start
+except ImportError:
+    from models import APIKey
+    from config import get_settings
+    from database import on_committed_changes, run_db
+    from services.api_keys import usage_today, _day_start
+
+# Сглаживание EWMA: вес нового наблюдения
+EWMA_ALPHA = 0.2
+
+
+class KeyState:
+    """Selection state of one API key (no DB session attached)."""
+
+    __slots__ = ("id", "key", "remaining", "latency", "error_rate", "circuit_until", "current")
+
+    def __init__(self, key_id: int, key: str, remaining: int):
+        self.id = key_id
+        self.key = key
+        self.remaining = remaining
+        self.latency = 0.0  # seconds, EWMA
+        self.error_rate = 0.0  # 0..1, EWMA
+        self.circuit_until = 0.0  # time.monotonic(); 0 = closed
+        self.current = 0.0  # smooth weighted round-robin counter
+
+    def available(self, now: float) -> bool:
+        return self.remaining > 0 and self.circuit_until <= now
+
+    def weight(self, limit: int) -> float:
+        quota = self.remaining / limit if limit > 0 else 1.0
+        return max(quota, 0.001) * max(1.0 - self.error_rate, 0.05) / (1.0 + self.latency)
+
+
+class _UserRing:
+    def __init__(self):
+        self.keys: Dict[int, KeyState] = {}
+        self.loaded_at = 0.0
+
+
+class KeyRing:
+    """Per-user API key rings with weighted selection and circuit breaking."""
+
+    def __init__(self, refresh_seconds: Optional[int] = None, auth_cooldown_seconds: Optional[int] = None):
+        """
+        Initialize key ring.
+
+        Args:
+            refresh_seconds: Reload user's keys from DB after this many seconds (default: settings)
+            auth_cooldown_seconds: Skip a key after an auth error for this long (default: settings)
+        """
+        settings = get_settings()
+        self.refresh_seconds = settings.key_ring_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self.auth_cooldown_seconds = (
+            settings.key_ring_auth_cooldown_seconds if auth_cooldown_seconds is None else auth_cooldown_seconds
+        )
+        self._rings: Dict[int, _UserRing] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Loading ----------
+
+    def _is_fresh(self, user_id: int) -> bool:
+        with self._lock:
+            ring = self._rings.get(user_id)
+            return ring is not None and time.monotonic() - ring.loaded_at < self.refresh_seconds
+
+    def load(self, session: Session, user_id: int) -> None:
+        """(Re)load the user's working keys from DB, keeping collected stats."""
+        limit = get_settings().api_daily_limit
+        rows = (
+            session.query(APIKey)
+            .filter(APIKey.user_id == user_id, APIKey.is_work == True)
+            .order_by(APIKey.id.asc())
+            .all()
+        )
+        with self._lock:
+            old = self._rings.get(user_id)
+            ring = _UserRing()
+            for row in rows:
+                state = old.keys.get(row.id) if old is not None else None
+                if state is None:
+                    state = KeyState(row.id, row.key, 0)
+                state.key = row.key
+                state.remaining = max(0, limit - usage_today(row))
+                ring.keys[row.id] = state
+            ring.loaded_at = time.monotonic()
+            self._rings[user_id] = ring
+
+    async def acandidates(self, session, user_id: int) -> List[KeyState]:
+        """candidates() for async code: DB is read only when the ring is stale."""
+        if not self._is_fresh(user_id):
+            await run_db(session, self.load, user_id)
+        return self.order(user_id)
+
+    def candidates(self, session: Session, user_id: int) -> List[KeyState]:
+        """
+        Keys to try for one request, best first.
+
+        The first key is the weighted round-robin pick, the rest follow by
+        weight (fallbacks if the first one fails). Keys without quota and
+        keys with an open circuit are left out.
+        """
+        if not self._is_fresh(user_id):
+            self.load(session, user_id)
+        return self.order(user_id)
+
+    def order(self, user_id: int) -> List[KeyState]:
+        limit = get_settings().api_daily_limit
+        now = time.monotonic()
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                return []
+            live = [s for s in ring.keys.values() if s.available(now)]
+            if not live:
+                return []
+            weights = {s.id: s.weight(limit) for s in live}
+            total = sum(weights.values())
+            for s in live:
+                s.current += weights[s.id]
+            picked = max(live, key=lambda s: s.current)
+            picked.current -= total
+            rest = sorted((s for s in live if s is not picked), key=lambda s: weights[s.id], reverse=True)
+            return [picked] + rest
+
+    def known(self, user_id: int) -> int:
+        """Number of working keys of the user in the ring."""
+        with self._lock:
+            ring = self._rings.get(user_id)
+            return len(ring.keys) if ring is not None else 0
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Force reload on next use (one user or all); collected stats are kept."""
+        with self._lock:
+            for uid, ring in self._rings.items():
+                if user_id is None or uid == user_id:
+                    ring.loaded_at = float("-inf")
+
+    # ---------- Feedback ----------
+
+    def _state(self, user_id: int, key_id: int) -> Optional[KeyState]:
+        ring = self._rings.get(user_id)
+        return ring.keys.get(key_id) if ring is not None else None
+
+    def record_claim(self, user_id: int, key_id: int, used: Optional[int]) -> None:
+        """Update remaining quota from claim_key_quota() (None = exhausted in DB)."""
+        limit = get_settings().api_daily_limit
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.remaining = 0 if used is None else max(0, limit - used)
+
+    def record_release(self, user_id: int, key_id: int) -> None:
+        """A claimed request was not made (quota given back)."""
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.remaining += 1
+
+    def record_success(self, user_id: int, key_id: int, latency: float) -> None:
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.latency += EWMA_ALPHA * (latency - state.latency)
+                state.error_rate *= 1.0 - EWMA_ALPHA
+
+    def record_error(self, user_id: int, key_id: int) -> None:
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.error_rate += EWMA_ALPHA * (1.0 - state.error_rate)
+
+    def open_circuit(self, user_id: int, key_id: int, seconds: float) -> None:
+        """Skip the key for the given time."""
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.circuit_until = time.monotonic() + seconds
+
+    def quota_exhausted(self, user_id: int, key_id: int) -> None:
+        """Provider reported quota exceeded: skip the key until the next quota day."""
+        seconds = (_day_start() + timedelta(days=1) - datetime.utcnow()).total_seconds()
+        with self._lock:
+            state = self._state(user_id, key_id)
+            if state is not None:
+                state.remaining = 0
+                state.circuit_until = time.monotonic() + seconds
+
+    def auth_failed(self, user_id: int, key_id: int) -> None:
+        """Key was rejected (not subscribed / invalid): skip it for a while."""
+        self.record_error(user_id, key_id)
+        self.open_circuit(user_id, key_id, self.auth_cooldown_seconds)
+
+    def stats(self, user_id: int) -> List[Dict[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                return []
+            return [
+                {
+                    "id": s.id,
+                    "remaining": s.remaining,
+                    "latency_ms": round(s.latency * 1000, 1),
+                    "error_rate": round(s.error_rate, 3),
+                    "circuit_open": s.circuit_until > now,
+                }
+                for s in ring.keys.values()
+            ]
+
+
+# Global ring instance
+_ring: Optional[KeyRing] = None
+_ring_lock = threading.Lock()
+
+
+def get_key_ring() -> KeyRing:
+    """Get the process-wide API key ring."""
+    global _ring
+    with _ring_lock:
+        if _ring is None:
+            _ring = KeyRing()
+        return _ring
+
+
+# ---------- Invalidation on key changes ----------
+# Счётчики квоты пишутся Core UPDATE и сюда не попадают - только изменения
+# самих ключей через ORM (добавление, удаление, is_work, значение ключа).
+
+def _invalidate_users(users: Set[int]) -> None:
+    if _ring is not None:
+        for user_id in users:
+            _ring.invalidate(user_id)
+
+
+on_committed_changes(APIKey, None, _invalidate_users)
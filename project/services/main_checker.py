@@ -1,28 +1,35 @@
 """
 Main Checker - главный сервис проверки аккаунтов.
-Логика: API проверка → если успешно → Proxy + скриншот.
+Логика: уровни services/check_pipeline (cache → probe → API) → если найден → Proxy + скриншот
+(или шапка профиля без браузера, services/profile_renderer).
 """
 
 import asyncio
+import concurrent.futures
 import os
+import threading
 from typing import Optional, Dict, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
 try:
-    from ..models import Account, Proxy
-    from ..utils.encryptor import OptionalFernet
-    from ..config import get_settings
+    from ..models import Account, Proxy, account_norm
+    from ..database import run_db
     from .universal_playwright_checker import check_instagram_account_universal
-    from .proxy_service import get_active_proxies
-    from .check_via_api import check_account_exists_via_api
+    from .proxy_selector import get_proxy_selector
+    from .proxy_credentials import get_proxy_url
+    from .accounts import mark_account_done
+    from .browser_pool import get_browser_pool
+    from .check_pipeline import check_account_tiered, tiered_result, tiers_for_mode
 except ImportError:
-    from models import Account, Proxy
-    from utils.encryptor import OptionalFernet
-    from config import get_settings
+    from models import Account, Proxy, account_norm
+    from database import run_db
     from services.universal_playwright_checker import check_instagram_account_universal
-    from services.proxy_service import get_active_proxies
-    from services.check_via_api import check_account_exists_via_api
+    from services.proxy_selector import get_proxy_selector
+    from services.proxy_credentials import get_proxy_url
+    from services.accounts import mark_account_done
+    from services.browser_pool import get_browser_pool
+    from services.check_pipeline import check_account_tiered, tiered_result, tiers_for_mode
 
 
 def build_proxy_url_from_object(proxy: Proxy) -> str:
@@ -35,19 +42,10 @@ def build_proxy_url_from_object(proxy: Proxy) -> str:
     Returns:
         Proxy URL string
     """
-    if proxy.username and proxy.password:
-        try:
-            settings = get_settings()
-            encryptor = OptionalFernet(settings.encryption_key)
-            password = encryptor.decrypt(proxy.password)
-            return f"{proxy.scheme}://{proxy.username}:{password}@{proxy.host}"
-        except:
-            return f"{proxy.scheme}://{proxy.host}"
-    else:
-        return f"{proxy.scheme}://{proxy.host}"
+    return get_proxy_url(proxy)
 
 
-def get_best_proxy(session: Session, user_id: int) -> Optional[str]:
+def get_best_proxy(session: Session, user_id: int) -> Optional[Tuple[int, str]]:
     """
     Get best available proxy for user.
     
@@ -56,75 +54,166 @@ def get_best_proxy(session: Session, user_id: int) -> Optional[str]:
         user_id: User ID
         
     Returns:
-        Proxy URL or None
+        (proxy_id, proxy_url) or None
     """
-    proxies = get_active_proxies(session, user_id)
-    
-    if not proxies:
+    # Если все в кулдауне - берем тот, что освободится первым
+    return get_proxy_selector().select(session, user_id, fallback=True)
+
+
+# Проверки, идущие прямо сейчас: normalized username -> Future с результатом.
+# concurrent.futures.Future, т.к. проверки идут в разных потоках / event loop'ах.
+# Future получает (результат, байты скриншота): владелец читает файл до того,
+# как вернёт путь своему вызывающему (тот может удалить файл сразу после отправки).
+_inflight_checks: Dict[str, concurrent.futures.Future] = {}
+_inflight_waiters: Dict[str, int] = {}
+_inflight_lock = threading.Lock()
+
+
+def _is_shareable(result: Tuple[bool, str, Optional[str]]) -> bool:
+    """
+    Can another user's check reuse this result?
+
+    Найден / не найден - свойство самого аккаунта. Ошибки (нет ключей,
+    квота, нет прокси, таймаут) зависят от пользователя - их не делим.
+    """
+    success, message, _ = result
+    if success:
+        return True
+    return message in ("API: не найден", "API v2: не найден", "Probe: не найден")
+
+
+def _mark_done_for_user(session: Session, user_id: int, username: str) -> None:
+    """Mark the user's account as done (found)."""
+    mark_account_done(session, user_id, username)
+
+
+def _update_proxy_stats(session: Session, user_id: int, proxy_id: int, success: bool) -> None:
+    """Update success statistics of the proxy used for the check."""
+    get_proxy_selector().record_result(session, user_id, proxy_id, success)
+    print(f"[MAIN-CHECKER] 📊 Статистика прокси обновлена")
+
+
+def _read_shared_screenshot(result: Optional[Tuple[bool, str, Optional[str]]], username: str) -> Optional[bytes]:
+    """Read the owner's screenshot for the waiters before the owner's caller may delete it."""
+    if result is None or not result[2] or not _is_shareable(result):
+        return None
+    try:
+        with open(result[2], "rb") as f:
+            return f.read()
+    except OSError as e:
+        print(f"[MAIN-CHECKER] ⚠️ Не удалось прочитать скриншот @{username}: {e}")
         return None
-    
-    # Сортируем по приоритету и success rate
-    best_proxy = None
-    best_score = -1
-    
-    for proxy in proxies:
-        # Пропускаем если в кулдауне
-        if proxy.cooldown_until and proxy.cooldown_until > datetime.now():
-            continue
-        
-        # Считаем score
-        success_rate = 0
-        if proxy.used_count > 0:
-            success_rate = proxy.success_count / proxy.used_count
-        
-        # Score = приоритет (1-10, меньше лучше) + success_rate (0-1)
-        # Инвертируем приоритет чтобы 1 было лучше 10
-        score = (11 - proxy.priority) * 10 + success_rate * 100
-        
-        if score > best_score:
-            best_score = score
-            best_proxy = proxy
-    
-    if best_proxy:
-        return build_proxy_url_from_object(best_proxy)
-    
-    # Если все в кулдауне - берем первый
-    if proxies:
-        return build_proxy_url_from_object(proxies[0])
-    
-    return None
 
 
-async def check_account_main(
+async def _apply_shared_result(
+    result: Tuple[bool, str, Optional[str]],
+    screenshot_bytes: Optional[bytes],
     username: str,
-    session: Session,
+    session,
     user_id: int,
     screenshot_path: Optional[str] = None
+) -> Tuple[bool, str, Optional[str]]:
+    """
+    Per-user part of a coalesced check: mark the user's account and write its screenshot copy.
+
+    Каждый вызывающий получает свою копию скриншота (из байтов, прочитанных
+    владельцем) - после отправки вызывающий код может удалить файл.
+    """
+    success, message, shared_screenshot = result
+
+    if success:
+        await run_db(session, _mark_done_for_user, user_id, username)
+
+    screenshot = None
+    if shared_screenshot and screenshot_bytes is not None:
+        if not screenshot_path:
+            root, ext = os.path.splitext(shared_screenshot)
+            screenshot_path = f"{root}_u{user_id}{ext}"
+        try:
+            with open(screenshot_path, "wb") as f:
+                f.write(screenshot_bytes)
+            screenshot = screenshot_path
+        except OSError as e:
+            print(f"[MAIN-CHECKER] ⚠️ Не удалось сохранить копию скриншота @{username}: {e}")
+
+    return success, message, screenshot
+
+
+async def check_account_main(
+    username: str,
+    session,
+    user_id: int,
+    screenshot_path: Optional[str] = None,
+    api_result: Optional[Dict] = None
 ) -> Tuple[bool, str, Optional[str]]:
     """
     Главная функция проверки аккаунта.
-    Логика: API проверка → если успешно → Proxy + скриншот.
+    Логика: cache → HTTP probe → API проверка → если найден → Proxy + скриншот.
+
+    Одновременные проверки одного username (разные пользователи, ручная
+    проверка во время автопроверки) объединяются: пайплайн выполняется
+    один раз, остальные вызовы ждут его результат и получают свою
+    запись в БД и копию скриншота.
     
     Args:
         username: Instagram username
-        session: Database session
+        session: Database session (Session или AsyncSession - тогда запросы к БД не блокируют loop)
         user_id: User ID
         screenshot_path: Path for screenshot (auto-generated if None)
+        api_result: Готовый результат API проверки (из batch-проверки) - шаг 1 пропускается
         
     Returns:
         Tuple of (success, message, screenshot_path)
     """
+    key = account_norm(username)
+    with _inflight_lock:
+        future = _inflight_checks.get(key)
+        owner = future is None
+        if owner:
+            future = concurrent.futures.Future()
+            _inflight_checks[key] = future
+        else:
+            _inflight_waiters[key] = _inflight_waiters.get(key, 0) + 1
+
+    if not owner:
+        print(f"[MAIN-CHECKER] ⏳ @{username} уже проверяется - ждём общий результат (user {user_id})")
+        shared, screenshot_bytes = await asyncio.shield(asyncio.wrap_future(future))
+        if shared is not None and _is_shareable(shared):
+            return await _apply_shared_result(shared, screenshot_bytes, username, session, user_id, screenshot_path)
+        # Общая проверка упала или ошибка уровня пользователя - проверяем сами
+        return await _check_account_pipeline(username, session, user_id, screenshot_path, api_result)
+
+    result = None
+    try:
+        result = await _check_account_pipeline(username, session, user_id, screenshot_path, api_result)
+        return result
+    finally:
+        with _inflight_lock:
+            if _inflight_checks.get(key) is future:
+                del _inflight_checks[key]
+            waiters = _inflight_waiters.pop(key, 0)
+        # Новые вызовы сюда уже не присоединятся; файл читаем, пока он точно на месте
+        screenshot_bytes = _read_shared_screenshot(result, username) if waiters else None
+        future.set_result((result, screenshot_bytes))
+
+
+async def _check_account_pipeline(
+    username: str,
+    session,
+    user_id: int,
+    screenshot_path: Optional[str] = None,
+    api_result: Optional[Dict] = None
+) -> Tuple[bool, str, Optional[str]]:
+    """Tiered check (services/check_pipeline) for one user (no coalescing)."""
     print(f"\n[MAIN-CHECKER] 🔍 Проверка @{username}")
     
     # Получаем режим проверки
     try:
         from .system_settings import get_global_verify_mode
-        verify_mode = get_global_verify_mode(session)
-        print(f"[MAIN-CHECKER] 🔧 Режим проверки: {verify_mode}")
     except ImportError:
         from services.system_settings import get_global_verify_mode
-        verify_mode = get_global_verify_mode(session)
-        print(f"[MAIN-CHECKER] 🔧 Режим проверки: {verify_mode}")
+    verify_mode = await run_db(session, get_global_verify_mode)
+    print(f"[MAIN-CHECKER] 🔧 Режим проверки: {verify_mode}")
     
     # Если режим api-v2, используем новый метод
     if verify_mode == "api-v2":
@@ -147,103 +236,15 @@ async def check_account_main(
         else:
             return False, f"API v2: ошибка - {result.get('error', 'unknown')}", None
     
-    # ШАГ 1: API проверка (быстрая)
-    print(f"[MAIN-CHECKER] 📡 Шаг 1: API проверка...")
-    api_result = await check_account_exists_via_api(session, user_id, username)
-    api_success = api_result.get("exists", False)
-    api_error = api_result.get("error")
-    api_message = "найден" if api_success else "не найден"
-    
-    # Check for API key exhaustion
-    if api_error == "all_api_keys_exhausted":
-        print(f"[MAIN-CHECKER] ❌ Все API ключи исчерпаны для пользователя {user_id}")
-        return False, "Все API ключи исчерпаны.", None
-    elif api_error == "no_api_keys_available":
-        print(f"[MAIN-CHECKER] ❌ Нет доступных API ключей для пользователя {user_id}")
-        return False, "Нет доступных API ключей.", None
-    
-    if not api_success:
-        print(f"[MAIN-CHECKER] ❌ API проверка не прошла: {api_message}")
-        return False, f"API: {api_message}", None
-    
-    print(f"[MAIN-CHECKER] ✅ API проверка прошла успешно")
-    
-    # ШАГ 2: Проверяем наличие прокси
-    proxy_url = get_best_proxy(session, user_id)
-    
-    if not proxy_url:
-        print(f"[MAIN-CHECKER] ⚠️ Прокси не найден, возвращаем только API результат")
-        return True, f"API: {api_message}", None
-    
-    print(f"[MAIN-CHECKER] 🌐 Найден прокси: {proxy_url[:50]}...")
-    
-    # ШАГ 3: Proxy + полный скриншот с темной темой в desktop формате
-    print(f"[MAIN-CHECKER] 📸 Шаг 2: Proxy проверка + полный скриншот (темная тема, desktop)...")
-    
-    # Генерируем путь для скриншота если не указан
-    if not screenshot_path:
-        screenshots_dir = "screenshots"
-        os.makedirs(screenshots_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        screenshot_path = os.path.join(screenshots_dir, f"{username}_{timestamp}.png")
-    
-    # Импортируем функцию проверки с полным скриншотом
-    try:
-        from .ig_screenshot import check_account_with_header_screenshot
-    except ImportError:
-        from services.ig_screenshot import check_account_with_header_screenshot
-    
-    # Проверяем через чекер с обычным скриншотом в desktop формате
-    proxy_result = await check_account_with_header_screenshot(
-        username=username,
-        proxy_url=proxy_url,
-        screenshot_path=screenshot_path,
-        headless=True,
-        timeout_ms=60000,  # Увеличиваем timeout до 60 секунд
-        dark_theme=True,  # Темная тема (черный фон)
-        mobile_emulation=False,  # Desktop формат (не мобильная эмуляция)
-        crop_ratio=0  # БЕЗ обрезки - полный скриншот страницы
+    # Уровни: cache → HTTP probe → RapidAPI → Proxy + скриншот или шапка профиля (только для подтверждённых)
+    if api_result is not None:
+        print(f"[MAIN-CHECKER] 📡 Используем результат batch API проверки")
+    ctx = await check_account_tiered(
+        username, session, user_id, screenshot_path, api_result, tiers=tiers_for_mode(verify_mode)
     )
-    
-    # Адаптируем результат к старому формату
-    proxy_success = proxy_result.get("exists", False)
-    proxy_message = proxy_result.get("checked_via", "proxy_screenshot")
-    screenshot = screenshot_path if os.path.exists(screenshot_path) else None
-    profile_data = proxy_result  # Сохраняем полный результат
-    
-    # Обновляем статистику прокси
-    try:
-        from .proxy_service import update_proxy_stats
-        
-        # Находим прокси для обновления статистики
-        proxies = session.query(Proxy).filter(
-            Proxy.user_id == user_id,
-            Proxy.is_active == True
-        ).all()
-        
-        for proxy in proxies:
-            if build_proxy_url_from_object(proxy) == proxy_url:
-                update_proxy_stats(session, proxy, proxy_success)
-                print(f"[MAIN-CHECKER] 📊 Статистика прокси обновлена")
-                break
-                
-    except Exception as e:
-        print(f"[MAIN-CHECKER] ⚠️ Не удалось обновить статистику прокси: {e}")
-    
-    # Результат: API успешно + Proxy результат
-    if proxy_success:
-        print(f"[MAIN-CHECKER] ✅ API + Proxy: успешно")
-        return True, f"API: {api_message} | Proxy: {proxy_message}", screenshot
-    else:
-        print(f"[MAIN-CHECKER] ⚠️ API успешно, но Proxy не прошел: {proxy_message}")
-        # Если API показал, что аккаунт существует, но Proxy не сработал,
-        # все равно возвращаем скриншот (если он был создан)
-        if screenshot and os.path.exists(screenshot):
-            print(f"[MAIN-CHECKER] 📸 Возвращаем скриншот несмотря на проблемы с Proxy")
-            return True, f"API: {api_message} | Proxy: {proxy_message}", screenshot
-        else:
-            print(f"[MAIN-CHECKER] ❌ Скриншот не создан из-за проблем с Proxy")
-            return True, f"API: {api_message} | Proxy: {proxy_message}", None
+    success, message, screenshot = tiered_result(ctx)
+    print(f"[MAIN-CHECKER] {'✅' if success else '❌'} @{username}: {message} (решено на уровне: {ctx.decided_by})")
+    return success, message, screenshot
 
 
 async def check_account_on_add(
@@ -332,12 +333,13 @@ async def check_account_with_header_dark_theme(
     print(f"\n[MAIN-CHECKER] 🌙 Проверка @{username} с header-скриншотом (темная тема)")
     
     # Проверяем наличие прокси
-    proxy_url = get_best_proxy(session, user_id)
+    proxy = get_best_proxy(session, user_id)
     
-    if not proxy_url:
+    if not proxy:
         print(f"[MAIN-CHECKER] ❌ Прокси не найден")
         return False, "Прокси не найден", None
     
+    proxy_id, proxy_url = proxy
     print(f"[MAIN-CHECKER] 🌐 Найден прокси: {proxy_url[:50]}...")
     
     # Генерируем путь для скриншота если не указан
@@ -362,25 +364,13 @@ async def check_account_with_header_dark_theme(
         timeout_ms=30000,
         dark_theme=True,  # Темная тема (черный фон)
         mobile_emulation=True,  # Мобильная эмуляция (iPhone 12)
-        crop_ratio=0  # БЕЗ обрезки - скриншот header элемента
+        crop_ratio=0,  # БЕЗ обрезки - скриншот header элемента
+        browser_pool=get_browser_pool()
     )
     
     # Обновляем статистику прокси
     try:
-        from .proxy_service import update_proxy_stats
-        
-        # Находим прокси для обновления статистики
-        proxies = session.query(Proxy).filter(
-            Proxy.user_id == user_id,
-            Proxy.is_active == True
-        ).all()
-        
-        for proxy in proxies:
-            if build_proxy_url_from_object(proxy) == proxy_url:
-                update_proxy_stats(session, proxy, result.get("exists", False))
-                print(f"[MAIN-CHECKER] 📊 Статистика прокси обновлена")
-                break
-                
+        _update_proxy_stats(session, user_id, proxy_id, result.get("exists", False))
     except Exception as e:
         print(f"[MAIN-CHECKER] ⚠️ Не удалось обновить статистику прокси: {e}")
     
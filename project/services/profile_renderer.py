@@ -0,0 +1,573 @@
+"""
+Profile header renderer (proof image for a found account without a browser).
+
+Раньше генератор шапки профиля жил в тестовом скрипте
+test_api_with_profile_gen.py: на каждый вызов заново загружал шрифты,
+рисовал галочку, холст и плейсхолдер аватара, рисовал прямо в event loop
+(CPU блокировал остальные проверки), а аватар качал новым ClientSession.
+Подтверждение найденного аккаунта в остальных режимах - скриншот Chromium
+(десятки секунд).
+
+Теперь:
+    - шрифты, галочка, маска аватара, холст и плейсхолдер создаются один раз
+      на процесс и переиспользуются
+    - рендер идёт в пуле процессов (CHECK_IMAGE_WORKERS процессов,
+      PROFILE_RENDER_PROCESS_POOL=false - в потоке), event loop не блокируется
+    - аватар качается через общую keep-alive сессию (services/http_sessions),
+      в процесс рендера передаются только байты
+    - режимы проверки, в которых найденный аккаунт подтверждается отрисованной
+      шапкой вместо скриншота, задаёт PROFILE_RENDER_VERIFY_MODES
+      (uses_profile_render, уровень render в services/check_pipeline);
+      api-v2 рендерит всегда
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+try:
+    from ..config import get_settings
+    from .http_sessions import get_profile_pic_session
+except ImportError:
+    from config import get_settings
+    from services.http_sessions import get_profile_pic_session
+
+
+# ============================================================================
+# 📐 ПАРАМЕТРЫ ДИЗАЙНА - ЗДЕСЬ МЕНЯЙТЕ РАСПОЛОЖЕНИЕ И РАЗМЕРЫ
+# Полностью синхронизировано с design_test.py
+# ============================================================================
+DESIGN = {
+    # === РАЗМЕР ХОЛСТА ===
+    "canvas_width": 1000,        # Ширина изображения
+    "canvas_height": 450,       # Высота изображения компактная
+    "background": "#000000",    # Цвет фона (черный)
+
+    # === ОТСТУПЫ ===
+    "pad_left": 60,             # Отступ слева
+    "pad_top": 145,              # Отступ сверху
+    "pad_right": 16,            # Отступ справа
+
+    # === АВАТАР ===
+    "avatar_size": 180,          # Размер аватара ~90px
+    "avatar_border": 0,         # Тонкая белая обводка
+    "avatar_x": 100,             # X позиция аватара
+    "avatar_y": 130,             # Y позиция аватара (вертикально центрирован)
+
+    # === USERNAME (имя пользователя) ===
+    "username_x_offset": 40,    # Отступ username от аватара
+    "username_y_offset": 0,     # Вертикально центрирован с аватаром
+    "username_font_size": 35,   # Размер шрифта username жирный 22-28px
+
+    # === ГАЛОЧКА ВЕРИФИКАЦИИ ===
+    "verified_size": 30,         # Размер галочки (18x18px как в Instagram)
+    "verified_offset_x": 8,      # Отступ от username
+    "verified_offset_y": 4,      # Смещение по Y
+    "verified_inner_padding": 3, # Отступ внутренней галочки от края
+    "verified_line_width": 2,    # Толщина линий галочки
+    "verified_spacing_after": 12, # Отступ после галочки для следующих элементов
+
+    # === ЗАМОК (для приватных) ===
+    "lock_offset_x": 22,        # Отступ замка от галочки
+
+    # === КНОПКА FOLLOW ===
+    "button_width": 76,         # Ширина кнопки Follow 88-100px
+    "button_height": 34,        # Высота кнопки 34px
+    "button_radius": 8,         # Радиус скругления углов
+    "button_offset_right": 15,  # Отступ кнопки от правого края
+    "button_offset_y": 5,       # Вертикально центрирована с username
+    "button_font_size": 18,     # Размер текста на кнопке
+
+    # === ТРИ ТОЧКИ ===
+    "dots_width": 34,           # Ширина кнопки с точками
+    "dots_offset_x": 8,         # Отступ от кнопки Follow
+    "dots_radius": 2,           # Радиус каждой точки
+    "dots_spacing": 12,         # Расстояние между точками
+    "dots_center_offset_x": 20, # Смещение центра точек
+
+    # === СТАТИСТИКА (posts/followers/following) ===
+    "stats_x": 320,               # X позиция статистики (0 = под username, или укажите точное значение)
+    "stats_y": 0,               # Y позиция статистики (0 = относительно аватара, или укажите точное значение)
+    "stats_y_offset": 60,       # Y позиция статистики относительно аватара (если stats_y = 0)
+    "stats_spacing": 20,        # Равные отступы между элементами
+    "stats_number_size": 20,    # Размер шрифта цифр ЖИРНЫЙ
+    "stats_label_size": 20,     # Размер шрифта подписей
+    "stats_line_gap": 5,        # Расстояние между цифрой и подписью
+
+    # === ИМЯ И БИОГРАФИЯ ===
+    "name_x": 320,                # X позиция имени (0 = под username, или точное значение)
+    "name_y": 0,                # Y позиция имени (0 = относительно статистики, или точное значение)
+    "name_y_offset": 40,        # Y отступ имени от статистики (если name_y = 0)
+    "name_font_size": 20,       # Размер шрифта имени
+    "bio_x": 320,                 # X позиция биографии (0 = под username, или точное значение)
+    "bio_y": 0,                 # Y позиция биографии (0 = относительно имени, или точное значение)
+    "bio_y_offset": 30,         # Y отступ биографии от имени (если bio_y = 0)
+    "bio_line_gap": 18,         # Расстояние между строками биографии
+    "bio_font_size": 20,        # Размер шрифта биографии
+    "bio_max_lines": 2,         # Максимум 2 строки биографии
+
+    # === ЦВЕТА ===
+    "color_text_primary": "#ffffff",    # Основной текст (белый)
+    "color_text_secondary": "#a8a8a8",  # Второстепенный текст (серый)
+    "color_button": "#0095f6",          # Кнопка Follow (синий)
+    "color_button_dark": "#262626",     # Серая кнопка (Requested/точки)
+    "color_verified": "#0095f6",        # Цвет галочки (синий)
+
+    # === ЖИРНОСТЬ ШРИФТОВ ===
+    "username_bold": False,             # Username жирный (True/False)
+    "name_bold": False,                 # Имя жирное (True/False)
+    "stat_num_bold": False,             # Числа статистики жирные (True/False)
+    "stat_label_bold": False,           # Подписи статистики жирные (True/False)
+    "bio_bold": False,                  # Биография жирная (True/False)
+    "button_bold": True,               # Кнопка жирная (True/False)
+
+    # === ВНУТРЕННИЕ ОТСТУПЫ КНОПКИ ===
+    "button_padding_top": 4,            # Отступ сверху внутри кнопки
+    "button_padding_bottom": 18,         # Отступ снизу внутри кнопки
+    "button_padding_left": 16,          # Отступ слева внутри кнопки
+    "button_padding_right": 16,         # Отступ справа внутри кнопки
+}
+
+
+# ============================================================================
+# 🔢 ФОРМАТИРОВАНИЕ ЧИСЕЛ
+# ============================================================================
+
+def format_number_with_spaces(n: int) -> str:
+    """Форматирует число с пробелами: 3959 -> '3 959'"""
+    try:
+        return f"{int(n):,}".replace(",", " ")
+    except Exception:
+        return str(n)
+
+
+def format_count_posts(count: int) -> str:
+    """Посты — полное число с пробелами"""
+    return format_number_with_spaces(count)
+
+
+def format_count_followers(count: int) -> str:
+    """Подписчики: до 9999 с пробелами, потом K/M/B"""
+    try:
+        n = int(count)
+        if n <= 9_999:
+            return format_number_with_spaces(n)
+        if n >= 1_000_000_000:
+            return f"{n // 1_000_000_000}B"
+        if n >= 1_000_000:
+            return f"{n // 1_000_000}M"
+        if n >= 1_000:
+            return f"{n // 1_000}K"
+        return str(n)
+    except Exception:
+        return str(count)
+
+
+def format_count_following(count: int) -> str:
+    """Подписки: K/M/B"""
+    return format_count_followers(count)
+
+
+def profile_fields(user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Renderer fields from an Instagram user dict.
+
+    Accepts web_profile_info style (edge_followed_by.count, ...), mobile API
+    style (follower_count, ...) and already normalized dicts (followers, ...).
+    """
+    if not isinstance(user, dict):
+        return {}
+
+    def count(*keys) -> int:
+        for key in keys:
+            value = user.get(key)
+            if isinstance(value, dict):
+                value = value.get("count")
+            if value is not None:
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    continue
+        return 0
+
+    return {
+        "full_name": user.get("full_name") or "",
+        "posts": count("posts", "media_count", "edge_owner_to_timeline_media"),
+        "followers": count("followers", "follower_count", "edge_followed_by"),
+        "following": count("following", "following_count", "edge_follow"),
+        "is_private": bool(user.get("is_private", False)),
+        "is_verified": bool(user.get("is_verified", False)),
+        "profile_pic_url": user.get("profile_pic_url_hd") or user.get("profile_pic_url") or "",
+    }
+
+
+# ============================================================================
+# 🧱 РЕСУРСЫ (один раз на процесс)
+# ============================================================================
+
+@lru_cache(maxsize=8)
+def load_verified_badge_image(size: int) -> Optional[Image.Image]:
+    """Галочка верификации (создаётся один раз на размер, не изменять - вставлять как есть)"""
+    try:
+        img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+
+        # Рисуем синий круг
+        draw.ellipse([0, 0, size, size], fill=DESIGN["color_verified"])
+
+        # Белая галочка из линий
+        check_size = size * 0.6
+        check_x = (size - check_size) // 2
+        check_y = (size - check_size) // 2
+        line_width = max(2, size // 8)
+        check_points = [
+            (check_x + check_size * 0.2, check_y + check_size * 0.5),  # Начало
+            (check_x + check_size * 0.45, check_y + check_size * 0.75), # Середина
+            (check_x + check_size * 0.8, check_y + check_size * 0.25)   # Конец
+        ]
+        for i in range(len(check_points) - 1):
+            draw.line([check_points[i], check_points[i + 1]], fill="#ffffff", width=line_width)
+
+        return img
+    except Exception as e:
+        print(f"[PROFILE-RENDER] ⚠️ Ошибка создания галочки: {e}")
+        return None
+
+
+@lru_cache(maxsize=1)
+def load_fonts() -> Dict[str, Any]:
+    """Шрифты с учетом настроек жирности из DESIGN (загружаются один раз)"""
+    tries = [
+        ("arialbd.ttf", "arial.ttf"),
+        ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+         "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    ]
+    sizes = {
+        "username": ("username_bold", "username_font_size"),
+        "name": ("name_bold", "name_font_size"),
+        "stat_num": ("stat_num_bold", "stats_number_size"),
+        "stat_label": ("stat_label_bold", "stats_label_size"),
+        "bio": ("bio_bold", "bio_font_size"),
+        "button": ("button_bold", "button_font_size"),
+    }
+
+    for bold_path, reg_path in tries:
+        try:
+            return {
+                name: ImageFont.truetype(bold_path if DESIGN[bold] else reg_path, DESIGN[size])
+                for name, (bold, size) in sizes.items()
+            }
+        except OSError:
+            continue
+
+    # Fallback
+    default = ImageFont.load_default()
+    return {name: default for name in sizes}
+
+
+@lru_cache(maxsize=4)
+def _avatar_mask(size: int) -> Image.Image:
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    return mask
+
+
+@lru_cache(maxsize=1)
+def _canvas_template() -> Image.Image:
+    """Пустой холст (для рендера берётся copy())."""
+    return Image.new("RGB", (DESIGN["canvas_width"], DESIGN["canvas_height"]), color=DESIGN["background"])
+
+
+@lru_cache(maxsize=1)
+def _placeholder_avatar() -> Image.Image:
+    size = DESIGN["avatar_size"]
+    tmp = Image.new("RGBA", (size, size), "#262626")
+    tmp.putalpha(_avatar_mask(size))
+    return make_circular_avatar(tmp, size, DESIGN["avatar_border"])
+
+
+def make_circular_avatar(image: Image.Image, size: int, border_px: int = 4) -> Image.Image:
+    """Создает круглый аватар с обводкой"""
+    avatar = ImageOps.fit(image.convert("RGBA"), (size, size), centering=(0.5, 0.5))
+    avatar.putalpha(_avatar_mask(size))
+
+    # Обводка
+    total = size + border_px * 2
+    bg = Image.new("RGBA", (total, total), (0, 0, 0, 0))
+    ImageDraw.Draw(bg).ellipse((0, 0, total, total), fill="#ffffff")
+    bg.paste(avatar, (border_px, border_px), avatar)
+    return bg
+
+
+def _warm_up() -> None:
+    """Load fonts and templates once (pool process initializer)."""
+    load_fonts()
+    load_verified_badge_image(DESIGN["verified_size"])
+    _canvas_template()
+    _placeholder_avatar()
+
+
+# ============================================================================
+# 🎨 РЕНДЕР (CPU, выполняется в пуле процессов)
+# ============================================================================
+
+def render_profile_image(profile: Dict[str, Any], output_path: str, avatar_bytes: Optional[bytes] = None) -> str:
+    """
+    Draw the profile header and save it as PNG.
+
+    Args:
+        profile: username, full_name, posts, followers, following, is_verified, biography
+        output_path: Where to save the image
+        avatar_bytes: Downloaded profile picture (None = placeholder)
+
+    Returns:
+        output_path
+    """
+    username = profile.get("username", "")
+    canvas = _canvas_template().copy()
+    draw = ImageDraw.Draw(canvas)
+    fonts = load_fonts()
+
+    avatar_x = DESIGN["avatar_x"]
+    avatar_y = DESIGN["avatar_y"]
+    avatar_size = DESIGN["avatar_size"]
+
+    # === 1. АВАТАР ===
+    avatar = None
+    if avatar_bytes:
+        try:
+            avatar = make_circular_avatar(Image.open(BytesIO(avatar_bytes)), avatar_size, DESIGN["avatar_border"])
+        except Exception:
+            avatar = None
+    if avatar is None:
+        avatar = _placeholder_avatar()
+    canvas.paste(avatar, (avatar_x, avatar_y), avatar)
+
+    # === 2. USERNAME ===
+    text_x = avatar_x + avatar_size + DESIGN["username_x_offset"]
+    username_y = avatar_y + DESIGN["username_y_offset"]
+    draw.text((text_x, username_y), username, fill=DESIGN["color_text_primary"], font=fonts["username"])
+    bbox = draw.textbbox((text_x, username_y), username, font=fonts["username"])
+    username_width = bbox[2] - bbox[0]
+
+    # === 3. ГАЛОЧКА ВЕРИФИКАЦИИ (сразу после username) ===
+    if profile.get("is_verified"):
+        check_x = text_x + username_width + DESIGN["verified_offset_x"]
+        check_y = username_y + DESIGN["verified_offset_y"]
+        check_size = DESIGN["verified_size"]
+        verified_image = load_verified_badge_image(check_size)
+        if verified_image:
+            canvas.paste(verified_image, (check_x, check_y), verified_image)
+        badge_x = check_x + check_size + DESIGN["verified_spacing_after"]
+    else:
+        badge_x = text_x + username_width + DESIGN["verified_offset_x"]
+
+    # === 4. ЗАМОК — отключен по требованию ===
+
+    # === 5. КНОПКА FOLLOW (после галочки, всегда синяя) ===
+    btn_w = DESIGN["button_width"]
+    btn_h = DESIGN["button_height"]
+    btn_x = badge_x + DESIGN["button_offset_right"]
+    btn_y = username_y + DESIGN["button_offset_y"]
+    draw.rounded_rectangle([btn_x, btn_y, btn_x + btn_w, btn_y + btn_h],
+                           radius=DESIGN["button_radius"], fill=DESIGN["color_button"])
+
+    button_text = "Follow"
+    bt_bbox = draw.textbbox((0, 0), button_text, font=fonts["button"])
+    bt_w = bt_bbox[2] - bt_bbox[0]
+    bt_h = bt_bbox[3] - bt_bbox[1]
+    available_w = btn_w - DESIGN["button_padding_left"] - DESIGN["button_padding_right"]
+    available_h = btn_h - DESIGN["button_padding_top"] - DESIGN["button_padding_bottom"]
+    if bt_w <= available_w and bt_h <= available_h:
+        draw.text((btn_x + DESIGN["button_padding_left"], btn_y + DESIGN["button_padding_top"]),
+                  button_text, fill="#ffffff", font=fonts["button"])
+    else:
+        # Если текст не помещается, центрируем
+        draw.text((btn_x + (btn_w - bt_w) / 2, btn_y + (btn_h - bt_h) / 2 - 2),
+                  button_text, fill="#ffffff", font=fonts["button"])
+
+    # === 6. ТРИ ТОЧКИ (без фона) ===
+    dot_radius = DESIGN["dots_radius"]
+    dot_spacing = DESIGN["dots_spacing"]
+    center_x = btn_x + btn_w + DESIGN["dots_offset_x"] + DESIGN["dots_center_offset_x"]
+    center_y = btn_y + btn_h // 2
+    for i in range(3):
+        dot_x = center_x - dot_spacing + (i * dot_spacing)
+        draw.ellipse([dot_x - dot_radius, center_y - dot_radius,
+                      dot_x + dot_radius, center_y + dot_radius],
+                     fill=DESIGN["color_text_primary"])
+
+    # === 7. СТАТИСТИКА (в одну строку) ===
+    stats_x = DESIGN["stats_x"] or text_x
+    stats_y = DESIGN["stats_y"] or avatar_y + DESIGN["stats_y_offset"]
+    stats_items = [
+        (profile.get("posts", 0), "posts", format_count_posts),
+        (profile.get("followers", 0), "followers", format_count_followers),
+        (profile.get("following", 0), "following", format_count_following),
+    ]
+    for count, label, formatter in stats_items:
+        count_str = formatter(count)
+        draw.text((stats_x, stats_y), count_str, fill=DESIGN["color_text_primary"], font=fonts["stat_num"])
+        count_bbox = draw.textbbox((0, 0), count_str, font=fonts["stat_num"])
+        label_x = stats_x + (count_bbox[2] - count_bbox[0]) + 4
+        draw.text((label_x, stats_y + 1), label, fill=DESIGN["color_text_secondary"], font=fonts["stat_label"])
+        label_bbox = draw.textbbox((0, 0), label, font=fonts["stat_label"])
+        stats_x = label_x + (label_bbox[2] - label_bbox[0]) + DESIGN["stats_spacing"]
+
+    # === 8. ИМЯ ===
+    full_name = profile.get("full_name") or ""
+    name_y = DESIGN["name_y"] or stats_y + DESIGN["name_y_offset"]
+    if full_name:
+        draw.text((DESIGN["name_x"] or text_x, name_y), full_name,
+                  fill=DESIGN["color_text_primary"], font=fonts["name"])
+
+    # === 9. БИОГРАФИЯ ===
+    biography = profile.get("biography") or ""
+    if biography:
+        if DESIGN["bio_y"] == 0:
+            bio_y = name_y + DESIGN["bio_y_offset"] if full_name else stats_y + DESIGN["name_y_offset"]
+        else:
+            bio_y = DESIGN["bio_y"]
+        for line in biography.split("\n")[:DESIGN["bio_max_lines"]]:
+            draw.text((DESIGN["bio_x"] or text_x, bio_y), line,
+                      fill=DESIGN["color_text_secondary"], font=fonts["bio"])
+            bio_y += DESIGN["bio_line_gap"]
+
+    # compress_level=1: та же картинка без optimize (optimize перебирает фильтры и в разы медленнее)
+    canvas.save(output_path, format="PNG", compress_level=1)
+    return output_path
+
+
+# ============================================================================
+# ⚙️ ПУЛ ПРОЦЕССОВ
+# ============================================================================
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Process-wide render pool (None = PROFILE_RENDER_PROCESS_POOL=false, render in a thread)."""
+    global _pool
+    settings = get_settings()
+    if not settings.profile_render_process_pool:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            workers = max(1, settings.check_image_workers)
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+            print(f"[PROFILE-RENDER] 🚀 Пул рендера запущен: {workers} процессов")
+        return _pool
+
+
+def shutdown_render_pool() -> None:
+    """Stop the render pool (graceful shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print(f"[PROFILE-RENDER] 🛑 Пул рендера остановлен")
+
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _render(profile: Dict[str, Any], output_path: str, avatar_bytes: Optional[bytes]) -> str:
+    pool = get_render_pool()
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, render_profile_image, profile, output_path, avatar_bytes
+            )
+        except BrokenProcessPool:
+            # Процесс рендера упал - пул пересоздастся при следующем вызове, этот рендер делаем в потоке
+            print(f"[PROFILE-RENDER] ⚠️ Пул рендера сломан, рендер в потоке")
+            _discard_broken_pool(pool)
+    return await asyncio.to_thread(render_profile_image, profile, output_path, avatar_bytes)
+
+
+# ============================================================================
+# 🎨 ГЛАВНАЯ ФУНКЦИЯ ГЕНЕРАЦИИ
+# ============================================================================
+
+async def download_profile_image(url: str) -> Optional[bytes]:
+    """Загружает фото профиля (байты, декодирование - в процессе рендера)"""
+    if not url or "YOUR_IMAGE" in url:
+        return None
+    try:
+        async with get_profile_pic_session().get(url) as resp:
+            if resp.status == 200:
+                return await resp.read()
+    except Exception:
+        pass
+    return None
+
+
+async def generate_instagram_profile_image_improved(
+    username: str,
+    full_name: str = "",
+    posts: int = 0,
+    followers: int = 0,
+    following: int = 0,
+    is_private: bool = False,
+    is_verified: bool = False,
+    biography: str = "",
+    profile_pic_url: str = "",
+    output_path: Optional[str] = None
+) -> dict:
+    """
+    Генерирует шапку профиля Instagram с использованием всех параметров из DESIGN
+
+    Returns:
+        {"success": True, "image_path": str} or {"success": False, "error": str}
+    """
+    try:
+        started = time.monotonic()
+        if not output_path:
+            out_dir = "generated_profiles"
+            os.makedirs(out_dir, exist_ok=True)
+            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_path = os.path.join(out_dir, f"{username}_profile_{ts}.png")
+        else:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+        avatar_bytes = await download_profile_image(profile_pic_url)
+        profile = {
+            "username": username,
+            "full_name": full_name,
+            "posts": posts,
+            "followers": followers,
+            "following": following,
+            "is_private": is_private,
+            "is_verified": is_verified,
+            "biography": biography,
+        }
+        await _render(profile, output_path, avatar_bytes)
+
+        print(f"[PROFILE-RENDER] 🎨 @{username}: {output_path} ({(time.monotonic() - started) * 1000:.0f} ms)")
+        return {"success": True, "image_path": output_path}
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": str(e)}
+
+
+def uses_profile_render(verify_mode: Optional[str]) -> bool:
+    """Found accounts in this verify mode are confirmed by a rendered header, not a browser screenshot."""
+    return verify_mode == "api-v2" or verify_mode in get_settings().profile_render_verify_modes
@@ -0,0 +1,136 @@
+"""
+Cache of decrypted proxy credentials.
+
+Пароль прокси хранится зашифрованным (Fernet), и каждая сборка URL
+создавала OptionalFernet и расшифровывала пароль заново - на каждую
+проверку и в циклах по всем прокси.
+
+Кэш держит в памяти процесса расшифрованный пароль, готовый URL и
+конфиг прокси для Playwright. Ключ - (proxy.id, шифротекст пароля):
+смена пароля даёт промах, изменение и удаление прокси через ORM
+сбрасывают запись сразу.
+
+Пароль, который не расшифровывается текущим ключом (сохранён открытым
+текстом, например через ProxyManager.batch_add_proxies), используется как есть.
+"""
+
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import event, inspect
+
+try:
+    from ..models import Proxy
+    from ..config import get_settings
+    from ..utils.encryptor import OptionalFernet
+except ImportError:
+    from models import Proxy
+    from config import get_settings
+    from utils.encryptor import OptionalFernet
+
+
+class ProxyCredentials:
+    """Decrypted credentials and prebuilt proxy settings of one proxy."""
+
+    __slots__ = ("ciphertext", "scheme", "host", "username", "password", "url", "playwright")
+
+    def __init__(self, proxy: Proxy, password: Optional[str]):
+        self.ciphertext = proxy.password
+        self.scheme = proxy.scheme
+        self.host = proxy.host
+        self.username = proxy.username if password else None
+        self.password = password
+        self.playwright = {"server": f"{proxy.scheme}://{proxy.host}"}
+        if self.username:
+            self.url = f"{proxy.scheme}://{self.username}:{password}@{proxy.host}"
+            self.playwright["username"] = self.username
+            self.playwright["password"] = password
+        else:
+            self.url = f"{proxy.scheme}://{proxy.host}"
+
+    def matches(self, proxy: Proxy) -> bool:
+        return (
+            self.ciphertext == proxy.password
+            and self.scheme == proxy.scheme
+            and self.host == proxy.host
+            and (self.username is None or self.username == proxy.username)
+        )
+
+
+_cache: Dict[int, ProxyCredentials] = {}
+_cache_lock = threading.Lock()
+_encryptor: Optional[OptionalFernet] = None
+
+
+def _decrypt(ciphertext: str) -> str:
+    global _encryptor
+    if _encryptor is None:
+        _encryptor = OptionalFernet(get_settings().encryption_key)
+    try:
+        return _encryptor.decrypt(ciphertext)
+    except Exception:
+        return ciphertext
+
+
+def get_proxy_credentials(proxy: Proxy) -> ProxyCredentials:
+    """
+    Decrypted credentials of the proxy (Fernet runs once per proxy and password).
+
+    Args:
+        proxy: Proxy object
+
+    Returns:
+        ProxyCredentials with password, url and playwright config
+    """
+    with _cache_lock:
+        cached = _cache.get(proxy.id) if proxy.id is not None else None
+    if cached is not None and cached.matches(proxy):
+        return cached
+
+    if not (proxy.username and proxy.password):
+        credentials = ProxyCredentials(proxy, None)
+    elif cached is not None and cached.ciphertext == proxy.password and cached.password:
+        # Поменялся host / scheme / username - пароль расшифровывать не нужно
+        credentials = ProxyCredentials(proxy, cached.password)
+    else:
+        credentials = ProxyCredentials(proxy, _decrypt(proxy.password))
+
+    if proxy.id is not None:
+        with _cache_lock:
+            _cache[proxy.id] = credentials
+    return credentials
+
+
+def get_proxy_url(proxy: Proxy) -> str:
+    """Proxy URL with decrypted credentials: scheme://[user:pass@]host:port"""
+    return get_proxy_credentials(proxy).url
+
+
+def get_playwright_proxy_config(proxy: Proxy) -> Dict[str, str]:
+    """Proxy config for Playwright: {"server", ["username", "password"]} (a copy)."""
+    return dict(get_proxy_credentials(proxy).playwright)
+
+
+def invalidate_proxy_credentials(proxy_id: Optional[int] = None) -> None:
+    """Drop cached credentials of one proxy (or all)."""
+    with _cache_lock:
+        if proxy_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(proxy_id, None)
+
+
+_CREDENTIAL_FIELDS = ("scheme", "host", "username", "password")
+
+
+@event.listens_for(Proxy, "after_update")
+def _forget_edited_proxy(mapper, connection, target: Proxy) -> None:
+    # Обновление статистики (used_count, fail_streak ...) кэш не трогает
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _CREDENTIAL_FIELDS):
+        invalidate_proxy_credentials(target.id)
+
+
+@event.listens_for(Proxy, "after_delete")
+def _forget_deleted_proxy(mapper, connection, target: Proxy) -> None:
+    invalidate_proxy_credentials(target.id)
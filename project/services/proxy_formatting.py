@@ -5,12 +5,10 @@ from typing import Optional
 
 try:
     from ..models import Proxy
-    from ..utils.encryptor import OptionalFernet
-    from ..config import get_settings
+    from .proxy_credentials import get_proxy_credentials
 except ImportError:
     from models import Proxy
-    from utils.encryptor import OptionalFernet
-    from config import get_settings
+    from services.proxy_credentials import get_proxy_credentials
 
 
 def format_proxy_card(proxy: Proxy, show_password: bool = False) -> str:
@@ -31,13 +29,7 @@ def format_proxy_card(proxy: Proxy, show_password: bool = False) -> str:
     # Build proxy URL
     if proxy.username:
         if show_password and proxy.password:
-            try:
-                settings = get_settings()
-                encryptor = OptionalFernet(settings.encryption_key)
-                password = encryptor.decrypt(proxy.password)
-                creds = f"{proxy.username}:{password}@"
-            except:
-                creds = f"{proxy.username}:***@"
+            creds = f"{proxy.username}:{get_proxy_credentials(proxy).password}@"
         else:
             creds = f"{proxy.username}:***@"
     else:
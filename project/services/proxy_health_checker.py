@@ -17,10 +17,12 @@ try:
     from ..models import Proxy
     from ..database import get_session_factory
     from .proxy_manager import ProxyManager
+    from .proxy_sweep import sweep_proxies, apply_health_results, apply_reactivation
 except ImportError:
     from models import Proxy
     from database import get_session_factory
     from services.proxy_manager import ProxyManager
+    from services.proxy_sweep import sweep_proxies, apply_health_results, apply_reactivation
 
 
 class ProxyHealthChecker:
@@ -135,6 +137,7 @@ class ProxyHealthChecker:
             'results': []
         }
         
+        to_check = []
         for proxy in proxies:
             # Skip inactive proxies
             if not proxy.is_active:
@@ -147,8 +150,12 @@ class ProxyHealthChecker:
                 print(f"[PROXY-HEALTH] ⏸️ {proxy.host} in cooldown until {proxy.cooldown_until}")
                 continue
             
-            # Check proxy
-            result = await self.check_single_proxy(proxy, session)
+            to_check.append(proxy)
+        
+        # Check proxies concurrently (bounded), results are saved in batches
+        results = await sweep_proxies(session, to_check, apply=self._apply_results)
+        
+        for result in results:
             summary['results'].append(result)
             summary['checked'] += 1
             
@@ -158,11 +165,8 @@ class ProxyHealthChecker:
                 summary['unhealthy'] += 1
                 
                 # Check if should be deactivated
-                if proxy.fail_streak >= self.failure_threshold:
+                if result['fail_streak'] >= self.failure_threshold:
                     summary['deactivated'] += 1
-            
-            # Small delay between checks to avoid overwhelming
-            await asyncio.sleep(0.5)
         
         summary['completed_at'] = datetime.now()
         summary['duration_seconds'] = (summary['completed_at'] - summary['started_at']).total_seconds()
@@ -183,6 +187,16 @@ class ProxyHealthChecker:
         
         return summary
     
+    def _apply_results(self, session: Session, results: List[Dict]) -> None:
+        """Save a batch of check results (cooldown after failure_threshold failures)."""
+        apply_health_results(
+            session,
+            results,
+            apply_cooldown=True,
+            cooldown_after=self.failure_threshold,
+            cooldown_minutes=int(self.cooldown_duration.total_seconds() // 60)
+        )
+    
     async def release_expired_cooldowns(self, session: Session) -> int:
         """
         Release proxies from expired cooldowns
@@ -233,24 +247,14 @@ class ProxyHealthChecker:
         
         print(f"[PROXY-HEALTH] 🔄 Attempting to reactivate {len(inactive_proxies)} inactive proxies...")
         
-        reactivated = 0
+        # Test if proxies work now (concurrently), working ones are reactivated in batches
+        results = await sweep_proxies(session, inactive_proxies, apply=apply_reactivation)
         
-        for proxy in inactive_proxies:
-            manager = ProxyManager(session)
-            
-            # Test if proxy works now
-            is_working = await manager.test_proxy_connection(proxy)
-            
-            if is_working:
-                proxy.is_active = True
-                proxy.fail_streak = 0
-                proxy.cooldown_until = None
+        reactivated = 0
+        for result in results:
+            if result['healthy']:
                 reactivated += 1
-                print(f"[PROXY-HEALTH] ♻️ Reactivated {proxy.host}")
-            
-            await asyncio.sleep(0.5)
-        
-        session.commit()
+                print(f"[PROXY-HEALTH] ♻️ Reactivated {result['host']}")
         
         if reactivated > 0:
             print(f"[PROXY-HEALTH] ✅ Reactivated {reactivated}/{len(inactive_proxies)} proxies")
@@ -418,17 +422,8 @@ async def check_user_proxies_health(user_id: int) -> Dict:
         
         checker = ProxyHealthChecker()
         
-        results = []
-        healthy_count = 0
-        
-        for proxy in proxies:
-            result = await checker.check_single_proxy(proxy, session)
-            results.append(result)
-            
-            if result['healthy']:
-                healthy_count += 1
-            
-            await asyncio.sleep(0.5)
+        results = await sweep_proxies(session, proxies, apply=checker._apply_results)
+        healthy_count = sum(1 for r in results if r['healthy'])
         
         return {
             'user_id': user_id,
@@ -19,9 +19,15 @@ from sqlalchemy import func
 try:
     from ..models import Proxy
     from ..database import get_session_factory
+    from .proxy_selector import get_proxy_selector
+    from .proxy_credentials import get_proxy_url, get_playwright_proxy_config
+    from .proxy_sweep import probe_proxy, sweep_proxies, apply_health_results
 except ImportError:
     from models import Proxy
     from database import get_session_factory
+    from services.proxy_selector import get_proxy_selector
+    from services.proxy_credentials import get_proxy_url, get_playwright_proxy_config
+    from services.proxy_sweep import probe_proxy, sweep_proxies, apply_health_results
 
 
 class ProxyManager:
@@ -81,6 +87,9 @@ class ProxyManager:
         """
         print(f"[PROXY-MANAGER] 🎯 Selecting proxy for user {user_id} (strategy: {strategy})")
         
+        if strategy not in ('priority', 'random', 'least_used'):
+            return self._select_adaptive(user_id, exclude_ids)
+        
         # Base query: active proxies for this user, not in cooldown
         query = self.session.query(Proxy).filter(
             Proxy.user_id == user_id,
@@ -99,58 +108,29 @@ class ProxyManager:
             return None
         
         # Apply strategy
-        if strategy == 'adaptive':
-            return self._select_adaptive(proxies)
-        elif strategy == 'priority':
+        if strategy == 'priority':
             return self._select_priority(proxies)
         elif strategy == 'random':
             return random.choice(proxies)
-        elif strategy == 'least_used':
-            return min(proxies, key=lambda p: p.used_count)
         else:
-            return self._select_adaptive(proxies)
+            return min(proxies, key=lambda p: p.used_count)
     
-    def _select_adaptive(self, proxies: List[Proxy]) -> Proxy:
+    def _select_adaptive(self, user_id: int, exclude_ids: Optional[List[int]] = None) -> Optional[Proxy]:
         """
-        Adaptive selection based on success rate and usage
+        Adaptive selection based on priority and success rate
         
-        Algorithm:
-        - Calculate score for each proxy
-        - Score = (success_rate * 0.7) + (inverse_usage * 0.2) + (priority_score * 0.1)
-        - Select best score with some randomness (epsilon-greedy)
+        Uses the in-memory proxy index (proxy_selector): best score from a heap,
+        with some randomness (epsilon-greedy: 90% best, 10% random exploration)
         """
-        scored_proxies = []
-        
-        for proxy in proxies:
-            # Success rate (0-1)
-            total_uses = proxy.used_count
-            if total_uses == 0:
-                success_rate = 0.5  # Neutral for new proxies
-            else:
-                success_rate = proxy.success_count / total_uses
-            
-            # Inverse usage (prefer less used) (0-1)
-            max_usage = max(p.used_count for p in proxies) if proxies else 1
-            inverse_usage = 1 - (proxy.used_count / (max_usage + 1))
-            
-            # Priority score (0-1) - lower priority number = higher score
-            priority_score = 1 - ((proxy.priority - 1) / 9)  # priority 1-10 -> score 1-0
-            
-            # Combined score
-            score = (success_rate * 0.7) + (inverse_usage * 0.2) + (priority_score * 0.1)
-            
-            scored_proxies.append((score, proxy))
+        picked = get_proxy_selector().select(self.session, user_id, exclude_ids=exclude_ids, explore=0.1)
         
-        # Sort by score
-        scored_proxies.sort(key=lambda x: x[0], reverse=True)
-        
-        # Epsilon-greedy selection (90% best, 10% random exploration)
-        if random.random() < 0.9:
-            selected = scored_proxies[0][1]
-        else:
-            selected = random.choice(proxies)
+        if picked is None:
+            print(f"[PROXY-MANAGER] ⚠️ No available proxies for user {user_id}")
+            return None
         
-        print(f"[PROXY-MANAGER] ✅ Selected proxy {selected.host} (score: {scored_proxies[0][0]:.3f})")
+        selected = self.session.get(Proxy, picked[0])
+        if selected is not None:
+            print(f"[PROXY-MANAGER] ✅ Selected proxy {selected.host}")
         return selected
     
     def _select_priority(self, proxies: List[Proxy]) -> Proxy:
@@ -230,39 +210,8 @@ class ProxyManager:
         Returns:
             True if proxy works, False otherwise
         """
-        proxy_url = self.build_proxy_url(proxy)
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    test_url,
-                    proxy=proxy_url,
-                    timeout=aiohttp.ClientTimeout(total=timeout)
-                ) as response:
-                    if response.status == 200:
-                        # Verify IP changed
-                        data = await response.json()
-                        origin_ip = data.get('origin', '')
-                        
-                        # Extract host from proxy
-                        proxy_host = proxy.host.split(':')[0] if ':' in proxy.host else proxy.host
-                        
-                        if proxy_host in origin_ip:
-                            print(f"[PROXY-MANAGER] ✅ Proxy {proxy.host} - IP verified: {origin_ip}")
-                            return True
-                        else:
-                            print(f"[PROXY-MANAGER] ⚠️ Proxy {proxy.host} - IP not changed (got {origin_ip})")
-                            return False
-                    else:
-                        print(f"[PROXY-MANAGER] ❌ Proxy {proxy.host} - HTTP {response.status}")
-                        return False
-        
-        except asyncio.TimeoutError:
-            print(f"[PROXY-MANAGER] ❌ Proxy {proxy.host} - Timeout")
-            return False
-        except Exception as e:
-            print(f"[PROXY-MANAGER] ❌ Proxy {proxy.host} - Error: {e}")
-            return False
+        async with aiohttp.ClientSession() as http:
+            return await probe_proxy(http, self.build_proxy_url(proxy), proxy.host, test_url, timeout)
     
     def mark_success(self, proxy_id: int):
         """Mark proxy usage as successful"""
@@ -503,10 +452,7 @@ class ProxyManager:
         Returns:
             Proxy URL string
         """
-        if proxy.username and proxy.password:
-            return f"{proxy.scheme}://{proxy.username}:{proxy.password}@{proxy.host}"
-        else:
-            return f"{proxy.scheme}://{proxy.host}"
+        return get_proxy_url(proxy)
     
     def build_playwright_proxy_config(self, proxy: Proxy) -> Dict[str, str]:
         """
@@ -518,15 +464,7 @@ class ProxyManager:
         Returns:
             Playwright proxy config dict
         """
-        config = {
-            "server": f"{proxy.scheme}://{proxy.host}"
-        }
-        
-        if proxy.username and proxy.password:
-            config["username"] = proxy.username
-            config["password"] = proxy.password
-        
-        return config
+        return get_playwright_proxy_config(proxy)
     
     def reset_cooldowns(self, user_id: int) -> int:
         """Reset cooldowns for all user's proxies"""
@@ -536,6 +474,7 @@ class ProxyManager:
         ).update({'cooldown_until': None})
         
         self.session.commit()
+        get_proxy_selector().invalidate(user_id)  # bulk UPDATE не вызывает ORM события
         print(f"[PROXY-MANAGER] 🔄 Reset cooldowns for {count} proxies")
         return count
     
@@ -547,6 +486,7 @@ class ProxyManager:
         ).update({'is_active': True, 'fail_streak': 0})
         
         self.session.commit()
+        get_proxy_selector().invalidate(user_id)  # bulk UPDATE не вызывает ORM события
         print(f"[PROXY-MANAGER] ✅ Reactivated {count} proxies")
         return count
 
@@ -584,41 +524,26 @@ async def test_all_user_proxies(session: Session, user_id: int) -> Dict[str, Any
     Returns:
         Test results dict
     """
-    with ProxyManager(session) as manager:
-        proxies = session.query(Proxy).filter(Proxy.user_id == user_id).all()
-        
-        print(f"[PROXY-MANAGER] 🧪 Testing {len(proxies)} proxies for user {user_id}")
-        
-        results = {
-            'total': len(proxies),
-            'working': 0,
-            'failed': 0,
-            'details': []
-        }
-        
-        for proxy in proxies:
-            is_working = await manager.test_proxy_connection(proxy)
-            
-            result_detail = {
-                'id': proxy.id,
-                'host': proxy.host,
-                'working': is_working
-            }
-            
-            results['details'].append(result_detail)
-            
-            if is_working:
-                results['working'] += 1
-                manager.mark_success(proxy.id)
-            else:
-                results['failed'] += 1
-                manager.mark_failure(proxy.id, apply_cooldown=False)
-            
-            # Small delay between tests
-            await asyncio.sleep(1)
-        
-        print(f"[PROXY-MANAGER] 📊 Test complete: {results['working']}/{results['total']} working")
-        return results
+    proxies = session.query(Proxy).filter(Proxy.user_id == user_id).all()
+    
+    print(f"[PROXY-MANAGER] 🧪 Testing {len(proxies)} proxies for user {user_id}")
+    
+    # Все прокси проверяются параллельно, результаты пишутся пачками
+    checked = await sweep_proxies(
+        session,
+        proxies,
+        apply=lambda s, batch: apply_health_results(s, batch, apply_cooldown=False)
+    )
+    
+    results = {
+        'total': len(proxies),
+        'working': sum(1 for r in checked if r['healthy']),
+        'failed': sum(1 for r in checked if not r['healthy']),
+        'details': [{'id': r['proxy_id'], 'host': r['host'], 'working': r['healthy']} for r in checked]
+    }
+    
+    print(f"[PROXY-MANAGER] 📊 Test complete: {results['working']}/{results['total']} working")
+    return results
 
 
 
@@ -0,0 +1,391 @@
+"""
+In-memory proxy selection index per user.
+
+Раньше каждая проверка читала все прокси пользователя из БД, считала score
+в Python и собирала URL (с расшифровкой пароля); после скриншота
+main_checker ещё раз перебирал все прокси, чтобы по URL найти использованный.
+
+Селектор держит прокси пользователя в памяти:
+    - куча по score: выбор лучшего прокси и обновление статистики за O(log n)
+      (устаревшие записи кучи отбрасываются лениво, по версии)
+    - timer wheel для кулдаунов: прокси уходит из кучи и возвращается в неё,
+      когда колесо доходит до конца кулдауна, без перебора всех прокси
+    - URL и расшифрованные учётные данные берутся из proxy_credentials при загрузке
+
+Выбор возвращает (proxy_id, url) - статистика потом пишется по id.
+
+БД остаётся источником истины: статистика пишется через
+proxy_service.record_proxy_result (или write-behind буфер), индекс
+перечитывается раз в PROXY_SELECTOR_REFRESH_SECONDS и сразу после изменения
+прокси через ORM в этом процессе (добавление, удаление, is_active, priority).
+"""
+
+import heapq
+import math
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import Proxy
+    from ..config import get_settings
+    from ..database import on_committed_changes, run_db
+    from .proxy_credentials import get_proxy_credentials
+    from .proxy_service import record_proxy_result
+except ImportError:
+    from models import Proxy
+    from config import get_settings
+    from database import on_committed_changes, run_db
+    from services.proxy_credentials import get_proxy_credentials
+    from services.proxy_service import record_proxy_result
+
+# Timer wheel: шаг и число слотов (один оборот = 512 секунд, более длинные
+# кулдауны просто проходят несколько оборотов)
+WHEEL_TICK_SECONDS = 1.0
+WHEEL_SLOTS = 512
+
+
+class ProxyState:
+    """Selection state of one proxy (no DB session attached)."""
+
+    __slots__ = (
+        "id", "scheme", "host", "username", "password", "url", "priority",
+        "used", "success", "fail_streak", "cooldown_until", "version",
+    )
+
+    def __init__(self, proxy_id: int):
+        self.id = proxy_id
+        self.scheme = "http"
+        self.host = ""
+        self.username: Optional[str] = None
+        self.password: Optional[str] = None  # decrypted
+        self.url = ""
+        self.priority = 5
+        self.used = 0
+        self.success = 0
+        self.fail_streak = 0
+        self.cooldown_until = 0.0  # time.monotonic(); 0 = not cooling down
+        self.version = 0  # bumped on every change, older heap entries are stale
+
+    def score(self) -> float:
+        """Priority 1..10 (1 is best) and success rate; new proxies count as 50%."""
+        success_rate = self.success / self.used if self.used > 0 else 0.5
+        return (11 - self.priority) * 10 + success_rate * 100
+
+    def heap_key(self) -> Tuple[float, int, int, int]:
+        # Равный score - меньше неудач подряд, затем менее использованный
+        return (-self.score(), self.fail_streak, self.used, self.id)
+
+
+class _TimerWheel:
+    """Hashed timer wheel: proxy ids due at a monotonic time."""
+
+    def __init__(self, tick: float = WHEEL_TICK_SECONDS, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        self.slots: List[List[Tuple[int, int]]] = [[] for _ in range(slots)]
+        self.current = int(time.monotonic() // tick)
+
+    def add(self, proxy_id: int, deadline: float) -> None:
+        # Срабатывает не раньше deadline и не в уже пройденном тике
+        due = max(math.ceil(deadline / self.tick), self.current + 1)
+        self.slots[due % len(self.slots)].append((due, proxy_id))
+
+    def expire(self, now: float) -> List[int]:
+        """Advance to now and return ids whose time has come."""
+        now_tick = int(now // self.tick)
+        if now_tick <= self.current:
+            return []
+        if now_tick - self.current >= len(self.slots):
+            indexes: Iterable[int] = range(len(self.slots))
+        else:
+            indexes = (t % len(self.slots) for t in range(self.current + 1, now_tick + 1))
+        fired = []
+        for index in indexes:
+            slot = self.slots[index]
+            if slot:
+                fired.extend(pid for due, pid in slot if due <= now_tick)
+                slot[:] = [(due, pid) for due, pid in slot if due > now_tick]
+        self.current = now_tick
+        return fired
+
+
+class _UserPool:
+    def __init__(self):
+        self.proxies: Dict[int, ProxyState] = {}
+        self.heap: List[Tuple[Tuple[float, int, int, int], int, int]] = []
+        self.wheel = _TimerWheel()
+        self.loaded_at = 0.0
+
+    def push(self, state: ProxyState) -> None:
+        """(Re)insert the proxy with its current score; older entries go stale."""
+        state.version += 1
+        if state.cooldown_until:
+            self.wheel.add(state.id, state.cooldown_until)
+        else:
+            heapq.heappush(self.heap, (state.heap_key(), state.version, state.id))
+        if len(self.heap) > 2 * len(self.proxies) + 16:
+            self._compact()
+
+    def _compact(self) -> None:
+        self.heap = [entry for entry in self.heap if self._is_live(entry)]
+        heapq.heapify(self.heap)
+
+    def _is_live(self, entry) -> bool:
+        state = self.proxies.get(entry[2])
+        return state is not None and state.version == entry[1] and not state.cooldown_until
+
+    def expire_cooldowns(self, now: float) -> None:
+        for proxy_id in self.wheel.expire(now):
+            state = self.proxies.get(proxy_id)
+            # Кулдаун мог быть снят успехом или продлён - тогда запись в колесе лишняя
+            if state is not None and state.cooldown_until and state.cooldown_until <= now:
+                state.cooldown_until = 0.0
+                self.push(state)
+
+    def best(self, exclude: Optional[set] = None) -> Optional[ProxyState]:
+        skipped = []
+        found = None
+        while self.heap:
+            entry = self.heap[0]
+            if not self._is_live(entry):
+                heapq.heappop(self.heap)
+                continue
+            if exclude and entry[2] in exclude:
+                skipped.append(heapq.heappop(self.heap))
+                continue
+            found = self.proxies[entry[2]]
+            break
+        for entry in skipped:
+            heapq.heappush(self.heap, entry)
+        return found
+
+    def ranked(self) -> List[ProxyState]:
+        live = sorted(entry for entry in self.heap if self._is_live(entry))
+        return [self.proxies[entry[2]] for entry in live]
+
+
+class ProxySelector:
+    """Per-user proxy index: best proxy by score, cooldowns on a timer wheel."""
+
+    def __init__(self, refresh_seconds: Optional[int] = None):
+        """
+        Initialize proxy selector.
+
+        Args:
+            refresh_seconds: Reload user's proxies from DB after this many seconds (default: settings)
+        """
+        settings = get_settings()
+        self.refresh_seconds = (
+            settings.proxy_selector_refresh_seconds if refresh_seconds is None else refresh_seconds
+        )
+        self._pools: Dict[int, _UserPool] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Loading ----------
+
+    def _is_fresh(self, user_id: int) -> bool:
+        with self._lock:
+            pool = self._pools.get(user_id)
+            return pool is not None and time.monotonic() - pool.loaded_at < self.refresh_seconds
+
+    def load(self, session: Session, user_id: int) -> None:
+        """(Re)load the user's active proxies from DB."""
+        rows = session.query(Proxy).filter(
+            Proxy.user_id == user_id,
+            Proxy.is_active == True
+        ).all()
+
+        wall_now = datetime.now()
+        now = time.monotonic()
+        pool = _UserPool()
+        for row in rows:
+            state = ProxyState(row.id)
+            state.scheme = row.scheme
+            state.host = row.host
+            state.priority = row.priority or 5
+            state.used = row.used_count or 0
+            state.success = row.success_count or 0
+            state.fail_streak = row.fail_streak or 0
+            if row.cooldown_until and row.cooldown_until > wall_now:
+                state.cooldown_until = now + (row.cooldown_until - wall_now).total_seconds()
+            credentials = get_proxy_credentials(row)
+            state.username = credentials.username
+            state.password = credentials.password
+            state.url = credentials.url
+            pool.proxies[row.id] = state
+        for state in pool.proxies.values():
+            pool.push(state)
+        pool.loaded_at = now
+        with self._lock:
+            self._pools[user_id] = pool
+
+    def _ensure(self, session: Session, user_id: int) -> None:
+        if not self._is_fresh(user_id):
+            self.load(session, user_id)
+
+    async def _aensure(self, session, user_id: int) -> None:
+        if not self._is_fresh(user_id):
+            await run_db(session, self.load, user_id)
+
+    # ---------- Selection ----------
+
+    def select(
+        self,
+        session: Session,
+        user_id: int,
+        exclude_ids: Optional[Iterable[int]] = None,
+        fallback: bool = False,
+        explore: float = 0.0
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Best available proxy of the user.
+
+        Args:
+            session: Database session (read only when the index is stale)
+            user_id: User ID
+            exclude_ids: Proxy IDs to skip
+            fallback: If every proxy is in cooldown, return the one that recovers first
+            explore: Probability of picking a random available proxy instead of the best
+
+        Returns:
+            (proxy_id, proxy_url) or None
+        """
+        self._ensure(session, user_id)
+        return self.pick(user_id, exclude_ids, fallback, explore)
+
+    async def aselect(
+        self,
+        session,
+        user_id: int,
+        exclude_ids: Optional[Iterable[int]] = None,
+        fallback: bool = False,
+        explore: float = 0.0
+    ) -> Optional[Tuple[int, str]]:
+        """select() for async code: DB is read only when the index is stale."""
+        await self._aensure(session, user_id)
+        return self.pick(user_id, exclude_ids, fallback, explore)
+
+    def pick(
+        self,
+        user_id: int,
+        exclude_ids: Optional[Iterable[int]] = None,
+        fallback: bool = False,
+        explore: float = 0.0
+    ) -> Optional[Tuple[int, str]]:
+        exclude = set(exclude_ids) if exclude_ids else None
+        with self._lock:
+            pool = self._pools.get(user_id)
+            if pool is None:
+                return None
+            pool.expire_cooldowns(time.monotonic())
+            if explore > 0 and random.random() < explore:
+                choices = [s for s in pool.ranked() if not exclude or s.id not in exclude]
+                state = random.choice(choices) if choices else None
+            else:
+                state = pool.best(exclude)
+            if state is None and fallback:
+                cooling = [s for s in pool.proxies.values() if not exclude or s.id not in exclude]
+                state = min(cooling, key=lambda s: s.cooldown_until, default=None)
+            return (state.id, state.url) if state is not None else None
+
+    def ranked(self, session: Session, user_id: int) -> List[ProxyState]:
+        """All available proxies of the user, best first (snapshot)."""
+        self._ensure(session, user_id)
+        return self._ranked(user_id)
+
+    async def aranked(self, session, user_id: int) -> List[ProxyState]:
+        """ranked() for async code."""
+        await self._aensure(session, user_id)
+        return self._ranked(user_id)
+
+    def _ranked(self, user_id: int) -> List[ProxyState]:
+        with self._lock:
+            pool = self._pools.get(user_id)
+            if pool is None:
+                return []
+            pool.expire_cooldowns(time.monotonic())
+            return pool.ranked()
+
+    # ---------- Feedback ----------
+
+    def record(self, user_id: int, proxy_id: int, success: bool, cooldown_seconds: int = 0) -> None:
+        """Update the in-memory stats of one proxy (O(log n), no DB)."""
+        with self._lock:
+            pool = self._pools.get(user_id)
+            state = pool.proxies.get(proxy_id) if pool is not None else None
+            if state is None:
+                return
+            state.used += 1
+            if success:
+                state.success += 1
+                state.fail_streak = 0
+                state.cooldown_until = 0.0
+            else:
+                state.fail_streak += 1
+                if cooldown_seconds > 0:
+                    state.cooldown_until = time.monotonic() + cooldown_seconds
+            pool.push(state)
+
+    def record_result(
+        self,
+        session: Session,
+        user_id: int,
+        proxy_id: int,
+        success: bool,
+        cooldown_seconds: int = 0
+    ) -> None:
+        """
+        Record one use of the proxy: in-memory index and DB statistics.
+
+        Args:
+            session: Database session
+            user_id: User ID
+            proxy_id: Proxy ID returned by select()
+            success: Was the request successful
+            cooldown_seconds: Cooldown duration on failure (0 = none)
+        """
+        self.record(user_id, proxy_id, success, cooldown_seconds)
+        record_proxy_result(session, proxy_id, success, cooldown_seconds)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Force reload on next use (one user or all)."""
+        with self._lock:
+            for uid, pool in self._pools.items():
+                if user_id is None or uid == user_id:
+                    pool.loaded_at = float("-inf")
+
+
+# Global selector instance
+_selector: Optional[ProxySelector] = None
+_selector_lock = threading.Lock()
+
+
+def get_proxy_selector() -> ProxySelector:
+    """Get the process-wide proxy selector."""
+    global _selector
+    with _selector_lock:
+        if _selector is None:
+            _selector = ProxySelector()
+        return _selector
+
+
+# ---------- Invalidation on proxy changes ----------
+# Индекс перестраивается только при изменении полей, влияющих на выбор.
+# Счётчики (used_count, success_count, fail_streak), которые ProxyManager /
+# proxy_utils / update_proxy_stats коммитят после каждого использования, его
+# не сбрасывают: они подтянутся при плановом обновлении
+# (PROXY_SELECTOR_REFRESH_SECONDS), а через record_result попадают в индекс сразу.
+
+_SELECTION_FIELDS = ("is_active", "priority", "scheme", "host", "username", "password", "cooldown_until")
+
+def _invalidate_users(users: Set[int]) -> None:
+    if _selector is not None:
+        for user_id in users:
+            _selector.invalidate(user_id)
+
+
+on_committed_changes(Proxy, _SELECTION_FIELDS, _invalidate_users)
@@ -1,13 +1,16 @@
 """Proxy service for managing proxies."""
 
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 from typing import List, Tuple, Optional
 from datetime import datetime, timedelta
 
 try:
     from ..models import Proxy
+    from .write_behind import get_write_behind
 except ImportError:
     from models import Proxy
+    from services.write_behind import get_write_behind
 
 
 def get_proxies_page(
@@ -128,6 +131,12 @@ def update_proxy_stats(
         success: Was the request successful
         cooldown_seconds: Cooldown duration in seconds
     """
+    buffer = get_write_behind()
+    if buffer is not None:
+        # Счётчики применит пакетный flush (used_count = used_count + n ...)
+        buffer.record_proxy_result(proxy.id, success, cooldown_seconds)
+        return
+    
     try:
         proxy.used_count += 1
         proxy.last_checked = datetime.now()
@@ -146,6 +155,52 @@ def update_proxy_stats(
         session.rollback()
 
 
+def record_proxy_result(
+    session: Session,
+    proxy_id: int,
+    success: bool,
+    cooldown_seconds: int = 0
+) -> None:
+    """
+    Update proxy statistics after use by proxy ID (no ORM object needed).
+    
+    Same rules as update_proxy_stats, written as one SQL UPDATE.
+    
+    Args:
+        session: Database session
+        proxy_id: Proxy ID
+        success: Was the request successful
+        cooldown_seconds: Cooldown duration in seconds
+    """
+    buffer = get_write_behind()
+    if buffer is not None:
+        buffer.record_proxy_result(proxy_id, success, cooldown_seconds)
+        return
+    
+    now = datetime.now()
+    values = {
+        "used_count": func.coalesce(Proxy.used_count, 0) + 1,
+        "last_checked": now,
+    }
+    if success:
+        values["success_count"] = func.coalesce(Proxy.success_count, 0) + 1
+        values["fail_streak"] = 0
+        values["cooldown_until"] = None
+    else:
+        values["fail_streak"] = func.coalesce(Proxy.fail_streak, 0) + 1
+        if cooldown_seconds > 0:
+            values["cooldown_until"] = now + timedelta(seconds=cooldown_seconds)
+    
+    try:
+        session.execute(
+            update(Proxy).where(Proxy.id == proxy_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+
+
 def get_active_proxies(session: Session, user_id: int) -> List[Proxy]:
     """
     Get all active proxies for user.
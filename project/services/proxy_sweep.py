@@ -0,0 +1,291 @@
+"""
+Concurrent proxy health sweep.
+
+Раньше health-check проверял прокси по одному с паузой 0.5-1 с между ними:
+600 прокси не успевали проверяться за 300-секундный интервал.
+
+Здесь все проверки идут параллельно с ограничениями:
+    - PROXY_SWEEP_CONCURRENCY проверок одновременно (семафор)
+    - PROXY_SWEEP_PER_HOST одновременно на один upstream-хост (прокси одного
+      провайдера обычно висят на одном IP / gateway с разными портами)
+    - PROXY_SWEEP_TIMEOUT_SECONDS на одну проверку (asyncio.wait_for)
+
+Результаты приходят по мере готовности и пишутся пачками по
+PROXY_SWEEP_BATCH_SIZE: пара UPDATE ... WHERE id IN (...) и один commit на
+пачку вместо commit на каждый прокси. Проверки с БД-сессией не работают:
+перед стартом прокси снимаются в SweepTarget (id, host, URL, fail_streak).
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import Proxy
+    from ..config import get_settings
+    from .proxy_credentials import get_proxy_url
+    from .proxy_selector import get_proxy_selector
+except ImportError:
+    from models import Proxy
+    from config import get_settings
+    from services.proxy_credentials import get_proxy_url
+    from services.proxy_selector import get_proxy_selector
+
+
+DEFAULT_TEST_URL = "https://httpbin.org/ip"
+
+
+@dataclass
+class SweepTarget:
+    """Proxy snapshot for a check (no DB session needed)."""
+    id: int
+    user_id: int
+    host: str
+    url: str
+    fail_streak: int
+
+    @property
+    def upstream(self) -> str:
+        """Proxy host without port."""
+        return self.host.rsplit(":", 1)[0]
+
+
+def sweep_targets(proxies: Iterable[Proxy]) -> List[SweepTarget]:
+    """Snapshot Proxy objects before checking them concurrently."""
+    return [
+        SweepTarget(p.id, p.user_id, p.host, get_proxy_url(p), p.fail_streak or 0)
+        for p in proxies
+    ]
+
+
+async def probe_proxy(
+    http: ClientSession,
+    proxy_url: str,
+    proxy_host: str,
+    test_url: str = DEFAULT_TEST_URL,
+    timeout: float = 15
+) -> bool:
+    """
+    Test if proxy is working (IP seen by the test URL must be the proxy's).
+
+    Args:
+        http: aiohttp session
+        proxy_url: Proxy URL with credentials
+        proxy_host: Proxy host ("ip:port")
+        test_url: URL to test against
+        timeout: Request timeout in seconds
+
+    Returns:
+        True if proxy works, False otherwise
+    """
+    try:
+        async with http.get(
+            test_url,
+            proxy=proxy_url,
+            timeout=ClientTimeout(total=timeout)
+        ) as response:
+            if response.status == 200:
+                # Verify IP changed
+                data = await response.json()
+                origin_ip = data.get('origin', '')
+
+                # Extract host from proxy
+                host = proxy_host.split(':')[0] if ':' in proxy_host else proxy_host
+
+                if host in origin_ip:
+                    print(f"[PROXY-PROBE] ✅ Proxy {proxy_host} - IP verified: {origin_ip}")
+                    return True
+                else:
+                    print(f"[PROXY-PROBE] ⚠️ Proxy {proxy_host} - IP not changed (got {origin_ip})")
+                    return False
+            else:
+                print(f"[PROXY-PROBE] ❌ Proxy {proxy_host} - HTTP {response.status}")
+                return False
+
+    except asyncio.TimeoutError:
+        print(f"[PROXY-PROBE] ❌ Proxy {proxy_host} - Timeout")
+        return False
+    except Exception as e:
+        print(f"[PROXY-PROBE] ❌ Proxy {proxy_host} - Error: {e}")
+        return False
+
+
+def apply_health_results(
+    session: Session,
+    results: List[Dict],
+    apply_cooldown: bool = True,
+    cooldown_after: int = 3,
+    cooldown_minutes: int = 15,
+    deactivate_after: int = 5
+) -> None:
+    """
+    Write a batch of check results (same rules as ProxyManager.mark_success / mark_failure).
+
+    Args:
+        session: DB session
+        results: Check results ('proxy_id', 'healthy')
+        apply_cooldown: Put failing proxies into cooldown after cooldown_after failures in a row
+        cooldown_after: Failures in a row before cooldown
+        cooldown_minutes: Cooldown duration
+        deactivate_after: Failures in a row before the proxy is deactivated
+    """
+    now = datetime.now()
+    healthy = [r['proxy_id'] for r in results if r['healthy']]
+    failed = [r['proxy_id'] for r in results if not r['healthy']]
+
+    if healthy:
+        session.execute(
+            update(Proxy).where(Proxy.id.in_(healthy)).values(
+                used_count=func.coalesce(Proxy.used_count, 0) + 1,
+                success_count=func.coalesce(Proxy.success_count, 0) + 1,
+                fail_streak=0,
+                last_checked=now,
+            ).execution_options(synchronize_session=False)
+        )
+    if failed:
+        # SET считается по старым значениям строки: streak - fail_streak после этой неудачи
+        streak = func.coalesce(Proxy.fail_streak, 0) + 1
+        values = {
+            "used_count": func.coalesce(Proxy.used_count, 0) + 1,
+            "fail_streak": streak,
+            "last_checked": now,
+            "is_active": case((streak >= deactivate_after, False), else_=Proxy.is_active),
+        }
+        if apply_cooldown:
+            values["cooldown_until"] = case(
+                (streak >= cooldown_after, now + timedelta(minutes=cooldown_minutes)),
+                else_=Proxy.cooldown_until,
+            )
+        session.execute(
+            update(Proxy).where(Proxy.id.in_(failed)).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    session.commit()
+
+
+def apply_reactivation(session: Session, results: List[Dict]) -> None:
+    """Reactivate proxies that passed the check (failed ones are left as they are)."""
+    working = [r['proxy_id'] for r in results if r['healthy']]
+    if working:
+        session.execute(
+            update(Proxy).where(Proxy.id.in_(working)).values(
+                is_active=True,
+                fail_streak=0,
+                cooldown_until=None,
+            ).execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+
+Probe = Callable[[ClientSession, str, str, str, float], Awaitable[bool]]
+
+
+async def sweep_proxies(
+    session: Session,
+    proxies: Iterable[Proxy],
+    apply: Optional[Callable[[Session, List[Dict]], None]] = None,
+    test_url: str = DEFAULT_TEST_URL,
+    concurrency: Optional[int] = None,
+    per_host: Optional[int] = None,
+    timeout: Optional[float] = None,
+    batch_size: Optional[int] = None,
+    probe: Probe = probe_proxy
+) -> List[Dict]:
+    """
+    Check proxies concurrently and write results in batches as they arrive.
+
+    Args:
+        session: DB session (used only for the batched writes)
+        proxies: Proxies to check
+        apply: Batch writer (default: apply_health_results)
+        test_url: URL to test against
+        concurrency: Checks at once (default: settings)
+        per_host: Checks at once per upstream host (default: settings)
+        timeout: Seconds per check (default: settings)
+        batch_size: Results per DB transaction (default: settings)
+        probe: Check function (default: probe_proxy)
+
+    Returns:
+        Check results in completion order: proxy_id, host, healthy,
+        response_time, error, checked_at, fail_streak (after the check)
+    """
+    settings = get_settings()
+    concurrency = concurrency or settings.proxy_sweep_concurrency
+    per_host = per_host or settings.proxy_sweep_per_host
+    timeout = timeout or settings.proxy_sweep_timeout_seconds
+    batch_size = batch_size or settings.proxy_sweep_batch_size
+    apply = apply or apply_health_results
+
+    targets = sweep_targets(proxies)
+    if not targets:
+        return []
+
+    limit = asyncio.Semaphore(concurrency)
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+    loop = asyncio.get_running_loop()
+
+    async def check(target: SweepTarget) -> Dict:
+        host_limit = host_limits.setdefault(target.upstream, asyncio.Semaphore(per_host))
+        result = {
+            'proxy_id': target.id,
+            'user_id': target.user_id,
+            'host': target.host,
+            'healthy': False,
+            'response_time': None,
+            'error': None,
+            'checked_at': None,
+        }
+        # Сначала слот хоста: иначе ожидающие своего хоста держат общие слоты,
+        # и прокси остальных хостов стоят за одним крупным gateway
+        async with host_limit, limit:
+            start = loop.time()
+            try:
+                result['healthy'] = await asyncio.wait_for(
+                    probe(http, target.url, target.host, test_url, timeout), timeout
+                )
+                if not result['healthy']:
+                    result['error'] = 'connection_failed'
+            except asyncio.TimeoutError:
+                result['error'] = 'timeout'
+            except Exception as e:
+                result['error'] = str(e)
+            result['response_time'] = round(loop.time() - start, 2)
+        result['checked_at'] = datetime.now()
+        result['fail_streak'] = 0 if result['healthy'] else target.fail_streak + 1
+        return result
+
+    def flush(batch: List[Dict]) -> None:
+        try:
+            apply(session, batch)
+        except Exception as e:
+            session.rollback()
+            print(f"[PROXY-SWEEP] ⚠️ Failed to save {len(batch)} results: {e}")
+            return
+        # Core UPDATE не вызывает ORM события - индекс выбора прокси перечитаем сами
+        selector = get_proxy_selector()
+        for user_id in {r['user_id'] for r in batch}:
+            selector.invalidate(user_id)
+
+    print(f"[PROXY-SWEEP] 🔍 Checking {len(targets)} proxies "
+          f"(concurrency: {concurrency}, per host: {per_host}, timeout: {timeout}s)")
+
+    results: List[Dict] = []
+    batch: List[Dict] = []
+    # Одна сессия на прогон: пул соединений на concurrency, закрывается в конце
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as http:
+        for finished in asyncio.as_completed([check(t) for t in targets]):
+            result = await finished
+            results.append(result)
+            batch.append(result)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    if batch:
+        flush(batch)
+
+    return results
@@ -8,13 +8,11 @@ import os
 
 try:
     from ..models import Proxy, Account
-    from ..utils.encryptor import OptionalFernet
-    from ..config import get_settings
+    from .proxy_credentials import get_proxy_url
     from .simple_monitor_checker import check_account_simple
 except ImportError:
     from models import Proxy, Account
-    from utils.encryptor import OptionalFernet
-    from config import get_settings
+    from services.proxy_credentials import get_proxy_url
     from services.simple_monitor_checker import check_account_simple
 
 
@@ -28,16 +26,7 @@ def build_proxy_url(proxy: Proxy) -> str:
     Returns:
         Proxy URL string
     """
-    if proxy.username and proxy.password:
-        try:
-            settings = get_settings()
-            encryptor = OptionalFernet(settings.encryption_key)
-            password = encryptor.decrypt(proxy.password)
-            return f"{proxy.scheme}://{proxy.username}:{password}@{proxy.host}"
-        except:
-            return f"{proxy.scheme}://{proxy.host}"
-    else:
-        return f"{proxy.scheme}://{proxy.host}"
+    return get_proxy_url(proxy)
 
 
 async def test_proxy_basic(proxy: Proxy) -> Tuple[bool, str, Optional[float]]:
@@ -150,11 +139,11 @@ async def test_proxy_with_screenshot(
     proxy_url = build_proxy_url(proxy)
     
     try:
-        # Import API checker and profile generator
-        import sys
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        
-        from test_api_with_profile_gen import generate_instagram_profile_image_improved
+        # Import profile generator
+        try:
+            from .profile_renderer import generate_instagram_profile_image_improved
+        except ImportError:
+            from services.profile_renderer import generate_instagram_profile_image_improved
         import aiohttp
         
         # Get Instagram API data via proxy WITH TRAFFIC MONITORING
@@ -7,8 +7,10 @@ from sqlalchemy.orm import Session
 
 try:
     from ..models import Proxy
+    from .proxy_selector import get_proxy_selector
 except ImportError:
     from models import Proxy
+    from services.proxy_selector import get_proxy_selector
 
 _PROXY_RE = re.compile(
     r'^(?P<scheme>http|https|socks5)://(?:(?P<user>[^:@]+):(?P<pass>[^@]+)@)?(?P<host>[^:]+:\d+)$',
@@ -90,14 +92,8 @@ def is_available(p: Proxy) -> bool:
 
 def select_best_proxy(session: Session, user_id: int) -> Optional[Proxy]:
     """Select best available proxy for user."""
-    # приоритет по: active & no cooldown → priority asc → fail_streak asc → used_count asc
-    q = (
-        session.query(Proxy)
-        .filter(Proxy.user_id == user_id, Proxy.is_active == True)
-        .order_by(Proxy.priority.asc(), Proxy.fail_streak.asc(), Proxy.used_count.asc())
-        .all()
-    )
-    for p in q:
-        if is_available(p):
-            return p
-    return None
+    # active & no cooldown → лучший score (приоритет, success rate) → fail_streak asc → used_count asc
+    picked = get_proxy_selector().select(session, user_id)
+    if picked is None:
+        return None
+    return session.get(Proxy, picked[0])
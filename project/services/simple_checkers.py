@@ -9,11 +9,13 @@ from datetime import datetime
 try:
     from ..models import Proxy, InstagramSession
     from .ig_sessions import decode_cookies
+    from .proxy_credentials import get_playwright_proxy_config
     from ..utils.encryptor import OptionalFernet
     from ..config import get_settings
 except ImportError:
     from models import Proxy, InstagramSession
     from services.ig_sessions import decode_cookies
+    from services.proxy_credentials import get_playwright_proxy_config
     from utils.encryptor import OptionalFernet
     from config import get_settings
 
@@ -280,14 +282,10 @@ async def check_account_instagram_proxy(
         result["error"] = "playwright_not_installed"
         return result
     
-    # Setup proxy config
-    proxy_config = {
-        "server": f"{proxy.scheme}://{proxy.host}"
-    }
+    # Setup proxy config (decrypted credentials from cache)
+    proxy_config = get_playwright_proxy_config(proxy)
     
-    if proxy.username and proxy.password:
-        proxy_config["username"] = proxy.username
-        proxy_config["password"] = proxy.password
+    if "username" in proxy_config:
         print(f"🔑 Using proxy with authentication")
     
     # Prepare screenshot path
@@ -0,0 +1,56 @@
+"""
+Stage concurrency limits for the check pipeline.
+
+Проверка аккаунта проходит этапы с разной стоимостью: API-запрос (сеть),
+браузер (Chromium / Selenium, память) и генерация картинки профиля (CPU).
+API и браузер ограничены размерами пулов воркеров глобального планировщика
+(cron/check_dispatcher.py); этапы внутри одной проверки (генерация
+картинки) оборачиваются в stage_slot(name).
+
+Лимиты привязаны к event loop (asyncio.Semaphore нельзя делить между loop'ами).
+Если лимиты для loop'а не заданы (ручные проверки через asyncio.run),
+stage_slot ничего не ограничивает.
+"""
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+
+STAGE_IMAGE = "image"
+
+
+_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+
+def set_stage_limits(limits: Dict[str, int]) -> None:
+    """
+    Set per-stage concurrency limits for the running event loop.
+
+    Args:
+        limits: {stage_name: max concurrent executions}
+    """
+    loop = asyncio.get_running_loop()
+    _limits[loop] = {name: asyncio.Semaphore(max(1, size)) for name, size in limits.items()}
+    print(f"[STAGE-LIMITS] ⚙️ Лимиты этапов: {limits}")
+
+
+def get_stage_semaphore(name: str) -> Optional[asyncio.Semaphore]:
+    """Get stage semaphore of the running loop (None if the stage is not limited)."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    return _limits.get(loop, {}).get(name)
+
+
+@asynccontextmanager
+async def stage_slot(name: str):
+    """Hold one slot of the stage for the duration of the block."""
+    semaphore = get_stage_semaphore(name)
+    if semaphore is None:
+        yield
+        return
+    async with semaphore:
+        yield
@@ -0,0 +1,307 @@
+"""
+Shared username -> lookup result cache.
+
+Одни и те же username проверяются снова и снова: несколько пользователей
+следят за одним аккаунтом, массовое добавление сразу запускает проверку,
+автопроверка идёт каждые несколько минут. Каждый промах - платный запрос
+RapidAPI или запрос через прокси.
+
+- Отдельные TTL для "существует", "не найден" и "ошибка"
+- Single-flight: одинаковые одновременные запросы ждут один общий fetch
+- Опциональный уровень в БД (USERNAME_CACHE_DB=true) переживает рестарт
+
+Кэшируется только сам результат поиска. Побочные эффекты (пометка аккаунта
+пользователя как done, списание квоты ключа) выполняет вызывающий код.
+Ошибки, зависящие от пользователя (нет ключей, квота, нет прокси),
+не кэшируются - у другого пользователя запрос может пройти.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+try:
+    from ..models import UsernameCacheEntry, account_norm
+    from ..config import get_settings
+    from ..database import run_db, upsert
+except ImportError:
+    from models import UsernameCacheEntry, account_norm
+    from config import get_settings
+    from database import run_db, upsert
+
+
+SOURCE_RAPIDAPI = "rapidapi"
+SOURCE_API_V2 = "api-v2"
+
+# Ошибки уровня пользователя, а не username
+USER_SCOPED_ERRORS = {"no_api_keys_available", "all_api_keys_exhausted", "no_proxies_available"}
+
+
+def _cache_key(source: str, username: str) -> Tuple[str, str]:
+    return source, account_norm(username)
+
+
+def _holds_sqlite_write(session: Session) -> bool:
+    """Has the session's SQLite transaction already written (holds the file write lock)?"""
+    if not session.in_transaction() or session.get_bind().dialect.name != "sqlite":
+        return False
+    # sqlite3 открывает транзакцию только перед записью; у других драйверов не знаем - считаем, что да
+    return getattr(session.connection().connection.dbapi_connection, "in_transaction", True)
+
+
+class UsernameResultCache:
+    """Two-tier (memory + optional DB) TTL cache with single-flight."""
+
+    def __init__(
+        self,
+        exists_ttl: Optional[int] = None,
+        not_found_ttl: Optional[int] = None,
+        error_ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        db_tier: Optional[bool] = None,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            exists_ttl: TTL for "account exists" results (seconds)
+            not_found_ttl: TTL for "not found" results (seconds)
+            error_ttl: TTL for lookup errors (seconds, 0 = do not cache)
+            max_entries: Max entries in memory (LRU)
+            db_tier: Also store results in the database
+        """
+        settings = get_settings()
+        self.exists_ttl = settings.username_cache_exists_ttl if exists_ttl is None else exists_ttl
+        self.not_found_ttl = settings.username_cache_not_found_ttl if not_found_ttl is None else not_found_ttl
+        self.error_ttl = settings.username_cache_error_ttl if error_ttl is None else error_ttl
+        self.max_entries = max_entries or settings.username_cache_max_entries
+        self.db_tier = settings.username_cache_db if db_tier is None else db_tier
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # concurrent.futures.Future: ждать можно из любого потока / event loop
+        self._inflight: Dict[Tuple[str, str], concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # ---------- TTL policy ----------
+
+    def ttl_for(self, result: Dict[str, Any]) -> int:
+        """TTL for a lookup result (0 = not cacheable)."""
+        if result.get("error") in USER_SCOPED_ERRORS:
+            return 0
+        exists = result.get("exists")
+        if exists is True:
+            return self.exists_ttl
+        if exists is False:
+            return self.not_found_ttl
+        return self.error_ttl
+
+    # ---------- Get / put ----------
+
+    def get(self, source: str, username: str, session: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get cached result (memory first, then DB tier).
+
+        Returns:
+            Copy of cached result dict or None
+        """
+        key = _cache_key(source, username)
+        result = self._get_memory(key)
+        if result is None and self.db_tier and session is not None:
+            result = self._db_get(session, key)
+        return self._count(result)
+
+    async def aget(self, source: str, username: str, session=None) -> Optional[Dict[str, Any]]:
+        """get() for async code: DB tier goes through run_db (Session or AsyncSession)."""
+        key = _cache_key(source, username)
+        result = self._get_memory(key)
+        if result is None and self.db_tier and session is not None:
+            result = await run_db(session, self._db_get, key)
+        return self._count(result)
+
+    def _get_memory(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                return dict(entry[1])
+            del self._entries[key]
+            return None
+
+    def _db_get(self, session: Session, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        row = session.query(UsernameCacheEntry).filter(
+            UsernameCacheEntry.source == key[0],
+            UsernameCacheEntry.username == key[1],
+            UsernameCacheEntry.expires_at > datetime.utcnow(),
+        ).first()
+        if row is None:
+            return None
+        result = json.loads(row.payload)
+        self._put_memory(key, result, (row.expires_at - datetime.utcnow()).total_seconds())
+        return dict(result)
+
+    def _count(self, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, source: str, username: str, result: Dict[str, Any], session: Optional[Session] = None) -> None:
+        """Store result with TTL by outcome (user-scoped errors are skipped)."""
+        ttl = self.ttl_for(result)
+        if ttl <= 0:
+            return
+        key = _cache_key(source, username)
+        self._put_memory(key, result, ttl)
+        if self.db_tier and session is not None:
+            self._db_put(session, key, result, ttl)
+
+    async def aput(self, source: str, username: str, result: Dict[str, Any], session=None) -> None:
+        """put() for async code: DB tier goes through run_db (Session or AsyncSession)."""
+        ttl = self.ttl_for(result)
+        if ttl <= 0:
+            return
+        key = _cache_key(source, username)
+        self._put_memory(key, result, ttl)
+        if self.db_tier and session is not None:
+            await run_db(session, self._db_put, key, result, ttl)
+
+    def _db_put(self, session: Session, key: Tuple[str, str], result: Dict[str, Any], ttl: int) -> None:
+        # Один upsert вместо SELECT + INSERT: бот и воркер, пишущие один
+        # username, не ловят IntegrityError. Транзакцию вызывающего не
+        # коммитим и не откатываем.
+        now = datetime.utcnow()
+        stmt = upsert(session, UsernameCacheEntry, {
+            "source": key[0],
+            "username": key[1],
+            "account_exists": result.get("exists"),
+            "payload": json.dumps(result, ensure_ascii=False, default=str),
+            "expires_at": now + timedelta(seconds=ttl),
+            "updated_at": now,
+        }, ("source", "username"))
+        try:
+            if _holds_sqlite_write(session):
+                # Отдельное соединение ждало бы этот же поток до busy_timeout:
+                # пишем в SAVEPOINT, в БД запись уйдёт с commit вызывающего
+                with session.begin_nested():
+                    session.execute(stmt)
+            else:
+                with type(session)(bind=session.get_bind()) as own:
+                    own.execute(stmt)
+                    own.commit()
+        except Exception as e:
+            print(f"[USERNAME-CACHE] ⚠️ DB tier write failed for @{key[1]}: {e}")
+
+    def _put_memory(self, key: Tuple[str, str], result: Dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str, source: Optional[str] = None) -> None:
+        """Drop cached results for a username (all sources by default)."""
+        name = account_norm(username)
+        with self._lock:
+            for key in list(self._entries):
+                if key[1] == name and (source is None or key[0] == source):
+                    del self._entries[key]
+
+    # ---------- Single-flight ----------
+
+    async def get_or_fetch(
+        self,
+        source: str,
+        username: str,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        session=None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return cached result or run fetch() once for all concurrent callers.
+
+        Args:
+            source: Lookup source (SOURCE_RAPIDAPI / SOURCE_API_V2)
+            username: Instagram username
+            fetch: Coroutine factory doing the real lookup
+            session: DB session for the DB tier (Session or AsyncSession)
+
+        Returns:
+            (result, from_cache) - from_cache is True for cache hits and for
+            results shared from another caller's in-flight fetch
+        """
+        cached = await self.aget(source, username, session)
+        if cached is not None:
+            return cached, True
+
+        flight_key = _cache_key(source, username)
+        with self._lock:
+            future = self._inflight.get(flight_key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[flight_key] = future
+
+        if not owner:
+            with self._lock:
+                self.coalesced += 1
+            shared = await asyncio.shield(asyncio.wrap_future(future))
+            if shared is not None and self.ttl_for(shared) > 0:
+                return dict(shared), True
+            # Запрос другого вызова упал или вернул ошибку уровня пользователя - пробуем сами
+            return await fetch(), False
+
+        try:
+            result = await fetch()
+        except BaseException:
+            self._finish_flight(flight_key, future, None)
+            raise
+
+        # Сначала в кэш, потом снимаем in-flight: новый вызов не должен проскочить между ними
+        await self.aput(source, username, result, session)
+        self._finish_flight(flight_key, future, result)
+        return result, False
+
+    def _finish_flight(self, flight_key: Tuple[str, str], future: concurrent.futures.Future,
+                       result: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            if self._inflight.get(flight_key) is future:
+                del self._inflight[flight_key]
+        future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+# Global cache instance
+_cache: Optional[UsernameResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_username_cache() -> UsernameResultCache:
+    """Get the process-wide username result cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UsernameResultCache()
+        return _cache
@@ -0,0 +1,296 @@
+"""
+Write-behind buffer for check results and counters.
+
+Каждая проверка делает несколько мелких коммитов: статистика прокси,
+done у найденного аккаунта, отметка об отправленном уведомлении. На прогоне в 1000 аккаунтов это тысячи fsync.
+
+Буфер копит изменения в памяти и пишет их одной транзакцией раз в
+WRITE_BEHIND_FLUSH_MS или когда набралось WRITE_BEHIND_MAX_ITEMS записей:
+    - accounts.done / date_of_finish (UPDATE ... WHERE done = false)
+    - proxies: used_count / success_count / fail_streak / cooldown_until
+    - expiry_notifications (только отсутствующие строки)
+
+Квота API ключей сюда не входит: её нужно резервировать до запроса
+(api_keys.claim_key_quota), отложенный счётчик позволил бы превысить лимит.
+
+Все операции идемпотентны или являются SQL-инкрементами: пакет удаляется
+из буфера только после успешного commit, при ошибке он возвращается в
+буфер и применяется со следующим flush. При остановке процесса буфер
+сбрасывается (stop_write_behind() / atexit).
+"""
+
+import atexit
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from ..models import Account, Proxy, ExpiryNotification, account_norm
+    from ..config import get_settings
+    from ..database import insert_ignore
+except ImportError:
+    from models import Account, Proxy, ExpiryNotification, account_norm
+    from config import get_settings
+    from database import insert_ignore
+
+
+@dataclass
+class ProxyDelta:
+    """Accumulated proxy usage since the last flush."""
+    used: int = 0
+    success: int = 0
+    # Неудачи после последнего успеха (или с начала пакета)
+    trailing_fails: int = 0
+    # В пакете был успех: fail_streak считается заново
+    reset: bool = False
+    cooldown_until: Optional[datetime] = None
+    last_checked: Optional[datetime] = None
+
+    def merge(self, newer: "ProxyDelta") -> None:
+        """Apply a later delta on top of this one."""
+        self.used += newer.used
+        self.success += newer.success
+        if newer.reset:
+            self.reset = True
+            self.trailing_fails = newer.trailing_fails
+            self.cooldown_until = newer.cooldown_until
+        else:
+            self.trailing_fails += newer.trailing_fails
+            self.cooldown_until = newer.cooldown_until or self.cooldown_until
+        self.last_checked = newer.last_checked or self.last_checked
+
+
+class WriteBehindBuffer:
+    """Collects small writes in memory and flushes them in one transaction."""
+
+    def __init__(self, SessionLocal: sessionmaker, flush_ms: Optional[int] = None, max_items: Optional[int] = None):
+        """
+        Initialize buffer.
+
+        Args:
+            SessionLocal: SQLAlchemy session factory used for flushes
+            flush_ms: Flush interval in milliseconds (default: settings)
+            max_items: Flush early when this many items are buffered (default: settings)
+        """
+        settings = get_settings()
+        self._SessionLocal = SessionLocal
+        self.flush_ms = flush_ms or settings.write_behind_flush_ms
+        self.max_items = max_items or settings.write_behind_max_items
+
+        self._lock = threading.Lock()
+        # Один flush за раз: иначе пакеты могут примениться не по порядку
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._accounts_done: Dict[Tuple[int, str], date] = {}
+        self._proxies: Dict[int, ProxyDelta] = {}
+        self._notifications: Set[Tuple[int, int, str, date]] = set()
+
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failed_flushes = 0
+
+    # ---------- Buffered writes ----------
+
+    def mark_account_done(self, user_id: int, username: str) -> None:
+        """Buffer accounts.done = True for the user's account."""
+        with self._lock:
+            self._accounts_done.setdefault((user_id, account_norm(username)), date.today())
+        self._maybe_wake()
+
+    def record_proxy_result(self, proxy_id: int, success: bool, cooldown_seconds: int = 0) -> None:
+        """Buffer proxy statistics for one use (same rules as update_proxy_stats)."""
+        now = datetime.now()
+        with self._lock:
+            delta = self._proxies.setdefault(proxy_id, ProxyDelta())
+            delta.used += 1
+            delta.last_checked = now
+            if success:
+                delta.success += 1
+                delta.reset = True
+                delta.trailing_fails = 0
+                delta.cooldown_until = None
+            else:
+                delta.trailing_fails += 1
+                if cooldown_seconds > 0:
+                    delta.cooldown_until = now + timedelta(seconds=cooldown_seconds)
+        self._maybe_wake()
+
+    def mark_notification_sent(self, user_id: int, account_id: int, notification_type: str) -> None:
+        """Buffer an ExpiryNotification row for today."""
+        with self._lock:
+            self._notifications.add((user_id, account_id, notification_type, date.today()))
+        self._maybe_wake()
+
+    def pending(self) -> int:
+        """Number of buffered items."""
+        with self._lock:
+            return self._pending_locked()
+
+    def _pending_locked(self) -> int:
+        return len(self._accounts_done) + len(self._proxies) + len(self._notifications)
+
+    def _maybe_wake(self) -> None:
+        # Сам flush делает фоновый поток: вызывающий код (event loop) не ждёт БД
+        if self.pending() >= self.max_items:
+            self._wake.set()
+
+    # ---------- Flush ----------
+
+    def flush(self) -> int:
+        """
+        Write all buffered items in one transaction.
+
+        Returns:
+            Number of flushed items (0 if the buffer was empty or the flush failed)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = (self._accounts_done, self._proxies, self._notifications)
+                count = self._pending_locked()
+                self._accounts_done, self._proxies, self._notifications = {}, {}, set()
+            if not count:
+                return 0
+
+            try:
+                with self._SessionLocal() as session:
+                    try:
+                        self._apply(session, *batch)
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        raise
+            except Exception as e:
+                self._restore(*batch)
+                self.failed_flushes += 1
+                print(f"[WRITE-BEHIND] ⚠️ Flush of {count} items failed, will retry: {e}")
+                return 0
+
+            self.flushes += 1
+            self.flushed_items += count
+            return count
+
+    def _apply(self, session, accounts_done, proxies, notifications) -> None:
+        # Accounts: one UPDATE per (user, date)
+        by_user: Dict[Tuple[int, date], List[str]] = defaultdict(list)
+        for (user_id, norm), finished in accounts_done.items():
+            by_user[(user_id, finished)].append(norm)
+        for (user_id, finished), norms in by_user.items():
+            session.execute(
+                update(Account)
+                .where(Account.user_id == user_id, Account.account_norm.in_(norms), Account.done == False)
+                .values(done=True, date_of_finish=finished)
+                .execution_options(synchronize_session=False)
+            )
+
+        # Proxies
+        for proxy_id, delta in proxies.items():
+            values = {
+                "used_count": func.coalesce(Proxy.used_count, 0) + delta.used,
+                "success_count": func.coalesce(Proxy.success_count, 0) + delta.success,
+                "last_checked": delta.last_checked,
+            }
+            if delta.reset:
+                values["fail_streak"] = delta.trailing_fails
+            elif delta.trailing_fails:
+                values["fail_streak"] = func.coalesce(Proxy.fail_streak, 0) + delta.trailing_fails
+            if delta.cooldown_until is not None:
+                values["cooldown_until"] = delta.cooldown_until
+            elif delta.reset:
+                values["cooldown_until"] = None
+            session.execute(
+                update(Proxy).where(Proxy.id == proxy_id).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+        # Expiry notifications: rows that are already there are skipped (uq_expiry_notification)
+        if notifications:
+            rows = [
+                {"user_id": u, "account_id": a, "notification_type": t, "notification_date": d}
+                for (u, a, t, d) in notifications
+            ]
+            session.execute(insert_ignore(session, ExpiryNotification), rows)
+
+    def _restore(self, accounts_done, proxies, notifications) -> None:
+        """Put a failed batch back (newer buffered items win / are merged on top)."""
+        with self._lock:
+            for key, finished in accounts_done.items():
+                self._accounts_done.setdefault(key, finished)
+            for proxy_id, older in proxies.items():
+                newer = self._proxies.get(proxy_id)
+                if newer is not None:
+                    older.merge(newer)
+                self._proxies[proxy_id] = older
+            self._notifications |= notifications
+
+    # ---------- Background thread ----------
+
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        print(f"[WRITE-BEHIND] 🚀 Started (every {self.flush_ms} ms or {self.max_items} items)")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[WRITE-BEHIND] ❌ Flush error: {e}")
+
+    def close(self) -> None:
+        """Stop the background thread and flush everything that is left."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.flush()
+        left = self.pending()
+        if left:
+            print(f"[WRITE-BEHIND] ❌ {left} items could not be written on shutdown")
+        print(f"[WRITE-BEHIND] 🛑 Stopped (flushes: {self.flushes}, items: {self.flushed_items})")
+
+
+# Global buffer instance (None = writes go straight to the DB)
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def start_write_behind(SessionLocal: sessionmaker) -> Optional[WriteBehindBuffer]:
+    """Start the process-wide buffer (no-op if WRITE_BEHIND=false)."""
+    global _buffer
+    if not get_settings().write_behind:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(SessionLocal)
+            _buffer.start()
+            atexit.register(stop_write_behind)
+        return _buffer
+
+
+def get_write_behind() -> Optional[WriteBehindBuffer]:
+    """Get the running buffer, or None if writes should go straight to the DB."""
+    return _buffer
+
+
+def stop_write_behind() -> None:
+    """Flush and stop the process-wide buffer."""
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.close()
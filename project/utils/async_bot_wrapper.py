@@ -1,120 +1,249 @@
 import asyncio
 import aiohttp
 import json
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    from ..config import get_settings
+    from ..services.http_sessions import get_session_manager
+    from .telegram_transport import TokenBucket
+except ImportError:
+    from config import get_settings
+    from services.http_sessions import get_session_manager
+    from utils.telegram_transport import TokenBucket
+
+
+TELEGRAM_SESSION = "telegram"
 
 
 class AsyncBotWrapper:
     """
     Асинхронная обертка для нашего TelegramBot для совместимости с ThreadSafeBotProxy.
+
+    Все запросы идут через общую keep-alive сессию текущего event loop
+    (services.http_sessions), поэтому пачка уведомлений не открывает
+    новое TLS-соединение на каждое сообщение. Используйте get_async_bot(),
+    чтобы получить общий экземпляр на процесс.
     """
-    def __init__(self, bot_token: str):
+    def __init__(self, bot_token: str, send_rate: Optional[float] = None, max_retries: int = 3):
+        settings = get_settings()
         self.token = bot_token
         self.api_url = f"https://api.telegram.org/bot{bot_token}"
-    
+        self.max_retries = max_retries
+        rate = send_rate or settings.telegram_send_rate
+        self._bucket = TokenBucket(rate, rate)
+
+    def _session(self) -> aiohttp.ClientSession:
+        """Pooled session bound to the running event loop."""
+        return get_session_manager().get_session(TELEGRAM_SESSION, 30)
+
+    async def _post(self, method: str, data: Optional[Dict[str, Any]] = None,
+                    files: Optional[Dict[str, tuple]] = None, timeout: float = 10) -> Dict[str, Any]:
+        """
+        API call with retry on 429 (retry_after).
+
+        Args:
+            method: Bot API method
+            data: Request fields
+            files: {field: (path, filename, content_type)} for multipart uploads
+            timeout: Request timeout (seconds)
+
+        Returns:
+            Telegram response dict
+        """
+        url = f"{self.api_url}/{method}"
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            if files:
+                # FormData нельзя отправить повторно - собираем на каждую попытку
+                payload = {"data": await _build_form(data or {}, files)}
+            else:
+                payload = {"json": data}
+            async with self._session().post(url, timeout=aiohttp.ClientTimeout(total=timeout), **payload) as response:
+                result = await response.json(content_type=None)
+
+            if not result.get("ok", False) and result.get("error_code") == 429 and attempt < self.max_retries:
+                attempt += 1
+                retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+                print(f"Telegram API 429, retry after {retry_after}s")
+                self._bucket.block_for(retry_after)
+                continue
+            return result
+
+    async def close(self) -> None:
+        """Close pooled Telegram session of the running event loop."""
+        await get_session_manager().close(TELEGRAM_SESSION)
+
     async def send_message(
-        self, 
-        chat_id: int, 
-        text: str, 
+        self,
+        chat_id: int,
+        text: str,
         reply_markup: Optional[Dict] = None,
         parse_mode: str = "HTML"
     ) -> bool:
         """Send message to chat."""
-        url = f"{self.api_url}/sendMessage"
         data = {
             "chat_id": chat_id,
             "text": text,
             "parse_mode": parse_mode
         }
-        
+
         if reply_markup:
             data["reply_markup"] = json.dumps(reply_markup)
-        
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data, timeout=10) as response:
-                    result = await response.json()
-                    if not result.get("ok", False):
-                        print(f"Telegram API error: {result.get('description', 'Unknown error')}")
-                        print(f"Error code: {result.get('error_code', 'N/A')}")
-                        return False
-                    return True
+            result = await self._post("sendMessage", data)
+            if not result.get("ok", False):
+                print(f"Telegram API error: {result.get('description', 'Unknown error')}")
+                print(f"Error code: {result.get('error_code', 'N/A')}")
+                return False
+            return True
         except Exception as e:
             print(f"Error sending message: {e}")
             # Try to send without HTML parsing if that's the issue
             try:
                 data.pop("parse_mode", None)
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=data, timeout=10) as response:
-                        result = await response.json()
-                        if not result.get("ok", False):
-                            print(f"Telegram API error (retry): {result.get('description', 'Unknown error')}")
-                            return False
-                        return True
+                result = await self._post("sendMessage", data)
+                if not result.get("ok", False):
+                    print(f"Telegram API error (retry): {result.get('description', 'Unknown error')}")
+                    return False
+                return True
             except Exception as e2:
                 print(f"Error sending message (retry): {e2}")
                 return False
-    
+
     async def send_photo(
-        self, 
-        chat_id: int, 
-        photo_path: str, 
+        self,
+        chat_id: int,
+        photo_path: str,
         caption: Optional[str] = None,
         parse_mode: str = "HTML"
     ) -> bool:
         """Send photo to chat."""
-        url = f"{self.api_url}/sendPhoto"
-        
+        data = {"chat_id": chat_id}
+        if caption:
+            data["caption"] = caption
+            data["parse_mode"] = parse_mode
+
         try:
-            from aiohttp import FormData
-            
-            form_data = FormData()
-            form_data.add_field('chat_id', str(chat_id))
-            
-            if caption:
-                form_data.add_field('caption', caption)
-                form_data.add_field('parse_mode', parse_mode)
-            
-            with open(photo_path, 'rb') as photo:
-                form_data.add_field('photo', photo, filename='screenshot.png', content_type='image/png')
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=form_data, timeout=30) as response:
-                        response.raise_for_status()
-                        result = await response.json()
-                        return result.get("ok", False)
+            result = await self._post(
+                "sendPhoto", data,
+                files={"photo": (photo_path, "screenshot.png", "image/png")},
+                timeout=30,
+            )
+            return result.get("ok", False)
         except Exception as e:
             print(f"Error sending photo: {e}")
             return False
-    
+
     async def send_document(
-        self, 
-        chat_id: int, 
-        document_path: str, 
+        self,
+        chat_id: int,
+        document_path: str,
         caption: Optional[str] = None,
         parse_mode: str = "HTML"
     ) -> bool:
         """Send document to chat."""
-        url = f"{self.api_url}/sendDocument"
-        
+        data = {"chat_id": chat_id}
+        if caption:
+            data["caption"] = caption
+            data["parse_mode"] = parse_mode
+
         try:
-            from aiohttp import FormData
-            
-            form_data = FormData()
-            form_data.add_field('chat_id', str(chat_id))
-            
-            if caption:
-                form_data.add_field('caption', caption)
-                form_data.add_field('parse_mode', parse_mode)
-            
-            with open(document_path, 'rb') as document:
-                form_data.add_field('document', document, filename='document.pdf', content_type='application/pdf')
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=form_data, timeout=30) as response:
-                        response.raise_for_status()
-                        result = await response.json()
-                        return result.get("ok", False)
+            result = await self._post(
+                "sendDocument", data,
+                files={"document": (document_path, "document.pdf", "application/pdf")},
+                timeout=30,
+            )
+            return result.get("ok", False)
         except Exception as e:
             print(f"Error sending document: {e}")
             return False
+
+    async def send_many(self, messages: List[Dict[str, Any]], concurrency: Optional[int] = None) -> List[bool]:
+        """
+        Send a batch of notifications over the pooled session.
+
+        Each message is a dict with "chat_id" and "text", optionally
+        "reply_markup", "parse_mode" and "photo_path". With "photo_path" the
+        text is used as caption; if the photo fails, the text is sent alone.
+        Messages to the same chat keep their order.
+
+        Args:
+            messages: Messages to send
+            concurrency: Max requests in flight (default: settings.telegram_send_concurrency)
+
+        Returns:
+            List of delivery flags in the same order as messages
+        """
+        if not messages:
+            return []
+
+        semaphore = asyncio.Semaphore(concurrency or get_settings().telegram_send_concurrency)
+        results: List[bool] = [False] * len(messages)
+
+        # Сообщения одного чата отправляем последовательно, чаты - параллельно
+        by_chat: Dict[Any, List[int]] = {}
+        for index, message in enumerate(messages):
+            by_chat.setdefault(message["chat_id"], []).append(index)
+
+        async def send_one(message: Dict[str, Any]) -> bool:
+            parse_mode = message.get("parse_mode", "HTML")
+            photo_path = message.get("photo_path")
+            if photo_path:
+                if await self.send_photo(message["chat_id"], photo_path, message.get("text"), parse_mode):
+                    return True
+                print(f"Photo to {message['chat_id']} failed, sending text only")
+            return await self.send_message(
+                message["chat_id"], message["text"],
+                reply_markup=message.get("reply_markup"), parse_mode=parse_mode,
+            )
+
+        async def send_chat(indexes: List[int]) -> None:
+            for index in indexes:
+                async with semaphore:
+                    try:
+                        results[index] = await send_one(messages[index])
+                    except Exception as e:
+                        print(f"Error sending message to {messages[index]['chat_id']}: {e}")
+
+        await asyncio.gather(*(send_chat(indexes) for indexes in by_chat.values()))
+        print(f"[ASYNC-BOT] 📤 Batch sent: {sum(results)}/{len(messages)}")
+        return results
+
+
+async def _build_form(data: Dict[str, Any], files: Dict[str, tuple]) -> aiohttp.FormData:
+    form = aiohttp.FormData()
+    for name, value in data.items():
+        form.add_field(name, str(value))
+    for field, (path, filename, content_type) in files.items():
+        content = await asyncio.to_thread(_read_file, path)
+        form.add_field(field, content, filename=filename, content_type=content_type)
+    return form
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Shared wrappers (one per bot token per process)
+_wrappers: Dict[str, AsyncBotWrapper] = {}
+_wrappers_lock = threading.Lock()
+
+
+def get_async_bot(bot_token: str) -> AsyncBotWrapper:
+    """
+    Get shared AsyncBotWrapper for the bot token.
+
+    The wrapper itself is loop-agnostic; connections are pooled per event loop
+    and closed with close_http_sessions() / AsyncBotWrapper.close().
+    """
+    with _wrappers_lock:
+        wrapper = _wrappers.get(bot_token)
+        if wrapper is None:
+            wrapper = AsyncBotWrapper(bot_token)
+            _wrappers[bot_token] = wrapper
+        return wrapper
@@ -25,4 +25,7 @@ class ThreadSafeBotProxy:
     async def send_document(self, *args: Any, **kwargs: Any):
         return await self._call(self._bot.send_document(*args, **kwargs))
 
+    async def send_many(self, *args: Any, **kwargs: Any):
+        return await self._call(self._bot.send_many(*args, **kwargs))
+
     # при необходимости добавляйте другие методы бота таким же образом
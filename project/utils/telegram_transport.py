@@ -0,0 +1,290 @@
+"""
+Асинхронный транспорт Telegram Bot API.
+
+- Long polling getUpdates через aiohttp (не блокирует event loop)
+- Один keep-alive ClientSession на все вызовы
+- Очередь исходящих сообщений: на каждый чат своя FIFO-очередь,
+  глобальный лимит (30 msg/s) и лимит на чат (1 msg/s с небольшим burst)
+- 429 Too Many Requests: ждём retry_after и повторяем, сообщение не теряется
+
+Транспорт живёт в главном event loop бота. Синхронный код (обработчики
+в отдельном потоке, фоновые проверки) отправляет сообщения через submit(),
+который потокобезопасен и возвращает concurrent.futures.Future.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+
+
+# Методы, которые создают новые сообщения в чате - к ним применяется лимит на чат
+PACED_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "sendMediaGroup"}
+
+
+class TokenBucket:
+    """Token bucket rate limiter (asyncio)."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def block_for(self, seconds: float) -> None:
+        """Block bucket (e.g. after 429 retry_after)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # Tokens start refilling only after the block ends
+        self._tokens = 0
+        self._updated = self._blocked_until
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if self._blocked_until > now:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramTransport:
+    """Async Telegram Bot API transport with pooled session and send queue."""
+
+    def __init__(
+        self,
+        token: str,
+        global_rate: float = 30.0,
+        per_chat_rate: float = 1.0,
+        per_chat_burst: float = 3.0,
+        max_retries: int = 5,
+        request_timeout: float = 30.0,
+    ):
+        """
+        Initialize transport.
+
+        Args:
+            token: Telegram bot token
+            global_rate: Max outgoing requests per second (all chats)
+            per_chat_rate: Max new messages per second in one chat
+            per_chat_burst: Burst of messages allowed in one chat
+            max_retries: Max retries on 429 / network errors
+            request_timeout: Timeout for regular API calls (seconds)
+        """
+        self.token = token
+        self.api_url = f"https://api.telegram.org/bot{token}"
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._chat_queues: Dict[Any, Deque[Tuple]] = {}
+        self._chat_workers: Dict[Any, asyncio.Task] = {}
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+
+        self.sent = 0
+        self.retried = 0
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def in_loop_thread(self) -> bool:
+        """True if called from the thread running the transport loop."""
+        return self._thread_id == threading.get_ident()
+
+    async def start(self) -> None:
+        """Create pooled session bound to the running loop."""
+        if self._session is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        connector = aiohttp.TCPConnector(limit=40, ttl_dns_cache=300, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+        print(f"[TG-TRANSPORT] 🚀 Async transport started")
+
+    async def close(self) -> None:
+        """Flush pending sends (best effort) and close session."""
+        workers = list(self._chat_workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=10)
+        for task in list(self._chat_workers.values()):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        print(f"[TG-TRANSPORT] 🛑 Transport closed (sent: {self.sent}, retried: {self.retried})")
+
+    # ---------- Low level ----------
+
+    async def _post(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Tuple]] = None,
+                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Single API call (no retries)."""
+        url = f"{self.api_url}/{method}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.request_timeout)
+
+        if files:
+            form = aiohttp.FormData()
+            for name, value in data.items():
+                if value is None:
+                    continue
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value)
+                form.add_field(name, str(value))
+            for field, (path, filename, content_type) in files.items():
+                content = await asyncio.to_thread(_read_file, path)
+                form.add_field(field, content, filename=filename, content_type=content_type)
+            async with self._session.post(url, data=form, timeout=client_timeout) as resp:
+                return await resp.json(content_type=None)
+
+        async with self._session.post(url, json=data, timeout=client_timeout) as resp:
+            return await resp.json(content_type=None)
+
+    async def request(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Tuple]] = None,
+                      chat_id: Any = None) -> Dict[str, Any]:
+        """
+        API call with retries on 429 (retry_after) and network errors.
+
+        Returns:
+            Telegram response dict ({"ok": bool, ...})
+        """
+        attempt = 0
+        while True:
+            await self._global_bucket.acquire()
+            try:
+                result = await self._post(method, data, files)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    print(f"[TG-TRANSPORT] ❌ {method} failed: {e}")
+                    return {"ok": False, "description": str(e)}
+                self.retried += 1
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+
+            if not result.get("ok") and result.get("error_code") == 429:
+                attempt += 1
+                retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+                if attempt > self.max_retries:
+                    print(f"[TG-TRANSPORT] ❌ {method}: 429 after {self.max_retries} retries")
+                    return result
+                self.retried += 1
+                print(f"[TG-TRANSPORT] ⏳ 429 Too Many Requests, retry after {retry_after}s")
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).block_for(retry_after)
+                else:
+                    self._global_bucket.block_for(retry_after)
+                await asyncio.sleep(retry_after)
+                continue
+
+            self.sent += 1
+            return result
+
+    # ---------- Send queue ----------
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def enqueue(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Tuple]] = None,
+                chat_id: Any = None) -> asyncio.Future:
+        """
+        Put API call into per-chat FIFO queue (must be called in transport loop).
+
+        Returns:
+            asyncio.Future with Telegram response dict
+        """
+        future = self._loop.create_future()
+        if chat_id is None:
+            chat_id = data.get("chat_id")
+        queue = self._chat_queues.setdefault(chat_id, deque())
+        queue.append((method, data, files, future))
+        if chat_id not in self._chat_workers:
+            self._chat_workers[chat_id] = self._loop.create_task(self._chat_worker(chat_id))
+        return future
+
+    async def _chat_worker(self, chat_id: Any) -> None:
+        queue = self._chat_queues[chat_id]
+        try:
+            while queue:
+                method, data, files, future = queue.popleft()
+                if future.cancelled():
+                    continue
+                if method in PACED_METHODS:
+                    await self._chat_bucket(chat_id).acquire()
+                try:
+                    result = await self.request(method, data, files, chat_id=chat_id)
+                except Exception as e:
+                    result = {"ok": False, "description": str(e)}
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._chat_workers.pop(chat_id, None)
+            if not queue:
+                self._chat_queues.pop(chat_id, None)
+
+    async def call(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Tuple]] = None,
+                   chat_id: Any = None) -> Dict[str, Any]:
+        """Queue API call and await its response (from any event loop)."""
+        if asyncio.get_running_loop() is self._loop:
+            return await self.enqueue(method, data, files, chat_id)
+        return await asyncio.wrap_future(self.submit(method, data, files, chat_id))
+
+    def submit(self, method: str, data: Dict[str, Any], files: Optional[Dict[str, Tuple]] = None,
+               chat_id: Any = None) -> concurrent.futures.Future:
+        """Queue API call from any thread (thread-safe)."""
+        async def _enqueue_and_wait():
+            return await self.enqueue(method, data, files, chat_id)
+        return asyncio.run_coroutine_threadsafe(_enqueue_and_wait(), self._loop)
+
+    def pending(self) -> int:
+        """Number of queued (not yet sent) API calls."""
+        return sum(len(q) for q in self._chat_queues.values())
+
+    # ---------- Updates ----------
+
+    async def get_updates(self, offset: int, timeout: int = 30) -> List[Dict[str, Any]]:
+        """Long polling getUpdates (does not block the event loop)."""
+        try:
+            result = await self._post(
+                "getUpdates",
+                {"offset": offset, "timeout": timeout},
+                timeout=timeout + 10,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error getting updates: {e}")
+            await asyncio.sleep(1)
+            return []
+        if not result.get("ok"):
+            if result.get("error_code") == 429:
+                await asyncio.sleep((result.get("parameters") or {}).get("retry_after", 1))
+            return []
+        return result.get("result", [])
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,268 @@
+"""
+Check worker process.
+
+Забирает задания проверки из очереди check_jobs (services/job_queue.py),
+выполняет их (API + proxy/скриншот или API v2) и отправляет уведомления.
+Бот в режиме CHECK_QUEUE_ENABLED=true только ставит задания в очередь.
+
+Запуск (можно несколько процессов, в том числе на разных машинах с общим Postgres):
+    python run_worker.py --concurrency 3
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from .config import get_settings
+    from .database import (
+        get_engine, get_session_factory, init_db, async_engine_for, get_async_session_factory, open_session, run_db,
+    )
+    from .models import Account, User, CheckJob
+    from .services.job_queue import (
+        lease_jobs, extend_lease, complete_job, fail_job, queue_stats, purge_finished_jobs, JOB_SOURCE_ADD,
+    )
+    from .services.traffic_monitor import get_traffic_monitor
+    from .services.browser_pool import start_browser_pool, close_browser_pool
+    from .services.http_sessions import close_http_sessions
+    from .services.profile_renderer import shutdown_render_pool
+    from .services.write_behind import start_write_behind, stop_write_behind
+    from .services.stage_limits import set_stage_limits, STAGE_IMAGE
+    from .services.check_schedule import OUTCOME_UNCHANGED, added_at, plan_next_check, save_check_schedule
+    from .cron.auto_checker_optimized import check_single_account_optimized, send_notifications
+    from .utils.async_bot_wrapper import get_async_bot
+except ImportError:
+    from config import get_settings
+    from database import (
+        get_engine, get_session_factory, init_db, async_engine_for, get_async_session_factory, open_session, run_db,
+    )
+    from models import Account, User, CheckJob
+    from services.job_queue import (
+        lease_jobs, extend_lease, complete_job, fail_job, queue_stats, purge_finished_jobs, JOB_SOURCE_ADD,
+    )
+    from services.traffic_monitor import get_traffic_monitor
+    from services.browser_pool import start_browser_pool, close_browser_pool
+    from services.http_sessions import close_http_sessions
+    from services.profile_renderer import shutdown_render_pool
+    from services.write_behind import start_write_behind, stop_write_behind
+    from services.stage_limits import set_stage_limits, STAGE_IMAGE
+    from services.check_schedule import OUTCOME_UNCHANGED, added_at, plan_next_check, save_check_schedule
+    from cron.auto_checker_optimized import check_single_account_optimized, send_notifications
+    from utils.async_bot_wrapper import get_async_bot
+
+
+# Чистка done / failed заданий (несколько воркеров - каждый чистит сам, DELETE идемпотентен)
+PURGE_INTERVAL_SECONDS = 600
+
+
+class CheckWorker:
+    """Leases check jobs from the DB queue and runs them concurrently."""
+
+    def __init__(
+        self,
+        SessionLocal: sessionmaker,
+        bot=None,
+        worker_id: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        AsyncSessionLocal: Optional[async_sessionmaker] = None,
+    ):
+        """
+        Initialize worker.
+
+        Args:
+            SessionLocal: SQLAlchemy session factory
+            bot: AsyncBotWrapper for notifications
+            worker_id: Unique worker name (default: host:pid)
+            concurrency: Jobs processed at the same time (default: settings)
+            lease_seconds: Job visibility timeout (default: settings)
+            poll_seconds: Delay between polls when the queue is empty (default: settings)
+            AsyncSessionLocal: Async session factory; when set, jobs use AsyncSession
+        """
+        settings = get_settings()
+        self._SessionLocal = SessionLocal
+        self._sessions = AsyncSessionLocal or SessionLocal
+        self._bot = bot
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency or settings.check_worker_concurrency
+        self.lease_seconds = lease_seconds or settings.check_job_lease_seconds
+        self.poll_seconds = poll_seconds or settings.check_worker_poll_seconds
+
+        self._running: Dict[int, asyncio.Task] = {}
+        self._next_purge = 0.0
+        self.processed = 0
+        self.failed = 0
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Poll the queue until stop_event is set, then wait for running jobs."""
+        set_stage_limits({STAGE_IMAGE: get_settings().check_image_workers})
+        print(f"[WORKER {self.worker_id}] 🚀 Started (concurrency: {self.concurrency}, lease: {self.lease_seconds}s)")
+
+        while not stop_event.is_set():
+            await self._purge_if_due()
+            free = self.concurrency - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    async with open_session(self._sessions) as session:
+                        jobs = await run_db(session, lease_jobs, self.worker_id, free, self.lease_seconds)
+                except Exception as e:
+                    print(f"[WORKER {self.worker_id}] ❌ Failed to lease jobs: {e}")
+
+            for job in jobs:
+                task = asyncio.create_task(self._process(job))
+                self._running[job.id] = task
+                task.add_done_callback(lambda _, job_id=job.id: self._running.pop(job_id, None))
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            elif len(self._running) >= self.concurrency:
+                # All slots busy - wait until one of the jobs finishes
+                await asyncio.wait(list(self._running.values()), return_when=asyncio.FIRST_COMPLETED)
+
+        if self._running:
+            print(f"[WORKER {self.worker_id}] ⏳ Waiting for {len(self._running)} running jobs...")
+            await asyncio.wait(list(self._running.values()), timeout=self.lease_seconds)
+        print(f"[WORKER {self.worker_id}] 🛑 Stopped (processed: {self.processed}, failed: {self.failed})")
+
+    async def _purge_if_due(self) -> None:
+        """Delete old finished jobs and jobs of deleted accounts (every PURGE_INTERVAL_SECONDS)."""
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL_SECONDS
+        try:
+            async with open_session(self._sessions) as session:
+                purged = await run_db(session, purge_finished_jobs)
+            if purged:
+                print(f"[WORKER {self.worker_id}] 🧹 Purged {purged} finished jobs")
+        except Exception as e:
+            print(f"[WORKER {self.worker_id}] ⚠️ Failed to purge finished jobs: {e}")
+
+    async def _heartbeat(self, job_id: int) -> None:
+        """Extend the lease while the job is running."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            async with open_session(self._sessions) as session:
+                if not await run_db(session, extend_lease, job_id, self.worker_id, self.lease_seconds):
+                    print(f"[WORKER {self.worker_id}] ⚠️ Lease lost for job {job_id}")
+                    return
+
+    async def _process(self, job: CheckJob) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            async with open_session(self._sessions) as session:
+                acc = await run_db(session, lambda s: s.get(Account, job.account_id))
+                user = await run_db(session, lambda s: s.get(User, job.user_id))
+                if acc is None or user is None or acc.done:
+                    await run_db(session, complete_job, job.id, self.worker_id, {"skipped": True})
+                    return
+
+                print(f"[WORKER {self.worker_id}] 🔍 Job {job.id}: @{acc.account} (attempt {job.attempts}/{job.max_attempts})")
+                _, result = await check_single_account_optimized(
+                    acc, job.user_id, user, session, get_traffic_monitor(), self._bot
+                )
+
+                if result['error']:
+                    status = await run_db(session, fail_job, job.id, self.worker_id, result['message'] or "check_error")
+                    self.failed += 1
+                    print(f"[WORKER {self.worker_id}] ❌ Job {job.id} @{acc.account}: {result['message']} -> {status}")
+                    return
+
+                if not result['success']:
+                    # Всё ещё не найден: следующая проверка по расписанию аккаунта (commit в complete_job)
+                    next_check_at, level = plan_next_check(
+                        datetime.now(), user.auto_check_interval or 5, acc.check_backoff,
+                        added_at(acc.from_date_time, acc.from_date), OUTCOME_UNCHANGED,
+                    )
+                    await run_db(session, save_check_schedule, [
+                        {"id": acc.id, "next_check_at": next_check_at, "check_backoff": level}
+                    ])
+
+                await run_db(session, complete_job, job.id, self.worker_id, {
+                    "success": result['success'],
+                    "message": result['message'],
+                    "screenshot_path": result['screenshot_path'],
+                })
+                self.processed += 1
+
+                notifications = []
+                if result.get('notification'):
+                    notifications.append(result['notification'])
+                elif job.source == JOB_SOURCE_ADD and not result['success']:
+                    notifications.append({
+                        "chat_id": job.user_id,
+                        "text": f"❌ <a href='https://www.instagram.com/{acc.account}/'>@{acc.account}</a> не найден",
+                    })
+                await send_notifications(self._bot, notifications)
+        except Exception as e:
+            print(f"[WORKER {self.worker_id}] ❌ Job {job.id} crashed: {e}")
+            self.failed += 1
+            try:
+                async with open_session(self._sessions) as session:
+                    await run_db(session, fail_job, job.id, self.worker_id, str(e))
+            except Exception as db_e:
+                print(f"[WORKER {self.worker_id}] ⚠️ Failed to return job {job.id} to queue: {db_e}")
+        finally:
+            heartbeat.cancel()
+
+
+async def main(argv=None) -> None:
+    """Worker entry point."""
+    parser = argparse.ArgumentParser(description="Check worker (DB job queue)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Jobs processed at the same time")
+    parser.add_argument("--worker-id", default=None, help="Unique worker name (default: host:pid)")
+    args = parser.parse_args(argv)
+
+    settings = get_settings()
+    engine = get_engine(settings.db_url)
+    init_db(engine)
+    session_factory = get_session_factory(engine)
+    start_write_behind(session_factory)
+
+    with session_factory() as session:
+        print(f"[WORKER] 📊 Queue: {queue_stats(session)}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка через Ctrl+C (KeyboardInterrupt)
+            pass
+
+    try:
+        await start_browser_pool()
+    except Exception as e:
+        print(f"[WORKER] ⚠️ Browser pool not started, falling back to per-check launch: {e}")
+
+    async_engine = async_engine_for(session_factory) if settings.db_async else None
+    worker = CheckWorker(
+        session_factory,
+        bot=get_async_bot(settings.bot_token),
+        worker_id=args.worker_id,
+        concurrency=args.concurrency,
+        AsyncSessionLocal=get_async_session_factory(async_engine) if async_engine is not None else None,
+    )
+    try:
+        await worker.run(stop_event)
+    finally:
+        await close_browser_pool()
+        await close_http_sessions()
+        shutdown_render_pool()
+        if async_engine is not None:
+            await async_engine.dispose()
+        stop_write_behind()
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""Entry point for a check worker process (DB job queue)."""
+
+import sys
+import os
+import asyncio
+
+# Add project directory to Python path
+project_dir = os.path.join(os.path.dirname(__file__), 'project')
+sys.path.insert(0, project_dir)
+
+# Now import and run the worker
+from worker import main
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,74 @@
+"""Test script for batched RapidAPI checks (fake API, in-memory DB)."""
+
+import asyncio
+import sys
+import os
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, APIKey, Account
+from config import get_settings
+import services.check_via_api as check_via_api
+
+
+async def test_api_batch():
+    """Usernames are spread across keys, quota is respected, results stream."""
+    print("=" * 70)
+    print("Testing batched API check")
+    print("=" * 70)
+
+    settings = get_settings()
+    engine = get_engine("sqlite:///:memory:")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    calls = []
+
+    async def fake_request_profile(key_value, username):
+        calls.append(key_value)
+        await asyncio.sleep(0.01)
+        if username.startswith("found"):
+            return {"result": {"username": username}}
+        return {"success": False, "message": "User not found"}
+
+    check_via_api._request_profile = fake_request_profile
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        # Key 2 has only 3 requests of quota left
+        session.add(APIKey(user_id=1, key="key-1", qty_req=0))
+        session.add(APIKey(user_id=1, key="key-2", qty_req=settings.api_daily_limit - 3))
+        usernames = [f"found{i}" for i in range(5)] + [f"missing{i}" for i in range(15)]
+        for name in usernames:
+            session.add(Account(user_id=1, account=name))
+        session.commit()
+
+        results = []
+        async for info in check_via_api.check_accounts_exist_via_api_batch(
+            session, 1, usernames, per_key_concurrency=3, per_key_rps=1000
+        ):
+            results.append(info)
+
+        assert len(results) == len(usernames), len(results)
+        assert sum(1 for r in results if r["exists"] is True) == 5
+        assert calls.count("key-2") <= 3, calls.count("key-2")
+        assert calls.count("key-1") >= 17, calls.count("key-1")
+        done = session.query(Account).filter(Account.done == True).count()
+        assert done == 5, done
+        print(f"   ✅ {len(results)} results, key-1: {calls.count('key-1')}, key-2: {calls.count('key-2')}")
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_api_batch())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
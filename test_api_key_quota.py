@@ -0,0 +1,91 @@
+"""Test script for atomic API key quota accounting (temporary SQLite DB, concurrent threads)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, APIKey
+from config import get_settings
+from services.api_keys import claim_key_quota, release_key_quota, exhaust_key_quota, usage_today, list_keys_for_user
+
+
+async def test_api_key_quota():
+    """Parallel claims never oversubscribe a key; new day, release and exhaust."""
+    print("=" * 70)
+    print("Testing atomic API key quota")
+    print("=" * 70)
+
+    limit = get_settings().api_daily_limit
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'quota.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(APIKey(id=1, user_id=1, key="key-1", qty_req=limit - 25, ref_date=datetime.utcnow()))
+        session.add(APIKey(id=2, user_id=1, key="key-2", qty_req=limit, ref_date=datetime.utcnow() - timedelta(days=1)))
+        session.commit()
+
+    print("1. 8 threads x 10 claims on a key with 25 requests left...")
+    granted = []
+
+    def worker():
+        with SessionLocal() as session:
+            for _ in range(10):
+                used = claim_key_quota(session, 1)
+                if used is not None:
+                    granted.append(used)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with SessionLocal() as session:
+        qty = session.get(APIKey, 1).qty_req
+    assert len(granted) == 25, len(granted)
+    assert sorted(granted) == list(range(limit - 24, limit + 1)), granted
+    assert qty == limit, qty
+    print(f"   ✅ {len(granted)} claims granted, qty_req = {qty}/{limit}")
+
+    print("2. Counter from a previous day restarts on the first claim...")
+    with SessionLocal() as session:
+        assert usage_today(session.get(APIKey, 2)) == 0
+        assert claim_key_quota(session, 2) == 1
+        list_keys_for_user(session, 1)
+        assert not session.dirty
+    print("   ✅ Yesterday's 950 -> 1, list_keys_for_user does not write")
+
+    print("3. Release and exhaust...")
+    with SessionLocal() as session:
+        release_key_quota(session, 2)
+        assert session.get(APIKey, 2).qty_req == 0
+        exhaust_key_quota(session, 2)
+        assert claim_key_quota(session, 2) is None
+        key = session.get(APIKey, 2)
+        key.is_work = False
+        session.commit()
+        assert claim_key_quota(session, 2) is None
+    print("   ✅ Released claim returned, exhausted / not working keys refuse claims")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_api_key_quota())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,96 @@
+"""Test script for batched notifications over a pooled session (local fake Bot API server)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from aiohttp import web
+from utils.async_bot_wrapper import get_async_bot
+from services.http_sessions import close_http_sessions
+
+
+async def test_async_bot_batch():
+    """One connection is reused, 429 is retried, failed photo falls back to text."""
+    print("=" * 70)
+    print("Testing AsyncBotWrapper.send_many")
+    print("=" * 70)
+
+    received = []
+    peers = set()
+    state = {"first": True}
+
+    async def send_message(request):
+        data = await request.json()
+        peers.add(request.transport.get_extra_info("peername"))
+        if state["first"]:
+            state["first"] = False
+            return web.json_response({"ok": False, "error_code": 429, "parameters": {"retry_after": 1}})
+        received.append(("text", data["chat_id"], data["text"]))
+        return web.json_response({"ok": True, "result": {}})
+
+    async def send_photo(request):
+        form = await request.post()
+        peers.add(request.transport.get_extra_info("peername"))
+        if form["chat_id"] == "3":
+            return web.json_response({"ok": False, "description": "bad photo"})
+        received.append(("photo", int(form["chat_id"]), form["caption"]))
+        return web.json_response({"ok": True, "result": {}})
+
+    app = web.Application()
+    app.router.add_post("/botTEST/sendMessage", send_message)
+    app.router.add_post("/botTEST/sendPhoto", send_photo)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 8766)
+    await site.start()
+
+    bot = get_async_bot("TEST")
+    bot.api_url = "http://127.0.0.1:8766/botTEST"
+    assert get_async_bot("TEST") is bot
+
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        f.write(b"png")
+        photo = f.name
+
+    try:
+        print("1. Batch of 20 messages, 2 photos (one fails)...")
+        messages = [{"chat_id": i % 2, "text": f"msg {i}"} for i in range(20)]
+        messages.append({"chat_id": 2, "text": "photo ok", "photo_path": photo})
+        messages.append({"chat_id": 3, "text": "photo fallback", "photo_path": photo})
+        results = await bot.send_many(messages, concurrency=4)
+        assert all(results), results
+        assert ("photo", 2, "photo ok") in received, received
+        assert ("text", 3, "photo fallback") in received, received
+        print(f"   ✅ {sum(results)}/{len(messages)} delivered")
+
+        print("2. Per-chat order kept...")
+        chat0 = [t for kind, chat, t in received if chat == 0]
+        assert chat0 == [f"msg {i}" for i in range(0, 20, 2)], chat0
+        print("   ✅ Order kept")
+
+        print("3. Connections reused...")
+        assert len(peers) <= 4, peers
+        print(f"   ✅ {len(peers)} connections for {len(received)} messages")
+    finally:
+        await bot.close()
+        await close_http_sessions()
+        await runner.cleanup()
+        os.unlink(photo)
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_async_bot_batch())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
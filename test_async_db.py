@@ -0,0 +1,100 @@
+"""Test script for the async DB path of the checking pipeline (fake API, temporary SQLite DB via aiosqlite)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import (
+    get_engine, get_session_factory, init_db, async_engine_for, get_async_session_factory, open_session, run_db,
+)
+from models import User, APIKey, Account
+from services.api_keys import claim_key_quota
+import services.check_via_api as check_via_api
+
+
+async def test_async_db():
+    """Batch API check and concurrent run_db calls on one AsyncSession."""
+    print("=" * 70)
+    print("Testing async DB path")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    usernames = [f"found{i}" for i in range(5)] + [f"missing{i}" for i in range(10)]
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(APIKey(user_id=1, key="key-1", qty_req=0))
+        session.add(APIKey(user_id=1, key="key-2", qty_req=0))
+        for name in usernames:
+            session.add(Account(user_id=1, account=name))
+        session.commit()
+
+    async def fake_request_profile(key_value, username):
+        await asyncio.sleep(0.01)
+        if username.startswith("found"):
+            return {"result": {"username": username}}
+        return {"success": False, "message": "User not found"}
+
+    original = check_via_api._request_profile
+    check_via_api._request_profile = fake_request_profile
+    async_engine = async_engine_for(SessionLocal)
+    AsyncSessionLocal = get_async_session_factory(async_engine)
+    try:
+        print("1. Batch check with AsyncSession (concurrent key workers share it)...")
+        async with open_session(AsyncSessionLocal) as session:
+            assert isinstance(session, AsyncSession)
+            results = [info async for info in check_via_api.check_accounts_exist_via_api_batch(
+                session, 1, usernames, per_key_concurrency=3, per_key_rps=1000
+            )]
+        assert len(results) == len(usernames), len(results)
+        with SessionLocal() as session:
+            done = session.query(Account).filter(Account.done == True).count()
+            used = sum(k.qty_req for k in session.query(APIKey).all())
+        assert done == 5, done
+        assert used == len(usernames), used
+        print(f"   ✅ {len(results)} results, {done} accounts done, {used} key requests counted")
+
+        print("2. Concurrent run_db calls on one AsyncSession are serialized...")
+
+        def bump(session, key_id):
+            key = session.get(APIKey, key_id)
+            key.qty_req += 1
+            session.commit()
+
+        async with open_session(AsyncSessionLocal) as session:
+            await asyncio.gather(*[run_db(session, bump, 1 + i % 2) for i in range(20)])
+        with SessionLocal() as session:
+            assert sum(k.qty_req for k in session.query(APIKey).all()) == used + 20
+        print("   ✅ 20 concurrent updates applied")
+
+        print("3. Same helpers with a sync Session...")
+        async with open_session(SessionLocal) as session:
+            before = session.get(APIKey, 1).qty_req
+            assert await run_db(session, claim_key_quota, 1) == before + 1
+        print("   ✅ run_db calls sync Session directly")
+    finally:
+        check_via_api._request_profile = original
+        await async_engine.dispose()
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_async_db())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
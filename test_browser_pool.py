@@ -0,0 +1,79 @@
+"""Test script for the persistent browser pool (no proxy, no Instagram)."""
+
+import asyncio
+import sys
+import os
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from services.browser_pool import BrowserPool
+
+
+async def test_browser_pool():
+    """Browser is launched once, reused for leases and recycled after max pages."""
+    print("=" * 70)
+    print("Testing Browser Pool")
+    print("=" * 70)
+
+    pool = BrowserPool(max_pages_per_browser=3, lease_seconds=30)
+    await pool.start()
+
+    try:
+        print("1. Leasing 3 contexts from the same (proxy-less) browser...")
+        for _ in range(3):
+            lease = await pool.acquire(None, headless=True)
+            context = await lease.new_context()
+            page = await context.new_page()
+            await page.set_content("<html><body>pool</body></html>")
+            await lease.release()
+        stats = pool.stats()
+        assert stats["launches"] == 1, stats
+        assert stats["leases"] == 3, stats
+        print(f"   ✅ {stats}")
+
+        print("2. Next lease recycles the browser (max_pages reached)...")
+        lease = await pool.acquire(None, headless=True)
+        await lease.new_context()
+        await lease.release()
+        stats = pool.stats()
+        assert stats["launches"] == 2, stats
+        assert stats["browsers"] == 1, stats
+        print(f"   ✅ {stats}")
+
+        print("3. Expired lease closes its contexts...")
+        pool.lease_seconds = 0.2
+        lease = await pool.acquire(None, headless=True)
+        context = await lease.new_context()
+        await asyncio.sleep(0.5)
+        assert pool.stats()["active_leases"] == 0, pool.stats()
+        print("   ✅ Lease reclaimed")
+
+        print("4. Other launch args get their own browser...")
+        pool.lease_seconds = 30
+        launches = pool.stats()["launches"]
+        desktop_args = ["--window-size=1366,768", "--disable-web-security"]
+        for _ in range(2):
+            lease = await pool.acquire(None, headless=True, args=list(desktop_args))
+            await lease.release()
+        lease = await pool.acquire(None, headless=True)
+        await lease.release()
+        stats = pool.stats()
+        assert stats["launches"] == launches + 1 and stats["browsers"] == 2, stats
+        print(f"   ✅ {stats}")
+    finally:
+        await pool.close()
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_browser_pool())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
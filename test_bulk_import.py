@@ -0,0 +1,66 @@
+"""Test script for bulk account import (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account
+from services.accounts import bulk_create_accounts, create_account
+
+
+async def test_bulk_import():
+    """Normalization, dedup against existing accounts, ids in input order."""
+    print("=" * 70)
+    print("Testing bulk account import")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bulk.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(User(id=2, username="other", is_active=True))
+        session.commit()
+        create_account(session, 1, "existing", 30)
+        create_account(session, 2, "taken_by_other", 30)
+
+        print("1. Dedup and normalization...")
+        ids, names, duplicates = bulk_create_accounts(
+            session, 1, ["@new1", " new2 ", "existing", "new1", "", "taken_by_other"], days=10, chunk_size=2
+        )
+        assert names == ["new1", "new2", "taken_by_other"], names
+        assert duplicates == 2, duplicates
+        rows = {a.id: a for a in session.query(Account).filter(Account.id.in_(ids))}
+        assert [rows[i].account for i in ids] == names
+        assert all(a.period == 10 and a.done is False and a.user_id == 1 for a in rows.values())
+        print(f"   ✅ Inserted {names}, {duplicates} duplicates skipped, ids match input order")
+
+        print("2. 5000 usernames...")
+        started = time.perf_counter()
+        ids, names, duplicates = bulk_create_accounts(session, 1, [f"bulk_{i}" for i in range(5000)] + ["new1"])
+        elapsed = time.perf_counter() - started
+        assert len(ids) == 5000 and duplicates == 1
+        assert session.query(Account).filter(Account.user_id == 1).count() == 5004
+        print(f"   ✅ 5000 accounts in {elapsed:.2f}s")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_bulk_import())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
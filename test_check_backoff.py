@@ -0,0 +1,113 @@
+"""Test script for the adaptive per-account check schedule (fake checks, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account
+from services.check_schedule import OUTCOME_ERROR, OUTCOME_UNCHANGED, plan_next_check
+import cron.check_dispatcher as check_dispatcher
+
+
+async def run_dispatcher(dispatcher, seconds=0.5):
+    stop = threading.Event()
+    asyncio.get_running_loop().call_later(seconds, stop.set)
+    await dispatcher.run(stop, tick_seconds=0.05)
+
+
+async def test_check_backoff():
+    """Unchanged accounts back off, unban windows pull checks back in."""
+    print("=" * 70)
+    print("Testing adaptive check schedule")
+    print("=" * 70)
+
+    now = datetime.now()
+
+    print("1. Backoff grows with unchanged checks and is capped...")
+    level, delays = 0, []
+    for _ in range(6):
+        next_check_at, level = plan_next_check(now, 5, level, None, OUTCOME_UNCHANGED)
+        delays.append((next_check_at - now).total_seconds() / 60)
+    assert delays == [10, 20, 40, 80, 80, 80], delays
+    next_check_at, level = plan_next_check(now, 5, 4, None, OUTCOME_ERROR)
+    assert level == 4 and next_check_at == now + timedelta(minutes=5)
+    next_check_at, _ = plan_next_check(now, 60, 4, None, OUTCOME_UNCHANGED)
+    assert next_check_at == now + timedelta(minutes=240)  # CHECK_BACKOFF_MAX_MINUTES
+    print(f"   ✅ Delays (minutes): {delays}; error keeps level, 240 min cap")
+
+    print("2. Unban windows (24h +- 6h)...")
+    inside, _ = plan_next_check(now, 5, 4, now - timedelta(hours=20), OUTCOME_UNCHANGED)
+    assert inside == now + timedelta(minutes=5)
+    before, _ = plan_next_check(now, 5, 4, now - timedelta(hours=17, minutes=30), OUTCOME_UNCHANGED)
+    assert before == now + timedelta(minutes=30)  # не перепрыгивает начало окна
+    far, _ = plan_next_check(now, 5, 4, now - timedelta(hours=10), OUTCOME_UNCHANGED)
+    assert far == now + timedelta(minutes=80)
+    print("   ✅ Every run inside the window, next check lands on the window start")
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'backoff.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="user1", is_active=True, auto_check_enabled=True, auto_check_interval=1))
+        for i in range(20):
+            session.add(Account(user_id=1, account=f"acc{i}", from_date=now.date(),
+                                from_date_time=now - timedelta(days=10)))
+        session.commit()
+
+    checked = []
+
+    async def fake_api_batch(session, user_id, usernames):
+        for name in usernames:
+            checked.append(name)
+            yield {"username": name, "exists": False, "error": None}
+
+    check_dispatcher.check_accounts_exist_via_api_batch = fake_api_batch
+    check_dispatcher.get_global_verify_mode = lambda session: "api"
+
+    print("3. First run checks every pending account...")
+    dispatcher = check_dispatcher.CheckDispatcher(SessionLocal, bot=None, first_run_spread=0)
+    dispatcher.load_users(run_immediately=True)
+    await run_dispatcher(dispatcher)
+    assert len(checked) == 20, checked
+    with SessionLocal() as session:
+        accounts = session.query(Account).all()
+        assert all(a.check_backoff == 1 for a in accounts)
+        assert all(a.next_check_at > now + timedelta(minutes=1) for a in accounts)
+    print("   ✅ 20 checks, backoff level 1 (next check in 2 minutes)")
+
+    print("4. Next run skips accounts that are not due...")
+    checked.clear()
+    with SessionLocal() as session:
+        session.query(Account).filter(Account.account == "acc3").update(
+            {"next_check_at": datetime.now() - timedelta(seconds=1)}
+        )
+        session.commit()
+    dispatcher._schedule[1]["next_run"] = datetime.now()
+    await run_dispatcher(dispatcher)
+    assert checked == ["acc3"], checked
+    with SessionLocal() as session:
+        assert session.query(Account).filter(Account.account == "acc3").one().check_backoff == 2
+    print("   ✅ 1 of 20 accounts checked")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_check_backoff())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,126 @@
+"""Test script for coalescing concurrent check_account_main calls (fake pipeline, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account
+import services.main_checker as main_checker
+
+
+async def test_check_coalescing():
+    """Concurrent checks of one username run the pipeline once; each user gets its DB update."""
+    print("=" * 70)
+    print("Testing check_account_main coalescing")
+    print("=" * 70)
+
+    tmp_dir = tempfile.mkdtemp()
+    engine = get_engine(f"sqlite:///{os.path.join(tmp_dir, 'coalesce.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        # Each user stored the username in their own spelling
+        for user_id, spelling in ((1, "shared_acc"), (2, "shared_acc"), (3, "Shared_Acc")):
+            session.add(User(id=user_id, username=f"user{user_id}", is_active=True))
+            session.add(Account(user_id=user_id, account=spelling))
+            session.add(Account(user_id=user_id, account="missing_acc"))
+        session.commit()
+
+    calls = []
+    outcomes = {
+        "shared_acc": (True, "API: найден | Proxy: ok", "shot"),
+        "missing_acc": (False, "API: не найден", None),
+        "nokeys_acc": (False, "Нет доступных API ключей.", None),
+    }
+
+    async def fake_pipeline(username, session, user_id, screenshot_path=None, api_result=None):
+        calls.append((username, user_id))
+        await asyncio.sleep(0.2)
+        success, message, shot = outcomes[username.lstrip("@").lower()]
+        if shot:
+            shot = os.path.join(tmp_dir, f"{username}_{user_id}.png")
+            with open(shot, "wb") as f:
+                f.write(b"png")
+            acc = session.query(Account).filter(Account.user_id == user_id, Account.account == username).first()
+            acc.done = True
+            session.commit()
+        return success, message, shot
+
+    original = main_checker._check_account_pipeline
+    main_checker._check_account_pipeline = fake_pipeline
+    try:
+        print("1. Three users check the same username at once...")
+        sessions = [SessionLocal() for _ in range(3)]
+
+        async def check_and_send(name, session, user_id):
+            # Как бот: файл удаляется сразу после отправки
+            result = await main_checker.check_account_main(name, session, user_id)
+            sent = open(result[2], "rb").read()
+            os.remove(result[2])
+            return result, sent
+
+        results = await asyncio.gather(*[
+            check_and_send(name, sessions[i], i + 1)
+            for i, name in enumerate(("shared_acc", "@shared_acc", "Shared_Acc"))
+        ])
+        assert len(calls) == 1, calls
+        assert all(success for (success, _, _), _ in results)
+        shots = [shot for (_, _, shot), _ in results]
+        assert len(set(shots)) == 3 and all(sent == b"png" for _, sent in results), results
+        with SessionLocal() as session:
+            done = session.query(Account).filter(Account.account.in_(["shared_acc", "Shared_Acc"]), Account.done == True).count()
+        assert done == 3, done
+        print(f"   ✅ 1 pipeline run, 3 accounts marked done, 3 screenshot copies (owner deletes its file at once)")
+
+        print("2. Not found is shared, user-scoped errors are not...")
+        calls.clear()
+        await asyncio.gather(*[main_checker.check_account_main("missing_acc", sessions[i], i + 1) for i in range(3)])
+        assert len(calls) == 1, calls
+        calls.clear()
+        await asyncio.gather(*[main_checker.check_account_main("nokeys_acc", sessions[i], i + 1) for i in range(3)])
+        assert len(calls) == 3, calls
+        print("   ✅ 'не найден' reused, 'нет ключей' re-checked per user")
+
+        print("3. Coalescing across event loops (threads)...")
+        calls.clear()
+        thread_results = []
+
+        def worker(user_id):
+            with SessionLocal() as session:
+                thread_results.append(asyncio.run(main_checker.check_account_main("missing_acc", session, user_id)))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in (1, 2, 3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1 and len(thread_results) == 3, calls
+        assert not main_checker._inflight_checks and not main_checker._inflight_waiters
+        print("   ✅ 3 loops -> 1 pipeline run")
+
+        for session in sessions:
+            session.close()
+    finally:
+        main_checker._check_account_pipeline = original
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_check_coalescing())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,96 @@
+"""Test script for the global check dispatcher (fake checks, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account
+import cron.check_dispatcher as check_dispatcher
+
+
+async def test_check_dispatcher():
+    """Browser concurrency is capped globally and small users are not starved."""
+    print("=" * 70)
+    print("Testing global check dispatcher")
+    print("=" * 70)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "dispatcher.db")
+    engine = get_engine(f"sqlite:///{db_path}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        for user_id, count in ((1, 12), (2, 2), (3, 2)):
+            session.add(User(id=user_id, username=f"user{user_id}", is_active=True,
+                             auto_check_enabled=True, auto_check_interval=60))
+            for i in range(count):
+                session.add(Account(user_id=user_id, account=f"u{user_id}_acc{i}"))
+        session.commit()
+
+    state = {"active": 0, "max_active": 0}
+    order = []
+
+    async def fake_api_batch(session, user_id, usernames):
+        for name in usernames:
+            await asyncio.sleep(0)
+            yield {"username": name, "exists": True, "error": None}
+
+    async def fake_check(acc, user_id, user, session, traffic_monitor, bot=None, api_result=None):
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        order.append(user_id)
+        await asyncio.sleep(0.05)
+        state["active"] -= 1
+        return acc, {'success': False, 'traffic_bytes': 0, 'duration_ms': 0, 'error': False}
+
+    check_dispatcher.check_accounts_exist_via_api_batch = fake_api_batch
+    check_dispatcher.check_single_account_optimized = fake_check
+
+    dispatcher = check_dispatcher.CheckDispatcher(SessionLocal, bot=None, api_workers=3, browser_workers=2,
+                                                first_run_spread=0)
+    dispatcher.load_users(run_immediately=True)
+    assert dispatcher.next_run_time(1) is not None
+
+    stop = threading.Event()
+    asyncio.get_running_loop().call_later(1.5, stop.set)
+    await dispatcher.run(stop, tick_seconds=0.05)
+
+    print("1. All accounts checked, runs completed...")
+    assert len(order) == 16, order
+    assert not dispatcher._runs, dispatcher._runs
+    print(f"   ✅ {len(order)} checks")
+
+    print("2. Browser stage capped globally...")
+    assert state["max_active"] == 2, state
+    print(f"   ✅ Max concurrent checks: {state['max_active']}")
+
+    print("3. Fair queue: small users are not stuck behind the big one...")
+    last_small = max(i for i, uid in enumerate(order) if uid != 1)
+    assert last_small < 8, order
+    print(f"   ✅ Order: {order}")
+
+    print("4. Next run scheduled after interval...")
+    next_run = dispatcher.next_run_time(2)
+    assert next_run is not None and (next_run - datetime.now()).total_seconds() > 3000
+    print(f"   ✅ Next run for user 2: {next_run.strftime('%H:%M:%S')}")
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_check_dispatcher())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
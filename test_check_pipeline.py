@@ -0,0 +1,163 @@
+"""Test script for the tiered check pipeline (fake tiers, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account, Proxy
+import services.ig_probe as ig_probe
+from services.username_cache import get_username_cache, SOURCE_RAPIDAPI
+import services.check_pipeline as check_pipeline
+import cron.check_dispatcher as check_dispatcher
+from services.check_pipeline import Tier, check_account_tiered, tiered_result, get_pipeline_metrics
+
+
+async def test_check_pipeline():
+    """Cheap tiers settle most accounts, RapidAPI and browser see only the rest."""
+    print("=" * 70)
+    print("Testing tiered check pipeline")
+    print("=" * 70)
+
+    calls = {"probe": [], "api": [], "screenshot": []}
+
+    async def fake_probe(ctx):
+        calls["probe"].append(ctx.username)
+        n = int(ctx.username[3:])
+        if n % 20 == 5:
+            return True  # кандидат
+        if n % 20 == 6:
+            return None  # неясно (редирект на логин)
+        return False
+
+    async def fake_api(ctx):
+        calls["api"].append(ctx.username)
+        if ctx.username == "keys":
+            ctx.error = "all_api_keys_exhausted"
+            return None
+        return ctx.username.endswith("5")
+
+    async def fake_screenshot(ctx):
+        calls["screenshot"].append(ctx.username)
+        ctx.proxy_message = "proxy_screenshot"
+        return True
+
+    tiers = [
+        check_pipeline.TIERS["cache"],
+        Tier("probe", fake_probe, authoritative=False),
+        Tier("api", fake_api),
+        Tier("screenshot", fake_screenshot, confirm_only=True),
+    ]
+
+    print("1. Single checks...")
+    assert tiered_result(await check_account_tiered("acc1", None, 1, tiers=tiers)) == (False, "Probe: не найден", None)
+    assert tiered_result(await check_account_tiered("acc6", None, 1, tiers=tiers)) == (False, "API: не найден", None)
+    ctx = await check_account_tiered("acc5", None, 1, tiers=tiers)
+    assert tiered_result(ctx) == (True, "API: найден | Proxy: proxy_screenshot", None) and ctx.decided_by == "api"
+    ctx = await check_account_tiered("acc9", None, 1, api_result={"exists": True}, tiers=tiers)
+    assert ctx.confirmed and calls["screenshot"] == ["acc5", "acc9"]
+    ctx = await check_account_tiered("keys", None, 1, tiers=[Tier("api", fake_api)])
+    assert tiered_result(ctx) == (False, "Все API ключи исчерпаны.", None)
+    assert calls["api"] == ["acc6", "acc5", "keys"], calls["api"]
+    print("   ✅ Probe negative stops, probe positive confirmed by API, screenshot only when confirmed")
+
+    print("2. Batch auto-check of 100 accounts...")
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pipeline.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+    with SessionLocal() as session:
+        session.add(User(id=1, username="user1", is_active=True, auto_check_enabled=True, auto_check_interval=60))
+        for i in range(100):
+            session.add(Account(user_id=1, account=f"acc{i}"))
+        session.commit()
+
+    cache = get_username_cache()
+    cache.put(SOURCE_RAPIDAPI, "acc0", {"exists": True, "error": None})
+    cache.put(SOURCE_RAPIDAPI, "acc1", {"exists": False, "error": None})
+
+    for name in calls:
+        calls[name].clear()
+    browser = []
+
+    async def fake_api_batch(session, user_id, usernames):
+        for name in usernames:
+            calls["api"].append(name)
+            yield {"username": name, "exists": name.endswith("5"), "error": None}
+
+    async def fake_check(acc, user_id, user, session, traffic_monitor, bot=None, api_result=None):
+        browser.append(acc.account)
+        return acc, {'success': True, 'traffic_bytes': 0, 'duration_ms': 0, 'error': False}
+
+    original_tiers = dict(check_pipeline.TIERS)
+    check_pipeline.TIERS["probe"] = Tier("probe", fake_probe, authoritative=False)
+    check_dispatcher.check_accounts_exist_via_api_batch = fake_api_batch
+    check_dispatcher.check_single_account_optimized = fake_check
+    check_dispatcher.get_global_verify_mode = lambda session: "api"
+    get_pipeline_metrics().reset()
+    try:
+        dispatcher = check_dispatcher.CheckDispatcher(SessionLocal, bot=None, first_run_spread=0)
+        dispatcher.load_users(run_immediately=True)
+        stop = threading.Event()
+        asyncio.get_running_loop().call_later(1.0, stop.set)
+        await dispatcher.run(stop, tick_seconds=0.05)
+    finally:
+        check_pipeline.TIERS.update(original_tiers)
+        cache.invalidate("acc0")
+        cache.invalidate("acc1")
+
+    assert len(calls["probe"]) == 98, len(calls["probe"])  # acc0 / acc1 из кэша
+    assert sorted(calls["api"]) == sorted(f"acc{i}" for i in range(100) if i % 20 in (5, 6)), calls["api"]
+    assert sorted(browser) == ["acc25", "acc45", "acc5", "acc65", "acc85"], browser
+    with SessionLocal() as session:
+        assert session.query(Account).filter(Account.account == "acc0").one().done  # найден по кэшу
+    snapshot = get_pipeline_metrics().snapshot()
+    assert snapshot["checks"] == 100
+    assert snapshot["tiers"]["cache"]["calls"] == 100 and snapshot["tiers"]["api"]["calls"] == 10
+    assert snapshot["tiers"]["probe"]["negative"] == 88
+    print(f"   ✅ {get_pipeline_metrics().summary()}; browser: {len(browser)}")
+
+    print("3. Probes rotate over proxies, a blocked proxy drops out...")
+    with SessionLocal() as session:
+        for i in range(1, 4):
+            session.add(Proxy(id=i, user_id=1, scheme="http", host=f"10.0.0.{i}:8080", priority=5,
+                              username="u", password="p", is_active=True))
+        session.commit()
+    used = []
+
+    async def fake_fetch(username, proxy_url):
+        used.append(proxy_url)
+        return None if "10.0.0.2" in proxy_url else False  # второй прокси - редирект на логин
+
+    original_fetch = ig_probe.fetch_profile_exists_via_proxy
+    ig_probe.fetch_profile_exists_via_proxy = fake_fetch
+    try:
+        with SessionLocal() as session:
+            contexts = await check_pipeline.prefilter_accounts(
+                session, 1, [f"probe{i}" for i in range(30)], concurrency=2
+            )
+    finally:
+        ig_probe.fetch_profile_exists_via_proxy = original_fetch
+    per_proxy = {i: sum(f"10.0.0.{i}" in url for url in used) for i in range(1, 4)}
+    assert per_proxy[2] <= 2 and per_proxy[1] >= 10 and per_proxy[3] >= 10, per_proxy
+    assert sum(ctx.exists is False for ctx in contexts.values()) >= 28
+    print(f"   ✅ Probes per proxy: {per_proxy}")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_check_pipeline())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,104 @@
+"""Test script for incremental rescheduling and staggered first runs (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User
+from cron.check_dispatcher import CheckDispatcher
+
+
+async def test_check_schedule():
+    """First runs spread over the interval; changes re-read only the changed users."""
+    print("=" * 70)
+    print("Testing incremental check schedule")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'schedule.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        for user_id in range(1, 101):
+            session.add(User(id=user_id, username=f"user{user_id}", is_active=True,
+                             auto_check_enabled=True, auto_check_interval=10))
+        session.commit()
+
+    print("1. Startup: first runs staggered across the interval...")
+    dispatcher = CheckDispatcher(SessionLocal, bot=None, first_run_spread=1.0)
+    started = datetime.now()
+    dispatcher.load_users(run_immediately=True)
+    offsets = [(dispatcher.next_run_time(user_id) - started).total_seconds() for user_id in range(1, 101)]
+    assert all(0 <= o <= 601 for o in offsets), offsets
+    # По одному пользователю на каждый 6-секундный слот
+    assert all(6 * slot <= o <= 6 * (slot + 1) + 1 for slot, o in enumerate(offsets)), offsets
+    print(f"   ✅ First runs from {min(offsets):.0f}s to {max(offsets):.0f}s, one user per 6s slot")
+
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    print("2. Interval change of one user...")
+    before = {user_id: dispatcher.next_run_time(user_id) for user_id in range(1, 101)}
+    with SessionLocal() as session:
+        session.get(User, 5).auto_check_interval = 60
+        session.get(User, 6).username = "renamed"  # не влияет на расписание
+        session.commit()
+    assert dispatcher._changed == {5}, dispatcher._changed
+    statements.clear()
+    dispatcher._apply_changes()
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1 and " IN " in selects[0], selects
+    assert dispatcher._schedule[5]["interval"] == 60
+    assert dispatcher.next_run_time(5) > before[5]
+    assert all(dispatcher.next_run_time(u) == before[u] for u in range(1, 101) if u != 5)
+    print("   ✅ One SELECT for the changed user, other users untouched")
+
+    print("3. Disable, deactivate and add users...")
+    with SessionLocal() as session:
+        session.get(User, 7).auto_check_enabled = False
+        session.get(User, 8).is_active = False
+        session.add(User(id=101, username="new", is_active=True, auto_check_enabled=True, auto_check_interval=10))
+        session.commit()
+    with SessionLocal() as session:
+        session.get(User, 9).auto_check_enabled = False
+        session.rollback()  # не закоммичено - расписание не меняется
+    dispatcher._apply_changes()
+    assert dispatcher.next_run_time(7) is None and dispatcher.next_run_time(8) is None
+    assert dispatcher.next_run_time(9) is not None
+    offset = dispatcher.next_run_time(101) - datetime.now()
+    assert timedelta(0) <= offset <= timedelta(minutes=10), offset
+    assert len(dispatcher._schedule) == 99
+    print(f"   ✅ 2 users removed, new user first run in {offset.total_seconds():.0f}s")
+
+    print("4. Full resync without run_immediately...")
+    dispatcher = CheckDispatcher(SessionLocal, bot=None, first_run_spread=0.5)
+    started = datetime.now()
+    dispatcher.load_users()
+    offsets = [(entry["next_run"] - started).total_seconds() for entry in dispatcher._schedule.values()
+               if entry["interval"] == 10]
+    assert all(600 <= o <= 900 for o in offsets), (min(offsets), max(offsets))
+    print(f"   ✅ First runs between {min(offsets):.0f}s and {max(offsets):.0f}s (interval + half of it)")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_check_schedule())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,108 @@
+"""Test script for the single-query expiry notification check (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+from datetime import date, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account, ExpiryNotification
+from services.expiry_notifications import check_and_send_expiry_notifications, mark_notifications_sent
+
+
+class FakeBot:
+    """Collects notifications; user 3 is unreachable."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_many(self, notifications):
+        self.sent.extend(notifications)
+        return [n["chat_id"] != 3 for n in notifications]
+
+
+async def test_expiry_notifications():
+    """One SELECT and one commit per run, no duplicates on the same day."""
+    print("=" * 70)
+    print("Testing expiry notification check")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'expiry.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+    today = date.today()
+
+    # 50 пользователей x 4 аккаунта: истёк, истекает через 3 дня, через 30 дней, уже done
+    with SessionLocal() as session:
+        for user_id in range(1, 51):
+            session.add(User(id=user_id, username=f"user{user_id}", is_active=user_id != 2))
+            for n, (to_date, done) in enumerate((
+                (today - timedelta(days=2), False),
+                (today + timedelta(days=3), False),
+                (today + timedelta(days=30), False),
+                (today - timedelta(days=5), True),
+            )):
+                session.add(Account(user_id=user_id, account=f"acc{user_id}_{n}",
+                                    from_date=today - timedelta(days=30), to_date=to_date, done=done))
+        session.commit()
+
+    statements = []
+    commits = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    print("1. First run...")
+    bot = FakeBot()
+    await check_and_send_expiry_notifications(SessionLocal, bot)
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(selects) == 1, selects
+    assert len(inserts) == 1 and "ON CONFLICT DO NOTHING" in inserts[0], inserts
+    assert len(commits) == 1, commits
+    # 49 активных пользователей x 2 типа уведомлений; пользователь 2 неактивен
+    assert len(bot.sent) == 98, len(bot.sent)
+    assert {n["chat_id"] for n in bot.sent} == set(range(1, 51)) - {2}
+    with SessionLocal() as session:
+        marked = session.query(ExpiryNotification).count()
+        types = {t for (t,) in session.query(ExpiryNotification.notification_type).distinct()}
+    assert marked == 96, marked  # пользователю 3 не доставлено
+    assert types == {"expired", "expiring_soon"}
+    print(f"   ✅ {len(bot.sent)} notifications, {len(selects)} SELECT, 1 INSERT, {len(commits)} commit")
+
+    print("2. Second run the same day...")
+    statements.clear()
+    commits.clear()
+    bot = FakeBot()
+    await check_and_send_expiry_notifications(SessionLocal, bot)
+    assert sorted(n["chat_id"] for n in bot.sent) == [3, 3], bot.sent
+    print("   ✅ Only the undelivered user is retried")
+
+    print("3. Duplicate markers are ignored...")
+    with SessionLocal() as session:
+        account_id = session.query(Account.id).filter(Account.user_id == 1).first()[0]
+        mark_notifications_sent(session, [(1, account_id, "expired"), (1, account_id, "expired")])
+        count = session.query(ExpiryNotification).filter(ExpiryNotification.user_id == 1).count()
+    assert count == 2, count
+    print("   ✅ ON CONFLICT DO NOTHING keeps one row per account, type and day")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_expiry_notifications())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
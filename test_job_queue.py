@@ -0,0 +1,135 @@
+"""Test script for the DB-backed check job queue and worker (fake checks, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account, CheckJob
+from services.job_queue import (
+    enqueue_check_jobs, lease_jobs, complete_job, fail_job, queue_stats, purge_finished_jobs,
+    JOB_QUEUED, JOB_FAILED, JOB_DONE,
+)
+from services.accounts import delete_account, mass_delete_all_accounts
+import worker as worker_module
+
+
+async def test_job_queue():
+    """Leases are exclusive, expire, retries back off, worker completes jobs."""
+    print("=" * 70)
+    print("Testing DB job queue")
+    print("=" * 70)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    engine = get_engine(f"sqlite:///{db_path}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        for i in range(6):
+            session.add(Account(user_id=1, account=f"acc{i}"))
+        session.commit()
+        account_ids = [a.id for a in session.query(Account).order_by(Account.id)]
+
+        print("1. Enqueue with dedup...")
+        assert enqueue_check_jobs(session, 1, account_ids[:4], max_attempts=2) == 4
+        assert enqueue_check_jobs(session, 1, account_ids[:4]) == 0
+        print("   ✅ Active jobs are not queued twice")
+
+        print("2. Two workers lease different jobs...")
+        a = lease_jobs(session, "w1", 2, lease_seconds=60)
+        b = lease_jobs(session, "w2", 5, lease_seconds=60)
+        assert len(a) == 2 and len(b) == 2, (a, b)
+        assert not {j.id for j in a} & {j.id for j in b}
+        assert lease_jobs(session, "w3", 5, lease_seconds=60) == []
+        print("   ✅ Exclusive leases")
+
+        print("3. Expired lease is taken over...")
+        session.query(CheckJob).filter(CheckJob.id == a[0].id).update(
+            {CheckJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+        )
+        session.commit()
+        taken = lease_jobs(session, "w3", 5, lease_seconds=60)
+        assert [j.id for j in taken] == [a[0].id], taken
+        assert not complete_job(session, a[0].id, "w1")  # w1 lost the lease
+        print("   ✅ Re-leased to w3, stale worker cannot complete")
+
+        print("4. Retry with backoff, then failed...")
+        assert fail_job(session, b[0].id, "w2", "boom", retry_delay_seconds=0) == JOB_QUEUED
+        again = lease_jobs(session, "w2", 1, lease_seconds=60)
+        assert [j.id for j in again] == [b[0].id]
+        assert fail_job(session, b[0].id, "w2", "boom") == JOB_FAILED
+        print("   ✅ Failed after max_attempts")
+
+        for job in [taken[0], a[1], b[1]]:
+            owner = "w3" if job.id == taken[0].id else ("w1" if job in a else "w2")
+            assert complete_job(session, job.id, owner, {"ok": True})
+        stats = queue_stats(session)
+        assert stats[JOB_DONE] == 3 and stats[JOB_FAILED] == 1, stats
+
+    print("5. Worker processes queued jobs...")
+    with SessionLocal() as session:
+        enqueue_check_jobs(session, 1, account_ids[4:])
+
+    checked = []
+
+    async def fake_check(acc, user_id, user, session, traffic_monitor, bot=None, api_result=None):
+        checked.append(acc.account)
+        await asyncio.sleep(0.05)
+        return acc, {'success': False, 'message': 'not found', 'screenshot_path': None,
+                     'traffic_bytes': 0, 'duration_ms': 0, 'error': False}
+
+    worker_module.check_single_account_optimized = fake_check
+    stop = asyncio.Event()
+    check_worker = worker_module.CheckWorker(SessionLocal, bot=None, worker_id="w-test",
+                                             concurrency=2, poll_seconds=0.05)
+    asyncio.get_running_loop().call_later(0.5, stop.set)
+    await check_worker.run(stop)
+
+    with SessionLocal() as session:
+        stats = queue_stats(session)
+    assert sorted(checked) == ["acc4", "acc5"], checked
+    assert stats[JOB_DONE] == 5, stats
+    print(f"   ✅ Queue: {stats}")
+
+    print("6. Retention purge and account deletion...")
+    with SessionLocal() as session:
+        assert purge_finished_jobs(session) == 0  # Всё свежее
+        session.query(CheckJob).filter(CheckJob.account_id == account_ids[1]).update(
+            {CheckJob.updated_at: datetime.utcnow() - timedelta(hours=25)}
+        )
+        session.commit()
+        assert purge_finished_jobs(session) == 1
+        delete_account(session, session.get(Account, account_ids[0]))
+        assert session.query(CheckJob).filter(CheckJob.account_id == account_ids[0]).count() == 0
+        enqueue_check_jobs(session, 1, account_ids[2:])
+        assert mass_delete_all_accounts(session, 1) == 5
+        assert session.query(CheckJob).count() == 0
+        # Сироты (аккаунт удалён в обход accounts.py) удаляет purge
+        session.add(Account(id=99, user_id=1, account="ghost"))
+        session.commit()
+        enqueue_check_jobs(session, 1, [99])
+        session.query(Account).filter(Account.id == 99).delete()
+        session.commit()
+        assert purge_finished_jobs(session) == 1
+    print("   ✅ Old finished jobs and jobs of deleted accounts removed")
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_job_queue())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,107 @@
+"""Test script for the in-memory API key ring (fake API, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+from collections import Counter
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User, APIKey
+from config import get_settings
+from services.key_ring import get_key_ring
+import services.check_via_api as check_via_api
+
+
+async def test_key_ring():
+    """Load is spread across keys, DB is read once, broken keys are skipped."""
+    print("=" * 70)
+    print("Testing API key ring")
+    print("=" * 70)
+
+    limit = get_settings().api_daily_limit
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ring.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        for i in (1, 2, 3):
+            session.add(APIKey(id=i, user_id=1, key=f"key-{i}", qty_req=0))
+        session.commit()
+
+    key_selects = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_key_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "WHERE api.user_id" in statement:
+            key_selects.append(statement)
+
+    calls = Counter()
+    responses = {}
+
+    async def fake_request_profile(key_value, username):
+        calls[key_value] += 1
+        return responses.get(key_value) or {"success": False, "message": "User not found"}
+
+    original = check_via_api._request_profile
+    check_via_api._request_profile = fake_request_profile
+    try:
+        print("1. 300 checks are spread over 3 keys, keys read from DB once...")
+        with SessionLocal() as session:
+            for i in range(300):
+                result = await check_via_api.check_account_exists_via_api(session, 1, f"spread_{i}")
+                assert result["error"] is None, result
+        assert len(key_selects) == 1, key_selects
+        assert all(90 <= calls[f"key-{i}"] <= 110 for i in (1, 2, 3)), calls
+        print(f"   ✅ {dict(calls)}, key SELECTs: {len(key_selects)}")
+
+        print("2. Auth / quota errors open the circuit...")
+        calls.clear()
+        responses["key-2"] = {"message": "You are not subscribed to this API."}
+        responses["key-3"] = {"message": "You have exceeded the DAILY quota for Requests on your current plan"}
+        with SessionLocal() as session:
+            for i in range(30):
+                result = await check_via_api.check_account_exists_via_api(session, 1, f"circuit_{i}")
+                assert result["error"] is None, result
+            key2, key3 = session.get(APIKey, 2), session.get(APIKey, 3)
+            assert key3.qty_req == limit, key3.qty_req
+            assert key2.qty_req == 100, key2.qty_req  # rejected request gave its claim back
+        assert calls["key-2"] == 1 and calls["key-3"] == 1 and calls["key-1"] == 30, calls
+        stats = {s["id"]: s for s in get_key_ring().stats(1)}
+        assert stats[2]["circuit_open"] and stats[3]["circuit_open"] and not stats[1]["circuit_open"]
+        print(f"   ✅ {dict(calls)} - keys 2 and 3 skipped after the first error")
+
+        print("3. Key changes reload the ring...")
+        with SessionLocal() as session:
+            session.add(APIKey(id=4, user_id=1, key="key-4", qty_req=0))
+            session.commit()
+        calls.clear()
+        with SessionLocal() as session:
+            for i in range(20):
+                await check_via_api.check_account_exists_via_api(session, 1, f"reload_{i}")
+        assert len(key_selects) == 2, key_selects
+        assert calls["key-4"] >= 5 and not calls["key-2"], calls
+        print(f"   ✅ New key picked up after commit: {dict(calls)}")
+    finally:
+        check_via_api._request_profile = original
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_key_ring())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
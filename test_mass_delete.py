@@ -0,0 +1,89 @@
+"""Test script for set-based mass delete of accounts (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account
+from sqlalchemy import text
+
+from services.accounts import (
+    bulk_create_accounts, find_duplicate, mass_delete_accounts_by_usernames, mass_delete_all_accounts,
+)
+
+
+async def test_mass_delete():
+    """Case-insensitive matching, delete types, not-found list, large lists."""
+    print("=" * 70)
+    print("Testing set-based mass delete")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'delete.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(User(id=2, username="other", is_active=True))
+        session.commit()
+        bulk_create_accounts(session, 1, ["Alpha", "Beta", "gamma", "delta", "done_one"])
+        bulk_create_accounts(session, 2, ["beta"])
+        session.query(Account).filter(Account.account == "done_one").update({"done": True})
+        session.commit()
+
+        print("1. Case-insensitive matching...")
+        deleted, not_found = mass_delete_accounts_by_usernames(session, 1, ["@alpha", "BETA", "missing"])
+        left = sorted(a.account for a in session.query(Account).filter(Account.user_id == 1))
+        assert deleted == 2 and not_found == ["missing"], (deleted, not_found)
+        assert left == ["delta", "done_one", "gamma"], left
+        assert session.query(Account).filter(Account.user_id == 2).count() == 1
+        print(f"   ✅ Deleted {deleted}, not found {not_found}, other user untouched")
+
+        print("2. Delete types...")
+        deleted, _ = mass_delete_accounts_by_usernames(session, 1, ["done_one", "Gamma"], delete_type="active")
+        assert deleted == 1
+        assert mass_delete_all_accounts(session, 1, delete_type="inactive") == 1
+        assert mass_delete_all_accounts(session, 1) == 1
+        assert session.query(Account).filter(Account.user_id == 1).count() == 0
+        print("   ✅ active / inactive / all")
+
+        print("3. 3000-line list...")
+        bulk_create_accounts(session, 1, [f"bulk_{i}" for i in range(3000)])
+        started = time.perf_counter()
+        deleted, not_found = mass_delete_accounts_by_usernames(
+            session, 1, [f"BULK_{i}" for i in range(3000)] + ["nope"]
+        )
+        elapsed = time.perf_counter() - started
+        assert deleted == 3000 and not_found == ["nope"]
+        print(f"   ✅ 3000 accounts deleted in {elapsed:.2f}s")
+
+        print("4. Case-only duplicates left by the account_norm migration...")
+        session.execute(text("DROP INDEX ux_accounts_user_account_norm"))
+        session.add_all([Account(user_id=1, account="Twin"), Account(user_id=1, account="twin")])
+        session.commit()
+        first = find_duplicate(session, 1, "TWIN")
+        assert first is not None and first.account == "Twin", first
+        deleted, _ = mass_delete_accounts_by_usernames(session, 1, ["twin"])
+        assert deleted == 1 and find_duplicate(session, 1, "twin").account == "Twin"
+        print("   ✅ Lookup returns the oldest match, exact spelling deleted")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_mass_delete())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,110 @@
+"""Test script for the profile header renderer (process pool, no browser)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from PIL import Image
+
+import services.check_pipeline as check_pipeline
+from services.check_pipeline import Tier, check_account_tiered, tiered_result, tiers_for_mode
+from services.profile_renderer import (
+    DESIGN, generate_instagram_profile_image_improved, get_render_pool, load_fonts, profile_fields,
+    shutdown_render_pool,
+)
+
+
+async def test_profile_renderer():
+    """Found accounts get a rendered header from profile data instead of a screenshot."""
+    print("=" * 70)
+    print("Testing profile header renderer")
+    print("=" * 70)
+
+    out_dir = tempfile.mkdtemp()
+
+    print("1. Profile fields from API responses...")
+    web = {"full_name": "Umar", "edge_followed_by": {"count": 153}, "edge_follow": {"count": 109},
+           "edge_owner_to_timeline_media": {"count": 7}, "is_verified": True, "profile_pic_url_hd": "hd"}
+    mobile = {"full_name": "Umar", "follower_count": 153, "following_count": 109, "media_count": 7,
+              "is_verified": True, "profile_pic_url": "hd"}
+    assert profile_fields(web) == profile_fields(mobile) == profile_fields(profile_fields(web))
+    assert profile_fields(web)["followers"] == 153 and profile_fields(None) == {}
+    print("   ✅ web_profile_info, mobile API and normalized dicts give the same fields")
+
+    print("2. Rendering in the process pool...")
+    assert get_render_pool() is not None
+    started = time.monotonic()
+    first = await generate_instagram_profile_image_improved(
+        username="ukudarov", output_path=os.path.join(out_dir, "first.png"), **profile_fields(web)
+    )
+    warmup_ms = (time.monotonic() - started) * 1000
+    assert first["success"], first
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(
+        generate_instagram_profile_image_improved(
+            username=f"user{i}", output_path=os.path.join(out_dir, f"user{i}.png"), **profile_fields(web)
+        )
+        for i in range(20)
+    ))
+    per_image_ms = (time.monotonic() - started) * 1000 / len(results)
+    assert all(r["success"] for r in results)
+    with Image.open(results[0]["image_path"]) as img:
+        assert img.size == (DESIGN["canvas_width"], DESIGN["canvas_height"])
+    assert per_image_ms < 1000, per_image_ms
+    print(f"   ✅ First render {warmup_ms:.0f} ms (pool start), then {per_image_ms:.0f} ms per image")
+
+    print("3. Assets are loaded once per process...")
+    load_fonts()
+    load_fonts()
+    info = load_fonts.cache_info()
+    assert info.misses == 1 and info.hits >= 1, info
+    print(f"   ✅ load_fonts: {info.misses} load, {info.hits} cache hits")
+
+    print("4. Verify mode selects render instead of the browser screenshot...")
+    names = lambda tiers: [t.name for t in tiers]
+    assert names(tiers_for_mode("api+proxy")) == ["cache", "probe", "api", "render"]
+    assert names(tiers_for_mode("instagram")) == ["cache", "probe", "api", "screenshot"]
+    assert names(tiers_for_mode("api-v2"))[-1] == "render"
+
+    async def fake_api(ctx):
+        ctx.api_result = {"username": ctx.username, "exists": True, "error": None, **profile_fields(web)}
+        return True
+
+    async def no_browser(ctx):
+        raise AssertionError("browser screenshot must not run")
+
+    original_tiers = dict(check_pipeline.TIERS)
+    check_pipeline.TIERS["probe"] = Tier("probe", lambda ctx: asyncio.sleep(0, True), authoritative=False)
+    check_pipeline.TIERS["api"] = Tier("api", fake_api)
+    check_pipeline.TIERS["screenshot"] = Tier("screenshot", no_browser, confirm_only=True)
+    try:
+        path = os.path.join(out_dir, "found.png")
+        ctx = await check_account_tiered("found_user", None, 1, screenshot_path=path, tiers=tiers_for_mode("api+proxy"))
+    finally:
+        check_pipeline.TIERS.update(original_tiers)
+    assert tiered_result(ctx) == (True, "API: найден", path), tiered_result(ctx)
+    assert os.path.exists(path)
+    print("   ✅ api+proxy: found account confirmed with a rendered header")
+
+    shutdown_render_pool()
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_profile_renderer())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
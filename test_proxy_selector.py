@@ -0,0 +1,127 @@
+"""Test script for the in-memory proxy selector (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Proxy
+from services.proxy_selector import ProxySelector, _TimerWheel
+import services.proxy_selector as proxy_selector
+
+
+async def test_proxy_selector():
+    """Best proxy by score, DB read once, stats by id, cooldowns expire on the wheel."""
+    print("=" * 70)
+    print("Testing proxy selector")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'selector.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(Proxy(id=1, user_id=1, scheme="http", host="10.0.0.1:8080", priority=5,
+                          username="u1", password="p1", used_count=10, success_count=9, fail_streak=0))
+        session.add(Proxy(id=2, user_id=1, scheme="http", host="10.0.0.2:8080", priority=5,
+                          used_count=10, success_count=5, fail_streak=0))
+        session.add(Proxy(id=3, user_id=1, scheme="socks5", host="10.0.0.3:1080", priority=1,
+                          used_count=0, success_count=0, fail_streak=0,
+                          cooldown_until=datetime.now() + timedelta(hours=1)))
+        session.add(Proxy(id=4, user_id=1, scheme="http", host="10.0.0.4:8080", priority=1,
+                          is_active=False, used_count=0, success_count=0, fail_streak=0))
+        session.commit()
+
+    proxy_selects = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_proxy_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "WHERE proxies.user_id" in statement:
+            proxy_selects.append(statement)
+
+    selector = ProxySelector(refresh_seconds=3600)
+    proxy_selector._selector = selector
+    try:
+        print("1. Best proxy with URL, DB read once for many picks...")
+        with SessionLocal() as session:
+            for _ in range(50):
+                assert selector.select(session, 1) == (1, "http://u1:p1@10.0.0.1:8080")
+        assert len(proxy_selects) == 1, proxy_selects
+        assert [s.id for s in selector.ranked(None, 1)] == [1, 2]
+        print(f"   ✅ (1, url) x 50, proxy SELECTs: {len(proxy_selects)}; cooling / inactive skipped")
+
+        print("2. Results update the index and the DB by id...")
+        with SessionLocal() as session:
+            for _ in range(9):
+                selector.record_result(session, 1, 1, False)
+            assert selector.select(session, 1)[0] == 2
+            selector.record_result(session, 1, 2, False, cooldown_seconds=1)
+            assert selector.select(session, 1)[0] == 1
+            assert selector.select(session, 1, exclude_ids=[1]) is None
+            assert selector.select(session, 1, exclude_ids=[1], fallback=True)[0] == 2
+        with SessionLocal() as session:
+            p1, p2 = session.get(Proxy, 1), session.get(Proxy, 2)
+            assert (p1.used_count, p1.success_count, p1.fail_streak) == (19, 9, 9)
+            assert p2.used_count == 11 and p2.cooldown_until is not None
+        assert len(proxy_selects) == 1, proxy_selects
+        print("   ✅ Failing proxy 1 dropped below 2, cooling proxy 2 skipped, DB counters written")
+
+        print("3. Cooldowns come back through the timer wheel...")
+        wheel = _TimerWheel(tick=1.0, slots=8)
+        start = wheel.current
+        wheel.add(7, start + 3.0)
+        wheel.add(8, start + 20.0)  # more than one revolution
+        assert wheel.expire(start + 2.0) == []
+        assert wheel.expire(start + 3.0) == [7]
+        assert wheel.expire(start + 19.5) == []
+        assert wheel.expire(start + 21.0) == [8]
+        time.sleep(2.1)
+        with SessionLocal() as session:
+            assert selector.select(session, 1, exclude_ids=[1])[0] == 2
+        print("   ✅ Expired cooldown puts the proxy back into the heap")
+
+        print("4. Proxy changes reload the index...")
+        with SessionLocal() as session:
+            session.get(Proxy, 4).is_active = True
+            session.commit()
+        with SessionLocal() as session:
+            assert selector.select(session, 1)[0] == 4
+        assert len(proxy_selects) == 2, proxy_selects
+        print("   ✅ Activated proxy 4 (priority 1) picked after commit")
+
+        print("5. Stat commits keep the index...")
+        with SessionLocal() as session:
+            proxy = session.get(Proxy, 4)
+            proxy.used_count = (proxy.used_count or 0) + 1
+            proxy.success_count = (proxy.success_count or 0) + 1
+            session.commit()
+        with SessionLocal() as session:
+            assert selector.select(session, 1)[0] == 4
+        assert len(proxy_selects) == 2, proxy_selects
+        print("   ✅ used_count / success_count commit did not reload the user's proxies")
+    finally:
+        proxy_selector._selector = None
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_proxy_selector())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
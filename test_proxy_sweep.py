@@ -0,0 +1,149 @@
+"""Test script for the concurrent proxy health sweep (fake probe, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Proxy
+from services.proxy_sweep import sweep_proxies, apply_health_results, apply_reactivation
+
+
+async def test_proxy_sweep():
+    """600 proxies in seconds, limits respected, results written in batches."""
+    print("=" * 70)
+    print("Testing concurrent proxy sweep")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sweep.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    # 600 прокси на 30 upstream-хостах; каждый 10-й не работает, прокси 1 уже падал 4 раза
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        for i in range(1, 601):
+            session.add(Proxy(id=i, user_id=1, scheme="http", host=f"10.0.{i % 30}.1:{8000 + i}",
+                              used_count=0, success_count=0, fail_streak=4 if i == 1 else 0))
+        session.commit()
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    running = {"total": 0, "max": 0}
+    per_host = {}
+    per_host_max = {}
+
+    async def fake_probe(http, proxy_url, proxy_host, test_url, timeout):
+        upstream = proxy_host.split(":")[0]
+        running["total"] += 1
+        per_host[upstream] = per_host.get(upstream, 0) + 1
+        running["max"] = max(running["max"], running["total"])
+        per_host_max[upstream] = max(per_host_max.get(upstream, 0), per_host[upstream])
+        try:
+            port = int(proxy_host.split(":")[1])
+            if port == 8000 + 7:
+                await asyncio.sleep(10)  # hangs - per-proxy timeout
+            await asyncio.sleep(0.05)
+            return (port - 8000) % 10 != 0 and port != 8000 + 1
+        finally:
+            running["total"] -= 1
+            per_host[upstream] -= 1
+
+    print("1. Sweep of 600 proxies...")
+    with SessionLocal() as session:
+        proxies = session.query(Proxy).all()
+        started = time.monotonic()
+        results = await sweep_proxies(
+            session, proxies, probe=fake_probe,
+            concurrency=50, per_host=3, timeout=1, batch_size=100,
+        )
+        duration = time.monotonic() - started
+    assert len(results) == 600
+    assert duration < 10, duration  # одна за другой: 600 x 0.55 с
+    assert running["max"] <= 50 and max(per_host_max.values()) <= 3, (running, per_host_max)
+    assert len(commits) == 6, commits
+    timed_out = [r for r in results if r["error"] == "timeout"]
+    assert [r["proxy_id"] for r in timed_out] == [7], timed_out
+    print(f"   ✅ {duration:.1f}s, max {running['max']} at once, max {max(per_host_max.values())} per host, "
+          f"{len(commits)} commits")
+
+    print("2. Results written with mark_success / mark_failure rules...")
+    with SessionLocal() as session:
+        ok = session.get(Proxy, 2)
+        assert (ok.used_count, ok.success_count, ok.fail_streak) == (1, 1, 0)
+        bad = session.get(Proxy, 10)
+        assert (bad.used_count, bad.fail_streak, bad.is_active, bad.cooldown_until) == (1, 1, True, None)
+        dead = session.get(Proxy, 1)
+        assert dead.fail_streak == 5 and not dead.is_active and dead.cooldown_until is not None
+        failed = session.query(Proxy).filter(Proxy.fail_streak > 0).count()
+    assert failed == 62, failed  # каждый 10-й, #1 и зависший #7
+    print("   ✅ healthy counted, failing proxy 1 deactivated after 5 failures in a row")
+
+    print("3. Reactivation sweep...")
+    commits.clear()
+
+    async def all_working(http, proxy_url, proxy_host, test_url, timeout):
+        return True
+
+    with SessionLocal() as session:
+        inactive = session.query(Proxy).filter(Proxy.is_active == False).all()
+        results = await sweep_proxies(session, inactive, apply=apply_reactivation, probe=all_working)
+    with SessionLocal() as session:
+        dead = session.get(Proxy, 1)
+        assert dead.is_active and dead.fail_streak == 0 and dead.cooldown_until is None
+    assert len(results) == 1 and len(commits) == 1
+    print("   ✅ Recovered proxy reactivated")
+
+    print("4. apply_health_results without cooldown...")
+    with SessionLocal() as session:
+        apply_health_results(session, [{"proxy_id": 10, "healthy": False}], apply_cooldown=False)
+        apply_health_results(session, [{"proxy_id": 10, "healthy": False}], apply_cooldown=False)
+        proxy = session.get(Proxy, 10)
+        assert proxy.fail_streak == 3 and proxy.cooldown_until is None
+    print("   ✅ 3 failures in a row, no cooldown")
+
+    print("5. One dominant gateway does not starve other hosts...")
+    with SessionLocal() as session:
+        for i in range(1001, 1201):
+            session.add(Proxy(id=i, user_id=1, scheme="http", host=f"10.9.9.9:{i}"))
+        for i in range(1201, 1211):
+            session.add(Proxy(id=i, user_id=1, scheme="http", host=f"10.8.{i}.1:8080"))
+        session.commit()
+    finished_at = {}
+
+    async def slow_working(http, proxy_url, proxy_host, test_url, timeout):
+        await asyncio.sleep(0.05)
+        finished_at[proxy_host] = time.monotonic()
+        return True
+
+    with SessionLocal() as session:
+        proxies = session.query(Proxy).filter(Proxy.id > 1000).order_by(Proxy.id).all()  # gateway первым
+        started = time.monotonic()
+        await sweep_proxies(session, proxies, probe=slow_working, concurrency=20, per_host=5, timeout=1)
+    others = max(t for host, t in finished_at.items() if not host.startswith("10.9.9.9")) - started
+    gateway = max(t for host, t in finished_at.items() if host.startswith("10.9.9.9")) - started
+    assert others < 0.5 and gateway > 1.5, (others, gateway)
+    print(f"   ✅ Other hosts done in {others:.2f}s while the gateway took {gateway:.1f}s")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_proxy_sweep())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
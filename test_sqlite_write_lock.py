@@ -0,0 +1,121 @@
+"""Test script for the SQLite production profile write lock (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from config import get_settings
+from database import SerializedWriteSession, get_engine, get_session_factory, init_db
+from models import User
+
+
+def test_sqlite_write_lock():
+    """Writers queue across threads and fail with "database is locked" instead of writing unlocked."""
+    print("=" * 70)
+    print("Testing SQLite write lock")
+    print("=" * 70)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "lock.db")
+
+    print("1. Session class follows the engine profile...")
+    plain = get_engine(f"sqlite:///{db_path}", sqlite_production=False)
+    assert not issubclass(get_session_factory(plain).class_, SerializedWriteSession)
+    engine = get_engine(f"sqlite:///{db_path}", sqlite_production=True)
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+    assert issubclass(SessionLocal.class_, SerializedWriteSession)
+    print("   ✅ only a production engine gets serialized sessions")
+
+    print("2. Writers of other threads wait for the commit...")
+    holder = SessionLocal()
+    holder.add(User(id=1, username="user1"))
+    holder.flush()
+    order = []
+
+    def writer():
+        with SessionLocal() as session:
+            session.execute(insert(User).values(id=2, username="user2"))
+            order.append("writer")
+            session.commit()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.3)
+    order.append("holder")
+    holder.commit()
+    thread.join()
+    assert order == ["holder", "writer"], order
+    print("   ✅ Second writer started after the first commit")
+
+    print("3. Another session of the same thread fails at once...")
+    holder.add(User(id=3, username="user3"))
+    holder.flush()
+    other = SessionLocal()
+    started = time.monotonic()
+    try:
+        other.execute(insert(User).values(id=4, username="user4"))
+        raise AssertionError("write without the lock")
+    except OperationalError as e:
+        assert "database is locked" in str(e), e
+    assert time.monotonic() - started < 0.1
+    other.close()
+    holder.commit()
+    print("   ✅ OperationalError 'database is locked', no wait")
+
+    print("4. Event loop thread waits only SQLITE_LOOP_WRITE_WAIT_MS...")
+    released = threading.Event()
+
+    def hold():
+        with SessionLocal() as session:
+            session.execute(insert(User).values(id=5, username="user5"))
+            released.wait(5)
+            session.commit()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    time.sleep(0.1)
+
+    async def write_on_loop():
+        with SessionLocal() as session:
+            session.add(User(id=6, username="user6"))
+            session.commit()
+
+    started = time.monotonic()
+    try:
+        asyncio.run(write_on_loop())
+        raise AssertionError("write without the lock")
+    except OperationalError as e:
+        assert "database is locked" in str(e), e
+    waited = time.monotonic() - started
+    released.set()
+    thread.join()
+    assert waited < get_settings().sqlite_busy_timeout_ms / 1000 / 2, waited
+    with SessionLocal() as session:
+        assert session.get(User, 6) is None and session.get(User, 5) is not None
+    print(f"   ✅ Loop gave up after {waited * 1000:.0f} ms, nothing written unlocked")
+
+    engine.dispose()
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        test_sqlite_write_lock()
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,96 @@
+"""Test script for the async Telegram transport (local fake Bot API server)."""
+
+import asyncio
+import sys
+import os
+import time
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from aiohttp import web
+from utils.telegram_transport import TelegramTransport
+
+
+async def test_telegram_transport():
+    """429 is retried, per-chat order is kept, per-chat rate is respected."""
+    print("=" * 70)
+    print("Testing async Telegram transport")
+    print("=" * 70)
+
+    received = []
+    state = {"first": True}
+
+    async def handler(request):
+        data = await request.json()
+        if state["first"]:
+            state["first"] = False
+            return web.json_response({"ok": False, "error_code": 429, "parameters": {"retry_after": 1}})
+        received.append((data["chat_id"], data["text"], time.monotonic()))
+        return web.json_response({"ok": True, "result": {"message_id": len(received)}})
+
+    app = web.Application()
+    app.router.add_post("/botTEST/sendMessage", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 8765)
+    await site.start()
+
+    transport = TelegramTransport("TEST", per_chat_rate=5.0, per_chat_burst=1.0)
+    transport.api_url = "http://127.0.0.1:8765/botTEST"
+    await transport.start()
+
+    try:
+        print("1. Burst of 5 messages to one chat and 5 to another...")
+        futures = [
+            transport.enqueue("sendMessage", {"chat_id": chat, "text": str(i)})
+            for i in range(5) for chat in (1, 2)
+        ]
+        results = await asyncio.gather(*futures)
+        assert all(r.get("ok") for r in results), results
+        assert len(received) == 10, received
+        assert transport.retried == 1, transport.retried
+        print("   ✅ All delivered, 429 retried once")
+
+        print("2. Per-chat order and pacing...")
+        chat1 = [r for r in received if r[0] == 1]
+        assert [t for _, t, _ in chat1] == [str(i) for i in range(5)], chat1
+        gaps = [b[2] - a[2] for a, b in zip(chat1, chat1[1:])]
+        assert min(gaps) >= 0.15, gaps
+        print(f"   ✅ Order kept, min gap {min(gaps):.2f}s")
+
+        print("3. Thread-safe submit from another thread...")
+        fut = await asyncio.to_thread(
+            lambda: transport.submit("sendMessage", {"chat_id": 3, "text": "x"}).result(timeout=5)
+        )
+        assert fut.get("ok"), fut
+        print("   ✅ Delivered")
+
+        print("4. Bot calls from the transport loop thread...")
+        from bot import TelegramBot
+        bot = TelegramBot("TEST")
+        bot.transport = transport
+        sent_before = len(received)
+        refused = bot._api_call("sendMessage", {"chat_id": 4, "text": "sync"})
+        assert refused["ok"] is False and "api_call" in refused["description"], refused
+        result = await bot.api_call("sendMessage", {"chat_id": 4, "text": "async"})
+        assert result["ok"] and result["result"]["message_id"] == sent_before + 1, result
+        assert [t for c, t, _ in received if c == 4] == ["async"], received
+        print("   ✅ Blocking call refused with ok=False, await bot.api_call() returns message_id")
+    finally:
+        await transport.close()
+        await runner.cleanup()
+
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_telegram_transport())
+    except Exception as e:
+        print(f"\n❌ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,139 @@
+"""Test script for the shared username lookup cache (fake fetches, temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from database import get_async_engine, get_async_session_factory, get_engine, get_session_factory, init_db
+from models import User, UsernameCacheEntry
+from services.username_cache import UsernameResultCache, SOURCE_RAPIDAPI, SOURCE_API_V2
+
+
+async def test_username_cache():
+    """TTL by outcome, single-flight, user-scoped errors, DB tier."""
+    print("=" * 70)
+    print("Testing username lookup cache")
+    print("=" * 70)
+
+    calls = []
+
+    def make_fetch(result, delay=0.05):
+        async def fetch():
+            calls.append(result.get("username"))
+            await asyncio.sleep(delay)
+            return dict(result)
+        return fetch
+
+    cache = UsernameResultCache(exists_ttl=60, not_found_ttl=60, error_ttl=0, max_entries=100, db_tier=False)
+
+    print("1. Single-flight for concurrent lookups...")
+    fetch = make_fetch({"username": "alpha", "exists": True, "error": None})
+    results = await asyncio.gather(*[
+        cache.get_or_fetch(SOURCE_RAPIDAPI, name, fetch) for name in ("alpha", "@Alpha", "ALPHA", "alpha")
+    ])
+    assert calls == ["alpha"], calls
+    assert all(r["exists"] is True for r, _ in results)
+    assert sum(1 for _, from_cache in results if not from_cache) == 1
+    print(f"   ✅ 4 lookups -> 1 fetch, stats: {cache.stats()}")
+
+    print("2. Cache hit and per-source keys...")
+    result, from_cache = await cache.get_or_fetch(SOURCE_RAPIDAPI, "alpha", fetch)
+    assert from_cache and result["exists"] is True and len(calls) == 1
+    await cache.get_or_fetch(SOURCE_API_V2, "alpha", fetch)
+    assert len(calls) == 2
+    print("   ✅ Repeated lookup served from cache, other source fetched separately")
+
+    print("3. Errors are not shared...")
+    calls.clear()
+    await cache.get_or_fetch(SOURCE_RAPIDAPI, "beta", make_fetch({"username": "beta", "exists": None, "error": "timeout"}))
+    await cache.get_or_fetch(SOURCE_RAPIDAPI, "beta", make_fetch({"username": "beta", "exists": None, "error": "timeout"}))
+    assert len(calls) == 2
+    calls.clear()
+    user_scoped = make_fetch({"username": "gamma", "exists": None, "error": "no_api_keys_available"})
+    await cache.get_or_fetch(SOURCE_RAPIDAPI, "gamma", user_scoped)
+    assert cache.get(SOURCE_RAPIDAPI, "gamma") is None
+    print("   ✅ error_ttl=0 and user-scoped errors are refetched")
+
+    print("4. Single-flight across threads / event loops...")
+    calls.clear()
+    slow = make_fetch({"username": "delta", "exists": False, "error": None}, delay=0.3)
+    thread_results = []
+
+    def worker():
+        thread_results.append(asyncio.run(cache.get_or_fetch(SOURCE_RAPIDAPI, "delta", slow)))
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1, calls
+    assert all(r["exists"] is False for r, _ in thread_results)
+    print("   ✅ 3 loops -> 1 fetch")
+
+    print("5. DB tier survives a new in-memory cache...")
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    engine = get_engine(f"sqlite:///{db_path}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+    with SessionLocal() as session:
+        db_cache = UsernameResultCache(exists_ttl=60, not_found_ttl=60, error_ttl=0, max_entries=100, db_tier=True)
+        calls.clear()
+        await db_cache.get_or_fetch(SOURCE_RAPIDAPI, "Epsilon", make_fetch({"username": "epsilon", "exists": True, "error": None}), session)
+        assert session.query(UsernameCacheEntry).count() == 1
+
+        restarted = UsernameResultCache(exists_ttl=60, not_found_ttl=60, error_ttl=0, max_entries=100, db_tier=True)
+        result, from_cache = await restarted.get_or_fetch(SOURCE_RAPIDAPI, "epsilon", make_fetch({"username": "epsilon"}), session)
+        assert from_cache and result["exists"] is True and len(calls) == 1
+    print("   ✅ Result loaded from username_cache table")
+
+    print("6. DB tier write keeps the caller's transaction...")
+    with SessionLocal() as other:  # другой процесс уже записал тот же username
+        other.add(UsernameCacheEntry(source=SOURCE_RAPIDAPI, username="zeta", account_exists=False,
+                                     payload="{}", expires_at=datetime.utcnow()))
+        other.commit()
+    zeta = lambda s: s.query(UsernameCacheEntry).filter(UsernameCacheEntry.username == "zeta").all()
+    with SessionLocal() as session:
+        assert session.get(User, 1) is None  # транзакция только читала
+        db_cache.put(SOURCE_RAPIDAPI, "Zeta", {"username": "zeta", "exists": True, "error": None}, session)
+        session.rollback()
+    with SessionLocal() as session:
+        rows = zeta(session)
+        assert len(rows) == 1 and rows[0].account_exists is True, rows
+    with SessionLocal() as session:
+        session.add(User(id=1, username="pending"))
+        session.flush()  # транзакция уже пишет - запись кэша идёт в неё
+        db_cache.put(SOURCE_RAPIDAPI, "Zeta", {"username": "zeta", "exists": False, "error": None}, session)
+        assert session.in_transaction() and session.get(User, 1) is not None
+        with SessionLocal() as other:
+            assert other.get(User, 1) is None and zeta(other)[0].account_exists is True
+        session.commit()
+    with SessionLocal() as session:
+        assert session.get(User, 1) is not None and zeta(session)[0].account_exists is False
+    async_sessions = get_async_session_factory(get_async_engine(f"sqlite:///{db_path}"))
+    async with async_sessions() as session:
+        await db_cache.aput(SOURCE_API_V2, "Eta", {"username": "eta", "exists": False, "error": None}, session)
+    with SessionLocal() as session:
+        assert session.query(UsernameCacheEntry).filter(UsernameCacheEntry.username == "eta").count() == 1
+    print("   ✅ Upsert over another writer's row, caller's transaction neither committed nor rolled back")
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_username_cache())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
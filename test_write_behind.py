@@ -0,0 +1,114 @@
+"""Test script for the write-behind buffer (temporary SQLite DB)."""
+
+import asyncio
+import sys
+import os
+import tempfile
+from datetime import date
+
+# Add project directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'project'))
+
+from sqlalchemy import event
+
+from database import get_engine, get_session_factory, init_db
+from models import User, Account, Proxy, ExpiryNotification
+from services.accounts import mark_account_done
+from services.proxy_service import update_proxy_stats
+from services.expiry_notifications import mark_notification_sent
+import services.write_behind as write_behind
+
+
+async def test_write_behind():
+    """Buffered writes land in one transaction, failed flushes are retried once."""
+    print("=" * 70)
+    print("Testing write-behind buffer")
+    print("=" * 70)
+
+    engine = get_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'wb.db')}")
+    init_db(engine)
+    SessionLocal = get_session_factory(engine)
+
+    with SessionLocal() as session:
+        session.add(User(id=1, username="tester", is_active=True))
+        session.add(Proxy(id=1, user_id=1, scheme="http", host="127.0.0.1:8080",
+                          used_count=0, success_count=0, fail_streak=5))
+        for i in range(10):
+            session.add(Account(id=i + 1, user_id=1, account=f"Acc{i}"))
+        session.commit()
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    buffer = write_behind.WriteBehindBuffer(SessionLocal, flush_ms=60000, max_items=10000)
+    write_behind._buffer = buffer
+    try:
+        print("1. Writes are buffered, not committed...")
+        with SessionLocal() as session:
+            proxy = session.get(Proxy, 1)
+            for i in range(10):
+                assert mark_account_done(session, 1, f"@acc{i}")
+            for success in (False, False, True, False):
+                update_proxy_stats(session, proxy, success, cooldown_seconds=60)
+            mark_notification_sent(session, 1, 1, "expired")
+            assert not mark_account_done(session, 1, "unknown")
+        with SessionLocal() as session:
+            assert session.query(Account).filter(Account.done == True).count() == 0
+        assert not commits, commits
+        print(f"   ✅ {buffer.pending()} items buffered, 0 commits")
+
+        print("2. One flush = one transaction...")
+        assert buffer.flush() == 12
+        assert len(commits) == 1, commits
+        with SessionLocal() as session:
+            assert session.query(Account).filter(Account.done == True, Account.date_of_finish == date.today()).count() == 10
+            proxy = session.get(Proxy, 1)
+            assert (proxy.used_count, proxy.success_count, proxy.fail_streak) == (4, 1, 1), \
+                (proxy.used_count, proxy.success_count, proxy.fail_streak)
+            assert proxy.cooldown_until is not None
+            assert session.query(ExpiryNotification).count() == 1
+        print("   ✅ accounts, proxy stats and notification written")
+
+        print("3. Failed flush is retried without double counting...")
+        buffer.record_proxy_result(1, False)
+        buffer.mark_notification_sent(1, 1, "expired")  # already there - skipped
+
+        def broken_factory():
+            raise RuntimeError("database is locked")
+
+        buffer._SessionLocal = broken_factory
+        assert buffer.flush() == 0 and buffer.pending() == 2
+        buffer._SessionLocal = SessionLocal
+        buffer.record_proxy_result(1, False)
+        assert buffer.flush() == 2
+        with SessionLocal() as session:
+            proxy = session.get(Proxy, 1)
+            assert (proxy.used_count, proxy.fail_streak) == (6, 3), (proxy.used_count, proxy.fail_streak)
+            assert session.query(ExpiryNotification).count() == 1
+        print("   ✅ used_count 4 -> 6, fail_streak 1 -> 3, duplicate notification skipped")
+
+        print("4. stop_write_behind() flushes leftovers...")
+        buffer.record_proxy_result(1, True)
+        write_behind.stop_write_behind()
+        assert write_behind.get_write_behind() is None
+        with SessionLocal() as session:
+            proxy = session.get(Proxy, 1)
+            assert (proxy.used_count, proxy.fail_streak, proxy.cooldown_until) == (7, 0, None)
+        print("   ✅ Buffer flushed on shutdown")
+    finally:
+        write_behind._buffer = None
+
+    print()
+    print("=" * 70)
+    print("✅ ALL TESTS PASSED!")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(test_write_behind())
+    except Exception as e:
+        print(f"\n❌ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)